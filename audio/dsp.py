@@ -0,0 +1,165 @@
+# Per-track insert chain: high-pass filter, parametric EQ and pan/balance.
+# The filters of a track are one cascade of second-order sections run by scipy's sosfilt over the
+# whole (frames, channels) block; the filter state (zi) is carried from block to block, so a block
+# edge is inaudible. Settings live in the song data, keyed by the track's file path, and are saved
+# as-is in .wproj:
+#   song["track_dsp"] = {"/path/Bass.wav": {"hpf": 80.0, "pan": -0.3,
+#                                           "eq": [{"freq": 250.0, "gain": -3.0, "q": 1.0}, ...]}}
+# Processors left at their neutral value (hpf 0, band gain 0, pan 0) are dropped when the chain is
+# built; a track whose whole chain is neutral gets no TrackDSP at all and costs nothing in the mix.
+import numpy as np
+
+HPF_ORDER = 2                 # 12 dB/octave
+HPF_RANGE = (20.0, 500.0)     # Hz
+EQ_BANDS = 3                  # Bands offered by the track dialog
+EQ_GAIN_RANGE = (-15.0, 15.0)  # dB
+EQ_Q_RANGE = (0.3, 8.0)
+DEFAULT_EQ = ({"freq": 120.0, "gain": 0.0, "q": 0.8},
+              {"freq": 1000.0, "gain": 0.0, "q": 1.0},
+              {"freq": 6000.0, "gain": 0.0, "q": 0.8})
+
+
+_signal = None
+
+
+def _scipy_signal():
+    """scipy.signal, imported when the first filter is designed (the import takes about a second)."""
+    global _signal
+    if _signal is None:
+        import scipy.signal
+        _signal = scipy.signal
+    return _signal
+
+
+def _clamp(value, low, high):
+    return max(low, min(high, float(value)))
+
+
+def normalize_dsp(settings):
+    """Clean settings dict (hpf in Hz or 0, eq bands, pan in -1..1) from stored or UI data."""
+    settings = settings or {}
+    out = {"hpf": 0.0, "eq": [], "pan": 0.0}
+    try:
+        hpf = float(settings.get("hpf", 0.0) or 0.0)
+        out["hpf"] = _clamp(hpf, *HPF_RANGE) if hpf > 0 else 0.0
+    except Exception:
+        pass
+    for band in settings.get("eq", []) or []:
+        try:
+            out["eq"].append({
+                "freq": _clamp(band.get("freq", 1000.0), 20.0, 20000.0),
+                "gain": _clamp(band.get("gain", 0.0), *EQ_GAIN_RANGE),
+                "q": _clamp(band.get("q", 1.0), *EQ_Q_RANGE),
+            })
+        except Exception:
+            continue
+    try:
+        out["pan"] = _clamp(settings.get("pan", 0.0) or 0.0, -1.0, 1.0)
+    except Exception:
+        pass
+    return out
+
+
+def is_neutral(settings):
+    s = normalize_dsp(settings)
+    return s["hpf"] <= 0 and s["pan"] == 0 and all(abs(b["gain"]) < 0.05 for b in s["eq"])
+
+
+def peaking_sos(freq, gain_db, q, sample_rate):
+    """Peaking EQ biquad (RBJ Audio EQ Cookbook) as one second-order section."""
+    a = 10.0 ** (gain_db / 40.0)
+    w0 = 2.0 * np.pi * freq / sample_rate
+    alpha = np.sin(w0) / (2.0 * q)
+    cos_w0 = np.cos(w0)
+    b = np.array([1.0 + alpha * a, -2.0 * cos_w0, 1.0 - alpha * a])
+    den = np.array([1.0 + alpha / a, -2.0 * cos_w0, 1.0 - alpha / a])
+    return np.concatenate([b / den[0], den / den[0]])[None, :]
+
+
+def design_sos(settings, sample_rate):
+    """Cascade of the active filters of a settings dict, or None when there is nothing to filter."""
+    s = normalize_dsp(settings)
+    signal = _scipy_signal()  # Also binds sosfilt for TrackDSP.process
+    nyquist = 0.5 * sample_rate
+    sections = []
+    if 0 < s["hpf"] < nyquist:
+        sections.append(signal.butter(HPF_ORDER, s["hpf"], btype='highpass', fs=sample_rate, output='sos'))
+    for band in s["eq"]:
+        if abs(band["gain"]) >= 0.05 and band["freq"] < nyquist:
+            sections.append(peaking_sos(band["freq"], band["gain"], band["q"], sample_rate))
+    return np.concatenate(sections) if sections else None
+
+
+def pan_gains(pan):
+    """(left, right) gains of the balance law: unity at center, the far side fades out.
+    Mono tracks are mixed at unity on both sides, so centered pan matches the plain mix.
+    """
+    pan = _clamp(pan, -1.0, 1.0)
+    return np.array([min(1.0, 1.0 - pan), min(1.0, 1.0 + pan)])
+
+
+class TrackDSP:
+    """Insert chain of one track with its running filter state."""
+
+    __slots__ = ('settings', 'sample_rate', 'sos', 'pan', '_zi', '_position')
+
+    def __init__(self, settings, sample_rate):
+        self.settings = normalize_dsp(settings)
+        self.sample_rate = int(sample_rate)
+        self.sos = design_sos(self.settings, self.sample_rate)
+        self.pan = pan_gains(self.settings["pan"]) if self.settings["pan"] != 0 else None
+        self._zi = None
+        self._position = None
+
+    def copy(self):
+        """Same chain with fresh filter state (for another player)."""
+        return TrackDSP(self.settings, self.sample_rate)
+
+    def reset(self):
+        self._zi = None
+        self._position = None
+
+    def process(self, block, position):
+        """Filter and pan a (frames, channels) block that starts at song sample `position`.
+        The state carries over only when this block continues the previous one; after a seek, loop
+        jump or a muted stretch the filters restart from rest. A stereo block may be panned in
+        place (the mixer passes its own gain-scaled copy); a panned mono block comes back stereo.
+        """
+        if self.sos is not None:
+            zi = self._zi
+            if zi is None or position != self._position or zi.shape[2] != block.shape[1]:
+                zi = np.zeros((len(self.sos), 2, block.shape[1]))
+            block, self._zi = _signal.sosfilt(self.sos, block, axis=0, zi=zi)
+            self._position = position + len(block)
+        if self.pan is not None:
+            if block.shape[1] == 1:
+                block = block * self.pan
+            else:
+                block[:, :2] *= self.pan
+        return block
+
+
+def build_track_dsp(settings, sample_rate):
+    """TrackDSP for the settings, or None when every processor is neutral (bypassed)."""
+    if not settings or is_neutral(settings):
+        return None
+    return TrackDSP(settings, sample_rate)
+
+
+def song_track_dsp(song_data, file_path):
+    """Stored insert settings of a track in the song (normalized), or None."""
+    stored = ((song_data or {}).get("track_dsp") or {}).get(file_path)
+    return normalize_dsp(stored) if stored else None
+
+
+def set_song_track_dsp(song_data, file_path, settings):
+    """Store a track's insert settings in the song data; neutral settings remove the entry."""
+    chains = dict(song_data.get("track_dsp") or {})
+    if settings is None or is_neutral(settings):
+        chains.pop(file_path, None)
+    else:
+        chains[file_path] = normalize_dsp(settings)
+    if chains:
+        song_data["track_dsp"] = chains
+    else:
+        song_data.pop("track_dsp", None)
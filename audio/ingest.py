@@ -0,0 +1,193 @@
+# Decode-once ingest of the stems chosen in the song form.
+# Each stem is read a single time and that read produces everything the app needs from it: the
+# optimized audio_opt cache file (the one AudioOptimizeWorker and the player look for), the routing
+# decision stored in it, and the stem's timeline envelope (see combine_envelopes). Stems whose
+# decoded frames fit in DECODE_ONCE_BYTES are kept in memory between the peak scan and the write;
+# longer ones are read twice, as the streaming optimizer always did.
+# A stem that already has a cache file is only read for its envelope, and one the library already
+# analyzed (audio/library.py) is not read at all.
+# StemIngest runs the stems one at a time on a background thread, from the moment they are
+# chosen, so most of the work is done by the time the form is confirmed.
+import os
+import threading
+from collections import deque
+import numpy as np
+from PyQt5.QtCore import QObject, pyqtSignal
+from audio.library import audio_cache_dir, cache_key_for
+from audio.route_classifier import route_from_metadata
+from audio.storage import load_sample_format
+from audio.wavstream import ENVELOPE_POINTS, StemEnvelope, WavReader, optimize_to_cache
+
+DECODE_ONCE_BYTES = 128 * 1024 * 1024  # Decoded stem kept for the second pass (a 6-min stereo stem)
+
+
+class IngestCancelled(Exception):
+    pass
+
+
+def ingest_stem(path, sample_format=None, should_stop=None, progress=None, library=None,
+                keep_decoded=DECODE_ONCE_BYTES):
+    """Cache file, route and envelope of one stem. Returns a dict with 'frames', 'sample_rate',
+    'peak', 'envelope' (float32 StemEnvelope values), 'left', 'info', 'cache_key', 'npz_path' and
+    'source' ('library', 'cache' or 'decoded'). should_stop() is polled between chunks (raises
+    IngestCancelled); progress(fraction) reports the read."""
+    st = os.stat(path)
+    key = cache_key_for(path, st)
+    cache_dir = audio_cache_dir()
+    os.makedirs(cache_dir, exist_ok=True)
+    npz_path = os.path.join(cache_dir, f"{key}.npz")
+    result = {'path': path, 'cache_key': key, 'npz_path': npz_path}
+
+    def checkpoint(fraction):
+        if should_stop is not None and should_stop():
+            raise IngestCancelled()
+        if progress is not None and fraction is not None:
+            progress(fraction)
+
+    if os.path.exists(npz_path):
+        stored = library.stem_analysis(path, st) if library is not None else None
+        if stored is not None:
+            stored.update(result, source='library')
+            return stored
+        # Cache already written (the stem was used before): one read for the envelope
+        with WavReader(path) as reader:
+            envelope = StemEnvelope(reader.frames, ENVELOPE_POINTS)
+            done = 0
+            for block in reader.chunks():
+                envelope.feed(block)
+                done += len(block)
+                checkpoint(done / max(1, reader.frames))
+            rate = int(reader.sample_rate)
+        with np.load(npz_path) as data:
+            route = route_from_metadata(data)
+        left, info = route if route is not None else (None, None)
+        source = 'cache'
+    else:
+        with WavReader(path) as reader:
+            frames = reader.frames
+        envelope = StemEnvelope(frames, ENVELOPE_POINTS)
+        rate, left, info = optimize_to_cache(path, npz_path, progress=checkpoint,
+                                             sample_format=sample_format or load_sample_format(),
+                                             envelope=envelope, keep_decoded=keep_decoded)
+        source = 'decoded'
+    result.update(frames=envelope.frames, sample_rate=int(rate), peak=float(envelope.peak),
+                  envelope=envelope.envelope(), left=left, info=info, source=source)
+    return result
+
+
+class StemIngest(QObject):
+    """Background ingest_stem() of the stems added with add(), one at a time in order. results and
+    failed ({path: result or error}) are filled on the thread that owns the object, before
+    stemDone / stemFailed reach other receivers."""
+    progress = pyqtSignal(str, float)     # path, 0..1
+    stemDone = pyqtSignal(str, object)    # path, ingest_stem() result
+    stemFailed = pyqtSignal(str, str)     # path, error message
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.results = {}
+        self.failed = {}
+        self._wanted = set()
+        self.sample_format = load_sample_format()
+        # Worker state, guarded by _cond
+        self._cond = threading.Condition()
+        self._queue = deque()
+        self._current = None
+        self._cancel_current = False
+        self._running = True
+        self._thread = None
+        self.stemDone.connect(self._store_result)
+        self.stemFailed.connect(self._store_error)
+
+    def add(self, paths):
+        with self._cond:
+            for path in paths:
+                if path in self._wanted:
+                    continue
+                self._wanted.add(path)
+                if not path.lower().endswith('.wav'):
+                    # Played (and shown) without an optimized cache, as before
+                    self.failed[path] = 'unsupported'
+                    continue
+                self._queue.append(path)
+            if self._queue and self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="StemIngest", daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+
+    def cancel(self, path):
+        """Forget a stem: dropped from the queue, or stopped if it is being read."""
+        with self._cond:
+            self._wanted.discard(path)
+            try:
+                self._queue.remove(path)
+            except ValueError:
+                pass
+            if self._current == path:
+                self._cancel_current = True
+        self.results.pop(path, None)
+        self.failed.pop(path, None)
+
+    def settled(self, paths):
+        """True once every path has a result or an error."""
+        return all(p in self.results or p in self.failed for p in paths)
+
+    def state(self, path):
+        """'done', 'failed', 'running' or 'queued'."""
+        if path in self.results:
+            return 'done'
+        if path in self.failed:
+            return 'failed'
+        with self._cond:
+            return 'running' if self._current == path else 'queued'
+
+    def shutdown(self):
+        with self._cond:
+            self._queue.clear()
+            self._cancel_current = True
+            self._running = False
+            self._cond.notify_all()
+
+    def _store_result(self, path, result):
+        if path in self._wanted:
+            self.results[path] = result
+
+    def _store_error(self, path, message):
+        if path in self._wanted:
+            self.failed[path] = message
+
+    def _should_stop(self):
+        return self._cancel_current or not self._running
+
+    def _run(self):
+        library = None
+        try:
+            from audio.library import StemLibrary
+            library = StemLibrary()
+        except Exception:
+            pass
+        try:
+            while True:
+                with self._cond:
+                    while not self._queue and self._running:
+                        self._cond.wait()
+                    if not self._running:
+                        return
+                    path = self._queue.popleft()
+                    self._current = path
+                    self._cancel_current = False
+                try:
+                    result = ingest_stem(path, self.sample_format, should_stop=self._should_stop,
+                                         progress=lambda f, p=path: self.progress.emit(p, f), library=library)
+                    self.stemDone.emit(path, result)
+                except IngestCancelled:
+                    pass
+                except Exception as e:
+                    print(f"[StemIngest] Could not ingest {path}: {e}")
+                    self.stemFailed.emit(path, str(e))
+                finally:
+                    with self._cond:
+                        self._current = None
+        finally:
+            if library is not None:
+                library.close()
@@ -0,0 +1,547 @@
+# Local stem library: an SQLite index of the song folders the user keeps their stems in.
+# The configured folders are scanned in the background. Every WAV gets a row with its header
+# data (rate, channels, length) as soon as it is found, so it can be searched right away. A second,
+# slower stage analyzes each new or changed stem once: it writes the optimized audio_opt cache file
+# (the same file AudioOptimizeWorker and the player look for), and stores the source peak, the
+# routing decision and a 1200-point RMS envelope. A song picked from the library therefore opens
+# with its caches warm and its timeline envelope computed from the database, without decoding.
+# Each stem folder is a song. The name, key, BPM, banner and track order used the last time it went
+# into a service are remembered and come back the next time it is picked.
+# Rescans only stat the files: unchanged stems (same size and mtime) are not read again.
+# Each thread opens its own StemLibrary (sqlite3 connections are per thread); the database is in
+# WAL mode so searches on the GUI thread do not wait for the scanner's writes.
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from PyQt5.QtCore import QStandardPaths
+from audio.probe import read_wav_header, SUPPORTED_EXTENSIONS
+
+LIBRARY_VERSION = 2         # Schema version (a database of another version is rebuilt)
+SEARCH_LIMIT = 100          # Songs returned by a search
+ENVELOPE_POINTS = 1200      # Same as audio.wavstream.ENVELOPE_POINTS (kept here: numpy-free import)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS folders (path TEXT PRIMARY KEY);
+CREATE TABLE IF NOT EXISTS stems (
+    path TEXT PRIMARY KEY,
+    song_dir TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    sample_rate INTEGER,
+    channels INTEGER,
+    frames INTEGER,
+    duration REAL,
+    error TEXT,
+    peak REAL,
+    route_left INTEGER,
+    route_method TEXT,
+    envelope BLOB,
+    cache_key TEXT,
+    analyzed REAL
+);
+CREATE INDEX IF NOT EXISTS stems_song ON stems(song_dir);
+CREATE TABLE IF NOT EXISTS songs (
+    dir TEXT PRIMARY KEY,
+    folder_name TEXT NOT NULL,
+    title TEXT,
+    key TEXT,
+    bpm TEXT,
+    banner_image TEXT,
+    tracks TEXT,
+    stems INTEGER NOT NULL DEFAULT 0,
+    duration REAL NOT NULL DEFAULT 0,
+    search TEXT NOT NULL DEFAULT '',
+    last_used REAL,
+    uses INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+
+class ScanStopped(Exception):
+    pass
+
+
+def _app_dir(location, fallback):
+    try:
+        base = QStandardPaths.writableLocation(location)
+        if not base:
+            base = os.path.expanduser(fallback)
+    except Exception:
+        base = os.path.expanduser(fallback)
+    return base
+
+
+def library_path():
+    """Location of the library database."""
+    base = _app_dir(QStandardPaths.AppDataLocation, '~/Library/Application Support/AppPythonAdrian')
+    return os.path.join(base, 'library', 'library.sqlite3')
+
+
+def audio_cache_dir():
+    """The audio_opt cache folder of the player and AudioOptimizeWorker."""
+    base = _app_dir(QStandardPaths.CacheLocation, '~/Library/Caches/AppPythonAdrian')
+    return os.path.join(base, 'audio_opt')
+
+
+def cache_key_for(path, st=None):
+    """Cache file key of a stem (same key as AudioPlayer._cache_key_for)."""
+    abs_path = os.path.abspath(path)
+    if st is None:
+        st = os.stat(abs_path)
+    payload = f"{abs_path}|{int(st.st_mtime)}|{int(st.st_size)}"
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def fold(text):
+    """Lower-case text without accents (search keys and queries)."""
+    text = unicodedata.normalize('NFD', str(text or ''))
+    return ''.join(c for c in text if not unicodedata.combining(c)).lower()
+
+
+def _like_pattern(word):
+    escaped = word.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f"%{escaped}%"
+
+
+def _under(path, root):
+    root = root.rstrip(os.sep)
+    return path == root or path.startswith(root + os.sep)
+
+
+class StemLibrary:
+    """Connection to the library database (use one per thread)."""
+
+    def __init__(self, path=None):
+        self.path = path or library_path()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._db = sqlite3.connect(self.path, timeout=10.0)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        version = self._db.execute("PRAGMA user_version").fetchone()[0]
+        if version == 1:
+            # Same schema; 24-bit WAVE_FORMAT_EXTENSIBLE stems failed to decode in version 1
+            # (their header was fine): analyze them again
+            with self._db:
+                self._db.execute("UPDATE stems SET error = NULL WHERE analyzed IS NULL AND "
+                                 "sample_rate IS NOT NULL AND error LIKE 'unreadable:%'")
+                self._db.execute(f"PRAGMA user_version = {LIBRARY_VERSION}")
+        elif version != LIBRARY_VERSION:
+            # An index, not user data: rebuilt on a schema change
+            with self._db:
+                for table in ('folders', 'stems', 'songs'):
+                    self._db.execute(f"DROP TABLE IF EXISTS {table}")
+                self._db.executescript(_SCHEMA)
+                self._db.execute(f"PRAGMA user_version = {LIBRARY_VERSION}")
+
+    def close(self):
+        try:
+            self._db.close()
+        except Exception:
+            pass
+
+    # Folders -------------------------------------------------------------------------------
+
+    def folders(self):
+        return [r['path'] for r in self._db.execute("SELECT path FROM folders ORDER BY path")]
+
+    def add_folder(self, path):
+        path = os.path.abspath(path)
+        with self._db:
+            self._db.execute("INSERT OR IGNORE INTO folders(path) VALUES (?)", (path,))
+        return path
+
+    def remove_folder(self, path):
+        """Stop indexing a folder; its stems leave the library unless another folder covers them."""
+        path = os.path.abspath(path)
+        with self._db:
+            self._db.execute("DELETE FROM folders WHERE path = ?", (path,))
+            roots = self.folders()
+            gone = [r['path'] for r in self._db.execute("SELECT path FROM stems")
+                    if _under(r['path'], path) and not any(_under(r['path'], root) for root in roots)]
+            self._delete_stems(gone)
+
+    # Scanning ------------------------------------------------------------------------------
+
+    def _walk(self, roots, checkpoint):
+        """{path: stat} of the WAV files under roots (hidden folders are skipped)."""
+        found = {}
+        for root in roots:
+            for folder, dirs, files in os.walk(root):
+                dirs[:] = [d for d in dirs if not d.startswith('.')]
+                if checkpoint is not None and not checkpoint():
+                    raise ScanStopped()
+                for name in files:
+                    if name.startswith('.') or not name.lower().endswith(SUPPORTED_EXTENSIONS):
+                        continue
+                    path = os.path.join(folder, name)
+                    try:
+                        found[path] = os.stat(path)
+                    except OSError:
+                        continue
+        return found
+
+    def _delete_stems(self, paths):
+        dirs = set()
+        for path in paths:
+            self._db.execute("DELETE FROM stems WHERE path = ?", (path,))
+            dirs.add(os.path.dirname(path))
+        self._update_songs(dirs)
+
+    def _update_songs(self, dirs):
+        """Recompute the stem count, length and search key of the songs in dirs (inside a transaction)."""
+        for song_dir in dirs:
+            rows = self._db.execute("SELECT path, duration FROM stems WHERE song_dir = ? ORDER BY path",
+                                    (song_dir,)).fetchall()
+            if not rows:
+                self._db.execute("DELETE FROM songs WHERE dir = ? AND last_used IS NULL", (song_dir,))
+                self._db.execute("UPDATE songs SET stems = 0 WHERE dir = ?", (song_dir,))
+                continue
+            folder_name = os.path.basename(song_dir) or song_dir
+            song = self._db.execute("SELECT title, key FROM songs WHERE dir = ?", (song_dir,)).fetchone()
+            words = [folder_name] + [os.path.splitext(os.path.basename(r['path']))[0] for r in rows]
+            if song is not None:
+                words += [song['title'] or '', song['key'] or '']
+            duration = max((r['duration'] or 0.0) for r in rows)
+            self._db.execute(
+                "INSERT INTO songs(dir, folder_name, stems, duration, search) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(dir) DO UPDATE SET folder_name = excluded.folder_name, stems = excluded.stems, "
+                "duration = excluded.duration, search = excluded.search",
+                (song_dir, folder_name, len(rows), duration, fold(' '.join(words))))
+
+    def index(self, checkpoint=None):
+        """Stage 1 of a scan: find the stems of every folder and record their headers. Returns
+        (new, changed, removed) counts. Stems whose size or mtime changed lose their analysis."""
+        roots = self.folders()
+        found = self._walk(roots, checkpoint)
+        known = {r['path']: (r['size'], r['mtime']) for r in self._db.execute("SELECT path, size, mtime FROM stems")}
+        new = changed = 0
+        touched = set()
+        with self._db:
+            for path, st in found.items():
+                old = known.get(path)
+                if old is not None and old == (st.st_size, st.st_mtime):
+                    continue
+                if old is None:
+                    new += 1
+                else:
+                    changed += 1
+                try:
+                    header = read_wav_header(path)
+                    rate, channels, frames = header['sample_rate'], header['channels'], header['frames']
+                    duration, error = frames / float(rate), ('truncated' if header['truncated'] else None)
+                except Exception as e:
+                    rate = channels = frames = duration = None
+                    error = f"unreadable: {e}"
+                self._db.execute(
+                    "INSERT OR REPLACE INTO stems(path, song_dir, size, mtime, sample_rate, channels, frames, "
+                    "duration, error) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (path, os.path.dirname(path), st.st_size, st.st_mtime, rate, channels, frames, duration, error))
+                touched.add(os.path.dirname(path))
+            # Stems gone from the folders (or from folders no longer in the library). A folder that is
+            # not there at all (an unplugged drive) keeps its stems until it comes back.
+            offline = [root for root in roots if not os.path.isdir(root)]
+            removed = [p for p in known if p not in found and not any(_under(p, root) for root in offline)]
+            self._delete_stems(removed)
+            self._update_songs(touched)
+        return new, changed, len(removed)
+
+    def pending(self):
+        """Stems still to analyze, grouped by song."""
+        return [r['path'] for r in self._db.execute(
+            "SELECT path FROM stems WHERE analyzed IS NULL AND (error IS NULL OR error = 'truncated') "
+            "ORDER BY song_dir, path")]
+
+    def analyze(self, path, checkpoint=None):
+        """Stage 2 of a scan for one stem: warm its audio_opt cache file and store its peak, route
+        and envelope (audio/ingest.py). Returns True if the stem was analyzed (False if it changed
+        or vanished)."""
+        from audio.ingest import IngestCancelled, ingest_stem
+
+        row = self._db.execute("SELECT size, mtime FROM stems WHERE path = ?", (path,)).fetchone()
+        try:
+            st = os.stat(path)
+        except OSError:
+            return False
+        if row is None or (row['size'], row['mtime']) != (st.st_size, st.st_mtime):
+            return False
+        try:
+            result = ingest_stem(path, should_stop=lambda: checkpoint is not None and not checkpoint())
+        except IngestCancelled:
+            raise ScanStopped()
+        except Exception as e:
+            print(f"[Library] Could not analyze {path}: {e}")
+            with self._db:
+                self._db.execute("UPDATE stems SET error = ? WHERE path = ?", (f"unreadable: {e}", path))
+            return False
+        left, info = result['left'], result['info'] or {}
+        with self._db:
+            self._db.execute(
+                "UPDATE stems SET peak = ?, route_left = ?, route_method = ?, envelope = ?, cache_key = ?, "
+                "analyzed = ? WHERE path = ? AND size = ? AND mtime = ?",
+                (result['peak'], None if left is None else int(bool(left)), info.get('method'),
+                 result['envelope'].astype('<f4').tobytes(), result['cache_key'], time.time(),
+                 path, st.st_size, st.st_mtime))
+        return True
+
+    def scan(self, progress=None, checkpoint=None, analyze=True):
+        """Index every folder, then analyze the new and changed stems. progress(stage, done, total)
+        is called with stage 'index' or 'analyze'; checkpoint() is called between files (and between
+        chunks of a file) and stops the scan when it returns False. Returns the scan's counts."""
+        started = time.perf_counter()
+        if progress is not None:
+            progress('index', 0, 0)
+        new, changed, removed = self.index(checkpoint)
+        stats = {'new': new, 'changed': changed, 'removed': removed, 'analyzed': 0, 'failed': 0,
+                 'index_seconds': time.perf_counter() - started}
+        if analyze:
+            todo = self.pending()
+            for n, path in enumerate(todo):
+                if progress is not None:
+                    progress('analyze', n, len(todo))
+                if checkpoint is not None and not checkpoint():
+                    raise ScanStopped()
+                if self.analyze(path, checkpoint):
+                    stats['analyzed'] += 1
+                else:
+                    stats['failed'] += 1
+            if progress is not None:
+                progress('analyze', len(todo), len(todo))
+        stats['seconds'] = time.perf_counter() - started
+        return stats
+
+    # Queries -------------------------------------------------------------------------------
+
+    def _song_dict(self, row):
+        return {
+            'dir': row['dir'],
+            'name': row['title'] or row['folder_name'],
+            'key': row['key'] or '',
+            'bpm': row['bpm'] or '',
+            'banner_image': row['banner_image'],
+            'stems': row['stems'],
+            'analyzed': row['analyzed'],
+            'duration': row['duration'],
+            'uses': row['uses'],
+            'last_used': row['last_used'],
+        }
+
+    _SONG_COLUMNS = ("dir, folder_name, title, key, bpm, banner_image, tracks, stems, duration, uses, last_used, "
+                     "(SELECT COUNT(*) FROM stems s WHERE s.song_dir = songs.dir AND s.analyzed IS NOT NULL) AS analyzed")
+
+    def search(self, text='', limit=SEARCH_LIMIT):
+        """Songs whose folder, title, key or stem names contain every word of text (accents and
+        case ignored), most recently used first."""
+        words = fold(text).split()
+        sql = f"SELECT {self._SONG_COLUMNS} FROM songs WHERE stems > 0"
+        args = []
+        for word in words:
+            sql += " AND search LIKE ? ESCAPE '\\'"
+            args.append(_like_pattern(word))
+        sql += " ORDER BY last_used IS NULL, last_used DESC, folder_name COLLATE NOCASE LIMIT ?"
+        args.append(int(limit))
+        return [self._song_dict(r) for r in self._db.execute(sql, args)]
+
+    def song(self, song_dir):
+        """A library song with its tracks (the order last used in a service, else by file name)."""
+        row = self._db.execute(f"SELECT {self._SONG_COLUMNS} FROM songs WHERE dir = ?", (song_dir,)).fetchone()
+        if row is None:
+            return None
+        entry = self._song_dict(row)
+        stems = [r['path'] for r in self._db.execute(
+            "SELECT path FROM stems WHERE song_dir = ? ORDER BY path", (song_dir,))]
+        tracks = None
+        try:
+            remembered = json.loads(row['tracks']) if row['tracks'] else None
+            if remembered and all(t in stems for t in remembered):
+                tracks = remembered
+        except ValueError:
+            pass
+        entry['tracks'] = tracks or stems
+        return entry
+
+    def stem_analysis(self, path, st=None):
+        """Stored analysis of a stem ('frames', 'sample_rate', 'peak', 'envelope', 'left', 'info'),
+        or None unless it is analyzed and unchanged since."""
+        import numpy as np
+        row = self._db.execute("SELECT size, mtime, frames, sample_rate, peak, route_left, route_method, envelope "
+                               "FROM stems WHERE path = ? AND analyzed IS NOT NULL", (path,)).fetchone()
+        if row is None or row['envelope'] is None:
+            return None
+        try:
+            st = st or os.stat(path)
+        except OSError:
+            return None
+        if (row['size'], row['mtime']) != (st.st_size, st.st_mtime):
+            return None
+        left = None if row['route_left'] is None else bool(row['route_left'])
+        return {'frames': int(row['frames']), 'sample_rate': int(row['sample_rate']), 'peak': row['peak'],
+                'envelope': np.frombuffer(row['envelope'], dtype='<f4'), 'left': left,
+                'info': {'method': row['route_method']} if row['route_method'] else None}
+
+    def song_envelope(self, tracks, points=ENVELOPE_POINTS):
+        """(envelope, total_samples, sample_rate) of a song made of tracks, from the stored stem
+        envelopes (see combine_envelopes). None unless every track is analyzed and unchanged since."""
+        from audio.wavstream import combine_envelopes
+        stems = [self.stem_analysis(path) for path in tracks]
+        if not stems or any(s is None for s in stems):
+            return None
+        envelope, total = combine_envelopes([(s['frames'], s['envelope']) for s in stems], points)
+        if total == 0:
+            return None
+        # The song's rate is the last stem's (as the song form always reported it)
+        return envelope, total, stems[-1]['sample_rate']
+
+    def remember_song(self, song_data):
+        """Record a song added to a service (its name, key, BPM, banner and track order) on its
+        library entry. Returns False if its stems are not in the library."""
+        tracks = song_data.get('tracks') or []
+        if not tracks:
+            return False
+        song_dir = os.path.dirname(os.path.abspath(tracks[0]))
+        banner = song_data.get('banner_image')
+        with self._db:
+            cursor = self._db.execute(
+                "UPDATE songs SET title = ?, key = ?, bpm = ?, banner_image = ?, tracks = ?, last_used = ?, "
+                "uses = uses + 1 WHERE dir = ? AND stems > 0",
+                (song_data.get('name') or None, str(song_data.get('key') or '') or None,
+                 str(song_data.get('bpm') or '') or None, banner or None,
+                 json.dumps([os.path.abspath(t) for t in tracks]), time.time(), song_dir))
+            if cursor.rowcount:
+                self._update_songs([song_dir])
+        return bool(cursor.rowcount)
+
+    def stats(self):
+        row = self._db.execute(
+            "SELECT (SELECT COUNT(*) FROM songs WHERE stems > 0) AS songs, COUNT(*) AS stems, "
+            "SUM(analyzed IS NOT NULL) AS analyzed FROM stems").fetchone()
+        return {'songs': row['songs'] or 0, 'stems': row['stems'] or 0, 'analyzed': row['analyzed'] or 0}
+
+
+class LibraryScanner(threading.Thread):
+    """Background scan of the library folders. pause() holds it between chunks (during playback);
+    rescan() makes it scan again once the current pass ends (e.g. a folder was added)."""
+
+    def __init__(self, path=None, analyze=True):
+        super().__init__(name="LibraryScanner", daemon=True)
+        self.path = path
+        self.analyze = analyze
+        self._lock = threading.Lock()
+        self._resume = threading.Event()
+        self._resume.set()
+        self._stop = threading.Event()
+        self._again = False
+        self._status = {'stage': 'index', 'done': 0, 'total': 0, 'finished': False, 'paused': False,
+                        'stats': None, 'passes': 0}
+
+    def status(self):
+        with self._lock:
+            return dict(self._status)
+
+    def _set(self, **values):
+        with self._lock:
+            self._status.update(values)
+
+    def pause(self, paused):
+        self._set(paused=bool(paused))
+        if paused:
+            self._resume.clear()
+        else:
+            self._resume.set()
+
+    def rescan(self):
+        """Scan again after the current pass. Returns False if the scanner already finished."""
+        with self._lock:
+            if self._status['finished']:
+                return False
+            self._again = True
+            return True
+
+    def stop(self, wait=0.0):
+        self._stop.set()
+        self._resume.set()
+        if wait:
+            self.join(wait)
+
+    def _checkpoint(self):
+        while not self._resume.wait(0.1):
+            if self._stop.is_set():
+                return False
+        return not self._stop.is_set()
+
+    def run(self):
+        library = None
+        try:
+            library = StemLibrary(self.path)
+            while True:
+                with self._lock:
+                    self._again = False
+                stats = library.scan(progress=lambda stage, done, total: self._set(stage=stage, done=done, total=total),
+                                     checkpoint=self._checkpoint, analyze=self.analyze)
+                with self._lock:
+                    self._status['stats'] = stats
+                    self._status['passes'] += 1
+                    if not self._again:
+                        self._status['finished'] = True
+                        break
+        except ScanStopped:
+            pass
+        except Exception as e:
+            print(f"[Library] Scan failed: {e}")
+        finally:
+            if library is not None:
+                library.close()
+            self._set(finished=True)
+
+
+_shared = None
+_scanner = None
+_scan_paused = False
+
+
+def shared():
+    """The GUI thread's library connection (None if the database cannot be opened)."""
+    global _shared
+    if _shared is None:
+        try:
+            _shared = StemLibrary()
+        except Exception as e:
+            print(f"[Library] Could not open the library: {e}")
+            return None
+    return _shared
+
+
+def current_scan():
+    return _scanner
+
+
+def start_scan():
+    """Scan the library folders in the background (or scan again after the running scan).
+    Returns the scanner, or None when no folder is configured."""
+    global _scanner
+    if _scanner is not None and _scanner.rescan():
+        return _scanner
+    library = shared()
+    if library is None or not library.folders():
+        return None
+    _scanner = LibraryScanner()
+    _scanner.pause(_scan_paused)
+    _scanner.start()
+    return _scanner
+
+
+def pause_scan(paused):
+    """Hold the scanner (it analyzes stems at full speed) while audio plays."""
+    global _scan_paused
+    _scan_paused = bool(paused)
+    if _scanner is not None:
+        _scanner.pause(paused)
+
+
+def stop_scan(wait=0.0):
+    if _scanner is not None and _scanner.is_alive():
+        _scanner.stop(wait)
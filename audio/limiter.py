@@ -0,0 +1,141 @@
+# Lookahead peak limiter for the master bus.
+# The signal goes through a short delay line while the gain computer looks at the samples that
+# are about to come out: a required gain per frame (dB, from the peak across channels) gets a
+# constant-rate release, is held for the lookahead length and then averaged over it, so the gain
+# is already down when the peak leaves the delay line and every output sample stays under the
+# ceiling. Each stage is a vectorized pass over the block; the few samples each stage needs from
+# the previous block are carried in preallocated buffers, so there is no pumping at block edges.
+# The release ramp and the attack sum run on values carried from the last reset() (absolute frame
+# index, running sum) rather than restarting per block, so the output is bit-identical however the
+# signal is cut into blocks (an offline export matches the live callback sample for sample).
+import numpy as np
+from scipy.ndimage import minimum_filter1d
+
+LIMITER_LOOKAHEAD_MS = 1.5    # Delay (and attack) of the limiter
+LIMITER_RELEASE_DB_PER_S = 60.0  # Gain recovery speed (6 dB in 100 ms)
+LIMITER_MAX_BLOCK = 4096      # Buffers are sized for this block length and grow if needed
+
+_DB_TO_LN = np.log(10.0) / 20.0
+
+
+class LookaheadLimiter:
+    """Stateful brickwall limiter: process() limits a (frames, channels) float32 block in place and
+    delays it by `latency` frames."""
+
+    def __init__(self, channels, sample_rate, ceiling=0.99, lookahead_ms=LIMITER_LOOKAHEAD_MS,
+                 release_db_per_s=LIMITER_RELEASE_DB_PER_S, max_block=LIMITER_MAX_BLOCK):
+        self.channels = int(channels)
+        self.sample_rate = int(sample_rate)
+        self.ceiling = float(ceiling)
+        self.lookahead = max(1, int(round(self.sample_rate * lookahead_ms / 1000.0)))
+        self.latency = self.lookahead - 1
+        self.release = float(release_db_per_s) / self.sample_rate  # dB per frame
+        self.gain_reduction_db = 0.0  # Deepest reduction of the last block (for meters/stats)
+        self._ceiling_db = 20.0 * np.log10(self.ceiling)
+        self._release_min = 0.0  # Running min of gain[k] - release * k since reset()
+        self._frame = 0          # Frames processed since reset()
+        self._size = 0
+        self._allocate(max_block)
+
+    def _allocate(self, frames):
+        keep = self.latency
+        old = (self._line[:keep].copy(), self._held[:keep].copy(), self._smooth[:keep].copy(),
+               self._sum[:keep + 1].copy()) if self._size else None
+        self._size = int(frames)
+        n = self._size + keep
+        self._line = np.zeros((n, self.channels), dtype=np.float32)  # Delay line: history + block
+        self._held = np.zeros(n)     # Released gain (dB): history for the hold window + block
+        self._smooth = np.zeros(n)   # Held gain (dB): history for the averaging window + block
+        self._hold_out = np.zeros(n)
+        self._abs = np.zeros(self._size, dtype=np.float32)
+        self._peak = np.zeros(self._size, dtype=np.float32)
+        self._gain = np.zeros(self._size)
+        self._gain32 = np.zeros(self._size, dtype=np.float32)
+        self._acc = np.zeros(self._size + 1)
+        self._sum = np.zeros(n + 1)  # Running sum of the held gain before each frame
+        self._index = np.arange(self._size, dtype=np.float64)
+        self._ramp = np.zeros(self._size)
+        if old is not None:
+            self._line[:keep], self._held[:keep], self._smooth[:keep], self._sum[:keep + 1] = old
+
+    def reset(self):
+        """Forget the signal history (silence in the delay line, no gain reduction)."""
+        self._line.fill(0.0)
+        self._held.fill(0.0)
+        self._smooth.fill(0.0)
+        self._sum.fill(0.0)
+        self._release_min = 0.0
+        self._frame = 0
+
+    def process(self, block):
+        n = len(block)
+        if n == 0:
+            return block
+        if n > self._size:
+            self._allocate(n)
+        keep = self.latency
+        L = self.lookahead
+
+        # Required gain per frame in dB: 0 below the ceiling, ceiling / peak above it
+        # (channel by channel: a max over the short channel axis is several times slower)
+        peak = self._peak[:n]
+        scratch = self._abs[:n]
+        np.abs(block[:, 0], out=peak)
+        for c in range(1, self.channels):
+            np.abs(block[:, c], out=scratch)
+            np.maximum(peak, scratch, out=peak)
+        gain = self._gain[:n]
+        gain[:] = peak
+        np.maximum(gain, self.ceiling, out=gain)
+        np.log10(gain, out=gain)
+        gain *= -20.0
+        gain += self._ceiling_db
+
+        # Release at a constant dB rate: released[i] = min over k <= i of gain[k] + rate * (i - k),
+        # i.e. a running minimum of gain[k] - rate * k with k counted from reset() (acc[0] carries
+        # the minimum over the previous blocks)
+        ramp = self._ramp[:n]
+        np.add(self._index[:n], float(self._frame), out=ramp)
+        ramp *= self.release
+        acc = self._acc[:n + 1]
+        acc[0] = self._release_min
+        np.subtract(gain, ramp, out=acc[1:])
+        np.minimum.accumulate(acc, out=acc)
+        self._release_min = float(acc[n])
+        self._frame += n
+        released = self._held[keep:keep + n]
+        np.add(acc[1:], ramp, out=released)
+        np.minimum(released, 0.0, out=released)
+
+        # Hold: minimum over the last `lookahead` frames (a centered filter, shifted back)
+        hold_in = self._held[:keep + n]
+        hold_out = self._hold_out[:keep + n]
+        minimum_filter1d(hold_in, L, output=hold_out)
+        held = self._smooth[keep:keep + n]
+        held[:] = hold_out[L // 2:L // 2 + n]
+
+        # Attack: average of the held gain over the lookahead, so the ramp reaches the held
+        # minimum exactly when the peak that caused it leaves the delay line
+        # (difference of a running sum that continues from the previous block's csum[keep])
+        csum = self._sum[:keep + n + 1]
+        csum[keep + 1:] = held
+        np.cumsum(csum[keep:], out=csum[keep:])
+        np.subtract(csum[L:L + n], csum[:n], out=gain)
+        gain *= _DB_TO_LN / L
+        self.gain_reduction_db = -float(gain.min()) / _DB_TO_LN
+        np.exp(gain, out=gain)
+        gain32 = self._gain32[:n]
+        gain32[:] = gain
+
+        # Delay line out, gain applied per channel (a broadcast multiply would allocate ufunc
+        # buffers); keep the last `latency` frames of every stage for the next block
+        line = self._line
+        line[keep:keep + n] = block
+        for c in range(self.channels):
+            np.multiply(line[:n, c], gain32, out=block[:, c])
+        if keep:
+            line[:keep] = line[n:n + keep]
+            self._held[:keep] = self._held[n:n + keep]
+            self._smooth[:keep] = self._smooth[n:n + keep]
+        self._sum[:keep + 1] = self._sum[n:n + keep + 1]
+        return block
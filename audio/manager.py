@@ -2,12 +2,28 @@ import threading
 import time
 from PyQt5.QtCore import QObject, pyqtSignal
 from audio.player import AudioPlayer
+from audio.timing import parse_bpm, next_bar_boundary, beat_length_samples
+from audio.transport import TransportScheduler, CountInSource
+from audio.routing import default_presets, routing_state, load_routing_state
+from audio.dsp import set_song_track_dsp
+from audio.transpose import song_transpose, set_song_transpose, clamp_semitones
+
+# Minimum distance (samples) between "now" and a scheduled transition, about one stream block
+TRANSITION_GUARD = 2048
+# Short fade used for hard cuts so the outgoing song does not click at the bar line
+TRANSITION_DECLICK = 128
 
 class AudioManager(QObject):
     """Manager for handling audio playback across multiple songs"""
     
     # Signal emitted when playback state changes
     playbackStateChanged = pyqtSignal(bool)  # True if playing, False if stopped/paused
+    # Emitted when a queued song takes over the transport (song_data)
+    songTransitioned = pyqtSignal(object)
+    # A song's player was built but its stored key offset has no rendered variants (song_data)
+    transposeMissing = pyqtSignal(object)
+    # Internal: fired from the audio thread, handled on the GUI thread
+    _transitionFired = pyqtSignal(object, bool)
     
     def __init__(self):
         super().__init__()
@@ -18,32 +34,156 @@ class AudioManager(QObject):
         self.lr_enabled = False
         self.output_device = None
         self.input_device = None
+        # Output routing presets of the project; routing is the active one (None: stereo/LR mix)
+        self.routing_presets = default_presets()
+        self.routing = None
+        # Second device (e.g. a USB interface for in-ears) playing the cue buses of the active preset
+        self.secondary_device = None
+        # Sample-clock scheduler shared by all players; the stream that is playing drives it
+        self.transport = TransportScheduler()
+        self.pending_transition = None  # (song_data, [TransportEvent, ...])
+        self._transitionFired.connect(self._on_transition_fired)
         
     def set_current_song(self, song_data):
         """Set the current song and initialize its audio player"""
-        song_id = self._get_song_id(song_data)
         self.current_song = song_data
-        
-        # Create a new player for this song if it doesn't exist
+        self.current_player = self._player_for(song_data)
+
+    def _configure_player(self, player, song_data):
+        """Hook a player up to the shared transport and apply the output settings and song tempo."""
+        player.transport = self.transport
+        try:
+            player.set_lr_mode(self.lr_enabled)
+        except Exception:
+            pass
+        player.set_routing(self.routing)
+        player.set_secondary_outputs(self._secondary_outputs())
+        try:
+            if self.output_device is not None:
+                player.set_output_device(self.output_device)
+        except Exception:
+            pass
+        player.set_tempo(parse_bpm(song_data.get("bpm")))
+
+    def _player_for(self, song_data):
+        """Return the player for a song, creating and loading it on first use."""
+        song_id = self._get_song_id(song_data)
         if song_id not in self.players:
             player = AudioPlayer()
-            try:
-                player.set_lr_mode(self.lr_enabled)
-            except Exception:
-                pass
-            try:
-                if self.output_device is not None:
-                    player.set_output_device(self.output_device)
-            except Exception:
-                pass
+            self._configure_player(player, song_data)
             # Load all tracks for this song
             for track_path in song_data.get("tracks", []):
                 player.load_track(track_path)
+            player.load_song_dsp(song_data)
             self.players[song_id] = player
-        else:
-            player = self.players[song_id]
-            
-        self.current_player = player
+            if not player.set_transpose(song_transpose(song_data)):
+                self.transposeMissing.emit(song_data)
+        return self.players[song_id]
+
+    def adopt_player(self, song_data, player):
+        """Use a player whose tracks were loaded in the background (audio.render.player_for_song)
+        for a song that has none yet. Returns False if the song already has a player."""
+        song_id = self._get_song_id(song_data)
+        if song_id in self.players:
+            return False
+        self._configure_player(player, song_data)
+        self.players[song_id] = player
+        if player.transpose != song_transpose(song_data):
+            self.transposeMissing.emit(song_data)
+        return True
+
+    def forget_song(self, song_id):
+        """Drop the player of a song id that no longer exists (e.g. its stems were relinked)."""
+        player = self.players.pop(song_id, None)
+        if player is None:
+            return
+        player.stop()
+        if player is self.current_player:
+            self._is_playing = False
+            self.current_player = None
+            self.current_song = None
+            self.playbackStateChanged.emit(False)
+
+    def queue_song_transition(self, song_data, count_in_beats=0, crossfade_ms=0, quantize=True):
+        """Start song_data at the next bar line of the playing song, sample-accurately.
+        Optional count-in clicks (beats at the new song's tempo) and an equal-power crossfade.
+        When nothing is playing the song simply starts now. Returns True if scheduled or started.
+        """
+        try:
+            incoming = self._player_for(song_data)
+            outgoing = self.current_player
+            if not incoming.tracks:
+                return False
+            if outgoing is None or outgoing is incoming or not self.is_playing():
+                self.stop_all()
+                self.set_current_song(song_data)
+                self.play_current_song()
+                self.songTransitioned.emit(song_data)
+                return True
+
+            self.cancel_song_transition()
+            owner = outgoing._host or outgoing
+            if incoming is not owner:
+                incoming.stop()
+            incoming.current_position = 0
+
+            rate = int(owner.tracks[0].sample_rate)
+            clock, position = outgoing._clock_anchor
+            boundary = None
+            if quantize:
+                boundary = next_bar_boundary(position, outgoing.bpm, rate, outgoing.beats_per_bar, guard=TRANSITION_GUARD)
+            if boundary is None:
+                boundary = position + TRANSITION_GUARD
+            at = clock + (boundary - position)
+
+            events = []
+            if int(incoming.tracks[0].sample_rate) != rate:
+                # Different sample rates cannot share one stream: hand over on the GUI thread at the bar line
+                events.append(self.transport.schedule(at, 'notify', on_fire=lambda: self._transitionFired.emit(song_data, True)))
+                self.pending_transition = (song_data, events)
+                return True
+
+            fade = max(TRANSITION_DECLICK, int(rate * max(0, crossfade_ms) / 1000.0))
+            start_at = at
+            if count_in_beats and count_in_beats > 0:
+                beat = beat_length_samples(incoming.bpm or outgoing.bpm, rate)
+                if beat is not None:
+                    cue = self._cue_channels()
+                    clicks = CountInSource(count_in_beats, beat, rate, left_only=self.lr_enabled, channels=cue)
+                    events.append(self.transport.schedule(at, 'start', clicks))
+                    start_at = at + int(round(count_in_beats * beat))
+            events.append(self.transport.schedule(at, 'stop', outgoing, fade=fade))
+            incoming_fade = fade if (crossfade_ms and start_at == at) else 0
+            events.append(self.transport.schedule(start_at, 'start', incoming, fade=incoming_fade,
+                                                  on_fire=lambda: self._transitionFired.emit(song_data, False)))
+            self.pending_transition = (song_data, events)
+            return True
+        except Exception as e:
+            print(f"[AudioManager] Error queueing transition: {e}")
+            return False
+
+    def cancel_song_transition(self):
+        """Cancel a queued transition that has not fired yet."""
+        if self.pending_transition:
+            for event in self.pending_transition[1]:
+                self.transport.cancel(event)
+        self.pending_transition = None
+
+    def _on_transition_fired(self, song_data, handoff):
+        """GUI-thread side of a transition: make the incoming song current."""
+        try:
+            self.pending_transition = None
+            if handoff:
+                self.stop_all()
+                self.set_current_song(song_data)
+                self.play_current_song()
+            else:
+                self.set_current_song(song_data)
+                self._is_playing = True
+                self.playbackStateChanged.emit(True)
+            self.songTransitioned.emit(song_data)
+        except Exception as e:
+            print(f"[AudioManager] Error applying transition: {e}")
 
     def reload_song_tracks(self, song_data):
         """Rebuild the player's tracks for a song, preferring cached optimized audio."""
@@ -52,17 +192,17 @@ class AudioManager(QObject):
             was_playing = self._is_playing and self.current_player and (self._get_song_id(self.current_song) == song_id)
             # Create a fresh player
             new_player = AudioPlayer()
-            try:
-                new_player.set_lr_mode(self.lr_enabled)
-            except Exception:
-                pass
-            try:
-                if self.output_device is not None:
-                    new_player.set_output_device(self.output_device)
-            except Exception:
-                pass
+            self._configure_player(new_player, song_data)
             for track_path in song_data.get("tracks", []):
                 new_player.load_track(track_path)
+            new_player.load_song_dsp(song_data)
+            new_player.set_transpose(song_transpose(song_data))
+            # Keep an active loop region and the practice speed across the rebuild
+            old_player = self.players.get(song_id)
+            if old_player is not None and old_player.loop_region:
+                new_player.set_loop_region(*old_player.loop_region)
+            if old_player is not None:
+                new_player.set_practice_speed(old_player.practice_speed)
             # Replace in map
             self.players[song_id] = new_player
             # If this is the current song, swap current player
@@ -88,6 +228,106 @@ class AudioManager(QObject):
             except Exception:
                 pass
 
+    def set_routing(self, preset):
+        """Activate a routing preset (one of routing_presets) on all players; None for the stereo mix."""
+        self.routing = preset
+        outputs = self._secondary_outputs()
+        for p in self.players.values():
+            try:
+                p.set_routing(preset)
+                p.set_secondary_outputs(outputs)
+            except Exception as e:
+                print(f"[AudioManager] Error setting routing: {e}")
+
+    def set_secondary_device(self, device):
+        """Play the cue buses of the active routing preset on another device (None: main device only)."""
+        self.secondary_device = device
+        outputs = self._secondary_outputs()
+        for p in self.players.values():
+            try:
+                p.set_secondary_outputs(outputs)
+            except Exception as e:
+                print(f"[AudioManager] Error setting secondary output: {e}")
+
+    def _secondary_outputs(self):
+        cue = self._cue_channels()
+        if self.secondary_device is None or not cue:
+            return []
+        return [{'device': self.secondary_device, 'channels': cue}]
+
+    def set_routing_by_name(self, name):
+        self.set_routing(next((p for p in self.routing_presets if p.name == name), None))
+
+    def transpose_jobs(self, song_data, semitones):
+        """Stems of the song still to render for a key offset: [(source path, variant cache path)]."""
+        return self._player_for(song_data).transpose_jobs(semitones)
+
+    def set_transpose(self, song_data, semitones):
+        """Store the song's key offset and switch its player to the rendered variants.
+        Returns False when some variants are not rendered yet (the song keeps playing as it was).
+        """
+        semitones = clamp_semitones(semitones)
+        set_song_transpose(song_data, semitones)
+        return self._player_for(song_data).set_transpose(semitones)
+
+    def revert_transpose(self, song_data):
+        """Store the key offset the song's player really plays in (its variants failed to render)."""
+        player = self.players.get(self._get_song_id(song_data))
+        if player is not None:
+            set_song_transpose(song_data, player.transpose)
+
+    def set_practice_speed(self, song_data, speed):
+        """Rehearsal speed of a song (1.0: normal) at its original pitch; kept for the session only."""
+        self._player_for(song_data).set_practice_speed(speed)
+
+    def practice_speed(self, song_data):
+        player = self.players.get(self._get_song_id(song_data))
+        return player.practice_speed if player is not None else 1.0
+
+    def set_track_dsp(self, song_data, track_index, settings):
+        """Store a track's insert chain (HPF/EQ/pan) in the song and apply it to the song's player."""
+        player = self.players.get(self._get_song_id(song_data))
+        if player is None or not (0 <= track_index < len(player.tracks)):
+            return
+        set_song_track_dsp(song_data, player.tracks[track_index].file_path, settings)
+        player.set_track_dsp(track_index, settings)
+
+    def set_track_buses(self, file_path, buses):
+        """Assign a track (by file name) to buses of the active preset; None restores its default."""
+        if self.routing is not None:
+            self.routing.assign(file_path, buses)
+
+    def routing_state(self):
+        return routing_state(self.routing_presets, self.routing)
+
+    def load_routing_state(self, data):
+        presets, active = load_routing_state(data)
+        self.routing_presets = presets
+        self.set_routing(active)
+
+    def _cue_channels(self):
+        """Output channels of the active preset's cue buses (count-in clicks), or None."""
+        if self.routing is None:
+            return None
+        buses = {b["name"]: b["channels"] for b in self.routing.buses}
+        return sorted({c for name in self.routing.cue for c in buses.get(name, [])})
+
+    def set_auto_tune(self, enabled: bool):
+        """Enable/disable adaptive block size across all players (next stream start)."""
+        for p in self.players.values():
+            try:
+                p.set_auto_tune(enabled)
+            except Exception:
+                pass
+
+    def set_sample_format(self, fmt):
+        """Stem storage format for songs loaded from now on (see audio/storage.py)."""
+        for p in self.players.values():
+            try:
+                p.set_sample_format(fmt)
+            except Exception:
+                pass
+
     def set_output_device(self, device):
         print(f"[AudioManager] set_output_device called with: {device}")
         self.output_device = device
@@ -140,14 +380,14 @@ class AudioManager(QObject):
         if self.current_player:
             if hasattr(self.current_player, "is_paused") and self.current_player.is_paused():
                 for player in self.players.values():
-                    if player is not self.current_player:
+                    if player is not self.current_player and player is not self.current_player._host:
                         player.stop()
                 self.current_player.play_all()
                 self._is_playing = True
                 self.playbackStateChanged.emit(True)
             else:
                 for player in self.players.values():
-                    if player is not self.current_player:
+                    if player is not self.current_player and player is not self.current_player._host:
                         player.stop()
                 self.current_player.play_all()
                 self._is_playing = True
@@ -162,6 +402,8 @@ class AudioManager(QObject):
             
     def stop_all(self):
         """Stop all playing songs"""
+        self.cancel_song_transition()
+        self.transport.cancel_all()
         for player in self.players.values():
             player.stop()
         self._is_playing = False
@@ -171,6 +413,13 @@ class AudioManager(QObject):
         """Check if any song is currently playing"""
         return self._is_playing and self.current_player and self.current_player.is_playing()
         
+    def callback_stats(self):
+        """Stats of the player whose stream is producing audio now (hosts a transition if any)."""
+        player = self.current_player
+        if player is None:
+            return None
+        return (player._host or player).stats
+
     def is_current_song(self, song_data):
         """Check if the given song is the current song"""
         if not self.current_song:
@@ -0,0 +1,248 @@
+# Secondary output devices fed from the main stream's mix.
+# The main stream is the clock master: every block it renders is mastered once, its own channels go
+# to its device and the channels of each secondary device are pushed into that device's ring buffer.
+# Each secondary stream pulls from its ring through a linear resampler whose ratio is steered by
+# the ring fill level, so two sound cards with slightly different clocks stay aligned for hours.
+import threading
+import time
+import numpy as np
+import sounddevice as sd
+
+DRIFT_MAX_PPM = 5000.0     # Resampling ratio limit (real cards drift < 200 ppm)
+# The PI loop runs on the measured fill (see SecondaryOutput.measured_fill) and is tuned slow
+# (about a 50 s period, damping ~0.8 with the default blocks): callback jitter is averaged out and
+# the ratio wobble stays in the tens of ppm, far below an audible pitch change.
+DRIFT_FILL_SMOOTHING = 0.02  # One-pole smoothing of the fill level, per secondary block
+DRIFT_KP = 1e-2            # Proportional gain (ratio per unit of relative fill error)
+DRIFT_KI = 1.2e-5          # Integral gain; removes the steady fill offset
+DRIFT_RATIO_AVERAGING = 1e-3  # Long average of the applied ratio, reported as the drift estimate
+
+
+class RingBuffer:
+    """Single-producer / single-consumer ring of float32 frames (no locks, preallocated).
+    Each position has one writer: when the consumer stalls, the producer keeps writing over the
+    oldest frames and only counts the overrun; the consumer notices (available() near or past
+    capacity) and skips ahead itself, so `read` never moves under a block being consumed."""
+
+    def __init__(self, capacity, channels):
+        self.capacity = int(capacity)
+        self.data = np.zeros((self.capacity, int(channels)), dtype=np.float32)
+        self.written = 0   # Advanced only by the producer
+        self.read = 0      # Advanced only by the consumer
+        self.overruns = 0
+
+    def available(self):
+        return self.written - self.read
+
+    def write(self, block):
+        n = len(block)
+        if n > self.capacity - self.available():
+            # Consumer stalled: overwrite the oldest frames rather than blocking the master callback
+            self.overruns += 1
+        i = self.written % self.capacity
+        head = min(n, self.capacity - i)
+        self.data[i:i + head] = block[:head]
+        if head < n:
+            self.data[:n - head] = block[head:]
+        self.written += n
+
+    def peek(self, out, n):
+        """Copy the next n frames into out[:n] without consuming them."""
+        i = self.read % self.capacity
+        head = min(n, self.capacity - i)
+        out[:head] = self.data[i:i + head]
+        if head < n:
+            out[head:n] = self.data[:n - head]
+
+    def consume(self, n):
+        self.read += n
+
+    def skip_to(self, frames):
+        """Consumer: drop the oldest frames so that `frames` remain queued."""
+        self.read = self.written - int(frames)
+
+
+class DriftEstimator:
+    """PI controller on the ring fill level; ratio() is input frames consumed per output frame."""
+
+    def __init__(self, target):
+        self.target = float(max(1, target))
+        self.fill = self.target
+        self.integral = 0.0
+        self._ratio = 1.0
+        self._ratio_avg = 1.0
+        self.limit = DRIFT_MAX_PPM * 1e-6
+
+    def update(self, fill):
+        self.fill += DRIFT_FILL_SMOOTHING * (fill - self.fill)
+        error = (self.fill - self.target) / self.target
+        self.integral = float(np.clip(self.integral + DRIFT_KI * error, -self.limit, self.limit))
+        self._ratio = 1.0 + float(np.clip(DRIFT_KP * error + self.integral, -self.limit, self.limit))
+        self._ratio_avg += DRIFT_RATIO_AVERAGING * (self._ratio - self._ratio_avg)
+        return self._ratio
+
+    def ratio(self):
+        return self._ratio
+
+    @property
+    def ppm(self):
+        """Estimated clock offset of the secondary device relative to the master (parts per million)."""
+        # Steady state: frames consumed per output frame = 1 / (1 + drift)
+        return (1.0 / self._ratio_avg - 1.0) * 1e6
+
+
+class AdaptiveResampler:
+    """Linear-interpolation resampler with a ratio that may change every block."""
+
+    def __init__(self, channels, max_frames):
+        self.phase = 0.0
+        self.prev = np.zeros((1, channels), dtype=np.float32)
+        # prev + input frames (ratio is bounded, so a block never needs more than this)
+        self._x = np.zeros((int(max_frames * (1 + DRIFT_MAX_PPM * 1e-6)) + 4, channels), dtype=np.float32)
+
+    def needed(self, frames, ratio):
+        """Input frames consumed for `frames` output frames (one more is peeked for interpolation)."""
+        return int(np.floor(self.phase + frames * ratio))
+
+    def process(self, ring, out, frames, ratio):
+        m = self.needed(frames, ratio)
+        if len(self._x) < m + 2:
+            self._x = np.zeros((m + 2, out.shape[1]), dtype=np.float32)
+        x = self._x
+        x[0] = self.prev[0]
+        ring.peek(x[1:], m + 1)
+        pos = self.phase + np.arange(frames) * ratio
+        idx = pos.astype(np.int64)
+        frac = (pos - idx).astype(np.float32)[:, None]
+        out[:frames] = x[idx] * (1.0 - frac) + x[idx + 1] * frac
+        ring.consume(m)
+        self.prev[0] = x[m]
+        self.phase = self.phase + frames * ratio - m
+
+
+class SecondaryOutput:
+    """One extra device playing `channels` of the master mix through a drift-compensated ring."""
+
+    def __init__(self, device, channels, sample_rate, master_block, block=1024, clock=time.perf_counter):
+        self.device = device
+        self.channels = list(channels)
+        self.sample_rate = int(sample_rate)
+        self.block = int(block)
+        self.master_block = int(master_block)
+        self.target = self.master_block + self.block
+        self.clock = clock
+        self.push_time = None
+        self.ring = RingBuffer(max(8 * self.target, 4 * self.sample_rate // 10), len(self.channels))
+        self.estimator = DriftEstimator(self.target)
+        self.resampler = AdaptiveResampler(len(self.channels), self.block)
+        self.primed = False
+        self.underruns = 0
+        self.stream = None
+        self._lock = threading.Lock()
+
+    def set_master_block(self, master_block):
+        """Follow a new master block size (a latency retune re-opens the master stream): the target
+        fill, the estimator and the ring are sized for it again. Called while the master is stopped;
+        this device goes silent until the new master has queued the new target, and the drift
+        learned so far is kept."""
+        master_block = int(master_block)
+        if master_block == self.master_block:
+            return
+        self.master_block = master_block
+        self.target = self.master_block + self.block
+        old = self.estimator
+        estimator = DriftEstimator(self.target)
+        estimator.integral, estimator._ratio, estimator._ratio_avg = old.integral, old._ratio, old._ratio_avg
+        # The callback takes the ring and estimator once per block, so swapping them is safe
+        self.ring = RingBuffer(max(8 * self.target, 4 * self.sample_rate // 10), len(self.channels))
+        self.estimator = estimator
+        self.push_time = None
+        self.primed = False
+
+    def push(self, mastered):
+        """Master callback: queue this device's channels of a mastered block."""
+        self.ring.write(mastered[:, self.channels])
+        self.push_time = self.clock()
+
+    def measured_fill(self, fill):
+        """Fill level without the master-block sawtooth: frames queued plus the frames the master has
+        produced since its last push (minus half a block, so the mean matches the raw level).
+        The raw level only moves in whole master blocks, which hides slow drift until it slips.
+        """
+        if self.push_time is None:
+            return float(fill)
+        since = (self.clock() - self.push_time) * self.sample_rate
+        return fill + min(max(since, 0.0), self.master_block) - self.master_block / 2.0
+
+    def callback(self, outdata, frames, time_info, status):
+        ring, estimator = self.ring, self.estimator
+        fill = ring.available()
+        if fill > ring.capacity - self.master_block:
+            # This device stalled and the master lapped (or is about to lap) the queued frames:
+            # resume from the newest ones at the target latency
+            ring.skip_to(estimator.target)
+            fill = ring.available()
+            estimator.fill = self.measured_fill(fill)
+        if not self.primed:
+            # Wait for the target latency before consuming, so the ring starts centered
+            if fill < estimator.target:
+                outdata.fill(0.0)
+                return
+            self.primed = True
+            estimator.fill = self.measured_fill(fill)
+        ratio = estimator.update(self.measured_fill(fill))
+        if fill < self.resampler.needed(frames, ratio) + 1:
+            self.underruns += 1
+            self.primed = False
+            outdata.fill(0.0)
+            return
+        self.resampler.process(ring, outdata, frames, ratio)
+
+    def start(self):
+        with self._lock:
+            if self.stream is not None:
+                return
+            try:
+                info = sd.query_devices(self.device)
+                channels = min(len(self.channels), int(info.get('max_output_channels', 0)))
+            except Exception:
+                channels = 0
+            if channels <= 0:
+                print(f"[MultiOut] Device {self.device} has no outputs, skipping")
+                return
+            self._device_channels = channels
+            self.stream = sd.OutputStream(
+                samplerate=self.sample_rate,
+                blocksize=self.block,
+                device=self.device,
+                channels=channels,
+                dtype='float32',
+                latency='low',
+                callback=self._device_callback,
+            )
+            self.stream.start()
+            print(f"[MultiOut] Secondary output started on device {self.device} ({channels} ch)")
+
+    def _device_callback(self, outdata, frames, time_info, status):
+        if outdata.shape[1] == len(self.channels):
+            self.callback(outdata, frames, time_info, status)
+        else:
+            # Device has fewer outputs than the routed channels: drop the extra ones
+            buf = np.zeros((frames, len(self.channels)), dtype=np.float32)
+            self.callback(buf, frames, time_info, status)
+            outdata[:] = buf[:, :outdata.shape[1]]
+
+    def stop(self):
+        with self._lock:
+            stream, self.stream = self.stream, None
+        if stream is not None:
+            try:
+                stream.stop()
+                stream.close()
+            except Exception as e:
+                print(f"[MultiOut] Error closing secondary output: {e}")
+
+    def status(self):
+        return (f"device={self.device} drift={self.estimator.ppm:+.1f} ppm "
+                f"fill={self.estimator.fill / self.sample_rate * 1000.0:.1f} ms "
+                f"underruns={self.underruns} overruns={self.ring.overruns}")
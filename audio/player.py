@@ -1,12 +1,29 @@
 import sounddevice as sd
 import numpy as np
-from scipy.io import wavfile
 import threading
+import time
 import os
-import unicodedata
-import re
 import hashlib
+from collections import deque
 from PyQt5.QtCore import QObject, pyqtSignal, QStandardPaths
+from audio.timing import next_bar_boundary, DEFAULT_BEATS_PER_BAR
+from audio.transport import GainRamp
+from audio.stats import CallbackStats, audio_logger
+from audio.multiout import SecondaryOutput
+from audio.route_classifier import classify_route, route_from_metadata
+from audio.wavstream import load_wav_float, block_peak, as_frames
+from audio.storage import load_sample_format, to_storage, decode_block, decode_into
+from audio.track import MixLane, Track, TrackTable
+from audio.limiter import LookaheadLimiter
+from audio.dsp import build_track_dsp, song_track_dsp
+from audio.transpose import variant_npz_path, clamp_semitones
+from audio.practice import PracticeEngine, clamp_speed
+from audio.tuning import LatencyTuner, DEFAULT_LEVEL, load_tuning_options
+
+# Mix level under which re-opening the stream (to change block size) is inaudible
+RETUNE_SILENCE_LEVEL = 0.002
+# Apply a block size increase after this long even without silence, if dropouts continue
+RETUNE_FORCE_AFTER = 3.0
 
 class AudioPlayer(QObject):
     # Signal emitted when volume levels change (for VU meter updates)
@@ -14,7 +31,7 @@ class AudioPlayer(QObject):
     
     def __init__(self):
         super().__init__()
-        self.tracks = []
+        self.tracks = []                  # [Track]; the callback reads self.params (see audio/track.py)
         self._is_playing = False
         self._is_paused = False
         self.stream = None
@@ -23,6 +40,20 @@ class AudioPlayer(QObject):
         self.playback_thread = None
         self.should_stop = False
         self.lr_enabled = False
+        self.routing = None               # RoutingPreset; None keeps the stereo/LR mix
+        self._route_cache = (None, None)  # (key, gain matrix) for the current preset/tracks/channels
+        # Stem storage: float32, or int16/float16 decoded per block into the lane's scratch buffer
+        self.sample_format = load_sample_format()
+        self._lane = MixLane()            # Buffers and filter state of the callback's mix
+        self.transpose = 0                # Semitones of the loaded stem variants (click/guide never move)
+        # Practice mode: below 1.0 the song plays slower at the same pitch (see audio/practice.py)
+        self.practice_speed = 1.0
+        self._practice = None             # PracticeEngine the callback pulls stretched audio from
+        self._practice_live = None        # Engine the callback rendered last (crossfaded out on a switch)
+        self._out_channels = 2            # Mix channels of the running stream
+        # Extra devices fed from this stream's mix: [{'device': id, 'channels': [mix channel, ...]}]
+        self.secondary_outputs = []
+        self._secondaries = []            # Live SecondaryOutput objects while the stream runs
         self.output_device = None
         self.input_device = None
         self._cache_dir = self._ensure_cache_dir()
@@ -30,6 +61,31 @@ class AudioPlayer(QObject):
         self.limiter_enabled = True       # Apply protection only on the master bus
         self.per_track_limiter = False    # Avoid limiting each track to preserve dynamics
         self.master_threshold = 0.99      # Very high threshold; acts only on extreme peaks
+        self._limiter = None              # LookaheadLimiter of the master bus (state carried across blocks)
+        self._limiter_key = None
+        # Seek requests made while playing are consumed by the audio thread at block boundaries
+        self._seek_queue = deque()
+        self.seek_crossfade_ms = 12       # Equal-power crossfade between old and new positions
+        self._xfade_curves = {}
+        # Song structure: tempo for bar quantization, active loop region and armed jump (samples)
+        self.bpm = None
+        self.beats_per_bar = DEFAULT_BEATS_PER_BAR
+        self.loop_region = None           # (start, end) wrapped sample-accurately by the callback
+        self._armed_jump = None           # (at_sample, target_sample) applied when playback reaches at_sample
+        # Transport: the stream owner advances the shared scheduler clock and mixes hosted sources
+        self.transport = None             # TransportScheduler shared by the AudioManager
+        self._host = None                 # Player whose stream renders this one during a transition
+        self._guests = []                 # [source, GainRamp or None, start_offset] rendered in our stream
+        self._own_ramp = None             # Fade applied to our own mix by a scheduled start/stop
+        self._own_delay = 0               # Offset of a scheduled start inside the next block
+        self._clock_anchor = (0, 0)       # (transport clock, current_position) after the last rendered block
+        # Per-block callback timing, underflows and errors (see audio/stats.py)
+        self.stats = CallbackStats()
+        # Stream block size / latency: auto-tuned per device, or fixed
+        self.auto_tune, min_block, max_block = load_tuning_options()
+        self.block_bounds = (min_block, max_block)
+        self.fixed_level = DEFAULT_LEVEL
+        self.tuner = None
         
     def load_track(self, file_path):
         """Load an audio track from file"""
@@ -44,34 +100,28 @@ class AudioPlayer(QObject):
             elif file_path.lower().endswith('.wav'):
                 # Prefer cached optimized version if available
                 cached = self._load_cached_optimized(file_path)
+                route = None
                 if cached is not None:
-                    sample_rate, samples = cached
+                    sample_rate, samples, route = cached
                 else:
-                    sample_rate, samples = wavfile.read(file_path)
-                    # Ensure samples are in float format
-                    if samples.dtype != np.float32 and samples.dtype != np.float64:
-                        samples = samples.astype(np.float32) / 32768.0
-                    # If mono, convert to stereo
-                    if len(samples.shape) == 1:
-                        samples = np.column_stack((samples, samples))
+                    # Decoded in chunks into one float32 (frames, channels) array (mono stays mono)
+                    sample_rate, samples = load_wav_float(file_path)
                     # Apply normalization to prevent clipping in source files
                     samples = self._normalize_audio(samples)
             else:
                 raise ValueError("Unsupported file format")
                 
-            # Detect route hint for LR based on filename and audio characteristics
-            left_hint = self._detect_left_route(file_path, samples)
-
-            track = {
-                'file_path': file_path,
-                'sample_rate': sample_rate,
-                'samples': samples,
-                'volume': 0.8,  # 80% volume
-                'muted': False,
-                'left_hint': left_hint,
-            }
+            # Route hint for LR/routing: decided once by the optimizer and kept in the cache file
+            if route is not None:
+                left_hint = route[0]
+            else:
+                left_hint = classify_route(file_path, samples, sample_rate)[0]
+            samples = to_storage(samples, self.sample_format)
+
+            # channels == 1: mono, broadcast to the bus at mix time
+            track = Track(file_path, sample_rate, samples, left_hint=left_hint)
             
-            self.tracks.append(track)
+            self.tracks = self.tracks + [track]
             return True
         except Exception as e:
             print(f"Error loading track {file_path}: {e}")
@@ -80,17 +130,84 @@ class AudioPlayer(QObject):
     def set_volume(self, track_index, volume):
         """Set volume for a specific track (0.0 to 1.0)"""
         if 0 <= track_index < len(self.tracks):
-            self.tracks[track_index]['volume'] = volume
+            self.tracks[track_index].volume = volume
             
     def set_mute(self, track_index, muted):
         """Mute/unmute a specific track"""
         if 0 <= track_index < len(self.tracks):
-            self.tracks[track_index]['muted'] = muted
+            self.tracks[track_index].muted = muted
+
+    def set_track_dsp(self, track_index, settings):
+        """Set a track's insert chain (HPF/EQ/pan settings dict, see audio.dsp); None bypasses it."""
+        if 0 <= track_index < len(self.tracks):
+            track = self.tracks[track_index]
+            track.dsp = build_track_dsp(settings, track.sample_rate)
+
+    def load_song_dsp(self, song_data):
+        """Apply the insert chains stored in the song data to the loaded tracks."""
+        for track in self.tracks:
+            track.dsp = build_track_dsp(song_track_dsp(song_data, track.file_path), track.sample_rate)
+
+    @property
+    def tracks(self):
+        return self._tracks
+
+    @tracks.setter
+    def tracks(self, tracks):
+        """Replace the track list; the callback switches to the new parameter table at its next block."""
+        tracks = list(tracks)
+        params = TrackTable(tracks)
+        self._tracks = tracks
+        self.params = params
 
     def set_lr_mode(self, enabled: bool):
         """Enable/disable LR routing mode."""
         self.lr_enabled = bool(enabled)
 
+    def set_routing(self, preset):
+        """Route tracks through a RoutingPreset (None: stereo mix)."""
+        old_channels = self.routing.channels if self.routing is not None else None
+        new_channels = preset.channels if preset is not None else None
+        needs_reopen = self.stream is not None and old_channels != new_channels
+        self.routing = preset
+        # The stream's channel count depends on the preset: re-open it like a device change
+        if needs_reopen:
+            self.set_output_device(self.output_device)
+
+    def _route_matrix(self, preset, out_channels):
+        # The table is part of the key: a new track list (not just a new length) rebuilds the matrix
+        params = self.params
+        key = (id(preset), preset.version, params, out_channels)
+        cached_key, matrix = self._route_cache
+        if cached_key != key:
+            matrix = preset.matrix(params.tracks, out_channels)
+            self._route_cache = (key, matrix)
+        return matrix
+
+    def set_secondary_outputs(self, outputs):
+        """Send mix channels to other devices (needs a routing preset); re-opens a running stream."""
+        outputs = [{'device': o['device'], 'channels': list(o['channels'])} for o in (outputs or []) if o.get('channels')]
+        changed = outputs != self.secondary_outputs
+        self.secondary_outputs = outputs
+        if changed and self.stream is not None:
+            self.set_output_device(self.output_device)
+
+    def _output_layout(self, device_channels):
+        """(mix channels, main device channel map or None). Channels sent to secondary devices are
+        left out of the main device; None means the mix goes to the main device as is."""
+        secondary = {c for out in self.secondary_outputs for c in out['channels']}
+        if self.routing is None or not secondary:
+            return self._stream_channels(device_channels), None
+        mix_channels = self.routing.channels
+        primary = [c for c in range(mix_channels) if c not in secondary][:max(1, device_channels)]
+        return mix_channels, np.asarray(primary, dtype=np.intp)
+
+    def _stream_channels(self, device_channels):
+        """Output channels to open: stereo (mono devices: 1), or what the routing preset needs."""
+        if self.routing is None:
+            return 2 if device_channels >= 2 else 1
+        return max(1, min(device_channels, max(2, self.routing.channels)))
+
     def set_output_device(self, device):
         try:
             print(f"[AudioPlayer] set_output_device called with: {device}")
@@ -105,6 +222,7 @@ class AudioPlayer(QObject):
                 try:
                     self.should_stop = True
                     self._is_playing = False
+                    self._release_guests()
                     if self.stream:
                         self.stream.stop()
                         self.stream.close()
@@ -147,6 +265,10 @@ class AudioPlayer(QObject):
         except Exception:
             pass
 
+    def set_auto_tune(self, enabled: bool):
+        """Enable/disable adaptive block size (applies when the next stream opens)."""
+        self.auto_tune = bool(enabled)
+
     def set_master_threshold(self, threshold: float):
         try:
             # Clamp to sensible range
@@ -185,7 +307,13 @@ class AudioPlayer(QObject):
         self.should_stop = False
         # Initialize volume levels
         self.volume_levels = [0.0] * len(self.tracks)
-        
+
+        # Our stream is still alive hosting another song: just resume rendering our own mix
+        if self.stream is not None and self._guests:
+            if self.practice_speed < 1.0:
+                self._start_practice(self.current_position)
+            return
+
         # Start playback in a separate thread to avoid blocking UI
         self._start_playback_thread()
         
@@ -200,19 +328,31 @@ class AudioPlayer(QObject):
         if self._is_playing and not self._is_paused:
             self._is_playing = False
             self._is_paused = True
+            # A hosted player leaves its host's stream and resumes on its own one
+            self._host = None
             # Stop the stream when pausing
             if self.stream:
                 try:
                     self.stream.stop()
                 except:
                     pass
-                    
+            # Resuming starts a new engine from the position heard last
+            self._stop_practice()
+
     def stop(self):
         """Stop playback and reset position"""
         self.should_stop = True
         self._is_playing = False
         self._is_paused = False
+        self._seek_queue.clear()
+        self._armed_jump = None
+        self._own_ramp = None
+        self._host = None
         self.current_position = 0
+        self._release_guests()
+        self._stop_practice()
+        if self._limiter is not None:
+            self._limiter.reset()
         if self.playback_thread and self.playback_thread.is_alive():
             self.playback_thread.join(timeout=1.0)  # Wait up to 1 second for thread to finish
             
@@ -225,11 +365,9 @@ class AudioPlayer(QObject):
         return self._is_paused
 
     def seek_to_fraction(self, frac: float):
-        """Seek to a position given by fraction (0..1) of the song length. Disabled while playing."""
+        """Seek to a position given by fraction (0..1) of the song length."""
         try:
-            if self.is_playing():
-                return False
-            max_length = max(len(t['samples']) for t in self.tracks) if self.tracks else 0
+            max_length = self.params.song_length()
             if max_length <= 0:
                 return False
             frac = max(0.0, min(1.0, float(frac)))
@@ -239,32 +377,477 @@ class AudioPlayer(QObject):
             return False
 
     def seek_to_sample(self, index: int):
-        """Seek to a specific sample index. Disabled while playing."""
+        """Seek to a specific sample index.
+        While playing, the jump is queued and applied by the audio thread at the next
+        block boundary with a short equal-power crossfade.
+        """
         try:
-            if self.is_playing():
-                return False
-            max_length = max(len(t['samples']) for t in self.tracks) if self.tracks else 0
+            max_length = self.params.song_length()
             if max_length <= 0:
                 return False
             index = int(index)
             index = max(0, min(index, max_length - 1))
-            self.current_position = index
+            if self.is_playing() and self._practice is not None:
+                # Practice mode: a new engine renders from the target; the callback crossfades into it
+                self._start_practice(index)
+            elif self.is_playing():
+                self._seek_queue.append(index)
+            else:
+                self._seek_queue.clear()
+                self.current_position = index
             return True
         except Exception:
             return False
-        
+
+    def set_tempo(self, bpm, beats_per_bar=DEFAULT_BEATS_PER_BAR):
+        """Set the song tempo used to quantize armed jumps to bar boundaries."""
+        self.bpm = bpm
+        self.beats_per_bar = beats_per_bar or DEFAULT_BEATS_PER_BAR
+
+    def set_loop_region(self, start, end):
+        """Loop playback between two sample positions. The wrap is seamless across blocks."""
+        try:
+            max_length = self.params.song_length()
+            start = max(0, int(start))
+            end = min(int(end), max_length) if max_length > 0 else int(end)
+            # Refuse degenerate loops (shorter than ~1.5 ms at 44.1 kHz)
+            if end - start < 64:
+                return False
+            self.loop_region = (start, end)
+            return True
+        except Exception:
+            return False
+
+    def clear_loop_region(self):
+        """Stop looping; playback continues past the loop end."""
+        self.loop_region = None
+
+    def arm_loop_region(self, start, end):
+        """Loop between two sample positions from the next bar boundary: a playhead outside the
+        region jumps to its start there (see arm_jump); inside it the loop applies at once."""
+        practice = self._practice
+        position = practice.source_position if practice is not None else self.current_position
+        if not self.set_loop_region(start, end):
+            return False
+        start, end = self.loop_region
+        if start <= position < end:
+            self.cancel_armed_jump()
+            return True
+        return self.arm_jump(start)
+
+    def arm_jump(self, target, quantize=True):
+        """Jump to target at the next bar boundary (or at the next block when tempo is unknown)."""
+        try:
+            max_length = self.params.song_length()
+            if max_length <= 0:
+                return False
+            target = max(0, min(int(target), max_length - 1))
+            if not self.is_playing():
+                return self.seek_to_sample(target)
+            # In practice mode the song is mixed ahead of what is heard: quantize from the mixed position
+            practice = self._practice
+            at = practice.source_position if practice is not None else self.current_position
+            if quantize:
+                rate = int(self.tracks[0].sample_rate)
+                # Guard of one typical block so the boundary is not already rendered
+                boundary = next_bar_boundary(at, self.bpm, rate, self.beats_per_bar, guard=2048)
+                if boundary is not None:
+                    at = boundary
+            self._armed_jump = (int(at), target)
+            return True
+        except Exception:
+            return False
+
+    def cancel_armed_jump(self):
+        self._armed_jump = None
+
+    def set_practice_speed(self, speed):
+        """Play slower at the same pitch (1.0: normal playback). Applied at once while playing."""
+        speed = clamp_speed(speed)
+        if speed == self.practice_speed:
+            return
+        self.practice_speed = speed
+        if self.is_playing() and self.stream is not None:
+            self._start_practice(self.current_position, from_live=self._practice is None)
+
+    def _start_practice(self, position, from_live=False):
+        """Replace the practice engine (none at normal speed); the callback crossfades into it.
+        from_live: the callback is mixing the song itself and fades that out into the engine."""
+        old = self._practice
+        if old is not None:
+            old.stop()
+        engine = None
+        if self.practice_speed < 1.0 and self.tracks:
+            # The engine primes with its own MixLane while the callback keeps mixing with the player's
+            engine = PracticeEngine(self, self.practice_speed, self._out_channels, position)
+            engine.from_live = from_live
+            engine.start()
+        self._practice = engine
+        return engine
+
+    def _stop_practice(self):
+        engine, self._practice = self._practice, None
+        self._practice_live = None
+        if engine is not None:
+            engine.stop()
+
+    def _xfade_curve(self, length):
+        """Equal-power (sin/cos) fade-in and fade-out curves of the given length, cached."""
+        curves = self._xfade_curves.get(length)
+        if curves is None:
+            t = (np.arange(length, dtype=np.float32) + 0.5) / float(length)
+            fade_in = np.sin(t * (np.pi / 2.0)).astype(np.float32)[:, None]
+            fade_out = np.cos(t * (np.pi / 2.0)).astype(np.float32)[:, None]
+            curves = (fade_in, fade_out)
+            self._xfade_curves[length] = curves
+        return curves
+
+    def _plan_segments(self, position, frames):
+        """Split a block into contiguous source segments, applying loop wraps and armed jumps.
+        Returns ([(src_position, count, dst_offset), ...], next_position).
+        """
+        segments = []
+        dst = 0
+        pos = position
+        while dst < frames:
+            remaining = frames - dst
+            boundary = None
+            next_pos = None
+            jump = self._armed_jump
+            if jump is not None and jump[0] < pos + remaining:
+                boundary = max(pos, jump[0])
+                next_pos = jump[1]
+            loop = self.loop_region
+            if loop is not None and pos <= loop[1] < pos + remaining and (boundary is None or loop[1] < boundary):
+                boundary = loop[1]
+                next_pos = loop[0]
+                jump = None
+            if boundary is None:
+                segments.append((pos, remaining, dst))
+                pos += remaining
+                break
+            count = boundary - pos
+            if count > 0:
+                segments.append((pos, count, dst))
+                dst += count
+            if jump is not None:
+                self._armed_jump = None
+            pos = next_pos
+        return segments, pos
+
+    def _render_position(self, mixed_audio, frames, out_channels):
+        """Mix a block from current_position, following loops/jumps, and advance the position."""
+        segments, next_pos = self._plan_segments(self.current_position, frames)
+        if len(segments) == 1:
+            levels = self._mix_tracks(mixed_audio, segments[0][0], frames, out_channels)
+        else:
+            levels = None
+            for src, count, dst in segments:
+                seg_levels = self._mix_tracks(mixed_audio[dst:dst + count], src, count, out_channels)
+                levels = seg_levels if levels is None else [max(a, b) for a, b in zip(levels, seg_levels)]
+            if levels is None:
+                levels = [0.0] * len(self.tracks)
+        self.current_position = next_pos
+        return levels
+
+    def _mix_tracks(self, mixed_audio, position, frames, out_channels, skip=None, lane=None):
+        """Mix all tracks starting at position into mixed_audio; returns per-track levels.
+        skip: optional mask of tracks left out of the mix (practice mode replaces the click).
+        lane: MixLane of the calling thread (the callback's by default).
+        """
+        # One snapshot of the parameter table per block: a track list swapped in by the UI thread
+        # is picked up at the next block, never halfway through this one
+        params = self.params
+        routing = self.routing
+        lane = lane or self._lane
+        active = params.active(position)
+        if skip is not None:
+            active &= ~skip
+        if routing is not None:
+            return self._mix_tracks_routed(params, routing, mixed_audio, position, frames, out_channels, active,
+                                           lane)
+        new_volume_levels = [0.0] * len(params)
+        volumes = params.volume
+        chains = lane.dsp(params)
+        for i in np.flatnonzero(active).tolist():
+            # Get samples for this track at the requested position
+            stored = params.samples[i][position:position + frames]
+            track_samples = decode_block(stored, lane.scratch(frames))
+
+            # Apply volume (in place when the block was decoded into the scratch buffer)
+            if track_samples is stored:
+                track_samples = track_samples * volumes[i]
+            else:
+                track_samples *= volumes[i]
+
+            # Insert chain (HPF/EQ/pan); None when all of its processors are bypassed
+            if chains[i] is not None:
+                track_samples = chains[i].process(track_samples, position)
+
+            # Apply LR routing if enabled
+            # Mono sources are mixed as (n, 1) and broadcast; under LR they feed one side only
+            side = None
+            if self.lr_enabled:
+                if params.left[i]:
+                    # Route only to left
+                    side = 0
+                    if track_samples.shape[1] >= 2:
+                        track_samples[:, 1] = 0.0
+                else:
+                    # Route only to right
+                    side = 1
+                    if track_samples.shape[1] >= 2:
+                        track_samples[:, 0] = 0.0
+
+            # Optional: per-track limiter disabled by default to preserve dynamics
+            if self.per_track_limiter:
+                track_samples = self._apply_soft_limiter(track_samples, threshold=self.master_threshold, knee_width=0.08)
+
+            # Calculate RMS volume level for this track (active tracks have at least one frame here)
+            rms = np.sqrt(np.mean(track_samples**2))
+            if side is not None and track_samples.shape[1] == 1:
+                rms *= np.sqrt(0.5)  # Same level as a stereo copy with one side silenced
+            new_volume_levels[i] = min(rms * 2.0, 1.0)  # Scale and clamp
+
+            mix_end_idx = min(len(track_samples), len(mixed_audio))
+            if out_channels >= 2 and side is not None and track_samples.shape[1] == 1:
+                mixed_audio[:mix_end_idx, side] += track_samples[:mix_end_idx, 0]
+            elif out_channels >= 2:
+                mixed_audio[:mix_end_idx] += track_samples[:mix_end_idx]
+            else:
+                mono = np.mean(track_samples[:mix_end_idx], axis=1)
+                if side is not None and track_samples.shape[1] == 1:
+                    mono *= 0.5
+                mixed_audio[:mix_end_idx, 0] += mono
+        return new_volume_levels
+
+    def _mix_tracks_routed(self, params, routing, mixed_audio, position, frames, out_channels, active, lane):
+        """Routing preset mix: stack the track blocks and apply the gain matrix to all of them at once."""
+        count = len(params)
+        # (tracks, frames, 2) stack buffer reused across blocks (a lane renders one block at a time)
+        blocks = lane.route_blocks
+        if blocks is None or blocks.shape[0] != count or blocks.shape[1] < frames:
+            blocks = lane.route_blocks = np.zeros((count, frames, 2), dtype=np.float32)
+        blocks = blocks[:, :frames]
+        chains = lane.dsp(params)
+        gains = np.where(active, params.volume, np.float32(0.0))
+        for i, samples in enumerate(params.samples):
+            n = 0
+            if active[i]:
+                chunk = samples[position:position + frames]
+                n = len(chunk)
+                # A mono (n, 1) chunk is broadcast into both stack channels; compact formats decode here
+                decode_into(chunk, blocks[i, :n])
+                if chains[i] is not None:
+                    blocks[i, :n] = chains[i].process(blocks[i, :n], position)
+            blocks[i, n:] = 0.0
+        if self.per_track_limiter:
+            for i in np.flatnonzero(gains):
+                blocks[i] = self._apply_soft_limiter(blocks[i] * gains[i], threshold=self.master_threshold, knee_width=0.08)
+            gains = (gains > 0).astype(np.float32)
+        # Volumes are folded into the (tracks, 2, N) matrix instead of scaling every sample
+        matrix = self._route_matrix(routing, out_channels) * gains[:, None, None]
+        mixed_audio += np.einsum('tfi,tin->fn', blocks, matrix, optimize=True)
+        energy = np.einsum('tfi,tfi->t', blocks, blocks) * (gains * gains) / max(1, frames * 2)
+        return np.minimum(np.sqrt(energy) * 2.0, 1.0).tolist()
+
+    def set_sample_format(self, fmt):
+        """Storage format for tracks loaded from now on ('float32', 'int16' or 'float16')."""
+        self.sample_format = fmt
+
+    def _render_block(self, mixed_audio, frames, out_channels):
+        """Render one block of this player's song, applying the most recent pending seek."""
+        if self._practice is not None or self._practice_live is not None:
+            return self._render_practice(mixed_audio, frames, out_channels)
+        seek_target = None
+        while self._seek_queue:
+            seek_target = self._seek_queue.popleft()
+
+        if seek_target is None:
+            return self._render_position(mixed_audio, frames, out_channels)
+
+        old_position = self.current_position
+        # Equal-power crossfade from the old position into the new one. The old position is mixed
+        # first, so track filters continue it from their state before the new position starts
+        sample_rate = self.tracks[0].sample_rate if self.tracks else 44100
+        xfade = min(frames, int(sample_rate * self.seek_crossfade_ms / 1000.0))
+        old_audio = None
+        if xfade > 0:
+            old_audio = np.zeros((xfade, out_channels), dtype=np.float32)
+            self._mix_tracks(old_audio, old_position, xfade, out_channels)
+        self.current_position = seek_target
+        levels = self._render_position(mixed_audio, frames, out_channels)
+        if old_audio is not None:
+            fade_in, fade_out = self._xfade_curve(xfade)
+            mixed_audio[:xfade] = mixed_audio[:xfade] * fade_in + old_audio * fade_out
+        return levels
+
+    def _render_practice(self, mixed_audio, frames, out_channels):
+        """Block from the practice engine's ring; a replaced engine (seek, new speed, back to normal
+        speed) is crossfaded out from what it still has buffered, and normal playback (the first
+        block of an engine started from it) from the live mix."""
+        engine, old = self._practice, self._practice_live
+        self._practice_live = engine
+        sample_rate = self.tracks[0].sample_rate if self.tracks else 44100
+        xfade = min(frames, int(sample_rate * self.seek_crossfade_ms / 1000.0))
+        old_audio = None
+        if xfade > 0 and old is not engine:
+            if old is not None:
+                old_audio = np.zeros((xfade, out_channels), dtype=np.float32)
+                old.render(old_audio, xfade)
+            elif engine.from_live:
+                # The engine started from a position already heard (it primed while the callback
+                # went on): fade out what the live mix continues with
+                old_audio = np.zeros((xfade, out_channels), dtype=np.float32)
+                self._mix_tracks(old_audio, self.current_position, xfade, out_channels)
+        if engine is not None:
+            levels = engine.render(mixed_audio, frames)
+            self.current_position = engine.position
+        else:
+            levels = self._render_position(mixed_audio, frames, out_channels)
+        if old_audio is not None:
+            fade_in, fade_out = self._xfade_curve(xfade)
+            mixed_audio[:xfade] = mixed_audio[:xfade] * fade_in + old_audio * fade_out
+        return levels
+
+    def _process_master(self, mixed_audio):
+        """Master bus: lookahead limiter (if enabled) and a final hard clip, in place."""
+        # Apply protection only on the master bus (if enabled)
+        if self.limiter_enabled:
+            self._master_limiter(mixed_audio.shape[1]).process(mixed_audio)
+
+        # Safety clip for the limiter-off path (a no-op after the limiter); unlike scaling the whole
+        # block by its peak it only touches the samples over full scale, so there is no pumping
+        np.clip(mixed_audio, -1.0, 1.0, out=mixed_audio)
+        return mixed_audio
+
+    def _master_limiter(self, channels):
+        """Limiter state for the current layout; rebuilt when channels, rate or threshold change."""
+        sample_rate = self.tracks[0].sample_rate if self.tracks else 44100
+        key = (channels, sample_rate, self.master_threshold)
+        limiter = self._limiter
+        if limiter is None or self._limiter_key != key:
+            limiter = LookaheadLimiter(channels, sample_rate, ceiling=self.master_threshold)
+            self._limiter, self._limiter_key = limiter, key
+        return limiter
+
+    def master_latency(self):
+        """Frames the master bus delays the mix by (the limiter lookahead)."""
+        if not self.limiter_enabled or self._limiter is None:
+            return 0
+        return self._limiter.latency
+
+    def _song_length(self):
+        return self.params.song_length()
+
+    def _end_transport_play(self):
+        """Finish playback stopped by a scheduled transport event (like stop(), from the audio thread)."""
+        self._is_playing = False
+        self._is_paused = False
+        self._own_ramp = None
+        self._seek_queue.clear()
+        self._armed_jump = None
+        self.current_position = 0
+        self.volume_levels = [0.0] * len(self.tracks)
+        engine, self._practice = self._practice, None
+        self._practice_live = None
+        if engine is not None:
+            engine.stop(wait=False)
+
+    def _release_guests(self):
+        """Detach hosted players when our stream goes away; they can resume on their own stream."""
+        guests, self._guests = self._guests, []
+        for source, _ramp, _offset in guests:
+            if isinstance(source, AudioPlayer) and source._host is self:
+                source._host = None
+                if source._is_playing:
+                    source._is_playing = False
+                    source._is_paused = True
+
+    def _apply_transport_event(self, event, offset):
+        """Apply a due transport event at a sample offset inside the current block (audio thread)."""
+        target = event.player
+        if event.kind == 'start' and target is not None:
+            if target is self:
+                if not self._is_playing:
+                    self._is_playing = True
+                    self._is_paused = False
+                    self._own_delay = offset
+                    self._own_ramp = GainRamp(event.fade, True, offset) if event.fade > 0 else None
+            elif isinstance(target, AudioPlayer):
+                if target._host is None and not target._is_playing and target.tracks:
+                    target._host = self
+                    target._is_playing = True
+                    target._is_paused = False
+                    target.should_stop = False
+                    self._guests.append([target, GainRamp(event.fade, True, offset), offset])
+            else:
+                self._guests.append([target, None, offset])
+        elif event.kind == 'stop' and target is not None:
+            if target is self:
+                if self._is_playing:
+                    self._own_ramp = GainRamp(event.fade, False, offset)
+            else:
+                for entry in self._guests:
+                    if entry[0] is target:
+                        entry[1] = GainRamp(event.fade, False, offset)
+        if event.on_fire is not None:
+            try:
+                event.on_fire()
+            except Exception:
+                pass
+
+    def render_guest(self, buf, frames, out_channels):
+        """Render this player into a host stream's block. Returns False once it should be dropped."""
+        if not self._is_playing or self._host is None:
+            return False
+        self.volume_levels = self._render_block(buf, frames, out_channels)
+        try:
+            self.volumeLevelsChanged.emit(self.volume_levels)
+        except:
+            pass
+        if self.transport is not None:
+            self._clock_anchor = (self.transport.clock, self.current_position)
+        if self.current_position >= self._song_length():
+            self._end_transport_play()
+            return False
+        return True
+
+    def _mix_guests(self, mixed_audio, frames, out_channels):
+        """Mix hosted sources (incoming songs, count-in) into this stream's block."""
+        for entry in list(self._guests):
+            source, ramp, offset = entry
+            buf = np.zeros((frames, out_channels), dtype=np.float32)
+            alive = source.render_guest(buf[offset:], frames - offset, out_channels)
+            entry[2] = 0
+            if ramp is not None:
+                buf *= ramp.gains(frames)
+                if ramp.finished:
+                    entry[1] = None
+                    if not ramp.fade_in:
+                        alive = False
+                        if isinstance(source, AudioPlayer):
+                            source._end_transport_play()
+            mixed_audio += buf
+            if not alive:
+                try:
+                    self._guests.remove(entry)
+                except ValueError:
+                    pass
+                if isinstance(source, AudioPlayer) and source._host is self:
+                    source._host = None
+
     def _playback_worker(self):
         """Worker function for audio playback in separate thread"""
         try:
             # Find the maximum length among all tracks
-            max_length = max(len(track['samples']) for track in self.tracks) if self.tracks else 0
+            max_length = self.params.song_length()
             
             # Use sample rate of first track (in a real app, you might want to resample)
             if not self.tracks:
                 return
                 
-            sample_rate = self.tracks[0]['sample_rate']
-            blocksize = 2048
+            sample_rate = self.tracks[0].sample_rate
             try:
                 default_pair = sd.default.device
             except Exception:
@@ -284,13 +867,13 @@ class AudioPlayer(QObject):
             if not _valid_out(device_id):
                 candidate = default_pair[1] if default_pair else None
                 device_id = candidate if _valid_out(candidate) else None
-            out_channels = 2
+            out_channels, primary_map = 2, None
             if _valid_out(device_id):
                 try:
                     ch = int(devices[device_id].get('max_output_channels', 0))
-                    out_channels = 2 if ch >= 2 else 1
+                    out_channels, primary_map = self._output_layout(ch)
                 except Exception:
-                    out_channels = 2
+                    out_channels, primary_map = 2, None
             else:
                 try:
                     idx2 = next((i for i, d in enumerate(devices) if int(d.get('max_output_channels', 0)) >= 2), None)
@@ -304,125 +887,188 @@ class AudioPlayer(QObject):
                 device_id = idx2
                 try:
                     ch = int(devices[device_id].get('max_output_channels', 0)) if device_id is not None else 2
-                    out_channels = 2 if ch >= 2 else 1
+                    out_channels, primary_map = self._output_layout(ch)
                 except Exception:
-                    out_channels = 2
+                    out_channels, primary_map = 2, None
             
             # Create a callback function for audio playback
-            def audio_callback(outdata, frames, time, status):
+            def audio_callback(outdata, frames, time_info, status):
+                started_wall = time.time()
+                started = time.perf_counter()
+                error = False
                 try:
-                    if self.should_stop or not self._is_playing:
+                    if self.should_stop or not (self._is_playing or self._guests):
                         raise sd.CallbackStop()
-                        
+
                     mixed_audio = np.zeros((frames, out_channels), dtype=np.float32)
-                    
-                    # Calculate volume levels for each track
-                    new_volume_levels = []
-                    
-                    # Mix all tracks
-                    for i, track in enumerate(self.tracks):
-                        if not track['muted'] and self.current_position < len(track['samples']):
-                            # Get samples for this track at the current position
-                            start_idx = self.current_position
-                            end_idx = min(start_idx + frames, len(track['samples']))
-                            track_samples = track['samples'][start_idx:end_idx]
-                            
-                            # Apply volume
-                            track_samples = track_samples * track['volume']
-
-                            # Apply LR routing if enabled
-                            if self.lr_enabled:
-                                if track.get('left_hint'):
-                                    # Route only to left
-                                    if track_samples.shape[1] >= 2:
-                                        track_samples[:, 1] = 0.0
+
+                    # This stream owns the transport clock: fire events due inside this block
+                    if self.transport is not None and self._host is None:
+                        for offset, event in self.transport.process_block(frames):
+                            self._apply_transport_event(event, offset)
+
+                    if self._is_playing:
+                        delay, self._own_delay = self._own_delay, 0
+                        new_volume_levels = self._render_block(mixed_audio[delay:], frames - delay, out_channels)
+                        if self._own_ramp is not None:
+                            mixed_audio *= self._own_ramp.gains(frames)
+                            if self._own_ramp.finished:
+                                if self._own_ramp.fade_in:
+                                    self._own_ramp = None
                                 else:
-                                    # Route only to right
-                                    if track_samples.shape[1] >= 2:
-                                        track_samples[:, 0] = 0.0
-                            
-                            # Optional: per-track limiter disabled by default to preserve dynamics
-                            if self.per_track_limiter:
-                                track_samples = self._apply_soft_limiter(track_samples, threshold=self.master_threshold, knee_width=0.08)
-                            
-                            # Calculate RMS volume level for this track
-                            if len(track_samples) > 0:
-                                rms = np.sqrt(np.mean(track_samples**2))
-                                new_volume_levels.append(min(rms * 2.0, 1.0))  # Scale and clamp
-                            else:
-                                new_volume_levels.append(0.0)
-                            
-                            mix_end_idx = min(len(track_samples), len(mixed_audio))
-                            if out_channels >= 2:
-                                mixed_audio[:mix_end_idx] += track_samples[:mix_end_idx]
-                            else:
-                                mono = np.mean(track_samples[:mix_end_idx], axis=1)
-                                mixed_audio[:mix_end_idx, 0] += mono
-                        else:
-                            new_volume_levels.append(0.0)
-                    
-                    # Update volume levels
-                    self.volume_levels = new_volume_levels
-                    
-                    # Emit volume levels signal (this needs to be thread-safe)
-                    try:
-                        self.volumeLevelsChanged.emit(self.volume_levels)
-                    except:
-                        pass  # Ignore errors in signal emission
-                    
-                    # Apply protection only on the master bus (if enabled)
-                    if self.limiter_enabled:
-                        mixed_audio = self._apply_soft_limiter(mixed_audio, threshold=self.master_threshold, knee_width=0.10)
-                    
-                    # Final normalization to prevent clipping (with safety margin)
-                    max_val = np.max(np.abs(mixed_audio))
-                    if max_val > 1.0:
-                        mixed_audio = mixed_audio * (1.0 / max_val)
-                        
-                    outdata[:] = mixed_audio
-                    
-                    # Move to next position
-                    self.current_position += frames
+                                    self._end_transport_play()
+                                    new_volume_levels = self.volume_levels
+                        if self.transport is not None:
+                            self._clock_anchor = (self.transport.clock, self.current_position)
+
+                        # Update volume levels
+                        self.volume_levels = new_volume_levels
+
+                        # Emit volume levels signal (this needs to be thread-safe)
+                        try:
+                            self.volumeLevelsChanged.emit(self.volume_levels)
+                        except:
+                            pass  # Ignore errors in signal emission
+
+                    if self._guests:
+                        self._mix_guests(mixed_audio, frames, out_channels)
+
+                    mastered = self._process_master(mixed_audio)
+                    if primary_map is None:
+                        outdata[:] = mastered
+                    else:
+                        outdata.fill(0)
+                        outdata[:, :len(primary_map)] = mastered[:, primary_map]
+                    for secondary in secondaries:
+                        secondary.push(mastered)
                     
-                    # Stop when we've played all samples
-                    if self.current_position >= max_length:
+                    # Stop when we've played all samples (keep the stream for hosted sources)
+                    if self._is_playing and self.current_position >= max_length:
                         self._is_playing = False
                         self._is_paused = False
+                    if not self._is_playing and not self._guests:
                         raise sd.CallbackStop()
+                except sd.CallbackStop:
+                    raise
                 except Exception as e:
-                    print(f"Error in audio callback: {e}")
-                    
-            # Start playback - using the original approach that worked
-            kwargs = {
-                'samplerate': int(sample_rate),
-                'channels': int(out_channels),
-                'callback': audio_callback,
-                'blocksize': int(blocksize),
-                'dtype': 'float32',
-                'latency': 'high',
-            }
+                    # Never leave stale samples in the device buffer; the worker logs the error
+                    error = True
+                    self.stats.last_error = str(e)
+                    outdata.fill(0)
+                finally:
+                    underflow = bool(getattr(status, 'output_underflow', False)) if status else False
+                    self.stats.record(started_wall, time.perf_counter() - started,
+                                      frames / float(sample_rate), underflow, error)
+
             try:
-                if _valid_out(device_id):
-                    kwargs['device'] = device_id
-                    print(f"[AudioPlayer] Creating stream with device_id: {device_id}")
-                else:
-                    print(f"[AudioPlayer] Creating stream with default device (device_id {device_id} not valid)")
-            except Exception as e:
-                print(f"[AudioPlayer] Error setting device in kwargs: {e}")
-            self.stream = sd.OutputStream(**kwargs)
-            self.stream.start()
-            print(f"[AudioPlayer] Stream started successfully")
-            
-            
-            # Keep the stream alive while playing (but not while paused)
-            while self._is_playing and not self.should_stop:
+                device_name = devices[device_id].get('name', 'default') if _valid_out(device_id) else 'default'
+            except Exception:
+                device_name = 'default'
+            tuner = LatencyTuner(device_name, *self.block_bounds) if self.auto_tune else None
+            self.tuner = tuner
+            blocksize, latency = tuner.level if tuner else self.fixed_level
+
+            # Secondary devices start first (silent until their ring is primed) so the master
+            # callback can feed them from its first block
+            secondaries = []
+            for out in self.secondary_outputs:
+                channels = [c for c in out['channels'] if c < out_channels]
+                if primary_map is None or not channels:
+                    continue
+                secondary = SecondaryOutput(out['device'], channels, sample_rate, blocksize)
+                try:
+                    secondary.start()
+                except Exception as e:
+                    print(f"[AudioPlayer] Could not open secondary output {out['device']}: {e}")
+                    audio_logger().warning(f"secondary output {out['device']} failed: {e}")
+                if secondary.stream is not None:
+                    secondaries.append(secondary)
+            self._secondaries = secondaries
+            stream_channels = max(1, len(primary_map)) if primary_map is not None else out_channels
+
+            def _open_stream(blocksize, latency):
+                # Secondaries re-target their rings before the first block of the new size arrives
+                for secondary in secondaries:
+                    secondary.set_master_block(blocksize)
+                # Start playback - using the original approach that worked
+                kwargs = {
+                    'samplerate': int(sample_rate),
+                    'channels': int(stream_channels),
+                    'callback': audio_callback,
+                    'blocksize': int(blocksize),
+                    'dtype': 'float32',
+                    'latency': latency,
+                }
+                try:
+                    if _valid_out(device_id):
+                        kwargs['device'] = device_id
+                        print(f"[AudioPlayer] Creating stream with device_id: {device_id}")
+                    else:
+                        print(f"[AudioPlayer] Creating stream with default device (device_id {device_id} not valid)")
+                except Exception as e:
+                    print(f"[AudioPlayer] Error setting device in kwargs: {e}")
+                stream = sd.OutputStream(**kwargs)
+                self.stats.reset_stream(sample_rate, blocksize, getattr(stream, 'latency', 0.0))
+                stream.start()
+                print(f"[AudioPlayer] Stream started successfully")
+                audio_logger().info(f"stream started: device={device_id} rate={int(sample_rate)} block={blocksize} "
+                                    f"latency={latency} ({self.stats.latency * 1000:.1f} ms) channels={stream_channels}/{out_channels}")
+                if tuner is not None:
+                    tuner.attach(self.stats)
+                return stream
+
+            # Practice mode: the producer has stretched audio ready before the first callback
+            self._out_channels = out_channels
+            if self.practice_speed < 1.0:
+                self._start_practice(self.current_position)
+            self.stream = _open_stream(blocksize, latency)
+
+            # Keep the stream alive while playing (but not while paused); drain stats to the log ~1/s
+            ticks = 0
+            while (self._is_playing or self._guests) and not self.should_stop:
                 sd.sleep(100)  # Small delay to prevent busy waiting
-                
+                ticks += 1
+                if ticks % 10 != 0:
+                    continue
+                self.stats.drain_to_log()
+                if ticks % 100 == 0:
+                    for secondary in secondaries:
+                        audio_logger().info(f"secondary output: {secondary.status()}")
+                if tuner is None or tuner.evaluate(self.stats) is None:
+                    continue
+                # Re-open only where the gap is inaudible, or when dropouts keep happening anyway
+                silent = max(self.volume_levels or [0.0]) < RETUNE_SILENCE_LEVEL and not self._guests
+                forced = tuner.trouble_in_window and time.monotonic() - tuner.pending_since >= RETUNE_FORCE_AFTER
+                if (silent or forced) and not self.should_stop:
+                    blocksize, latency = tuner.apply_pending()
+                    audio_logger().info(f"retuning stream to block={blocksize} latency={latency} "
+                                        f"({'silence' if silent else 'dropouts'})")
+                    old_stream, self.stream = self.stream, None
+                    try:
+                        old_stream.stop()
+                        old_stream.close()
+                    except Exception:
+                        pass
+                    self.stream = _open_stream(blocksize, latency)
+
         except Exception as e:
             print(f"Error during playback: {e}")
         finally:
             self._is_playing = False
             self.should_stop = False
+            self._release_guests()
+            self._stop_practice()
+            for secondary in self._secondaries:
+                audio_logger().info(f"secondary output stopped: {secondary.status()}")
+                secondary.stop()
+            self._secondaries = []
+            try:
+                self.stats.drain_to_log(force_summary=True)
+                # Stream start is a safe point: keep a pending change for the next playback
+                if self.tuner is not None and self.tuner.pending is not None:
+                    self.tuner.apply_pending()
+            except Exception:
+                pass
             # Clean up stream
             if self.stream:
                 try:
@@ -470,123 +1116,90 @@ class AudioPlayer(QObject):
             npz_path = self._cached_npz_path(file_path)
             if os.path.exists(npz_path):
                 data = np.load(npz_path)
-                samples = data['samples']
+                samples = as_frames(data['samples'])
                 sample_rate = int(data['sample_rate'])
-                if len(samples.shape) == 1:
-                    samples = np.column_stack((samples, samples))
-                return sample_rate, samples.astype(np.float32)
+                return sample_rate, to_storage(samples, self.sample_format), route_from_metadata(data)
         except Exception:
             pass
         return None
 
-    def replace_track_samples(self, file_path, sample_rate, samples):
-        """Replace samples for a loaded track if present."""
-        try:
-            for t in self.tracks:
-                if t.get('file_path') == file_path:
-                    t['sample_rate'] = int(sample_rate or t.get('sample_rate', 44100))
-                    if len(samples.shape) == 1:
-                        samples = np.column_stack((samples, samples))
-                    t['samples'] = samples.astype(np.float32)
-                    break
-        except Exception:
-            pass
+    def _variant_npz_path(self, file_path, semitones):
+        return variant_npz_path(self._cache_dir, self._cache_key_for(file_path), semitones)
 
-    def _normalize_text(self, s):
-        try:
-            s = s or ""
-            s = unicodedata.normalize('NFD', s)
-            s = ''.join(c for c in s if not unicodedata.combining(c))
-            return s.lower()
-        except Exception:
-            return (s or "").lower()
+    def transpose_jobs(self, semitones):
+        """(source path, variant cache path) of the stems still to render for a key offset."""
+        jobs = []
+        for t in self.tracks:
+            if t.left_hint or not t.file_path.lower().endswith('.wav'):
+                continue
+            npz_path = self._variant_npz_path(t.file_path, semitones)
+            if clamp_semitones(semitones) and not os.path.exists(npz_path):
+                jobs.append((t.file_path, npz_path))
+        return jobs
 
-    def _detect_left_route(self, file_path, samples):
-        """Heurística: retorna True se deve ir para o canal esquerdo (click/guia/metronomo)."""
+    def set_transpose(self, semitones):
+        """Switch every pitched stem to its variant for a key offset (0 = original key).
+        All variants must already be rendered (see transpose_jobs); returns False otherwise.
+        The new arrays have the same length, so playback continues at the same position.
+        """
+        semitones = clamp_semitones(semitones)
+        if semitones == self.transpose:
+            return True
+        if semitones and self.transpose_jobs(semitones):
+            return False
         try:
-            name = self._normalize_text(os.path.basename(file_path))
-            tokens = [t for t in re.split(r'[^a-z0-9]+', name) if t]
-
-            # Palavras-chave explícitas para enviar à ESQUERDA (prioridade absoluta)
-            force_left = {
-                'click', 'clicktrack', 'clk', 'tempo',
-                'metronome', 'metronomo', 'metron', 'metro',
-                'guia', 'gui', 'guide'
-            }
-            if any((kw in name) or (kw in tokens) for kw in force_left):
-                return True
-
-            # Palavras-chave de vozes/coral para enviar à DIREITA (se não contiver guia)
-            voice_right = {
-                'bgv', 'bgvs', 'bvg', 'bvgs',
-                'choir', 'coral', 'vox', 'voxes', 'vozes', 'voz',
-                'voice', 'vocals', 'backing', 'backs',
-                'soprano', 'tenor', 'alto', 'baritone', 'baritono', 'contralto',
-                'lead', 'solo'
-            }
-            if any((kw in name) or (kw in tokens) for kw in voice_right):
-                # Apenas envia para direita se não houver termos de guia explícitos
-                if not any((kw in name) or (kw in tokens) for kw in {'guia', 'guide', 'gui'}):
+            tracks = []
+            for t in self.tracks:
+                if t.left_hint or not t.file_path.lower().endswith('.wav'):
+                    tracks.append(t)
+                    continue
+                if semitones:
+                    data = np.load(self._variant_npz_path(t.file_path, semitones))
+                    samples = as_frames(data['samples'])
+                else:
+                    cached = self._load_cached_optimized(t.file_path)
+                    if cached is not None:
+                        samples = cached[1]
+                    else:
+                        samples = self._normalize_audio(load_wav_float(t.file_path)[1])
+                samples = to_storage(samples, self.sample_format)
+                if len(samples) != len(t.samples):
                     return False
+                tracks.append(t.copy(samples=samples))
+        except Exception as e:
+            print(f"Error loading transposed stems: {e}")
+            return False
+        self.tracks = tracks
+        self.transpose = semitones
+        return True
 
-            # Instrumentos típicos: manter à DIREITA
-            instrument_right = {
-                'piano', 'keys', 'keyboard', 'synth', 'pad', 'organ', 'rhodes',
-                'bass', 'baixo', 'sub',
-                'drum', 'drums', 'kick', 'snare', 'hihat', 'hi-hat', 'tom', 'perc', 'percussion',
-                'gtr', 'guitar', 'acoustic', 'electric', 'eletric', 'leadguitar', 'rhythm',
-                'flute', 'strings', 'violin', 'violino', 'cello', 'sax', 'trumpet'
-            }
-            if any((kw in name) or (kw in tokens) for kw in instrument_right):
-                return False
-        except Exception:
-            pass
-        # Fallback simples por áudio: analisa blocos RMS para silêncio vs atividade
+    def replace_track_samples(self, file_path, sample_rate, samples):
+        """Replace samples for a loaded track if present."""
         try:
-            if samples is None or len(samples) == 0:
-                return False
-            mono = samples
-            if len(mono.shape) > 1:
-                mono = np.mean(np.abs(mono), axis=1)
-            else:
-                mono = np.abs(mono)
-            block = max(512, min(4096, len(mono)//100))
-            if block <= 0:
-                return False
-            trim_len = (len(mono)//block)*block
-            mono = mono[:trim_len]
-            blocks = mono.reshape(-1, block)
-            rms = np.sqrt(np.mean(blocks**2, axis=1))
-            # Normaliza RMS
-            max_r = rms.max() if rms.size > 0 else 1.0
-            if max_r <= 0:
-                return False
-            nrms = rms / max_r
-            # Fração de blocos "silenciosos"
-            silence_ratio = float(np.mean(nrms < 0.06))
-            # Se quase nunca fica em silêncio -> parece click constante
-            if silence_ratio < 0.03:
-                return True
-            # Guia intermitente (alternância marcada): mais restrito para evitar false positives
-            active_ratio = 1.0 - silence_ratio
-            if 0.25 <= active_ratio <= 0.75 and np.std(nrms) > 0.12:
-                return True
+            for i, t in enumerate(self.tracks):
+                if t.file_path == file_path:
+                    track = t.copy(samples=to_storage(as_frames(samples), self.sample_format))
+                    track.sample_rate = int(sample_rate or t.sample_rate)
+                    if track.dsp is not None:
+                        track.dsp = build_track_dsp(track.dsp.settings, track.sample_rate)
+                    # New table with the new array and length, swapped in at the next block
+                    self.tracks = self.tracks[:i] + [track] + self.tracks[i + 1:]
+                    break
         except Exception:
             pass
-        return False
-                
+
     def _normalize_audio(self, samples):
         """Normalize audio to prevent clipping while maintaining dynamics"""
         if len(samples) == 0:
             return samples
             
-        # Calculate the peak amplitude
-        peak_amplitude = np.max(np.abs(samples))
+        # Calculate the peak amplitude (without a full-size abs temporary)
+        peak_amplitude = block_peak(samples)
         
         # If the peak is too high, normalize with a safety margin
         if peak_amplitude > 0.95:
             # Normalize to ~0.9 to leave modest headroom for mixing without sounding too quiet
-            samples = samples * (0.9 / peak_amplitude)
+            samples *= 0.9 / peak_amplitude
             
         return samples
 
@@ -0,0 +1,240 @@
+# Practice mode: a song played slower (e.g. 80-90 %) at its original pitch, for rehearsals.
+# The audio callback hands out exactly `frames` of audio per block, so the stretched audio is made
+# ahead of it: a producer thread mixes the song from the player's tracks (loops, armed jumps and
+# insert chains as usual), time-stretches the mix with the phase vocoder of audio/transpose.py
+# (hop ratio Hs/Ha = 1/speed) and writes it into a RingBuffer that the callback drains. The mixed
+# bus is stretched once instead of every stem, so the cost does not grow with the track count.
+# Click stems (by name, see route_classifier.is_click_name) stay out of the stretched mix: the
+# vocoder would smear their transients and the click has to follow the new tempo anyway. A
+# metronome is synthesized on the output timeline at bpm * speed instead, on the channels and at
+# the volume of the click stem. Without a bpm the click stem is stretched with everything else.
+import threading
+import time
+from collections import deque
+import numpy as np
+from audio.multiout import RingBuffer
+from audio.route_classifier import is_click_name
+from audio.track import MixLane
+from audio.timing import beat_length_samples, DEFAULT_BEATS_PER_BAR
+from audio.transport import click_sounds
+from audio.transpose import PhaseVocoder
+
+PRACTICE_SPEEDS = (1.0, 0.95, 0.9, 0.85, 0.8, 0.75)  # Offered by the song card menu
+SPEED_RANGE = (0.5, 1.0)
+PRACTICE_HOP = 1024       # Synthesis hop; the analysis hop is round(PRACTICE_HOP * speed)
+PRACTICE_CHUNK = 2048     # Source frames mixed per producer step
+LOOKAHEAD_SECONDS = 0.3   # Stretched audio kept ready ahead of the callback
+PRIME_TIMEOUT = 0.5       # Longest wait for the first stretched block when an engine starts
+
+
+def clamp_speed(speed):
+    """Playback speed within SPEED_RANGE (1.0 = normal playback)."""
+    try:
+        speed = float(speed)
+    except Exception:
+        return 1.0
+    if not speed > 0:
+        return 1.0
+    return max(SPEED_RANGE[0], min(SPEED_RANGE[1], speed))
+
+
+class PracticeEngine:
+    """Producer thread rendering a player's song time-stretched into a ring buffer.
+    render() runs on the audio thread; mixing and stretching run on the producer thread only.
+    """
+
+    def __init__(self, player, speed, out_channels, position):
+        self.player = player
+        self.out_channels = int(out_channels)
+        self.sample_rate = int(player.tracks[0].sample_rate) if player.tracks else 44100
+        self.hop_s = PRACTICE_HOP
+        self.hop_a = max(1, int(round(PRACTICE_HOP * clamp_speed(speed))))
+        self.speed = self.hop_a / float(self.hop_s)  # Source frames per output frame (exact)
+        self._vocoder = PhaseVocoder(self.out_channels, self.hop_a, self.hop_s)
+        self.target = int(LOOKAHEAD_SECONDS * self.sample_rate)
+        # Room for the lookahead plus the largest block one step can produce
+        self.ring = RingBuffer(self.target + int(2 * PRACTICE_CHUNK / SPEED_RANGE[0]) + 4 * PRACTICE_HOP,
+                               self.out_channels)
+        self._src = int(position)        # Next song sample the producer mixes
+        self._expected = int(position)   # Song sample that continues the last mixed segment
+        self._fed = 0                    # Mixed frames fed to the vocoder
+        self._out = 0                    # Stretched frames produced
+        self._map = deque([(0, int(position))])  # (fed frame, song sample) at every source jump
+        self._pending = None             # Stretched block waiting for room in the ring
+        self._played = 0                 # Stretched frames handed to the callback
+        self.position = int(position)    # Song sample being heard
+        self.levels = [0.0] * len(player.tracks)
+        self.underruns = 0
+        self.finished = False            # Song end reached and the vocoder tail written to the ring
+        self._at_end = False
+        # Metronome replacing the click stems: onsets on the output timeline, kept until fully written
+        self._beat_len = beat_length_samples(player.bpm, self.sample_rate)
+        self.beats_per_bar = max(1, int(player.beats_per_bar or DEFAULT_BEATS_PER_BAR))
+        self._accent, self._beat = click_sounds(self.sample_rate)
+        self._clicks = deque()           # (output frame, accent)
+        self._click_key = None
+        self._click_mask = None
+        self._lane = MixLane(own_dsp=True)  # Never the callback's buffers or filter state
+        self.from_live = False           # Set by the player: started from normal playback
+        self._running = False
+        self._thread = None
+
+    @property
+    def source_position(self):
+        """Next song sample the producer will mix (ahead of what is heard by the lookahead)."""
+        return self._src
+
+    def start(self):
+        """Start producing and wait (briefly) until the first stretched audio is ready."""
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="PracticeEngine", daemon=True)
+        self._thread.start()
+        deadline = time.monotonic() + PRIME_TIMEOUT
+        while self.ring.available() < PRACTICE_CHUNK and not self.finished and time.monotonic() < deadline:
+            time.sleep(0.002)
+
+    def stop(self, wait=True):
+        """Stop the producer (wait=False from the audio thread). The ring can still be rendered."""
+        self._running = False
+        thread = self._thread
+        if wait and thread is not None and thread.is_alive() and thread is not threading.current_thread():
+            thread.join(timeout=1.0)
+
+    def render(self, out, frames):
+        """Copy the next `frames` stretched frames into out (audio thread). Returns the track levels."""
+        ring = self.ring
+        n = min(frames, ring.available())
+        if n:
+            ring.peek(out, n)
+            ring.consume(n)
+        if n < frames:
+            out[n:frames] = 0.0
+            if not self.finished:
+                self.underruns += 1
+        self._played += n
+        fed = self._played * self.speed
+        song_map = self._map
+        while len(song_map) > 1 and song_map[1][0] <= fed:
+            song_map.popleft()
+        start_fed, start_pos = song_map[0]
+        self.position = int(start_pos + fed - start_fed)
+        if self.finished and n < frames:
+            self.position = max(self.position, self.player.params.song_length())
+        return self.levels
+
+    def _run(self):
+        while self._running:
+            try:
+                if self._pending is None:
+                    if self._at_end:
+                        self.finished = True
+                    if self._at_end or self.ring.available() >= self.target:
+                        time.sleep(0.005)
+                        continue
+                    self._pending = self._produce()
+                    if self._pending is None:
+                        continue
+                if self.ring.capacity - self.ring.available() < len(self._pending):
+                    time.sleep(0.005)
+                    continue
+                self.ring.write(self._pending)
+                self._pending = None
+            except Exception as e:
+                print(f"[PracticeEngine] Error rendering: {e}")
+                self.finished = True
+                break
+
+    def _produce(self):
+        """Mix the next chunk of the song, stretch it and add the metronome. Returns float32 or None."""
+        player = self.player
+        params = player.params
+        length = params.song_length()
+        if self._src >= length:
+            self._at_end = True
+            tail = self._vocoder.flush(self._fed)
+            return self._finish_block(np.concatenate(tail) if tail else None, params)
+
+        frames = min(PRACTICE_CHUNK, length - self._src)
+        mixed = np.zeros((frames, self.out_channels), dtype=np.float32)
+        skip = self._click_tracks(params)
+        segments, next_pos = player._plan_segments(self._src, frames)
+        levels = None
+        for src, count, dst in segments:
+            if src != self._expected:
+                self._map.append((self._fed + dst, src))
+            seg_levels = player._mix_tracks(mixed[dst:dst + count], src, count, self.out_channels, skip=skip,
+                                            lane=self._lane)
+            levels = seg_levels if levels is None else [max(a, b) for a, b in zip(levels, seg_levels)]
+            if skip is not None:
+                self._schedule_clicks(src, count, self._fed + dst)
+            self._expected = src + count
+        self._src = next_pos
+        self._fed += frames
+        if levels is not None:
+            self.levels = levels
+        return self._finish_block(self._vocoder.feed(mixed), params)
+
+    def _click_tracks(self, params):
+        """Mask of the click stems replaced by the metronome, or None (no bpm or no click stem)."""
+        if self._click_key is not params:
+            mask = None
+            if self._beat_len is not None:
+                mask = np.array([is_click_name(t.file_path) for t in params.tracks], dtype=bool)
+                if not mask.any():
+                    mask = None
+            self._click_key, self._click_mask = params, mask
+        return self._click_mask
+
+    def _schedule_clicks(self, src, count, fed_at):
+        """Queue the beats of song samples [src, src + count), mixed at fed frame fed_at."""
+        beat_len = self._beat_len
+        b = max(0, int(src // beat_len) - 1)
+        while True:
+            onset = int(round(b * beat_len))
+            if onset >= src + count:
+                break
+            if onset >= src:
+                at = int(round((fed_at + onset - src) / self.speed))
+                self._clicks.append((at, b % self.beats_per_bar == 0))
+            b += 1
+
+    def _click_gains(self, params):
+        """Per output channel gain of the metronome: the click stems' volume, mute and routing."""
+        gains = np.zeros(self.out_channels)
+        player = self.player
+        routing = player.routing
+        matrix = player._route_matrix(routing, self.out_channels) if routing is not None else None
+        for i in np.flatnonzero(self._click_mask & ~params.muted).tolist():
+            if matrix is not None:
+                # Mono and stereo stems feed both input rows of the matrix with the same click
+                g = matrix[i].sum(axis=0)
+            elif self.out_channels >= 2:
+                g = np.zeros(self.out_channels)
+                g[0] = 1.0
+                if not (player.lr_enabled and params.left[i]):
+                    g[1] = 1.0
+            else:
+                g = np.array([0.5 if player.lr_enabled and params.left[i] else 1.0])
+            gains += float(params.volume[i]) * g
+        return gains
+
+    def _finish_block(self, block, params):
+        if block is None or not len(block):
+            return None
+        start, end = self._out, self._out + len(block)
+        self._out = end
+        if self._clicks:
+            gains = self._click_gains(params)
+            clicks = self._clicks
+            for at, accent in list(clicks):
+                if at >= end:
+                    break
+                sound = self._accent if accent else self._beat
+                c0 = max(0, start - at)
+                d0 = max(0, at - start)
+                n = min(len(sound) - c0, len(block) - d0)
+                if n > 0:
+                    block[d0:d0 + n] += sound[c0:c0 + n, None] * gains
+            while clicks and clicks[0][0] + len(self._accent) <= end:
+                clicks.popleft()
+        return block.astype(np.float32)
@@ -0,0 +1,232 @@
+# Checks of a project's stems before anything is decoded, used when a project is opened.
+# Each stem is stat-ed and its WAV header parsed (a few hundred bytes: the RIFF/RF64 chunk list up
+# to the data chunk, never the samples) on a thread pool, so a 20-song project is checked in about
+# the time of its slowest file instead of the sum of all of them (network shares and spinning
+# disks mostly wait on I/O, which releases the GIL).
+# Missing stems get relink suggestions: files with the same name under the project's folder, the
+# folders of the stems that were found and the nearest existing parent of the missing path. The
+# candidate sharing the most trailing path components with the old path wins (a moved
+# "Culto/Musica 1/Baixo.wav" is preferred over another "Baixo.wav"); files the project already
+# uses and ambiguous matches are never suggested.
+import os
+import struct
+from concurrent.futures import ThreadPoolExecutor
+
+PROBE_WORKERS = 8             # Threads stat-ing and reading headers
+SUPPORTED_EXTENSIONS = ('.wav',)
+SEARCH_DEPTH = 4              # Folder levels walked under each relink search folder
+SEARCH_MAX_FILES = 20000      # Files indexed per search before giving up on a huge tree
+
+WAVE_FORMAT_PCM = 1
+WAVE_FORMAT_IEEE_FLOAT = 3
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+def read_wav_header(path):
+    """Format of a WAV file from its header: sample_rate, channels, bits, format, frames,
+    truncated (the data chunk is shorter than it declares), data_offset and block_align. Raises ValueError if it is not a WAV."""
+    with open(path, 'rb') as f:
+        riff = f.read(12)
+        if len(riff) < 12 or riff[8:12] != b'WAVE' or riff[:4] not in (b'RIFF', b'RF64'):
+            raise ValueError("not a WAV file")
+        file_size = os.fstat(f.fileno()).st_size
+        fmt = None
+        ds64_data = None
+        data_size = None
+        data_offset = None
+        while data_size is None:
+            head = f.read(8)
+            if len(head) < 8:
+                break
+            chunk_id, size = struct.unpack('<4sI', head)
+            if chunk_id == b'fmt ':
+                body = f.read(size)
+                if len(body) < 16:
+                    raise ValueError("short fmt chunk")
+                fmt = struct.unpack('<HHIIHH', body[:16])
+                if fmt[0] == WAVE_FORMAT_EXTENSIBLE and len(body) >= 26:
+                    # The real format is the first two bytes of the SubFormat GUID
+                    fmt = (struct.unpack('<H', body[24:26])[0],) + fmt[1:]
+                if size & 1:
+                    f.seek(1, os.SEEK_CUR)
+            elif chunk_id == b'ds64':
+                body = f.read(size)
+                if len(body) >= 16:
+                    ds64_data = struct.unpack('<Q', body[8:16])[0]
+            elif chunk_id == b'data':
+                data_offset = f.tell()
+                # RF64 stores sizes over 4 GB in the ds64 chunk (0xFFFFFFFF here)
+                data_size = ds64_data if size == 0xFFFFFFFF and ds64_data is not None else size
+            else:
+                f.seek(size + (size & 1), os.SEEK_CUR)
+    if fmt is None or data_size is None:
+        raise ValueError("missing fmt or data chunk")
+    format_tag, channels, sample_rate, _byte_rate, block_align, bits = fmt
+    if channels < 1 or sample_rate < 1 or block_align < 1:
+        raise ValueError("invalid fmt chunk")
+    available = max(0, file_size - data_offset)
+    return {
+        'format': format_tag,
+        'sample_rate': int(sample_rate),
+        'channels': int(channels),
+        'bits': int(bits),
+        'frames': int(min(data_size, available) // block_align),
+        'truncated': data_size > available,
+        'data_offset': int(data_offset),
+        'block_align': int(block_align),
+    }
+
+
+def probe_stem(path):
+    """Stat a stem and read its header. Returns a dict with 'path', 'exists', 'size', 'mtime',
+    'error' (None when the stem can be loaded) and the read_wav_header() fields plus 'duration'."""
+    result = {'path': path, 'exists': False, 'size': 0, 'mtime': 0.0, 'error': None}
+    try:
+        st = os.stat(path)
+    except OSError:
+        result['error'] = 'missing'
+        return result
+    result.update(exists=True, size=st.st_size, mtime=st.st_mtime)
+    if not path.lower().endswith(SUPPORTED_EXTENSIONS):
+        result['error'] = 'unsupported'
+        return result
+    try:
+        header = read_wav_header(path)
+    except (OSError, ValueError, struct.error) as e:
+        result['error'] = f'unreadable: {e}'
+        return result
+    result.update(header)
+    result['duration'] = header['frames'] / float(header['sample_rate'])
+    if header['format'] not in (WAVE_FORMAT_PCM, WAVE_FORMAT_IEEE_FLOAT):
+        result['error'] = 'unsupported'
+    elif header['truncated']:
+        # Still loadable (the frames that are there play), but worth telling the user
+        result['error'] = 'truncated'
+    return result
+
+
+def probe_stems(paths, workers=PROBE_WORKERS, on_result=None):
+    """probe_stem() of every path on a thread pool: {path: result}. on_result(result) is called
+    (from the pool's threads) as each one finishes."""
+    unique = list(dict.fromkeys(paths))
+    results = {}
+
+    def probe(path):
+        result = probe_stem(path)
+        if on_result is not None:
+            on_result(result)
+        return result
+
+    if not unique:
+        return results
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(unique))), thread_name_prefix="probe") as pool:
+        for result in pool.map(probe, unique):
+            results[result['path']] = result
+    return results
+
+
+def _existing_ancestor(path):
+    folder = os.path.dirname(os.path.abspath(path))
+    while folder and not os.path.isdir(folder):
+        parent = os.path.dirname(folder)
+        if parent == folder:
+            return None
+        folder = parent
+    return folder
+
+
+def search_folders(missing, found=(), project_path=None):
+    """Folders worth searching for moved stems, most specific first."""
+    folders = []
+    if project_path:
+        folders.append(os.path.dirname(os.path.abspath(project_path)))
+    for path in found:
+        folders.append(os.path.dirname(os.path.abspath(path)))
+        # Sibling song folders of the stems that are still there
+        folders.append(os.path.dirname(os.path.dirname(os.path.abspath(path))))
+    for path in missing:
+        ancestor = _existing_ancestor(path)
+        if ancestor and os.path.dirname(ancestor) != ancestor:
+            folders.append(ancestor)
+    return list(dict.fromkeys(f for f in folders if f and os.path.isdir(f)))
+
+
+def index_files(folders, names, depth=SEARCH_DEPTH, max_files=SEARCH_MAX_FILES):
+    """{lower-case file name: [paths]} of the files named in names found under folders."""
+    index = {}
+    seen = set()
+    scanned = 0
+    for root in folders:
+        stack = [(root, 0)]
+        while stack and scanned < max_files:
+            folder, level = stack.pop()
+            real = os.path.realpath(folder)
+            if real in seen:
+                continue
+            seen.add(real)
+            try:
+                entries = list(os.scandir(folder))
+            except OSError:
+                continue
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if level < depth and not entry.name.startswith('.'):
+                            stack.append((entry.path, level + 1))
+                    elif entry.name.lower() in names:
+                        index.setdefault(entry.name.lower(), []).append(entry.path)
+                except OSError:
+                    continue
+                scanned += 1
+    return index
+
+
+def _shared_tail(a, b):
+    pa = os.path.normcase(os.path.abspath(a)).replace('\\', '/').split('/')
+    pb = os.path.normcase(os.path.abspath(b)).replace('\\', '/').split('/')
+    n = 0
+    while n < min(len(pa), len(pb)) and pa[-1 - n] == pb[-1 - n]:
+        n += 1
+    return n
+
+
+def suggest_relinks(missing, folders, exclude=()):
+    """{missing path: suggested existing path} for the missing stems found under folders.
+    Files in exclude (the stems the project still uses) are never suggested. A candidate must
+    share its folder name with the missing path unless it is the only file of that name, and a
+    tie between the best candidates is left to the user."""
+    names = {os.path.basename(p).lower() for p in missing}
+    index = index_files(folders, names)
+    used = {os.path.normcase(os.path.abspath(p)) for p in exclude}
+    best = {}
+    for path in missing:
+        candidates = [c for c in index.get(os.path.basename(path).lower(), [])
+                      if os.path.normcase(os.path.abspath(c)) not in used and os.path.isfile(c)]
+        if not candidates:
+            continue
+        scored = sorted(((_shared_tail(path, c), c) for c in candidates), reverse=True)
+        if len(scored) > 1 and (scored[0][0] < 2 or scored[1][0] == scored[0][0]):
+            continue
+        best[path] = scored[0]
+    # A file suggested for several stems goes to the one it matches best (to none on a tie)
+    claims = {}
+    for path, (score, choice) in best.items():
+        claims.setdefault(choice, []).append((score, path))
+    suggestions = {}
+    for choice, claimants in claims.items():
+        claimants.sort(reverse=True)
+        if len(claimants) == 1 or claimants[0][0] > claimants[1][0]:
+            suggestions[claimants[0][1]] = choice
+    return suggestions
+
+
+def relink_song(song_data, mapping):
+    """Point the song's stems (and their insert chains) at new paths. Returns True if it changed."""
+    tracks = song_data.get("tracks", []) or []
+    if not any(t in mapping for t in tracks):
+        return False
+    song_data["tracks"] = [mapping.get(t, t) for t in tracks]
+    chains = song_data.get("track_dsp")
+    if chains:
+        song_data["track_dsp"] = {mapping.get(t, t): s for t, s in chains.items()}
+    return True
@@ -0,0 +1,144 @@
+# Offline render ("bounce") of a song's mix to a WAV file, faster than real time.
+# Blocks go through the same AudioPlayer path as the live audio callback (_render_block for
+# mixing/LR routing, _process_master for the limiter), so an export matches what the sound card
+# plays: the float output is the callback's outdata without the limiter's lookahead delay.
+import os
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import numpy as np
+from audio.player import AudioPlayer
+from audio.transpose import song_transpose
+
+# Large blocks amortize the per-block Python overhead (the live stream uses 2048)
+RENDER_BLOCK = 65536
+
+
+def offline_player(source, lr_enabled=None):
+    """Detached copy of a player's tracks and mix settings (volume, mute, inserts, LR, limiter).
+    Sample arrays are shared read-only; the copy has no stream, transport, loop or seek state.
+    """
+    player = AudioPlayer()
+    player.tracks = [t.copy() for t in source.tracks]
+    player.transpose = source.transpose
+    player.lr_enabled = source.lr_enabled if lr_enabled is None else bool(lr_enabled)
+    player.limiter_enabled = source.limiter_enabled
+    player.per_track_limiter = source.per_track_limiter
+    player.master_threshold = source.master_threshold
+    return player
+
+
+def player_for_song(song_data, lr_enabled=False):
+    """Load a song's tracks into a fresh player (cached optimized audio is preferred)."""
+    player = AudioPlayer()
+    player.set_lr_mode(lr_enabled)
+    for track_path in song_data.get("tracks", []):
+        player.load_track(track_path)
+    player.load_song_dsp(song_data)
+    player.set_transpose(song_transpose(song_data))
+    return player
+
+
+def render_blocks(player, block_size=RENDER_BLOCK, out_channels=2):
+    """Yield the mastered float32 blocks (frames, out_channels) of the whole song from sample 0.
+    The master limiter's lookahead delay is compensated: its first output frames are dropped and
+    its tail is flushed with silence, so the file lines up with the song and has the same length.
+    """
+    length = player._song_length()
+    player.current_position = 0
+    if player._limiter is not None:
+        player._limiter.reset()
+    skip = None
+    while player.current_position < length:
+        frames = min(int(block_size), length - player.current_position)
+        mixed_audio = np.zeros((frames, out_channels), dtype=np.float32)
+        player._render_block(mixed_audio, frames, out_channels)
+        block = player._process_master(mixed_audio)
+        if skip is None:
+            skip = player.master_latency()
+        if skip:
+            dropped = min(skip, len(block))
+            block, skip = block[dropped:], skip - dropped
+        if len(block):
+            yield block
+    tail = player.master_latency()
+    if tail and length:
+        yield player._process_master(np.zeros((tail, out_channels), dtype=np.float32))
+
+
+def _pcm_bytes(block, bits):
+    x = np.clip(block, -1.0, 1.0)
+    if bits == 24:
+        ints = np.round(x * 8388607.0).astype('<i4')
+        return ints.view(np.uint8).reshape(-1, 4)[:, :3].tobytes()
+    return np.round(x * 32767.0).astype('<i2').tobytes()
+
+
+def render_to_wav(player, out_path, block_size=RENDER_BLOCK, bits=16, out_channels=2,
+                  progress=None, should_cancel=None):
+    """Render a player's mix to a PCM WAV file block by block (memory bounded by block_size).
+    The file is written next to out_path and moved in place when complete.
+    Returns a report dict with frames, duration, elapsed time and the real-time factor (rtf).
+    """
+    if not player.tracks:
+        raise ValueError("Song has no tracks to render")
+    bits = 24 if int(bits) == 24 else 16
+    sample_rate = int(player.tracks[0].sample_rate)
+    length = player._song_length()
+    tmp_path = out_path + ".part"
+    started = time.perf_counter()
+    written = 0
+    try:
+        with wave.open(tmp_path, 'wb') as wav:
+            wav.setnchannels(out_channels)
+            wav.setsampwidth(bits // 8)
+            wav.setframerate(sample_rate)
+            for block in render_blocks(player, block_size, out_channels):
+                if should_cancel is not None and should_cancel():
+                    raise InterruptedError("Render cancelled")
+                wav.writeframesraw(_pcm_bytes(block, bits))
+                written += len(block)
+                if progress is not None and length > 0:
+                    progress(written / float(length))
+        os.replace(tmp_path, out_path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except Exception:
+            pass
+        raise
+    elapsed = time.perf_counter() - started
+    duration = written / float(sample_rate) if sample_rate else 0.0
+    return {
+        'path': out_path,
+        'frames': written,
+        'sample_rate': sample_rate,
+        'duration': duration,
+        'elapsed': elapsed,
+        'rtf': (duration / elapsed) if elapsed > 0 else float('inf'),
+    }
+
+
+def render_songs(jobs, max_workers=None, block_size=RENDER_BLOCK, bits=16, progress=None, should_cancel=None):
+    """Render several songs in parallel (numpy releases the GIL for the heavy block math).
+    jobs: list of (key, player, out_path). progress(key, fraction) may be called from pool threads.
+    Returns {key: report or Exception}.
+    """
+    results = {}
+    if not jobs:
+        return results
+    workers = max_workers or min(len(jobs), max(1, (os.cpu_count() or 2) - 1))
+
+    def _run(key, player, out_path):
+        cb = (lambda frac: progress(key, frac)) if progress is not None else None
+        return render_to_wav(player, out_path, block_size, bits, progress=cb, should_cancel=should_cancel)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(_run, key, player, out_path): key for key, player, out_path in jobs}
+        for future in as_completed(futures):
+            key = futures[future]
+            try:
+                results[key] = future.result()
+            except Exception as e:
+                results[key] = e
+    return results
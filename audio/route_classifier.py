@@ -0,0 +1,171 @@
+# Click/guide detection used for LR and routing presets (Track.left_hint).
+# The file name decides first, through precompiled keyword matchers; only undecided names fall
+# back to an activity analysis of a decimated envelope. AudioOptimizeWorker runs this once and
+# stores the decision with its features in the cache file, so loading a song never re-analyzes.
+import json
+import os
+import re
+import unicodedata
+import numpy as np
+
+# Bump when the rules change: cached decisions with another version are recomputed
+ROUTE_CLASSIFIER_VERSION = 1
+
+# Envelope rate for the audio analysis (RMS of block activity does not need full bandwidth)
+ANALYSIS_RATE = 5512
+
+# Click/metrônomo: vai à esquerda e é re-sintetizado no andamento do modo de ensaio
+CLICK_TERMS = (
+    'click', 'clicktrack', 'clk', 'tempo',
+    'metronome', 'metronomo', 'metron', 'metro',
+)
+# Termos de guia que impedem uma faixa de voz de ir para a direita
+GUIDE_TERMS = ('guia', 'guide', 'gui')
+# Palavras-chave explícitas para enviar à ESQUERDA (prioridade absoluta)
+FORCE_LEFT = CLICK_TERMS + GUIDE_TERMS
+# Palavras-chave de vozes/coral para enviar à DIREITA (se não contiver guia)
+VOICE_RIGHT = (
+    'bgv', 'bgvs', 'bvg', 'bvgs',
+    'choir', 'coral', 'vox', 'voxes', 'vozes', 'voz',
+    'voice', 'vocals', 'backing', 'backs',
+    'soprano', 'tenor', 'alto', 'baritone', 'baritono', 'contralto',
+    'lead', 'solo',
+)
+# Instrumentos típicos: manter à DIREITA
+INSTRUMENT_RIGHT = (
+    'piano', 'keys', 'keyboard', 'synth', 'pad', 'organ', 'rhodes',
+    'bass', 'baixo', 'sub',
+    'drum', 'drums', 'kick', 'snare', 'hihat', 'hi-hat', 'tom', 'perc', 'percussion',
+    'gtr', 'guitar', 'acoustic', 'electric', 'eletric', 'leadguitar', 'rhythm',
+    'flute', 'strings', 'violin', 'violino', 'cello', 'sax', 'trumpet',
+)
+
+
+def _matcher(keywords):
+    # Substring match, same as `kw in name` for every keyword (a token match is also a substring)
+    return re.compile('|'.join(re.escape(k) for k in sorted(keywords, key=len, reverse=True)))
+
+
+_FORCE_LEFT_RE = _matcher(FORCE_LEFT)
+_CLICK_RE = _matcher(CLICK_TERMS)
+_GUIDE_RE = _matcher(GUIDE_TERMS)
+_VOICE_RE = _matcher(VOICE_RIGHT)
+_INSTRUMENT_RE = _matcher(INSTRUMENT_RIGHT)
+
+
+def normalize_name(file_path):
+    """Lower-case file name without accents."""
+    s = os.path.basename(file_path or "")
+    try:
+        s = unicodedata.normalize('NFD', s)
+        s = ''.join(c for c in s if not unicodedata.combining(c))
+    except Exception:
+        pass
+    return s.lower()
+
+
+def classify_name(file_path):
+    """True (left), False (right) or None when the name alone does not decide."""
+    name = normalize_name(file_path)
+    if _FORCE_LEFT_RE.search(name):
+        return True
+    if _VOICE_RE.search(name) and not _GUIDE_RE.search(name):
+        return False
+    if _INSTRUMENT_RE.search(name):
+        return False
+    return None
+
+
+def is_click_name(file_path):
+    """True when the file name marks a click/metronome stem (a guide never counts as one)."""
+    name = normalize_name(file_path)
+    return bool(_CLICK_RE.search(name)) and not _GUIDE_RE.search(name)
+
+
+class ActivityAnalyzer:
+    """Block-activity features of a stem, fed in consecutive chunks (see audio_features).
+
+    Every chunk but the last must be a multiple of `stride` frames, so blocks never straddle chunks
+    and the result is the same as analyzing the whole stem at once.
+    """
+
+    def __init__(self, total_frames, sample_rate=44100):
+        self.step = max(1, int(sample_rate) // ANALYSIS_RATE)
+        # Same block length as the full-rate analysis (1% of the stem, 512..4096 frames), decimated
+        self.block = max(1, max(512, min(4096, int(total_frames) // 100)) // self.step)
+        self.stride = self.block * self.step
+        decimated = -(-int(total_frames) // self.step)
+        self.energy = np.zeros(decimated // self.block, dtype=np.float32)
+        self._pos = 0
+
+    def feed(self, chunk):
+        first = self._pos // self.stride
+        self._pos += len(chunk)
+        env = chunk[::self.step]
+        env = np.abs(env).mean(axis=1) if env.ndim > 1 else np.abs(env)
+        count = min(len(env) // self.block, len(self.energy) - first)
+        if count > 0:
+            blocks = env[:count * self.block].reshape(count, self.block).astype(np.float32, copy=False)
+            self.energy[first:first + count] = np.einsum('ij,ij->i', blocks, blocks)
+        return self
+
+    def features(self):
+        if len(self.energy) == 0:
+            return {'silence_ratio': 1.0, 'nrms_std': 0.0}
+        rms = np.sqrt(self.energy / self.block)
+        max_r = float(rms.max())
+        if max_r <= 0:
+            return {'silence_ratio': 1.0, 'nrms_std': 0.0}
+        nrms = rms / max_r
+        return {
+            # Fração de blocos "silenciosos"
+            'silence_ratio': float(np.mean(nrms < 0.06)),
+            'nrms_std': float(np.std(nrms)),
+        }
+
+
+def audio_features(samples, sample_rate=44100):
+    """Activity features of a stem from a decimated envelope (no full-length temporaries)."""
+    if samples is None or len(samples) == 0:
+        return {'silence_ratio': 1.0, 'nrms_std': 0.0}
+    return ActivityAnalyzer(len(samples), sample_rate).feed(samples).features()
+
+
+def classify_audio(features):
+    # Se quase nunca fica em silêncio -> parece click constante
+    if features['silence_ratio'] < 0.03:
+        return True
+    # Guia intermitente (alternância marcada): mais restrito para evitar false positives
+    active_ratio = 1.0 - features['silence_ratio']
+    return 0.25 <= active_ratio <= 0.75 and features['nrms_std'] > 0.12
+
+
+def classify_route(file_path, samples=None, sample_rate=44100):
+    """(left_hint, info) where info records how it was decided, for the cache metadata."""
+    by_name = classify_name(file_path)
+    if by_name is not None:
+        return by_name, {'method': 'name', 'version': ROUTE_CLASSIFIER_VERSION}
+    try:
+        features = audio_features(samples, sample_rate)
+        left = bool(classify_audio(features))
+    except Exception:
+        return False, {'method': 'error', 'version': ROUTE_CLASSIFIER_VERSION}
+    return left, dict(features, method='audio', version=ROUTE_CLASSIFIER_VERSION)
+
+
+def route_metadata(left, info):
+    """Cache-file fields (np.savez keywords) recording a routing decision."""
+    return {'route_left': np.array(bool(left)), 'route_info': np.array(json.dumps(info))}
+
+
+def route_from_metadata(data):
+    """(left_hint, info) stored in a cache file, or None if missing or from another classifier version."""
+    try:
+        if 'route_left' not in data or 'route_info' not in data:
+            return None
+        info = json.loads(str(data['route_info']))
+        if info.get('version') != ROUTE_CLASSIFIER_VERSION:
+            return None
+        return bool(data['route_left']), info
+    except Exception:
+        return None
@@ -0,0 +1,137 @@
+# Output routing: tracks are sent to named buses, buses are mapped to device output channels.
+# A preset is turned into a gain matrix of shape (tracks, 2, out_channels) that the player applies
+# to the whole block at once (stereo in, N channels out). Presets are stored in the .wproj project.
+#
+# Preset dict (as saved in the project):
+#   {"name": "...", "buses": [{"name": "In-ear", "channels": [0, 1]}, ...],
+#    "cue": ["In-ear"], "main": ["PA"], "tracks": {"click.wav": ["In-ear"]}}
+# "cue" is the default for click/guide tracks (left_hint), "main" for every other track and
+# "tracks" overrides the buses of a track by file name (so the same preset works for every song).
+import copy
+import os
+import numpy as np
+
+DEFAULT_PRESETS = [
+    {
+        "name": "Click/Guia nos fones (1-2), banda no PA (3-4)",
+        "buses": [{"name": "In-ear", "channels": [0, 1]}, {"name": "PA", "channels": [2, 3]}],
+        "cue": ["In-ear"],
+        "main": ["PA"],
+        "tracks": {},
+    },
+    {
+        "name": "Fones com banda (1-2), banda no PA (3-4)",
+        "buses": [{"name": "In-ear", "channels": [0, 1]}, {"name": "PA", "channels": [2, 3]}],
+        "cue": ["In-ear"],
+        "main": ["In-ear", "PA"],
+        "tracks": {},
+    },
+    {
+        "name": "Click no canal 1, banda no canal 2 (mono)",
+        "buses": [{"name": "Click", "channels": [0]}, {"name": "Banda", "channels": [1]}],
+        "cue": ["Click"],
+        "main": ["Banda"],
+        "tracks": {},
+    },
+]
+
+
+def track_route_key(file_path):
+    """Name used to assign a track in a preset (file name, case-insensitive)."""
+    return os.path.basename(file_path or "").lower()
+
+
+class RoutingPreset:
+    """Bus layout plus per-track bus assignment. `version` changes on every edit."""
+
+    def __init__(self, name, buses, cue=None, main=None, tracks=None):
+        self.name = str(name)
+        self.buses = [{"name": str(b["name"]), "channels": [int(c) for c in b.get("channels", [])]} for b in buses]
+        names = [b["name"] for b in self.buses]
+        self.cue = [b for b in (cue or names[:1]) if b in names]
+        self.main = [b for b in (main or names[-1:]) if b in names]
+        self.tracks = {str(k): [b for b in v if b in names] for k, v in (tracks or {}).items()}
+        self.version = 0
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data.get("name", "Preset"), data.get("buses", []), data.get("cue"),
+                   data.get("main"), data.get("tracks"))
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "buses": copy.deepcopy(self.buses),
+            "cue": list(self.cue),
+            "main": list(self.main),
+            "tracks": {k: list(v) for k, v in self.tracks.items()},
+        }
+
+    @property
+    def bus_names(self):
+        return [b["name"] for b in self.buses]
+
+    @property
+    def channels(self):
+        """Number of output channels the preset needs."""
+        return max((c + 1 for b in self.buses for c in b["channels"]), default=2)
+
+    def buses_for(self, track):
+        override = self.tracks.get(track_route_key(track.file_path))
+        if override is not None:
+            return override
+        return self.cue if track.left_hint else self.main
+
+    def assign(self, file_path, buses):
+        """Send a track (by file name) to the given buses; None restores the cue/main default."""
+        key = track_route_key(file_path)
+        if buses is None:
+            self.tracks.pop(key, None)
+        else:
+            self.tracks[key] = [b for b in buses if b in self.bus_names]
+        self.version += 1
+
+    def matrix(self, tracks, out_channels):
+        """Gain matrix (tracks, 2, out_channels). Channels the device does not have are dropped."""
+        m = np.zeros((len(tracks), 2, out_channels), dtype=np.float32)
+        channels = {b["name"]: b["channels"] for b in self.buses}
+        for t, track in enumerate(tracks):
+            for bus in self.buses_for(track):
+                outs = [c for c in channels.get(bus, []) if 0 <= c < out_channels]
+                if len(channels.get(bus, [])) == 1:
+                    # Mono bus: sum of L and R, same level as the mono device fallback
+                    for c in outs:
+                        m[t, :, c] += 0.5
+                else:
+                    # Stereo (or wider) bus: L to the even positions, R to the odd ones
+                    for pos, c in enumerate(channels[bus]):
+                        if c in outs:
+                            m[t, pos % 2, c] += 1.0
+        return m
+
+
+def default_presets():
+    return [RoutingPreset.from_dict(p) for p in DEFAULT_PRESETS]
+
+
+def routing_state(presets, active):
+    """Project file section: {"presets": [...], "active": name or None}."""
+    return {
+        "presets": [p.to_dict() for p in presets],
+        "active": active.name if active is not None else None,
+    }
+
+
+def load_routing_state(data):
+    """(presets, active preset or None) from a project's "routing" section."""
+    presets = []
+    for item in (data or {}).get("presets", []) or []:
+        try:
+            presets.append(RoutingPreset.from_dict(item))
+        except Exception as e:
+            print(f"[Routing] Ignoring invalid preset: {e}")
+    if not presets:
+        presets = default_presets()
+    active_name = (data or {}).get("active")
+    active = next((p for p in presets if p.name == active_name), None)
+    return presets, active
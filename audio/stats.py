@@ -0,0 +1,155 @@
+# Audio callback instrumentation: per-block timing, underflows and errors.
+# The audio thread writes into a preallocated ring (no locks, no allocation); the playback worker
+# thread drains it into a rotating log and the settings overlay reads snapshots from the GUI thread.
+import logging
+import logging.handlers
+import os
+import time
+import numpy as np
+from PyQt5.QtCore import QStandardPaths
+
+FLAG_UNDERFLOW = 1   # PortAudio reported output underflow for this block
+FLAG_LATE = 2        # Callback took longer than the block duration
+FLAG_ERROR = 4       # Callback raised (the block was output as silence)
+
+STATS_CAPACITY = 4096  # ~3 minutes of blocks at 2048 frames / 44.1 kHz
+SUMMARY_INTERVAL = 10.0  # seconds between summary lines in the log
+
+_audio_logger = None
+
+
+def audio_log_path():
+    try:
+        base = QStandardPaths.writableLocation(QStandardPaths.AppDataLocation)
+        if not base:
+            base = os.path.expanduser('~/Library/Application Support/AppPythonAdrian')
+    except Exception:
+        base = os.path.expanduser('~/Library/Application Support/AppPythonAdrian')
+    return os.path.join(base, 'logs', 'audio.log')
+
+
+def audio_logger():
+    """Logger writing to a rotating audio.log (5 x 512 KB) in the app data folder."""
+    global _audio_logger
+    if _audio_logger is None:
+        logger = logging.getLogger('adoraplay.audio')
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        try:
+            path = audio_log_path()
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            handler = logging.handlers.RotatingFileHandler(path, maxBytes=512 * 1024, backupCount=5, encoding='utf-8')
+            handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(message)s'))
+            logger.addHandler(handler)
+        except Exception as e:
+            print(f"[AudioStats] Could not open audio log: {e}")
+            logger.addHandler(logging.NullHandler())
+        _audio_logger = logger
+    return _audio_logger
+
+
+class CallbackStats:
+    """Single-writer ring buffer of audio callback measurements.
+
+    Only the audio thread calls record(): it fills preallocated arrays and then advances
+    `written`. Readers never lock; a slot overwritten while being copied is at most one block off.
+    """
+
+    def __init__(self, capacity=STATS_CAPACITY):
+        self.capacity = int(capacity)
+        self.wall = np.zeros(self.capacity, dtype=np.float64)     # time.time() when the block started
+        self.elapsed = np.zeros(self.capacity, dtype=np.float32)  # seconds spent in the callback
+        self.deadline = np.zeros(self.capacity, dtype=np.float32)  # block duration in seconds
+        self.flags = np.zeros(self.capacity, dtype=np.uint8)
+        self.written = 0
+        self.underflows = 0
+        self.late_blocks = 0
+        self.errors = 0
+        self.last_error = ''
+        self.sample_rate = 0
+        self.blocksize = 0
+        self.latency = 0.0
+        self._drained = 0
+        self._last_summary = time.monotonic()
+
+    def reset_stream(self, sample_rate, blocksize, latency):
+        """Describe the stream the following blocks belong to (called when a stream starts)."""
+        self.sample_rate = int(sample_rate or 0)
+        self.blocksize = int(blocksize or 0)
+        try:
+            self.latency = float(latency or 0.0)
+        except Exception:
+            self.latency = 0.0
+
+    def record(self, started_wall, elapsed, deadline, underflow=False, error=False):
+        i = self.written % self.capacity
+        flags = 0
+        if underflow:
+            flags |= FLAG_UNDERFLOW
+            self.underflows += 1
+        if elapsed > deadline:
+            flags |= FLAG_LATE
+            self.late_blocks += 1
+        if error:
+            flags |= FLAG_ERROR
+            self.errors += 1
+        self.wall[i] = started_wall
+        self.elapsed[i] = elapsed
+        self.deadline[i] = deadline
+        self.flags[i] = flags
+        self.written += 1
+
+    def _window(self, start, end):
+        """Indices (oldest first) of blocks start..end-1 still present in the ring."""
+        start = max(start, end - self.capacity)
+        return np.arange(start, end) % self.capacity
+
+    def recent_loads(self, count=256):
+        """Callback time / deadline for the most recent blocks (oldest first)."""
+        end = self.written
+        idx = self._window(max(0, end - count), end)
+        deadline = self.deadline[idx]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            loads = np.where(deadline > 0, self.elapsed[idx] / deadline, 0.0)
+        return loads, self.flags[idx].copy()
+
+    def snapshot(self, count=512):
+        loads, _flags = self.recent_loads(count)
+        return {
+            'blocks': self.written,
+            'underflows': self.underflows,
+            'late_blocks': self.late_blocks,
+            'errors': self.errors,
+            'last_error': self.last_error,
+            'latency_ms': self.latency * 1000.0,
+            'deadline_ms': (self.blocksize / float(self.sample_rate) * 1000.0) if self.sample_rate else 0.0,
+            'load_p50': float(np.percentile(loads, 50)) if len(loads) else 0.0,
+            'load_p99': float(np.percentile(loads, 99)) if len(loads) else 0.0,
+            'load_max': float(loads.max()) if len(loads) else 0.0,
+        }
+
+    def drain_to_log(self, logger=None, force_summary=False):
+        """Log every flagged block since the last drain, plus a periodic summary (non-realtime thread)."""
+        end = self.written
+        start = self._drained
+        if end <= start and not force_summary:
+            return
+        logger = logger or audio_logger()
+        idx = self._window(start, end)
+        self._drained = end
+        for i in idx[self.flags[idx] != 0]:
+            flags = int(self.flags[i])
+            kinds = [name for bit, name in ((FLAG_UNDERFLOW, 'underflow'), (FLAG_LATE, 'late'), (FLAG_ERROR, 'error')) if flags & bit]
+            stamp = time.strftime('%H:%M:%S', time.localtime(self.wall[i])) + f".{int((self.wall[i] % 1) * 1000):03d}"
+            load = (self.elapsed[i] / self.deadline[i] * 100.0) if self.deadline[i] > 0 else 0.0
+            extra = f" ({self.last_error})" if flags & FLAG_ERROR and self.last_error else ''
+            logger.warning(f"{'+'.join(kinds)} at {stamp} callback {self.elapsed[i] * 1000:.2f} ms "
+                           f"/ {self.deadline[i] * 1000:.1f} ms ({load:.0f}%){extra}")
+        now = time.monotonic()
+        if force_summary or now - self._last_summary >= SUMMARY_INTERVAL:
+            self._last_summary = now
+            snap = self.snapshot()
+            logger.info(f"blocks={snap['blocks']} underflows={snap['underflows']} late={snap['late_blocks']} "
+                        f"errors={snap['errors']} load p50={snap['load_p50'] * 100:.0f}% "
+                        f"p99={snap['load_p99'] * 100:.0f}% max={snap['load_max'] * 100:.0f}% "
+                        f"latency={snap['latency_ms']:.1f} ms block={snap['deadline_ms']:.1f} ms")
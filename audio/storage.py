@@ -0,0 +1,87 @@
+# In-memory / cache sample format of the stems.
+# 'float32' keeps the decoded samples as they are. The compact formats halve memory and cache I/O:
+# 'int16' stores full scale as 32767 (max error 1.5e-5, about -96 dBFS), 'float16' keeps the
+# floating-point range with ~11 bits of mantissa (max error 2.4e-4 near full scale). The mixer
+# converts only the block it needs into float32 (see decode_into).
+import numpy as np
+from PyQt5.QtCore import QSettings
+
+SAMPLE_FORMATS = ('float32', 'int16', 'float16')
+DEFAULT_SAMPLE_FORMAT = 'float32'
+INT16_FULL_SCALE = 32767.0
+CONVERT_CHUNK = 1 << 18  # Frames converted at a time (no full-size float temporaries)
+
+_INT16_TO_FLOAT = np.float32(1.0 / INT16_FULL_SCALE)
+
+
+def load_sample_format():
+    """Sample format chosen in the settings ('audio_sample_format')."""
+    try:
+        fmt = QSettings('AdoraPlay', 'AppPythonAdrian').value('audio_sample_format', DEFAULT_SAMPLE_FORMAT, type=str)
+        if fmt in SAMPLE_FORMATS:
+            return fmt
+    except Exception:
+        pass
+    return DEFAULT_SAMPLE_FORMAT
+
+
+def save_sample_format(fmt):
+    try:
+        QSettings('AdoraPlay', 'AppPythonAdrian').setValue('audio_sample_format', fmt)
+    except Exception:
+        pass
+
+
+def decode_into(chunk, out):
+    """Convert stored frames into the float32 array out (same length; a mono chunk is broadcast)."""
+    if chunk.dtype == np.int16:
+        np.multiply(chunk, _INT16_TO_FLOAT, out=out, casting='unsafe')
+    else:
+        out[...] = chunk
+    return out
+
+
+def decode_block(chunk, scratch):
+    """float32 frames of a stored chunk: the chunk itself for float32 storage, otherwise converted
+    into the front of the preallocated scratch buffer (the result is only valid until its next use)."""
+    if chunk.dtype == np.float32:
+        return chunk
+    return decode_into(chunk, scratch[:len(chunk), :chunk.shape[1]])
+
+
+def encode_block(block, fmt):
+    """float32 frames in -1..1 to the storage format."""
+    if fmt == 'int16':
+        out = np.multiply(block, INT16_FULL_SCALE, dtype=np.float32)
+        np.rint(out, out=out)
+        np.clip(out, -INT16_FULL_SCALE, INT16_FULL_SCALE, out=out)
+        return out.astype(np.int16)
+    return np.asarray(block, dtype=fmt)
+
+
+def to_storage(samples, fmt):
+    """The stem in the storage format, converted chunk by chunk (returned as is if already there)."""
+    if samples.dtype == np.dtype(fmt):
+        return samples
+    out = np.empty(samples.shape, dtype=fmt)
+    scratch = np.empty((min(len(samples), CONVERT_CHUNK),) + samples.shape[1:], dtype=np.float32)
+    for start in range(0, len(samples), CONVERT_CHUNK):
+        chunk = samples[start:start + CONVERT_CHUNK]
+        block = decode_into(chunk, scratch[:len(chunk)]) if chunk.dtype != np.float32 else chunk
+        out[start:start + len(chunk)] = encode_block(block, fmt)
+    return out
+
+
+def to_float32(samples):
+    """Whole stem as float32 (for offline analysis; the mixer decodes per block instead)."""
+    return to_storage(samples, 'float32')
+
+
+def storage_error(samples, fmt):
+    """Largest absolute difference introduced by storing float32 samples in fmt (quality check)."""
+    worst = 0.0
+    for start in range(0, len(samples), CONVERT_CHUNK):
+        block = np.asarray(samples[start:start + CONVERT_CHUNK], dtype=np.float32)
+        back = to_float32(encode_block(block, fmt))
+        worst = max(worst, float(np.max(np.abs(back - block))) if block.size else 0.0)
+    return worst
@@ -0,0 +1,81 @@
+# Song structure helpers: markers, sections and loop regions stored in the song data.
+# Times are kept in seconds so they survive re-optimization and are saved as-is in .wproj:
+#   song["markers"] = [{"name": "Refrão", "time": 42.5}, ...]
+#   song["loops"] = [{"name": "Refrão", "start": 42.5, "end": 58.1}, ...]
+
+
+def song_markers(song_data):
+    """Return the song's markers sorted by time (list of dicts with 'name' and 'time')."""
+    markers = []
+    for m in (song_data or {}).get("markers", []) or []:
+        try:
+            markers.append({"name": str(m.get("name", "")), "time": max(0.0, float(m.get("time", 0.0)))})
+        except Exception:
+            continue
+    markers.sort(key=lambda m: m["time"])
+    return markers
+
+
+def add_marker(song_data, time, name=None):
+    """Add a marker at time (seconds) and return its index in the sorted marker list."""
+    markers = song_markers(song_data)
+    time = max(0.0, float(time))
+    if not name:
+        name = f"Marcador {len(markers) + 1}"
+    markers.append({"name": name, "time": round(time, 4)})
+    markers.sort(key=lambda m: m["time"])
+    song_data["markers"] = markers
+    return next(i for i, m in enumerate(markers) if m["time"] == round(time, 4) and m["name"] == name)
+
+
+def remove_marker(song_data, index):
+    markers = song_markers(song_data)
+    if 0 <= index < len(markers):
+        del markers[index]
+        song_data["markers"] = markers
+        return True
+    return False
+
+
+def section_bounds(song_data, time, duration):
+    """Return (start, end) in seconds of the section containing time.
+    Sections are the spans between consecutive markers, plus song start and end.
+    """
+    edges = [0.0] + [m["time"] for m in song_markers(song_data) if 0.0 < m["time"] < duration] + [float(duration)]
+    start, end = 0.0, float(duration)
+    for a, b in zip(edges, edges[1:]):
+        if a <= time < b:
+            start, end = a, b
+            break
+    return start, end
+
+
+def section_name(song_data, start):
+    for m in song_markers(song_data):
+        if abs(m["time"] - start) < 1e-3:
+            return m["name"]
+    return "Início" if start <= 0.0 else "Seção"
+
+
+def song_loops(song_data):
+    loops = []
+    for lp in (song_data or {}).get("loops", []) or []:
+        try:
+            start, end = float(lp.get("start", 0.0)), float(lp.get("end", 0.0))
+            if end > start:
+                loops.append({"name": str(lp.get("name", "")), "start": start, "end": end})
+        except Exception:
+            continue
+    return loops
+
+
+def add_loop(song_data, start, end, name=""):
+    """Store a loop region (seconds) in the song data, reusing an identical one. Returns its index."""
+    loops = song_loops(song_data)
+    start, end = round(float(start), 4), round(float(end), 4)
+    for i, lp in enumerate(loops):
+        if abs(lp["start"] - start) < 1e-3 and abs(lp["end"] - end) < 1e-3:
+            return i
+    loops.append({"name": name, "start": start, "end": end})
+    song_data["loops"] = loops
+    return len(loops) - 1
@@ -0,0 +1,61 @@
+import math
+
+
+DEFAULT_BEATS_PER_BAR = 4
+
+
+def parse_bpm(value):
+    """Parse a song's bpm field (str/int/float) into a positive float, or None."""
+    try:
+        if value is None:
+            return None
+        if isinstance(value, str):
+            value = value.strip().lower().replace('bpm', '').replace(',', '.').strip()
+        bpm = float(value)
+        if not math.isfinite(bpm) or bpm <= 0:
+            return None
+        return bpm
+    except Exception:
+        return None
+
+
+def beat_length_samples(bpm, sample_rate):
+    """Length of one beat in samples (float), or None when bpm is unknown."""
+    bpm = parse_bpm(bpm)
+    if bpm is None or not sample_rate:
+        return None
+    return float(sample_rate) * 60.0 / bpm
+
+
+def bar_length_samples(bpm, sample_rate, beats_per_bar=DEFAULT_BEATS_PER_BAR):
+    """Length of one bar in samples (float), or None when bpm is unknown."""
+    beat = beat_length_samples(bpm, sample_rate)
+    if beat is None:
+        return None
+    return beat * max(1, int(beats_per_bar or DEFAULT_BEATS_PER_BAR))
+
+
+def next_bar_boundary(position, bpm, sample_rate, beats_per_bar=DEFAULT_BEATS_PER_BAR, guard=0):
+    """First bar boundary (in samples) at or after position + guard.
+    Bars are counted from sample 0 of the song. Returns None when bpm is unknown.
+    """
+    bar = bar_length_samples(bpm, sample_rate, beats_per_bar)
+    if bar is None:
+        return None
+    target = max(0, int(position) + int(guard))
+    index = math.ceil(target / bar)
+    return int(round(index * bar))
+
+
+def seconds_to_samples(seconds, sample_rate):
+    try:
+        return max(0, int(round(float(seconds) * float(sample_rate))))
+    except Exception:
+        return 0
+
+
+def samples_to_seconds(samples, sample_rate):
+    try:
+        return float(samples) / float(sample_rate) if sample_rate else 0.0
+    except Exception:
+        return 0.0
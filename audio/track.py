@@ -0,0 +1,137 @@
+# Track model of AudioPlayer.
+# A Track holds one loaded stem and its metadata. The mix parameters the audio callback reads
+# every block (volume, mute, LR side, length) live in the player's TrackTable, one NumPy array
+# per parameter, so the callback indexes arrays instead of looking keys up in per-track dicts.
+# Track.volume / Track.muted / Track.dsp write through to the table the track is bound to: a change
+# from the UI thread is a single element store, picked up by the next block. Adding or replacing tracks
+# builds a new table that the player swaps in whole, so a block never sees a half-updated list.
+# A MixLane holds what mixing a block writes to (decode scratch, routed stack, filter state); each
+# thread that mixes a player's tracks has its own.
+import numpy as np
+
+DEFAULT_VOLUME = 0.8  # 80% volume
+
+
+class Track:
+    """One stem: samples (frames, channels) in the player's storage format plus mix settings."""
+
+    __slots__ = ('file_path', 'sample_rate', 'samples', 'channels', 'left_hint',
+                 '_volume', '_muted', '_dsp', '_table', '_index')
+
+    def __init__(self, file_path, sample_rate, samples, volume=DEFAULT_VOLUME, muted=False, left_hint=False,
+                 dsp=None):
+        self.file_path = file_path
+        self.sample_rate = int(sample_rate)
+        self.samples = samples
+        self.channels = int(samples.shape[1]) if samples.ndim > 1 else 1
+        self.left_hint = bool(left_hint)
+        self._volume = float(volume)
+        self._muted = bool(muted)
+        self._dsp = dsp
+        self._table = None
+        self._index = 0
+
+    @property
+    def volume(self):
+        return self._volume
+
+    @volume.setter
+    def volume(self, value):
+        self._volume = float(value)
+        if self._table is not None:
+            self._table.volume[self._index] = self._volume
+
+    @property
+    def muted(self):
+        return self._muted
+
+    @muted.setter
+    def muted(self, value):
+        self._muted = bool(value)
+        if self._table is not None:
+            self._table.muted[self._index] = self._muted
+
+    @property
+    def dsp(self):
+        """Insert chain (audio.dsp.TrackDSP), None when bypassed."""
+        return self._dsp
+
+    @dsp.setter
+    def dsp(self, chain):
+        self._dsp = chain
+        if self._table is not None:
+            self._table.dsp[self._index] = chain
+
+    def __len__(self):
+        return len(self.samples)
+
+    def copy(self, samples=None):
+        """Unbound copy (sharing the sample array unless another one is given; fresh filter state)."""
+        return Track(self.file_path, self.sample_rate, self.samples if samples is None else samples,
+                     self._volume, self._muted, self.left_hint,
+                     self._dsp.copy() if self._dsp is not None else None)
+
+    def __repr__(self):
+        return f"Track({self.file_path!r}, {len(self.samples)} frames x {self.channels})"
+
+
+class TrackTable:
+    """Struct-of-arrays snapshot of a track list: the sample arrays and one array per parameter."""
+
+    __slots__ = ('tracks', 'samples', 'volume', 'muted', 'left', 'length', 'dsp')
+
+    def __init__(self, tracks):
+        self.tracks = tuple(tracks)
+        self.samples = [t.samples for t in tracks]
+        self.volume = np.array([t.volume for t in tracks], dtype=np.float32)
+        self.muted = np.array([t.muted for t in tracks], dtype=bool)
+        self.left = np.array([t.left_hint for t in tracks], dtype=bool)
+        self.length = np.array([len(t.samples) for t in tracks], dtype=np.int64)
+        self.dsp = [t.dsp for t in tracks]
+        # Bind last: from now on volume/mute changes of these tracks land in this table
+        for i, t in enumerate(tracks):
+            t._table = self
+            t._index = i
+
+    def __len__(self):
+        return len(self.samples)
+
+    def active(self, position):
+        """Mask of the tracks that play at position (not muted and not finished)."""
+        return ~self.muted & (self.length > position)
+
+    def song_length(self):
+        return int(self.length.max()) if len(self.length) else 0
+
+
+class MixLane:
+    """Scratch buffers and insert-chain filter state of one thread mixing a player's tracks. The
+    audio callback uses the player's lane with the table's own chains; a lane with own_dsp runs
+    private copies of them (fresh filter state), so it can mix ahead of the callback."""
+
+    __slots__ = ('decode_buf', 'route_blocks', 'own_dsp', '_chains')
+
+    def __init__(self, own_dsp=False):
+        self.decode_buf = None      # float32 (frames, 2) compact stems are decoded into
+        self.route_blocks = None    # (tracks, frames, 2) stack buffer of the routed mix
+        self.own_dsp = bool(own_dsp)
+        self._chains = []           # [(table chain, private copy)]
+
+    def scratch(self, frames):
+        buf = self.decode_buf
+        if buf is None or len(buf) < frames:
+            buf = self.decode_buf = np.zeros((frames, 2), dtype=np.float32)
+        return buf
+
+    def dsp(self, params):
+        """Insert chains to run for the table: its own, or this lane's copies of them (a chain the
+        UI replaced is copied again)."""
+        if not self.own_dsp:
+            return params.dsp
+        chains = self._chains
+        if len(chains) != len(params.dsp):
+            chains = self._chains = [(None, None)] * len(params.dsp)
+        for i, chain in enumerate(params.dsp):
+            if chains[i][0] is not chain:
+                chains[i] = (chain, chain.copy() if chain is not None else None)
+        return [copy for _chain, copy in chains]
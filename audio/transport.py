@@ -0,0 +1,155 @@
+import heapq
+import itertools
+import threading
+import numpy as np
+
+
+class TransportEvent:
+    """A start/stop event for a player, due at an absolute sample time of the transport clock."""
+    __slots__ = ('at', 'kind', 'player', 'fade', 'on_fire', 'cancelled', 'seq')
+
+    def __init__(self, at, kind, player=None, fade=0, on_fire=None, seq=0):
+        self.at = int(at)
+        self.kind = kind          # 'start', 'stop' or 'notify'
+        self.player = player
+        self.fade = int(fade)     # equal-power fade length in samples (0 = hard cut)
+        self.on_fire = on_fire    # optional callable run on the audio thread when the event fires
+        self.cancelled = False
+        self.seq = seq
+
+    def __lt__(self, other):
+        return (self.at, self.seq) < (other.at, other.seq)
+
+
+class TransportScheduler:
+    """Queue of transport events driven by the output stream's sample clock.
+
+    The stream that owns the clock calls process_block(frames) once per callback; events due
+    inside that block are returned with their sample offset. Nothing here depends on a real
+    stream, so the scheduler can be driven by a simulated clock (just call process_block).
+    """
+
+    def __init__(self):
+        self.clock = 0              # Samples rendered by the clock-owning stream
+        self.anchor = (0, 0)        # (clock, song position) snapshot written by the audio thread
+        self._heap = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def schedule(self, at, kind, player=None, fade=0, on_fire=None):
+        event = TransportEvent(at, kind, player, fade, on_fire, next(self._seq))
+        with self._lock:
+            heapq.heappush(self._heap, event)
+        return event
+
+    def cancel(self, event):
+        if event is not None:
+            event.cancelled = True
+
+    def cancel_all(self):
+        with self._lock:
+            for event in self._heap:
+                event.cancelled = True
+            self._heap = []
+
+    def pending(self):
+        with self._lock:
+            return sorted(e for e in self._heap if not e.cancelled)
+
+    def has_pending(self):
+        return any(not e.cancelled for e in self._heap)
+
+    def process_block(self, frames):
+        """Advance the clock by frames and return [(offset, event)] for events due in this block.
+        Events already in the past fire at offset 0. Never blocks: if the GUI thread holds the
+        lock, due events simply fire one block later.
+        """
+        due = []
+        block_end = self.clock + frames
+        if self._heap and self._lock.acquire(blocking=False):
+            try:
+                while self._heap and self._heap[0].at < block_end:
+                    event = heapq.heappop(self._heap)
+                    if not event.cancelled:
+                        due.append((max(0, event.at - self.clock), event))
+            finally:
+                self._lock.release()
+        self.clock = block_end
+        return due
+
+
+class GainRamp:
+    """Equal-power gain ramp carried across blocks: 0 -> 1 when fade_in, else 1 -> 0."""
+
+    def __init__(self, length, fade_in, delay=0):
+        self.length = max(0, int(length))
+        self.fade_in = bool(fade_in)
+        self.delay = max(0, int(delay))
+        self.pos = 0
+
+    @property
+    def finished(self):
+        return self.delay == 0 and self.pos >= self.length
+
+    def gains(self, frames):
+        """Return a (frames, 1) float32 gain column for the next block and advance."""
+        g = np.empty(frames, dtype=np.float32)
+        head = min(self.delay, frames)
+        g[:head] = 0.0 if self.fade_in else 1.0
+        self.delay -= head
+        n = min(frames - head, self.length - self.pos)
+        if n > 0:
+            t = (np.arange(self.pos, self.pos + n, dtype=np.float32) + 0.5) / float(self.length)
+            curve = np.sin(t * (np.pi / 2.0)) if self.fade_in else np.cos(t * (np.pi / 2.0))
+            g[head:head + n] = curve
+            self.pos += n
+        g[head + max(0, n):] = 1.0 if self.fade_in else 0.0
+        return g[:, None]
+
+
+def click_sounds(sample_rate):
+    """(accent, beat) metronome clicks: 30 ms decaying sines at 1500 Hz and 1000 Hz, float32."""
+    n = max(1, int(sample_rate * 0.03))
+    t = np.arange(n, dtype=np.float32) / float(sample_rate)
+    env = np.exp(-t * 120.0).astype(np.float32)
+    accent = (0.6 * np.sin(2 * np.pi * 1500.0 * t) * env).astype(np.float32)
+    beat = (0.45 * np.sin(2 * np.pi * 1000.0 * t) * env).astype(np.float32)
+    return accent, beat
+
+
+class CountInSource:
+    """Synthesized count-in clicks (accented first beat) mixed by the clock-owning stream."""
+
+    def __init__(self, beats, beat_length, sample_rate, left_only=False, channels=None):
+        self.beats = max(0, int(beats))
+        self.beat_length = max(1, int(round(beat_length)))
+        self.left_only = bool(left_only)
+        self.channels = list(channels) if channels else None  # Output channels of the cue bus (routing)
+        self.pos = 0
+        self._accent, self._beat = click_sounds(sample_rate)
+
+    def is_alive(self):
+        return self.pos < self.beats * self.beat_length
+
+    def render_guest(self, buf, frames, out_channels):
+        end = self.pos + frames
+        for beat in range(self.pos // self.beat_length, self.beats):
+            onset = beat * self.beat_length
+            if onset >= end:
+                break
+            click = self._accent if beat == 0 else self._beat
+            c0 = max(0, self.pos - onset)
+            if c0 >= len(click):
+                continue
+            d0 = max(0, onset - self.pos)
+            n = min(len(click) - c0, frames - d0)
+            if self.channels is not None:
+                for c in self.channels:
+                    if c < out_channels:
+                        buf[d0:d0 + n, c] += click[c0:c0 + n]
+            elif out_channels >= 2 and self.left_only:
+                buf[d0:d0 + n, 0] += click[c0:c0 + n]
+            else:
+                buf[d0:d0 + n] += click[c0:c0 + n, None]
+        self.pos = end
+        return self.is_alive()
@@ -0,0 +1,337 @@
+# Offline key transposition of a song's stems.
+# A stem is pitch-shifted by time-stretching it with a phase vocoder (hop ratio Hs/Ha ~ 2^(n/12),
+# identity phase locking around spectral peaks) and resampling the result by Ha/Hs back to the
+# original length. Both stages stream: the WAV is read in chunks, the vocoder works on batches of
+# STFT frames with its phase state carried between batches, and the polyphase resampler runs on
+# overlapping chunks, so memory stays at a few chunks even for long stems.
+# Variants are written to the audio cache next to the optimized stem, one file per semitone offset
+# (<cache key>_t+2.npz), scaled like the optimizer's output. Click/guide stems (left-routed) are
+# never transposed. The chosen offset is stored in the song data as song["transpose"].
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing
+import numpy as np
+from audio.wavstream import WavReader, as_frames, block_peak, write_npz_stream, CHUNK_FRAMES, TARGET_PEAK
+from audio.storage import encode_block, DEFAULT_SAMPLE_FORMAT
+
+TRANSPOSE_RANGE = (-6, 6)  # Semitones offered for a song
+PV_FFT = 4096              # Vocoder frame (93 ms at 44.1 kHz)
+PV_HOP = 1024              # Analysis hop; the synthesis hop rounds Ha * ratio (pitch error < 1 cent)
+PV_BATCH = 64              # STFT frames per vectorized batch
+
+_NOTES = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
+_FLATS = {'Db': 'C#', 'Eb': 'D#', 'Gb': 'F#', 'Ab': 'G#', 'Bb': 'A#', 'Cb': 'B', 'Fb': 'E'}
+_FLAT_NAMES = {'C#': 'Db', 'D#': 'Eb', 'F#': 'Gb', 'G#': 'Ab', 'A#': 'Bb'}
+
+
+def clamp_semitones(semitones):
+    try:
+        return max(TRANSPOSE_RANGE[0], min(TRANSPOSE_RANGE[1], int(semitones)))
+    except Exception:
+        return 0
+
+
+def song_transpose(song_data):
+    """Semitone offset chosen for the song (0 = original key)."""
+    return clamp_semitones((song_data or {}).get("transpose", 0))
+
+
+def set_song_transpose(song_data, semitones):
+    semitones = clamp_semitones(semitones)
+    if semitones:
+        song_data["transpose"] = semitones
+    else:
+        song_data.pop("transpose", None)
+
+
+def transposed_key(key, semitones):
+    """Key name moved by semitones ('G', -2 -> 'F'; 'Bbm', 1 -> 'Bm'); unknown names are kept."""
+    semitones = clamp_semitones(semitones)
+    m = re.match(r'^\s*([A-Ga-g])([#b♯♭]?)(.*)$', str(key or ''))
+    if not semitones or not m:
+        return key
+    root = m.group(1).upper() + m.group(2).replace('♯', '#').replace('♭', 'b')
+    flat = 'b' in m.group(2) or '♭' in m.group(2)
+    root = _FLATS.get(root, root)
+    if root not in _NOTES:
+        return key
+    name = _NOTES[(_NOTES.index(root) + semitones) % 12]
+    if flat or (semitones < 0 and len(name) > 1):
+        name = _FLAT_NAMES.get(name, name)
+    return name + m.group(3)
+
+
+def variant_npz_path(cache_dir, cache_key, semitones):
+    """Cache file of a stem transposed by semitones (the optimized stem itself for 0)."""
+    semitones = clamp_semitones(semitones)
+    if not semitones:
+        return os.path.join(cache_dir, f"{cache_key}.npz")
+    return os.path.join(cache_dir, f"{cache_key}_t{semitones:+d}.npz")
+
+
+def hop_ratio(semitones, hop=PV_HOP):
+    """(analysis hop, synthesis hop) of the vocoder for a pitch shift."""
+    return hop, max(1, int(round(hop * 2.0 ** (semitones / 12.0))))
+
+
+class PhaseVocoder:
+    """Streaming time-stretch by hop_s / hop_a: feed() input blocks, get the stretched output."""
+
+    def __init__(self, channels, hop_a, hop_s, n_fft=PV_FFT, batch=PV_BATCH):
+        self.channels = channels
+        self.hop_a, self.hop_s, self.n_fft, self.batch = hop_a, hop_s, n_fft, batch
+        self.window = np.hanning(n_fft + 1)[:-1]
+        bins = np.arange(n_fft // 2 + 1)
+        self.omega = 2.0 * np.pi * bins / n_fft  # Bin center frequencies (rad/sample)
+        half = n_fft // 2
+        # Frames are centered: frame t covers input [t*Ha - N/2, t*Ha + N/2)
+        self._in = np.zeros((half, channels))
+        self._in_start = -half
+        self._frame = 0
+        self._out = np.zeros((n_fft, channels))
+        self._norm = np.zeros(n_fft)
+        self._out_start = -half
+        self._emitted = 0  # Next output sample to emit (output time 0 = input time 0)
+        self._phase_an = None
+        self._phase_syn = None
+
+    def _frames_ready(self):
+        end = self._in_start + len(self._in)
+        start = self._frame * self.hop_a - self.n_fft // 2
+        if end - start < self.n_fft:
+            return 0
+        return min(self.batch, (end - start - self.n_fft) // self.hop_a + 1)
+
+    def _process(self, count):
+        N, Ha, Hs = self.n_fft, self.hop_a, self.hop_s
+        first = self._frame * Ha - N // 2 - self._in_start
+        span = self._in[first:first + (count - 1) * Ha + N]
+        # (count, channels, N) frames without copying the input
+        frames = np.lib.stride_tricks.sliding_window_view(span, N, axis=0)[::Ha][:count]
+        spec = np.fft.rfft(frames * self.window, axis=-1)
+        mag = np.abs(spec)
+        phase = np.angle(spec)
+
+        if self._phase_an is None:
+            self._phase_an = phase[0] - Ha * self.omega
+            self._phase_syn = phase[0] - Hs * self.omega
+        # Instantaneous frequency of every bin from consecutive analysis phases
+        prev = np.concatenate([self._phase_an[None], phase[:-1]], axis=0)
+        dphi = phase - prev - Ha * self.omega
+        dphi -= 2.0 * np.pi * np.round(dphi / (2.0 * np.pi))
+        advance = Hs * (self.omega + dphi / Ha)
+        acc = self._phase_syn[None] + np.cumsum(advance, axis=0)
+        self._phase_an = phase[-1]
+        self._phase_syn = np.mod(acc[-1], 2.0 * np.pi)
+
+        # Identity phase locking: each bin keeps its phase offset to the nearest spectral peak
+        peaks = np.zeros(mag.shape, dtype=bool)
+        peaks[..., 2:-2] = ((mag[..., 2:-2] > mag[..., 1:-3]) & (mag[..., 2:-2] >= mag[..., 3:-1]) &
+                            (mag[..., 2:-2] > mag[..., :-4]) & (mag[..., 2:-2] >= mag[..., 4:]))
+        peaks[..., 0] = ~peaks.any(axis=-1)  # A frame without peaks locks to bin 0
+        k = np.arange(mag.shape[-1])
+        left = np.maximum.accumulate(np.where(peaks, k, -1), axis=-1)
+        right = np.flip(np.minimum.accumulate(np.flip(np.where(peaks, k, 1 << 30), axis=-1), axis=-1), axis=-1)
+        nearest = np.where((left < 0) | ((right - k) < (k - left)), right, left)
+        nearest = np.minimum(nearest, k[-1])
+        peak_syn = np.take_along_axis(acc, nearest, axis=-1)
+        peak_an = np.take_along_axis(phase, nearest, axis=-1)
+        out_phase = peak_syn + (phase - peak_an)
+
+        grains = np.fft.irfft(mag * np.exp(1j * out_phase), n=N, axis=-1) * self.window
+        # Overlap-add at the synthesis hop, with the running window sum for exact normalization
+        base = self._frame * Hs - N // 2 - self._out_start
+        need = base + (count - 1) * Hs + N
+        if need > len(self._out):
+            grow = need - len(self._out)
+            self._out = np.concatenate([self._out, np.zeros((grow, self.channels))])
+            self._norm = np.concatenate([self._norm, np.zeros(grow)])
+        w2 = self.window * self.window
+        for i in range(count):
+            at = base + i * Hs
+            self._out[at:at + N] += grains[i].T
+            self._norm[at:at + N] += w2
+        self._frame += count
+
+        # Drop input no later frame needs
+        keep_from = self._frame * Ha - N // 2 - self._in_start
+        if keep_from > 0:
+            self._in = self._in[keep_from:]
+            self._in_start += keep_from
+
+    def _take(self, upto):
+        """Normalized output up to absolute output sample `upto` (samples no frame will touch again)."""
+        lo = self._emitted - self._out_start
+        hi = upto - self._out_start
+        if hi <= lo:
+            return None
+        block = self._out[lo:hi] / np.maximum(self._norm[lo:hi], 1e-3)[:, None]
+        self._out = self._out[hi:]
+        self._norm = self._norm[hi:]
+        self._out_start = upto
+        self._emitted = upto
+        return block
+
+    def feed(self, block):
+        self._in = np.concatenate([self._in, as_frames(block).astype(np.float64)])
+        while True:
+            count = self._frames_ready()
+            if not count:
+                break
+            self._process(count)
+        return self._take(self._frame * self.hop_s - self.n_fft // 2)
+
+    def flush(self, input_frames):
+        """Pad with silence past the end and return the rest of the stretched output."""
+        pad = np.zeros((self.n_fft, self.channels))
+        blocks = []
+        while self._frame * self.hop_a - self.n_fft // 2 < input_frames:
+            self._in = np.concatenate([self._in, pad])
+            while True:
+                count = self._frames_ready()
+                if not count:
+                    break
+                self._process(count)
+        done = self._take(self._frame * self.hop_s - self.n_fft // 2)
+        if done is not None:
+            blocks.append(done)
+        rest = self._take(self._out_start + len(self._out))
+        if rest is not None:
+            blocks.append(rest)
+        return blocks
+
+
+class StreamResampler:
+    """resample_poly(x, up, down) over a stream, computed on overlapping chunks aligned to the
+    polyphase period; the output equals resampling the whole signal at once."""
+
+    def __init__(self, up, down, channels):
+        g = np.gcd(int(up), int(down))
+        self.up, self.down = int(up) // g, int(down) // g
+        self.channels = channels
+        from scipy.signal import resample_poly  # Imported on first use (scipy.signal is slow to import)
+        self._resample_poly = resample_poly
+        # Filter support of resample_poly in input samples, rounded up to whole periods
+        half = 10 * max(self.up, self.down) / float(self.up) + 2
+        self.margin = int(np.ceil(half / self.down)) * self.down
+        self._buf = np.zeros((self.margin, channels))  # Leading silence = the signal's zero padding
+        self._buf_start = -self.margin
+        self._next = 0  # Next output sample
+
+    def _run(self, end_out):
+        """Outputs [next, end_out), end_out a multiple of up unless flushing."""
+        if end_out <= self._next:
+            return None
+        a = (self._next // self.up) * self.down - self.margin
+        b = -(-end_out * self.down // self.up) + self.margin
+        seg = self._buf[a - self._buf_start:b - self._buf_start]
+        if len(seg) < b - a:
+            seg = np.concatenate([seg, np.zeros((b - a - len(seg), self.channels))])
+        y = self._resample_poly(seg, self.up, self.down, axis=0)
+        offset = a * self.up // self.down
+        out = y[self._next - offset:end_out - offset]
+        self._next = end_out
+        drop = (self._next // self.up) * self.down - self.margin - self._buf_start
+        if drop > 0:
+            self._buf = self._buf[drop:]
+            self._buf_start += drop
+        return out
+
+    def feed(self, block):
+        self._buf = np.concatenate([self._buf, block])
+        avail = self._buf_start + len(self._buf) - self.margin
+        end_out = (max(0, avail) // self.down) * self.up
+        return self._run(end_out)
+
+    def flush(self, total_out):
+        return self._run(total_out)
+
+
+def pitch_shift_blocks(chunks, frames, channels, semitones, scale=1.0):
+    """Yield float32 blocks of the pitch-shifted signal, exactly `frames` frames in total."""
+    hop_a, hop_s = hop_ratio(semitones)
+    vocoder = PhaseVocoder(channels, hop_a, hop_s)
+    resampler = StreamResampler(hop_a, hop_s, channels)
+    produced = 0
+
+    def _emit(block):
+        nonlocal produced
+        if block is None or not len(block) or produced >= frames:
+            return None
+        block = block[:frames - produced]
+        produced += len(block)
+        out = block.astype(np.float32)
+        if scale != 1.0:
+            out *= scale
+        np.clip(out, -1.0, 1.0, out=out)
+        return out
+
+    for chunk in chunks:
+        stretched = vocoder.feed(chunk)
+        if stretched is not None:
+            out = _emit(resampler.feed(stretched))
+            if out is not None:
+                yield out
+    for stretched in vocoder.flush(frames):
+        out = _emit(resampler.feed(stretched))
+        if out is not None:
+            yield out
+    out = _emit(resampler.flush(frames))
+    if out is not None:
+        yield out
+    if produced < frames:
+        yield np.zeros((frames - produced, channels), dtype=np.float32)
+
+
+def transpose_to_cache(path, npz_path, semitones, sample_format=DEFAULT_SAMPLE_FORMAT,
+                       target_peak=TARGET_PEAK, chunk_frames=CHUNK_FRAMES):
+    """Write the stem at path transposed by semitones to npz_path (same layout as the optimizer's
+    cache: scaled to target_peak like the original, mono kept mono). Returns npz_path.
+    """
+    with WavReader(path) as reader:
+        frames, channels = reader.frames, reader.channels
+        peak = 0.0
+        for block in reader.chunks(chunk_frames):
+            peak = max(peak, block_peak(block))
+        scale = (target_peak / peak) if peak > target_peak else 1.0
+        blocks = (encode_block(b, sample_format) for b in
+                  pitch_shift_blocks(reader.chunks(chunk_frames), frames, channels, semitones, scale))
+        extra = {'sample_rate': np.array(int(reader.sample_rate)), 'transpose': np.array(int(semitones))}
+        tmp_path = npz_path[:-4] + ".part.npz"
+        try:
+            write_npz_stream(tmp_path, frames, channels, blocks, extra, dtype=sample_format)
+            os.replace(tmp_path, npz_path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except Exception:
+                pass
+            raise
+    return npz_path
+
+
+def transpose_stems(jobs, semitones, sample_format=DEFAULT_SAMPLE_FORMAT, max_workers=None, progress=None):
+    """Render transposed variants on a process pool (one stem per worker; the vocoder's Python-level
+    batch loop would serialize on the GIL in threads).
+    jobs: list of (path, npz_path). progress(done, total) is called as stems finish.
+    Returns {path: npz_path or Exception}.
+    """
+    results = {}
+    if not jobs:
+        return results
+    workers = max_workers or max(1, min(len(jobs), (os.cpu_count() or 2) - 1))
+    # spawn: never fork a process that runs Qt and audio threads
+    ctx = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+        futures = {pool.submit(transpose_to_cache, path, npz_path, semitones, sample_format): path
+                   for path, npz_path in jobs}
+        for done, future in enumerate(as_completed(futures), 1):
+            path = futures[future]
+            try:
+                results[path] = future.result()
+            except Exception as e:
+                results[path] = e
+            if progress is not None:
+                progress(done, len(jobs))
+    return results
@@ -0,0 +1,144 @@
+# Adaptive block size / latency for the output stream.
+# The tuner starts at the smallest allowed block (low control latency for MIDI transport) and
+# reads the callback stats once a second: dropouts or high load step it up, long calm periods
+# step it down. The player re-opens the stream with the new setting only at safe points.
+# The setting reached for each device is remembered in QSettings.
+import time
+import numpy as np
+from PyQt5.QtCore import QSettings
+
+# (blocksize, latency) ordered from lowest to highest latency
+TUNING_LEVELS = (
+    (256, 'low'),
+    (512, 'low'),
+    (1024, 'low'),
+    (1024, 'high'),
+    (2048, 'high'),
+    (4096, 'high'),
+)
+DEFAULT_LEVEL = (2048, 'high')   # Fixed setting used when auto-tuning is off
+DEFAULT_MIN_BLOCK = 256
+DEFAULT_MAX_BLOCK = 4096
+
+STEP_UP_LOAD = 0.75        # p99 callback load that counts as trouble
+STEP_DOWN_LOAD = 0.30      # p99 load below which the window counts as calm
+CALM_SECONDS = 30.0        # calm time needed before stepping down
+HOLD_AFTER_TROUBLE = 300.0  # no step down for 5 minutes after a dropout
+
+
+def _settings():
+    return QSettings('AdoraPlay', 'AppPythonAdrian')
+
+
+def _device_key(device_name):
+    safe = "".join(c if c.isalnum() else "_" for c in (device_name or "default"))
+    return f"audio_tuning/{safe}"
+
+
+def load_device_tuning(device_name):
+    """Return the (blocksize, latency) persisted for a device, or None."""
+    try:
+        value = _settings().value(_device_key(device_name), "", type=str)
+        if value:
+            block, latency = value.split(",", 1)
+            return int(block), latency.strip()
+    except Exception:
+        pass
+    return None
+
+
+def save_device_tuning(device_name, blocksize, latency):
+    try:
+        _settings().setValue(_device_key(device_name), f"{int(blocksize)},{latency}")
+    except Exception:
+        pass
+
+
+def load_tuning_options():
+    """(auto_tune, min_block, max_block) from the app settings."""
+    try:
+        s = _settings()
+        auto = s.value('audio_auto_tune', True, type=bool)
+        min_block = s.value('audio_tuning_min_block', DEFAULT_MIN_BLOCK, type=int)
+        max_block = s.value('audio_tuning_max_block', DEFAULT_MAX_BLOCK, type=int)
+        return bool(auto), int(min_block), int(max_block)
+    except Exception:
+        return True, DEFAULT_MIN_BLOCK, DEFAULT_MAX_BLOCK
+
+
+class LatencyTuner:
+    """Chooses the stream's (blocksize, latency) from CallbackStats, within block bounds."""
+
+    def __init__(self, device_name, min_block=DEFAULT_MIN_BLOCK, max_block=DEFAULT_MAX_BLOCK):
+        self.device_name = device_name
+        self.levels = [lv for lv in TUNING_LEVELS if min_block <= lv[0] <= max_block] or [DEFAULT_LEVEL]
+        saved = load_device_tuning(device_name)
+        self.index = self.levels.index(saved) if saved in self.levels else 0
+        self.pending = None          # level index waiting for a safe point
+        self.pending_since = 0.0
+        self.trouble_in_window = False
+        self._read = 0
+        self._underflows = 0
+        self._late = 0
+        self._calm = 0.0
+        self._hold_until = 0.0
+        self._last_eval = None
+
+    @property
+    def level(self):
+        return self.levels[self.index]
+
+    def attach(self, stats):
+        """Start evaluating from the current end of a stats ring (a new stream was opened)."""
+        self._read = stats.written
+        self._underflows = stats.underflows
+        self._late = stats.late_blocks
+        self._calm = 0.0
+        self._last_eval = time.monotonic()
+
+    def evaluate(self, stats, now=None):
+        """Look at the blocks recorded since the last call. Returns the pending level or None."""
+        now = time.monotonic() if now is None else now
+        elapsed = (now - self._last_eval) if self._last_eval is not None else 0.0
+        self._last_eval = now
+        end = stats.written
+        count = min(end - self._read, stats.capacity)
+        self._read = end
+        if count <= 0:
+            return self.pending
+        loads, _flags = stats.recent_loads(count)
+        p99 = float(np.percentile(loads, 99)) if len(loads) else 0.0
+        underflows = stats.underflows - self._underflows
+        late = stats.late_blocks - self._late
+        self._underflows = stats.underflows
+        self._late = stats.late_blocks
+
+        self.trouble_in_window = underflows > 0 or late > 0 or p99 > STEP_UP_LOAD
+        if self.trouble_in_window:
+            self._calm = 0.0
+            self._hold_until = now + HOLD_AFTER_TROUBLE
+            if self.index < len(self.levels) - 1:
+                self._request(self.index + 1, now)
+        elif p99 < STEP_DOWN_LOAD:
+            self._calm += elapsed
+            if self._calm >= CALM_SECONDS and now >= self._hold_until and self.index > 0 and self.pending is None:
+                self._request(self.index - 1, now)
+                self._calm = 0.0
+        else:
+            self._calm = 0.0
+        return self.pending
+
+    def _request(self, index, now):
+        if self.pending is None or index > self.pending:
+            if self.pending is None:
+                self.pending_since = now
+            self.pending = index
+
+    def apply_pending(self):
+        """Commit the pending level (the stream is being re-opened) and remember it for the device."""
+        if self.pending is None:
+            return self.level
+        self.index = self.pending
+        self.pending = None
+        save_device_tuning(self.device_name, *self.level)
+        return self.level
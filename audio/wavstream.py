@@ -0,0 +1,331 @@
+# Chunked WAV decoding and the two-pass streaming optimizer behind the audio_opt cache.
+# Pass one reads the stem chunk by chunk for its peak (and the click/guide activity analysis),
+# pass two decodes again, scales, and writes the frames straight into the cache .npz, so
+# peak memory is a few chunks no matter how long the stem is.
+import os
+import threading
+import zipfile
+import numpy as np
+from scipy.io import wavfile
+from audio.probe import WAVE_FORMAT_IEEE_FLOAT, WAVE_FORMAT_PCM, read_wav_header
+from audio.storage import encode_block, DEFAULT_SAMPLE_FORMAT
+from audio.route_classifier import ActivityAnalyzer, classify_name, classify_audio, route_metadata, ROUTE_CLASSIFIER_VERSION
+
+CHUNK_FRAMES = 1 << 18  # ~6 s at 44.1 kHz, 2 MB of stereo float32
+TARGET_PEAK = 0.90      # Offline normalization only (modest headroom, no compression)
+ENVELOPE_POINTS = 1200  # Timeline envelope points (the song form's precomputed envelope)
+
+
+class WavReader:
+    """Random-access float32 frames of a PCM/float WAV without decoding the whole file."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+        try:
+            # Memory-mapped: slicing reads only the requested frames from disk
+            self.sample_rate, self._data = wavfile.read(path, mmap=True)
+            self.frames = len(self._data)
+            self.channels = 1 if self._data.ndim == 1 else int(self._data.shape[1])
+        except Exception:
+            # Layouts scipy cannot memory-map (24-bit PCM, WAVE_FORMAT_EXTENSIBLE): the data chunk
+            # read straight from the file, seeking per chunk
+            self._data = None
+            header = read_wav_header(path)
+            self.sample_rate = header['sample_rate']
+            self.frames = header['frames']
+            self.channels = header['channels']
+            self._offset = header['data_offset']
+            self._align = header['block_align']
+            self._width = self._align // self.channels  # Container bytes (24-bit may sit in 4)
+            self._float = header['format'] == WAVE_FORMAT_IEEE_FLOAT
+            if (header['format'] not in (WAVE_FORMAT_PCM, WAVE_FORMAT_IEEE_FLOAT)
+                    or self._width * self.channels != self._align
+                    or self._width not in ((4, 8) if self._float else (1, 2, 3, 4))):
+                raise ValueError(f"Unsupported WAV format {header['format']} ({header['bits']}-bit)")
+            self._file = open(path, 'rb')
+
+    def read(self, start, count):
+        """Frames [start, start + count) as float32 in -1..1, shape (n,) for mono or (n, channels)."""
+        if self._data is not None:
+            raw = self._data[start:start + count]
+            if raw.dtype == np.float32:
+                return np.array(raw)
+            if raw.dtype == np.int16:
+                out = raw.astype(np.float32)
+                out *= 1.0 / 32768.0
+                return out
+            if raw.dtype == np.int32:
+                out = raw.astype(np.float32)
+                out *= 1.0 / 2147483648.0
+                return out
+            if raw.dtype == np.uint8:
+                out = raw.astype(np.float32)
+                out -= 128.0
+                out *= 1.0 / 128.0
+                return out
+            return raw.astype(np.float32)
+        count = max(0, min(count, self.frames - start))
+        self._file.seek(self._offset + start * self._align)
+        buf = np.frombuffer(self._file.read(count * self._align), dtype=np.uint8)
+        buf = buf[:(len(buf) // self._align) * self._align]
+        if self._float:
+            out = buf.view('<f4' if self._width == 4 else '<f8').astype(np.float32)
+        elif self._width == 3:
+            wide = np.zeros((len(buf) // 3, 4), dtype=np.uint8)
+            wide[:, 1:] = buf.reshape(-1, 3)
+            out = (wide.view('<i4')[:, 0] >> 8).astype(np.float32)
+            out *= 1.0 / 8388608.0
+        elif self._width == 1:
+            out = buf.astype(np.float32)
+            out -= 128.0
+            out *= 1.0 / 128.0
+        else:
+            dtype = '<i2' if self._width == 2 else '<i4'
+            out = buf.view(dtype).astype(np.float32)
+            out *= 1.0 / float(2 ** (8 * self._width - 1))
+        return out if self.channels == 1 else out.reshape(-1, self.channels)
+
+    def chunks(self, chunk_frames=CHUNK_FRAMES):
+        for start in range(0, self.frames, chunk_frames):
+            yield self.read(start, chunk_frames)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._data = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def as_frames(samples):
+    """(frames, channels) view of a sample array; mono stays one column (the mixer broadcasts it)."""
+    samples = np.asarray(samples)
+    return samples.reshape(-1, 1) if samples.ndim == 1 else samples
+
+
+def block_peak(block):
+    """max(|x|) without a full-size np.abs temporary."""
+    if block.size == 0:
+        return 0.0
+    return max(float(block.max()), -float(block.min()))
+
+
+def write_npz_stream(npz_path, frames, channels, blocks, extra, dtype='float32'):
+    """Write an .npz (same layout as np.savez) whose 'samples' array comes from an iterator of
+    blocks of `dtype`. The file is written next to npz_path and moved in place when complete (the
+    temp name is per thread: two writers of the same cache file never share one)."""
+    dtype = np.dtype(dtype).newbyteorder('<')
+    tmp_path = f"{npz_path}.{os.getpid()}-{threading.get_ident()}.part"
+    written = 0
+    try:
+        with zipfile.ZipFile(tmp_path, 'w', zipfile.ZIP_STORED, allowZip64=True) as zf:
+            with zf.open('samples.npy', 'w', force_zip64=True) as f:
+                header = {'descr': np.lib.format.dtype_to_descr(dtype),
+                          'fortran_order': False, 'shape': (int(frames), int(channels))}
+                np.lib.format.write_array_header_1_0(f, header)
+                for block in blocks:
+                    f.write(np.ascontiguousarray(block, dtype=dtype).data)
+                    written += len(block)
+            if written != frames:
+                raise IOError(f"Expected {frames} frames, wrote {written}")
+            for name, value in extra.items():
+                with zf.open(f"{name}.npy", 'w') as f:
+                    np.lib.format.write_array(f, np.asanyarray(value))
+        os.replace(tmp_path, npz_path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except Exception:
+            pass
+        raise
+
+
+def npz_array_header(npz_path, name='samples'):
+    """(shape, dtype) of an array stored in an .npz, read from its header only (the data is not loaded)."""
+    with zipfile.ZipFile(npz_path) as zf:
+        with zf.open(f"{name}.npy") as f:
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, _fortran, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, _fortran, dtype = np.lib.format.read_array_header_2_0(f)
+    return tuple(shape), dtype
+
+
+class StemEnvelope:
+    """Peak and block RMS of a stem's mono magnitude (mean |x| over channels), fed in consecutive
+    chunks of any length. For a stem as long as its song these are the blocks of the song's
+    timeline envelope, so combine_envelopes() builds it without decoding the stems again."""
+
+    def __init__(self, total_frames, points=ENVELOPE_POINTS):
+        self.frames = int(total_frames)
+        self.block = max(1, self.frames // max(1, int(points)))
+        self.energy = np.zeros(self.frames // self.block, dtype=np.float64)
+        self.peak = 0.0
+        self._pos = 0
+
+    def feed(self, chunk):
+        n = len(chunk)
+        if n == 0:
+            return self
+        self.peak = max(self.peak, block_peak(chunk))
+        start = self._pos
+        self._pos += n
+        # Frames past the last whole block are dropped (they do not make a timeline point)
+        count = min(n, len(self.energy) * self.block - start)
+        if count <= 0:
+            return self
+        if chunk.ndim == 1:
+            mono = np.abs(chunk[:count])
+        else:
+            # Column by column: a mean over the short channel axis is several times slower
+            mono = np.abs(chunk[:count, 0])
+            for c in range(1, chunk.shape[1]):
+                mono += np.abs(chunk[:count, c])
+            mono *= np.float32(1.0 / chunk.shape[1])
+        index, offset = divmod(start, self.block)
+        done = 0
+        if offset:
+            # End of a block the previous chunk started
+            done = min(count, self.block - offset)
+            self.energy[index] += float(np.dot(mono[:done], mono[:done]))
+            index += 1
+        whole = (count - done) // self.block
+        if whole:
+            blocks = mono[done:done + whole * self.block].reshape(whole, self.block)
+            self.energy[index:index + whole] += np.einsum('ij,ij->i', blocks, blocks)
+            index += whole
+            done += whole * self.block
+        if done < count:
+            # Start of a block the next chunk ends
+            self.energy[index] += float(np.dot(mono[done:count], mono[done:count]))
+        return self
+
+    def envelope(self):
+        """float32 block RMS values (frames // block of them)."""
+        return np.sqrt(self.energy / self.block).astype(np.float32)
+
+
+def combine_envelopes(stems, points=ENVELOPE_POINTS):
+    """(envelope, total_samples) of a song's timeline from its stems' StemEnvelope values, given as
+    (frames, envelope) pairs: block RMS summed over the stems, normalized to the loudest block,
+    floored at 0.05. Exact when the stems are as long as the song."""
+    total = max((int(frames) for frames, _ in stems), default=0)
+    if total == 0:
+        return [], 0
+    block = max(1, total // max(1, int(points)))
+    count = total // block
+    combined = np.zeros(count, dtype=np.float64)
+    edges = np.arange(count + 1) * float(block)
+    for frames, env in stems:
+        if len(env) == 0:
+            continue
+        own = max(1, int(frames) // max(1, int(points)))
+        if own == block and len(env) <= count:
+            combined[:len(env)] += env
+        else:
+            # Shorter stem: its blocks differ from the song's. Its cumulative energy, interpolated
+            # at the song's block edges, gives the energy of each song block (none after its end).
+            power = np.square(env, dtype=np.float64)
+            own_edges = np.arange(len(env) + 1) * float(own)
+            energy = np.concatenate(([0.0], np.cumsum(power * own)))
+            if frames > own_edges[-1]:
+                # Frames after its last whole block: at the level of that block
+                own_edges = np.append(own_edges, float(frames))
+                energy = np.append(energy, energy[-1] + power[-1] * (frames - len(env) * own))
+            cumulative = np.interp(edges, own_edges, energy)
+            combined += np.sqrt(np.maximum(np.diff(cumulative), 0.0) / block)
+    max_val = combined.max()
+    env = combined / max_val if max_val > 0 else combined
+    env = np.maximum(np.clip(env, 0.0, 1.0), 0.05)
+    return env.tolist(), total
+
+
+def wav_channels(path):
+    """Channel count from the WAV header."""
+    with WavReader(path) as reader:
+        return reader.channels
+
+
+def optimize_to_cache(path, npz_path, target_peak=TARGET_PEAK, chunk_frames=CHUNK_FRAMES, progress=None,
+                      sample_format=DEFAULT_SAMPLE_FORMAT, envelope=None, keep_decoded=0):
+    """Two-pass streaming version of the optimizer: peak scan, then scaled frames to npz_path, stored
+    in sample_format (see audio/storage.py). Returns (sample_rate, left_hint, route_info).
+    progress(fraction) covers both passes. A StemEnvelope passed as envelope is fed the source
+    frames during the first pass. A stem whose decoded float32 frames fit in keep_decoded bytes is
+    decoded once: the first pass keeps its chunks and the second scales those instead of reading
+    the file again.
+    """
+    with WavReader(path) as reader:
+        frames = reader.frames
+        left = classify_name(path)
+        analyzer = ActivityAnalyzer(frames, reader.sample_rate) if left is None else None
+        if analyzer is not None:
+            # Chunks aligned to whole analysis blocks (a few frames more or less than requested)
+            chunk_frames = max(1, int(chunk_frames) // analyzer.stride) * analyzer.stride
+        total = max(1, 2 * frames)
+        kept = [] if frames * reader.channels * 4 <= keep_decoded else None
+
+        # Pass 1: peak and activity features
+        peak = 0.0
+        done = 0
+        for block in reader.chunks(chunk_frames):
+            if kept is not None:
+                kept.append(block)
+            peak = max(peak, block_peak(block))
+            if analyzer is not None:
+                analyzer.feed(block)
+            if envelope is not None:
+                envelope.feed(block)
+            done += len(block)
+            if progress is not None:
+                progress(done / total)
+
+        if analyzer is not None:
+            features = analyzer.features()
+            left = bool(classify_audio(features))
+            info = dict(features, method='audio', version=ROUTE_CLASSIFIER_VERSION)
+        else:
+            info = {'method': 'name', 'version': ROUTE_CLASSIFIER_VERSION}
+        scale = (target_peak / peak) if peak > target_peak else 1.0
+
+        # Pass 2: scale in place and stream into the cache file
+        def _scaled():
+            done2 = frames
+            # Kept chunks are released as they are written
+            source = reader.chunks(chunk_frames) if kept is None else (kept.pop(0) for _ in range(len(kept)))
+            for block in source:
+                block = as_frames(block)
+                if scale != 1.0:
+                    block *= scale
+                np.clip(block, -1.0, 1.0, out=block)
+                yield encode_block(block, sample_format)
+                done2 += len(block)
+                if progress is not None:
+                    progress(done2 / total)
+
+        # Mono stems are cached mono (frames, 1): half the size on disk and in memory
+        channels = reader.channels
+        extra = {'sample_rate': np.array(int(reader.sample_rate))}
+        extra.update(route_metadata(left, info))
+        write_npz_stream(npz_path, frames, channels, _scaled(), extra, dtype=sample_format)
+        return int(reader.sample_rate), left, info
+
+
+def load_wav_float(path, chunk_frames=CHUNK_FRAMES):
+    """Decode a whole WAV into one preallocated float32 (frames, channels) array (no full-size
+    temporaries). Mono files give a single column."""
+    with WavReader(path) as reader:
+        samples = np.empty((reader.frames, reader.channels), dtype=np.float32)
+        pos = 0
+        for block in reader.chunks(chunk_frames):
+            n = len(block)
+            samples[pos:pos + n] = as_frames(block)
+            pos += n
+        return int(reader.sample_rate), samples
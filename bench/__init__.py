@@ -0,0 +1 @@
+# Headless benchmarks for the audio engine (no sound card needed).
@@ -0,0 +1,240 @@
+# Headless benchmark of the real-time mixing callback.
+#
+# Drives AudioPlayer's actual audio_callback through a fake sounddevice backend with synthetic
+# stems, and reports callback time against the block deadline, transient allocation per block
+# and CPU headroom. Results are written as JSON so runs can be compared across commits:
+#
+#   python -m bench.audio_bench --tracks 4 16 --seconds 20 --out bench.json
+#   python -m bench.audio_bench --tracks 4 16 --seconds 20 --compare bench.json
+import argparse
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from bench import fake_sounddevice
+
+# The bench never opens a real device: route the player's sounddevice import to the fake backend
+sys.modules['sounddevice'] = fake_sounddevice
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from audio.player import AudioPlayer  # noqa: E402
+from audio.routing import default_presets  # noqa: E402
+from audio.track import Track  # noqa: E402
+from audio.storage import SAMPLE_FORMATS, to_storage, storage_error  # noqa: E402
+
+TOGGLES = {'on': [True], 'off': [False], 'both': [False, True]}
+
+
+def synth_tracks(count, seconds, rate, seed=1234):
+    """float32 stems: a mono click-like track routed left, the rest stereo noise/tones routed right."""
+    rng = np.random.default_rng(seed)
+    frames = int(seconds * rate)
+    t = np.arange(frames, dtype=np.float32) / float(rate)
+    tracks = []
+    for i in range(count):
+        if i == 0:
+            mono = (np.sin(2 * np.pi * 1000.0 * t) * (np.mod(t, 0.5) < 0.02)).astype(np.float32)
+            samples = mono[:, None] * 0.8
+        else:
+            tone = np.sin(2 * np.pi * (110.0 * (i + 1)) * t)[:, None]
+            samples = (0.3 * tone + 0.1 * rng.standard_normal((frames, 2))).astype(np.float32)
+        tracks.append(Track(f"synthetic_{i}.wav", rate, samples.astype(np.float32), left_hint=i == 0))
+    return tracks
+
+
+def _percentile(values, q):
+    return float(np.percentile(np.asarray(values, dtype=np.float64), q)) if values else 0.0
+
+
+def mix_error(reference, player, frames, out_channels, blocks=64):
+    """Largest sample difference between the float32 mix of `reference` tracks and the player's mix."""
+    ref = AudioPlayer()
+    ref.tracks = reference
+    ref.lr_enabled, ref.routing, ref.per_track_limiter = player.lr_enabled, player.routing, player.per_track_limiter
+    worst = 0.0
+    for b in range(blocks):
+        a = np.zeros((frames, out_channels), dtype=np.float32)
+        c = np.zeros((frames, out_channels), dtype=np.float32)
+        ref._mix_tracks(a, b * frames, frames, out_channels)
+        player._mix_tracks(c, b * frames, frames, out_channels)
+        worst = max(worst, float(np.max(np.abs(a - c))))
+    return worst
+
+
+def run_scenario(tracks, seconds, rate, blocksize, lr, limiter, per_track_limiter, routing=False,
+                 sample_format='float32', warmup=16, alloc_blocks=200):
+    player = AudioPlayer()
+    reference = synth_tracks(tracks, seconds, rate)
+    player.tracks = [t.copy(samples=to_storage(t.samples, sample_format)) for t in reference]
+    player.set_lr_mode(lr)
+    player.set_limiter_enabled(limiter)
+    player.set_per_track_limiter(per_track_limiter)
+    if routing:
+        # 4-channel preset: click/guide to the in-ear pair, band to in-ear and PA
+        player.set_routing(default_presets()[1])
+    # Fixed block size: the adaptive tuner would otherwise pick (and persist) its own
+    player.set_auto_tune(False)
+    player.fixed_level = (int(blocksize), 'high')
+
+    previous = len(fake_sounddevice.streams)
+    player.play_all()
+    stream = fake_sounddevice.wait_for_stream(previous)
+    if stream is None:
+        player.stop()
+        raise RuntimeError("Player did not open a stream")
+    blocksize = int(stream.blocksize or blocksize)
+    outdata = np.zeros((blocksize, int(stream.channels or 2)), dtype=np.float32)
+    # Quality of the compact formats: stem round-trip error and the error it leaves in the mix
+    max_error = max(storage_error(t.samples, sample_format) for t in reference)
+    out_channels = player.routing.channels if player.routing is not None else outdata.shape[1]
+    mixed_error = mix_error(reference, player, blocksize, out_channels) if sample_format != 'float32' else 0.0
+    total_blocks = max(1, player._song_length() // blocksize)
+    deadline = blocksize / float(rate)
+
+    try:
+        for _ in range(min(warmup, total_blocks)):
+            stream.callback(outdata, blocksize, None, None)
+        player.current_position = 0
+
+        times = []
+        for _ in range(total_blocks):
+            t0 = time.perf_counter()
+            stream.callback(outdata, blocksize, None, None)
+            times.append(time.perf_counter() - t0)
+
+        # Separate pass: tracemalloc slows the callback, so it never contaminates the timings
+        player.current_position = 0
+        allocs = []
+        tracemalloc.start()
+        try:
+            for _ in range(min(alloc_blocks, total_blocks)):
+                tracemalloc.reset_peak()
+                before = tracemalloc.get_traced_memory()[0]
+                stream.callback(outdata, blocksize, None, None)
+                allocs.append(tracemalloc.get_traced_memory()[1] - before)
+        finally:
+            tracemalloc.stop()
+    finally:
+        player.stop()
+
+    mean = float(np.mean(times))
+    return {
+        'tracks': tracks,
+        'seconds': seconds,
+        'rate': rate,
+        'blocksize': blocksize,
+        'lr': lr,
+        'limiter': limiter,
+        'per_track_limiter': per_track_limiter,
+        'routing': routing,
+        'sample_format': sample_format,
+        'stems_mb': sum(t.samples.nbytes for t in player.tracks) / (1024.0 * 1024.0),
+        'max_error': max_error,
+        'mix_error': mixed_error,
+        'channels': outdata.shape[1],
+        'blocks': len(times),
+        'deadline_ms': deadline * 1000.0,
+        'p50_ms': _percentile(times, 50) * 1000.0,
+        'p99_ms': _percentile(times, 99) * 1000.0,
+        'max_ms': max(times) * 1000.0,
+        'mean_ms': mean * 1000.0,
+        'over_deadline': int(sum(1 for t in times if t > deadline)),
+        'headroom': 1.0 - mean / deadline,
+        'headroom_p99': 1.0 - _percentile(times, 99) / deadline,
+        'alloc_bytes_p50': int(_percentile(allocs, 50)),
+        'alloc_bytes_max': int(max(allocs)) if allocs else 0,
+    }
+
+
+def scenario_key(result):
+    return (result['tracks'], result['rate'], result['blocksize'],
+            result['lr'], result['limiter'], result['per_track_limiter'], result.get('routing', False),
+            result.get('sample_format', 'float32'))
+
+
+def environment():
+    try:
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=root,
+                                capture_output=True, text=True, timeout=5).stdout.strip()
+    except Exception:
+        commit = ''
+    return {
+        'commit': commit,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def compare(results, baseline_path):
+    """Print p50/p99 change against a previous JSON result file."""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    base = {scenario_key(r): r for r in baseline.get('scenarios', [])}
+    print(f"\nCompared with {baseline_path} (commit {baseline.get('environment', {}).get('commit', '?')}):")
+    for r in results:
+        b = base.get(scenario_key(r))
+        if b is None:
+            continue
+        d50 = (r['p50_ms'] / b['p50_ms'] - 1.0) * 100.0 if b['p50_ms'] else 0.0
+        d99 = (r['p99_ms'] / b['p99_ms'] - 1.0) * 100.0 if b['p99_ms'] else 0.0
+        print(f"  {_label(r):<66} p50 {d50:+6.1f}%  p99 {d99:+6.1f}%")
+
+
+def _label(r):
+    return (f"{r['tracks']:>3} trk {r['rate']} Hz/{r['blocksize']}"
+            f" lr={'on' if r['lr'] else 'off'} lim={'on' if r['limiter'] else 'off'}"
+            f" trk_lim={'on' if r['per_track_limiter'] else 'off'}"
+            f"{' routed/' + str(r['channels']) + 'ch' if r.get('routing') else ''}"
+            f"{' ' + r['sample_format'] if r.get('sample_format', 'float32') != 'float32' else ''}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless benchmark of the audio mixing callback")
+    parser.add_argument('--tracks', type=int, nargs='+', default=[4, 16])
+    parser.add_argument('--seconds', type=float, default=20.0)
+    parser.add_argument('--rate', type=int, nargs='+', default=[44100])
+    parser.add_argument('--blocksize', type=int, nargs='+', default=[2048])
+    parser.add_argument('--lr', choices=TOGGLES, default='both')
+    parser.add_argument('--limiter', choices=TOGGLES, default='on')
+    parser.add_argument('--per-track-limiter', choices=TOGGLES, default='off')
+    parser.add_argument('--routing', choices=TOGGLES, default='off', help="Mix through a 4-channel routing preset")
+    parser.add_argument('--format', choices=SAMPLE_FORMATS, nargs='+', default=['float32'],
+                        help="Stem storage formats to measure (compact formats also report their max error)")
+    parser.add_argument('--out', help="Write results as JSON to this path")
+    parser.add_argument('--compare', help="Previous JSON results to compare against")
+    args = parser.parse_args(argv)
+
+    results = []
+    matrix = itertools.product(args.tracks, args.rate, args.blocksize, TOGGLES[args.lr], TOGGLES[args.limiter],
+                               TOGGLES[args.per_track_limiter], TOGGLES[args.routing], args.format)
+    for tracks, rate, blocksize, lr, limiter, per_track, routing, fmt in matrix:
+        r = run_scenario(tracks, args.seconds, rate, blocksize, lr, limiter, per_track, routing, fmt)
+        results.append(r)
+        quality = (f"  stems {r['stems_mb']:.0f} MB  err {r['max_error']:.1e} (mix {r['mix_error']:.1e})"
+                   if fmt != 'float32' else f"  stems {r['stems_mb']:.0f} MB")
+        print(f"{_label(r):<66} p50 {r['p50_ms']:7.3f} ms  p99 {r['p99_ms']:7.3f} ms  "
+              f"max {r['max_ms']:7.3f} ms / {r['deadline_ms']:.1f} ms  "
+              f"headroom {r['headroom'] * 100:5.1f}%  alloc {r['alloc_bytes_p50'] / 1024:.0f} KiB/block{quality}")
+
+    if args.compare:
+        compare(results, args.compare)
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump({'environment': environment(), 'scenarios': results}, f, indent=2)
+        print(f"\nResults written to {args.out}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
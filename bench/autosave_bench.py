@@ -0,0 +1,237 @@
+# Checks and GUI-thread cost of the background project autosave (ui/autosave.py).
+#
+# Works on a synthetic project: N songs, each with a 1200-point timeline envelope, markers, loops
+# and insert chains (like songs from the song form).
+# Checks (the script exits 1 if one fails):
+#   - round trip: the written file loads back as the project;
+#   - incremental: after one song is edited, only that song is serialized again;
+#   - coalescing: a burst of edits becomes a single write;
+#   - atomic: a reader polling the file while it is rewritten never sees a partial file, and no
+#     temp file is left behind;
+#   - failed write: when the worship data cannot be serialized, the next write (after a song
+#     edit) still carries it instead of an empty one.
+# It then times what the GUI thread pays. One figure is the flush itself (collecting the dirty
+# sections); the script fails if its CPU time goes over the budget. The other is the lateness of a
+# 1 ms GUI-like timer loop while the writer rewrites the whole project over and over, next to the
+# lateness of the same loop on an idle machine:
+#
+#   python -m bench.autosave_bench
+#   python -m bench.autosave_bench --songs 20 80 --out autosave.json
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from PyQt5.QtCore import QCoreApplication  # noqa: E402
+from ui import autosave  # noqa: E402
+from ui.autosave import ProjectAutosave  # noqa: E402
+
+
+def synth_project(songs):
+    rng = np.random.default_rng(3)
+    worship = {"name": "Culto de Domingo", "date": "2026-10-18"}
+    song_list = []
+    for i in range(songs):
+        tracks = [f"/musicas/{i:02d}/{name}.wav" for name in ("Click", "Guia", "Bateria", "Baixo", "Teclas", "Vozes")]
+        song_list.append({
+            "name": f"Música {i + 1}", "key": "G", "bpm": 72 + i, "tracks": tracks,
+            "banner_image": None,
+            "precomputed_envelope": np.round(rng.random(1200), 4).tolist(),
+            "precomputed_total_samples": 44100 * 300, "precomputed_sample_rate": 44100,
+            "markers": [{"name": f"Parte {k}", "time": 20.0 * k} for k in range(8)],
+            "loops": [{"name": "Refrão", "start": 40.0, "end": 60.0}],
+            "track_dsp": {t: {"hpf": 80.0, "pan": 0.0, "eq": [{"freq": 250.0, "gain": -3.0, "q": 1.0}]}
+                          for t in tracks[2:]},
+        })
+    routing = {"active": "Banda", "presets": [{"name": "Banda", "buses": [{"name": "Click", "channels": [2]}]}]}
+    return worship, song_list, routing
+
+
+class Project:
+    def __init__(self, songs, path):
+        self.worship, self.songs, self.routing = synth_project(songs)
+        self.saves = []
+        self.failures = []
+        self.autosave = ProjectAutosave(lambda: self.worship, lambda: self.songs, lambda: self.routing)
+        self.autosave.saved.connect(lambda p, s: self.saves.append(s))
+        self.autosave.failed.connect(lambda p, e: self.failures.append(e))
+        self.autosave.start(path)
+
+    def expected(self):
+        return {"version": autosave.PROJECT_VERSION, "worship": self.worship, "songs": self.songs,
+                "routing": self.routing}
+
+
+def settle(app, project, timeout=10.0):
+    """Run the event loop until the autosave timer fired and the writer is idle."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        app.processEvents()
+        if not project.autosave.is_dirty() and project.autosave.wait(0.01):
+            app.processEvents()
+            return True
+        time.sleep(0.002)
+    return False
+
+
+def checks(app, folder, songs):
+    results = []
+    path = os.path.join(folder, "check.wproj")
+    project = Project(songs, path)
+    settle(app, project)
+    with open(path, encoding='utf-8') as f:
+        ok = json.load(f) == project.expected()
+    results.append(("round trip", ok, f"{os.path.getsize(path) / 1024.0:.0f} KB, {songs} songs"))
+
+    project.songs[3]["markers"] = project.songs[3]["markers"] + [{"name": "Final", "time": 290.0}]
+    project.autosave.mark_song(project.songs[3])
+    settle(app, project)
+    with open(path, encoding='utf-8') as f:
+        ok = json.load(f) == project.expected() and project.autosave.last_sections == 1
+    results.append(("incremental", ok, f"{project.autosave.last_sections} section(s) serialized"))
+
+    before = len(project.saves)
+    for i in range(200):
+        project.songs[i % songs]["bpm"] = 100 + i
+        project.autosave.mark_song(project.songs[i % songs])
+        app.processEvents()
+    settle(app, project)
+    writes = len(project.saves) - before
+    results.append(("coalescing", writes == 1, f"200 edits, {writes} write(s)"))
+
+    bad = []
+    stop = threading.Event()
+
+    def reader():
+        while not stop.is_set():
+            try:
+                with open(path, encoding='utf-8') as f:
+                    json.load(f)
+            except ValueError as e:
+                bad.append(str(e))
+
+    thread = threading.Thread(target=reader, daemon=True)
+    thread.start()
+    for i in range(30):
+        project.songs[i % songs]["key"] = "ABCDEFG"[i % 7]
+        project.autosave.mark_song(project.songs[i % songs])
+        project.autosave.flush()
+        project.autosave.wait()
+    stop.set()
+    thread.join()
+    leftovers = [n for n in os.listdir(folder) if n.endswith('.tmp')]
+    results.append(("atomic", not bad and not leftovers, f"{len(bad)} partial read(s), {len(leftovers)} temp file(s)"))
+    project.autosave.shutdown()
+
+    # The first write fails on the worship section; the next one only has a song edit
+    path = os.path.join(folder, "failed.wproj")
+    project = Project(songs, path)
+    project.worship["tags"] = {"ceia"}
+    settle(app, project)
+    failed = len(project.failures) == 1 and not os.path.exists(path)
+    del project.worship["tags"]
+    project.songs[0]["key"] = "D"
+    project.autosave.mark_song(project.songs[0])
+    settle(app, project)
+    with open(path, encoding='utf-8') as f:
+        ok = failed and json.load(f) == project.expected()
+    results.append(("failed write", ok, f"{len(project.failures)} failure(s), worship kept on the retry"))
+    project.autosave.shutdown()
+    return results
+
+
+def timer_lateness(seconds):
+    """Lateness (ms) of a 1 ms sleep loop with nothing else running: the machine's noise floor."""
+    late = []
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        t0 = time.perf_counter()
+        time.sleep(0.001)
+        late.append(time.perf_counter() - t0 - 0.001)
+    return np.array(late) * 1000.0
+
+
+def gui_cost(app, folder, songs, seconds):
+    """Flush time and lateness of a 1 ms timer loop while the writer rewrites everything."""
+    project = Project(songs, os.path.join(folder, f"timing-{songs}.wproj"))
+    flushes = []
+    flush_cpu = []
+    late = []
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        if project.autosave.wait(0):
+            # Every song dirty: the writer serializes the whole project again
+            for song in project.songs:
+                project.autosave.mark_song(song)
+            t0, c0 = time.perf_counter(), time.thread_time()
+            project.autosave.flush()
+            flushes.append(time.perf_counter() - t0)
+            flush_cpu.append(time.thread_time() - c0)
+        t0 = time.perf_counter()
+        time.sleep(0.001)
+        late.append(time.perf_counter() - t0 - 0.001)
+    project.autosave.shutdown()
+    return np.array(flushes) * 1000.0, np.array(flush_cpu) * 1000.0, np.array(late) * 1000.0, len(flushes)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Background autosave checks and GUI-thread cost")
+    parser.add_argument('--songs', type=int, nargs='+', default=[20, 40, 80])
+    parser.add_argument('--seconds', type=float, default=3.0, help="Timing run per project size")
+    parser.add_argument('--budget-ms', type=float, default=1.0, help="Largest accepted GUI-thread flush")
+    parser.add_argument('--out', help="Write results as JSON to this path")
+    args = parser.parse_args(argv)
+
+    app = QCoreApplication.instance() or QCoreApplication(sys.argv[:1])
+    autosave.AUTOSAVE_DELAY = 0.05
+    folder = tempfile.mkdtemp(prefix="autosave_bench_")
+    failed = False
+    try:
+        check_rows = []
+        for name, ok, detail in checks(app, folder, args.songs[0]):
+            failed = failed or not ok
+            check_rows.append({'check': name, 'ok': ok, 'detail': detail})
+            print(f"{name:<14} {detail:<40} {'OK' if ok else 'FAIL'}")
+
+        print()
+        idle = timer_lateness(args.seconds)
+        baseline = {'timer_late_ms_p50': float(np.percentile(idle, 50)),
+                    'timer_late_ms_p99': float(np.percentile(idle, 99)), 'timer_late_ms_max': float(np.max(idle))}
+        print(f"  idle:     1 ms timer late by {baseline['timer_late_ms_p50']:.3f} ms median, "
+              f"{baseline['timer_late_ms_p99']:.3f} ms p99, {baseline['timer_late_ms_max']:.3f} ms max")
+        timings = []
+        for songs in args.songs:
+            flushes, flush_cpu, late, writes = gui_cost(app, folder, songs, args.seconds)
+            row = {'songs': songs, 'writes': writes,
+                   'flush_ms_median': float(np.median(flushes)), 'flush_ms_max': float(np.max(flushes)),
+                   'flush_cpu_ms_max': float(np.max(flush_cpu)),
+                   'timer_late_ms_p50': float(np.percentile(late, 50)),
+                   'timer_late_ms_p99': float(np.percentile(late, 99)),
+                   'timer_late_ms_max': float(np.max(late))}
+            timings.append(row)
+            print(f"{songs:3d} songs: {writes:4d} full writes, flush {row['flush_ms_median']:.3f} ms "
+                  f"(max {row['flush_ms_max']:.3f}, CPU max {row['flush_cpu_ms_max']:.3f}), 1 ms timer late by {row['timer_late_ms_p50']:.3f} ms "
+                  f"median, {row['timer_late_ms_p99']:.3f} ms p99, {row['timer_late_ms_max']:.3f} ms max")
+            # CPU time of the GUI thread (wall time also counts the machine preempting it)
+            if row['flush_cpu_ms_max'] > args.budget_ms:
+                print(f"FAIL: a flush blocked the GUI thread over {args.budget_ms:.1f} ms")
+                failed = True
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump({'checks': check_rows, 'idle': baseline, 'timing': timings}, f, indent=2)
+        print(f"\nResults written to {args.out}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
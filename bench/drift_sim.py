@@ -0,0 +1,187 @@
+# Simulated clock drift between the master stream and a secondary output device.
+#
+# Drives SecondaryOutput (ring buffer + drift estimator + adaptive resampler) with two simulated
+# clocks: the master pushes blocks at the nominal rate, the secondary pulls blocks at the rate
+# skewed by --ppm. No device and no real time is involved, so a 90-minute service runs in seconds.
+# It reports the drift estimate against the true skew and how far the ring latency wandered.
+# A retune scenario then re-opens the master mid-run with another block size (the latency auto-tune
+# going from 256 to 4096 frames): the secondary must follow it without underruns. A stall scenario
+# stops the secondary device for longer than its ring holds: the master keeps writing (counted as
+# overruns) without touching the consumer's read position, and the secondary skips ahead itself
+# when it resumes, with a single splice, no underruns and the latency back on target:
+#
+#   python -m bench.drift_sim --ppm -120 80 250 --minutes 90
+#   python -m bench.drift_sim --ppm 100 --minutes 90 --out drift.json
+import argparse
+import heapq
+import json
+import os
+import sys
+
+import numpy as np
+
+from bench import fake_sounddevice
+
+sys.modules['sounddevice'] = fake_sounddevice
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from audio.multiout import SecondaryOutput  # noqa: E402
+
+
+def simulate(ppm, minutes, rate=48000, master_block=2048, secondary_block=1024, jitter=0.2, seed=7, settle=60.0,
+             retune=None, retune_gap=0.05, stall=None):
+    """retune: (seconds, block) at which the master stops, stays stopped for retune_gap seconds and
+    restarts with that block size (latency stats are taken from settle seconds after it).
+    stall: (seconds, duration) during which the secondary device runs no callback."""
+    rng = np.random.default_rng(seed)
+    now = [0.0]
+    out = SecondaryOutput(None, [0, 1], rate, master_block, secondary_block, clock=lambda: now[0])
+    secondary_rate = rate * (1.0 + ppm * 1e-6)
+    master_period = master_block / float(rate)
+    secondary_period = secondary_block / secondary_rate
+    end = minutes * 60.0
+    first_block = master_block
+    retune_underruns = None
+    if retune is not None:
+        settle += retune[0]
+
+    # Master signal: a slow sine, so the resampled output can be checked for continuity
+    phase = 0.0
+    step = 2 * np.pi * 220.0 / rate
+    block = np.zeros((master_block, 2), dtype=np.float32)
+    master_start = 0.0
+    buf = np.zeros((secondary_block, 2), dtype=np.float32)
+
+    # (time, order, kind): callbacks are scheduled on their ideal clock plus scheduling jitter
+    events = [(0.0, 0, 'm'), (0.0, 1, 's')]
+    mk = sk = 0
+    fills, ppms = [], []
+    max_step = 0.0
+    jumps = 0
+    max_fill = 0
+    stall_underruns = None
+    last = None
+    while events:
+        t, _order, kind = heapq.heappop(events)
+        if t > end:
+            break
+        now[0] = t
+        if kind == 'm':
+            if retune is not None and t >= retune[0]:
+                # Stream re-opened: the player re-targets the secondary, then the new master starts
+                master_block = int(retune[1])
+                master_period = master_block / float(rate)
+                block = np.zeros((master_block, 2), dtype=np.float32)
+                retune_underruns = out.underruns
+                out.set_master_block(master_block)
+                master_start, mk = t + retune_gap, 0
+                retune = None
+                heapq.heappush(events, (master_start, 0, 'm'))
+                continue
+            samples = np.sin(phase + step * np.arange(master_block))
+            phase = (phase + step * master_block) % (2 * np.pi)
+            block[:, 0] = samples
+            block[:, 1] = samples
+            out.push(block)
+            mk += 1
+            heapq.heappush(events, (master_start + mk * master_period + rng.uniform(0, jitter) * master_period,
+                                    0, 'm'))
+        else:
+            sk += 1
+            heapq.heappush(events, (sk * secondary_period + rng.uniform(0, jitter) * secondary_period, 1, 's'))
+            if stall is not None and stall[0] <= t < stall[0] + stall[1]:
+                if stall_underruns is None:
+                    stall_underruns = out.underruns
+                continue
+            max_fill = max(max_fill, out.ring.available())
+            out.callback(buf, secondary_block, None, None)
+            if out.primed:
+                if last is not None:
+                    seam = abs(float(buf[0, 0]) - last)
+                    max_step = max(max_step, seam)
+                    # Blocks with a step a 220 Hz sine never takes: splices of skipped frames
+                    jumps += int(seam > 0.05 or bool(np.any(np.abs(np.diff(buf[:, 0])) > 0.05)))
+                last = float(buf[-1, 0])
+                if t >= settle:
+                    fills.append(out.estimator.fill)
+                    ppms.append(out.estimator.ppm)
+
+    fills = np.asarray(fills) if fills else np.zeros(1)
+    target_ms = out.target / float(rate) * 1000.0
+    fill_ms = fills / float(rate) * 1000.0
+    return {
+        'ppm': ppm,
+        'minutes': minutes,
+        'rate': rate,
+        'master_block': first_block,
+        'retuned_block': master_block if master_block != first_block else None,
+        'secondary_block': secondary_block,
+        'estimated_ppm': float(np.mean(ppms[-1000:])) if ppms else 0.0,
+        'target_ms': target_ms,
+        'latency_min_ms': float(fill_ms.min()),
+        'latency_max_ms': float(fill_ms.max()),
+        'latency_wander_ms': float(np.max(np.abs(fill_ms - target_ms))),
+        'underruns': out.underruns,
+        'underruns_after_retune': None if retune_underruns is None else out.underruns - retune_underruns,
+        'overruns': out.ring.overruns,
+        'underruns_after_stall': None if stall_underruns is None else out.underruns - stall_underruns,
+        'max_fill': int(max_fill),
+        'capacity': out.ring.capacity,
+        'jumps': jumps,
+        # Largest sample step at block seams: a 220 Hz sine never steps more than ~0.03
+        'max_seam_step': max_step,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulated clock drift between two output devices")
+    parser.add_argument('--ppm', type=float, nargs='+', default=[-150.0, 50.0, 200.0])
+    parser.add_argument('--minutes', type=float, default=90.0)
+    parser.add_argument('--rate', type=int, default=48000)
+    parser.add_argument('--master-block', type=int, default=2048)
+    parser.add_argument('--secondary-block', type=int, default=1024)
+    parser.add_argument('--retune', type=int, nargs=2, default=[256, 4096], metavar=('FROM', 'TO'),
+                        help="Master block sizes of the retune scenario")
+    parser.add_argument('--out', help="Write results as JSON to this path")
+    args = parser.parse_args(argv)
+
+    results = []
+    failed = False
+    scenarios = [(ppm, args.minutes, args.master_block, None, None) for ppm in args.ppm]
+    # Retune a minute in, with the first skew
+    scenarios.append((args.ppm[0], min(args.minutes, 10.0), args.retune[0], (60.0, args.retune[1]), None))
+    # Secondary device stalled for a second, 30 s in
+    scenarios.append((args.ppm[0], min(args.minutes, 2.0), args.master_block, None, (30.0, 1.0)))
+    for ppm, minutes, master_block, retune, stall in scenarios:
+        r = simulate(ppm, minutes, args.rate, master_block, args.secondary_block, retune=retune, stall=stall)
+        results.append(r)
+        if stall is not None:
+            # The master lapped the stalled ring; the secondary skipped to the newest frames itself:
+            # one splice, no dropout, latency centered on the target again
+            ok = (r['overruns'] > 0 and r['max_fill'] > r['capacity'] and r['underruns_after_stall'] == 0
+                  and r['jumps'] == 1 and r['latency_wander_ms'] < master_block / float(args.rate) * 1000.0)
+            print(f"stall of {stall[1]:.1f} s at {stall[0]:.0f} s ({r['overruns']} overruns, {r['jumps']} splice, "
+                  f"{r['max_fill']} frames queued for a {r['capacity']}-frame ring):")
+        elif retune is None:
+            ok = r['underruns'] == 0 and r['overruns'] == 0 and abs(r['estimated_ppm'] - ppm) < max(5.0, abs(ppm) * 0.05)
+        else:
+            # The PI loop needs minutes to settle again on the larger blocks: the ring must simply
+            # follow the new block size (no dropouts, latency centered on the new target)
+            ok = (r['underruns_after_retune'] == 0 and r['overruns'] == 0
+                  and r['latency_wander_ms'] < r['retuned_block'] / float(args.rate) * 1000.0)
+            print(f"retune {master_block} -> {retune[1]} frames at {retune[0]:.0f} s "
+                  f"({r['underruns_after_retune']} underruns after it):")
+        failed = failed or not ok
+        print(f"{ppm:+8.1f} ppm over {r['minutes']:.0f} min: estimated {r['estimated_ppm']:+8.1f} ppm  "
+              f"latency {r['latency_min_ms']:.1f}..{r['latency_max_ms']:.1f} ms (target {r['target_ms']:.1f})  "
+              f"underruns {r['underruns']} overruns {r['overruns']}  seam {r['max_seam_step']:.3f}  "
+              f"{'OK' if ok else 'FAIL'}")
+
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump({'scenarios': results}, f, indent=2)
+        print(f"\nResults written to {args.out}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
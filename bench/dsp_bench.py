@@ -0,0 +1,105 @@
+# How many tracks x EQ bands of per-track inserts fit in the audio block deadline.
+#
+# Mixes synthetic stems with AudioPlayer's real mixer (_mix_tracks) while every track runs an
+# insert chain of a high-pass filter, N peaking EQ bands and pan, and reports the block time
+# against the deadline (2048 frames at 44.1 kHz = 46.4 ms by default). A block "fits" when its
+# p99 stays inside --budget of the deadline, leaving the rest for the device, the master bus and
+# the UI. The 'none' row is the same mix with every insert bypassed:
+#
+#   python -m bench.dsp_bench
+#   python -m bench.dsp_bench --tracks 8 16 32 64 --bands 0 3 5 --out dsp.json
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from bench import fake_sounddevice
+
+sys.modules['sounddevice'] = fake_sounddevice
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from audio.player import AudioPlayer  # noqa: E402
+from bench.audio_bench import synth_tracks, _percentile  # noqa: E402
+
+
+def chain_settings(bands):
+    eq = [{"freq": 100.0 * (4 ** b), "gain": 3.0 if b % 2 else -3.0, "q": 1.0} for b in range(bands)]
+    return {"hpf": 80.0, "eq": eq, "pan": -0.2}
+
+
+def run(tracks, bands, seconds, rate, blocksize, blocks):
+    player = AudioPlayer()
+    player.tracks = synth_tracks(tracks, seconds, rate)
+    if bands is not None:
+        for i in range(tracks):
+            player.set_track_dsp(i, chain_settings(bands))
+    length = player.params.song_length()
+    mixed = np.zeros((blocksize, 2), dtype=np.float32)
+    times = []
+    position = 0
+    for _ in range(blocks + 8):
+        if position + blocksize > length:
+            position = 0
+        mixed.fill(0.0)
+        t0 = time.perf_counter()
+        player._mix_tracks(mixed, position, blocksize, 2)
+        times.append(time.perf_counter() - t0)
+        position += blocksize
+    times = times[8:]  # Warm-up blocks
+    return {
+        'tracks': tracks,
+        'bands': 'none' if bands is None else bands,
+        'sections': 0 if bands is None else 1 + bands,
+        'p50_ms': _percentile(times, 50) * 1000.0,
+        'p99_ms': _percentile(times, 99) * 1000.0,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Per-track insert chains (HPF/EQ/pan) against the block deadline")
+    parser.add_argument('--tracks', type=int, nargs='+', default=[8, 16, 32, 64])
+    parser.add_argument('--bands', type=int, nargs='+', default=[0, 1, 3, 5],
+                        help="Peaking EQ bands per track (each chain also has the high-pass and pan)")
+    parser.add_argument('--seconds', type=float, default=10.0, help="Length of the synthetic stems")
+    parser.add_argument('--rate', type=int, default=44100)
+    parser.add_argument('--blocksize', type=int, default=2048)
+    parser.add_argument('--blocks', type=int, default=150, help="Measured blocks per scenario")
+    parser.add_argument('--budget', type=float, default=0.5, help="Share of the deadline the mix may use")
+    parser.add_argument('--out', help="Write results as JSON to this path")
+    args = parser.parse_args(argv)
+
+    deadline_ms = args.blocksize / float(args.rate) * 1000.0
+    limit_ms = deadline_ms * args.budget
+    print(f"{args.blocksize} frames at {args.rate} Hz: deadline {deadline_ms:.1f} ms, budget {limit_ms:.1f} ms\n")
+    results = []
+    for tracks in args.tracks:
+        for bands in [None] + list(args.bands):
+            r = run(tracks, bands, args.seconds, args.rate, args.blocksize, args.blocks)
+            r['fits'] = r['p99_ms'] <= limit_ms
+            results.append(r)
+            print(f"{tracks:4d} tracks  bands {str(r['bands']):>4}  p50 {r['p50_ms']:7.2f} ms  "
+                  f"p99 {r['p99_ms']:7.2f} ms  {100.0 * r['p99_ms'] / deadline_ms:5.1f}% of deadline  "
+                  f"{'fits' if r['fits'] else 'OVER'}")
+
+    # Per-track cost of a chain, from the largest track count (less fixed overhead per track)
+    print()
+    largest = max(args.tracks)
+    base = next(r for r in results if r['tracks'] == largest and r['bands'] == 'none')
+    for bands in args.bands:
+        r = next(r for r in results if r['tracks'] == largest and r['bands'] == bands)
+        per_track = max(1e-6, (r['p99_ms'] - base['p99_ms']) / largest)
+        fit = int(limit_ms / (base['p99_ms'] / largest + per_track))
+        print(f"HPF + {bands} band(s) + pan: {per_track * 1000.0:6.1f} us per track per block, "
+              f"about {fit} tracks fit in the budget")
+
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump({'deadline_ms': deadline_ms, 'budget': args.budget, 'scenarios': results}, f, indent=2)
+        print(f"\nResults written to {args.out}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,71 @@
+# Minimal stand-in for the sounddevice module used by the headless benchmarks.
+# OutputStream never talks to PortAudio: it only records its callback so the bench can
+# drive it block by block with a simulated clock.
+import time
+
+
+class CallbackStop(Exception):
+    pass
+
+
+class CallbackAbort(Exception):
+    pass
+
+
+class _Default:
+    device = (None, 0)
+
+
+default = _Default()
+
+# Streams created so far (most recent last)
+streams = []
+
+_DEVICES = [
+    {'name': 'Fake Output', 'max_output_channels': 8, 'max_input_channels': 0, 'default_samplerate': 48000.0},
+]
+
+
+def query_devices(device=None, kind=None):
+    if device is not None:
+        return _DEVICES[int(device)]
+    return list(_DEVICES)
+
+
+def sleep(msec):
+    time.sleep(msec / 1000.0)
+
+
+class OutputStream:
+    def __init__(self, samplerate=None, blocksize=None, device=None, channels=None, dtype=None,
+                 latency=None, callback=None, **kwargs):
+        self.samplerate = samplerate
+        self.blocksize = blocksize
+        self.device = device
+        self.channels = channels
+        self.dtype = dtype
+        self.latency = 0.0
+        self.callback = callback
+        self.active = False
+        self.closed = False
+        streams.append(self)
+
+    def start(self):
+        self.active = True
+
+    def stop(self):
+        self.active = False
+
+    def close(self):
+        self.active = False
+        self.closed = True
+
+
+def wait_for_stream(previous_count, timeout=2.0):
+    """Return the first stream created after previous_count streams existed, or None."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if len(streams) > previous_count:
+            return streams[previous_count]
+        time.sleep(0.002)
+    return None
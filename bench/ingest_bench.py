@@ -0,0 +1,272 @@
+# Decode-once ingest of the song form's stems (audio/ingest.py) against the previous flow.
+#
+# The previous flow decoded every stem three times. The song form read each one whole to compute
+# the timeline envelope (legacy_form_envelope below) before closing. AudioOptimizeWorker then read
+# it twice more to write the cache file (peak scan, then scaled write). The ingest starts when the
+# tracks are chosen and decodes each stem once. Loading the song afterwards reads the cache file in
+# both flows.
+# Works on a synthetic song (mono and stereo WAV stems, one shorter than the others), each flow
+# with an empty audio cache. It counts the frames decoded from the WAVs and times each stage.
+# Checks (the script exits 1 if one fails):
+#   - decode once: the ingest decodes each stem's frames once and the optimizer afterwards none;
+#   - cache: the cache files match the streaming optimizer's, samples and routing;
+#   - envelope: matches the song form's previous envelope (exactly for stems as long as the song);
+#   - over the budget: a stem too long to keep is read twice and gives the same cache file;
+#   - cancel: a stem removed while it is read stops, leaves no file behind and no result, and a
+#     queued one is never read.
+#
+#   python -m bench.ingest_bench
+#   python -m bench.ingest_bench --stems 8 --seconds 120 --out ingest.json
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+STEM_NAMES = ("Click", "Guia", "Bateria", "Baixo", "Guitarra", "Teclas", "Vozes", "Pad")
+ENVELOPE_TOLERANCE = 0.05  # Largest difference from the previous envelope with a shorter stem
+
+
+def legacy_form_envelope(file_paths, target_points=1200):
+    """The song form's previous envelope (FormEnvelopeWorker): every stem read whole with scipy.
+    Returns (envelope, total_samples, sample_rate)."""
+    from scipy.io import wavfile
+    tracks = []
+    max_len = 0
+    sample_rate = 44100
+    for path in file_paths:
+        if not path.lower().endswith('.wav'):
+            continue
+        sr, samples = wavfile.read(path)
+        sample_rate = sr
+        if samples.dtype != np.float32 and samples.dtype != np.float64:
+            samples = samples.astype(np.float32) / 32768.0
+        mono = np.abs(samples) if len(samples.shape) == 1 else np.mean(np.abs(samples), axis=1)
+        tracks.append(mono)
+        max_len = max(max_len, len(mono))
+    if not tracks or max_len == 0:
+        return [], 0, sample_rate
+    block = max(1, max_len // max(100, int(target_points)))
+    combined = None
+    for mono in tracks:
+        if len(mono) < max_len:
+            mono = np.concatenate([mono, np.zeros(max_len - len(mono), dtype=mono.dtype)])
+        mono = mono[:(len(mono) // block) * block]
+        rms = np.sqrt(np.mean(mono.reshape(-1, block) ** 2, axis=1))
+        combined = rms if combined is None else combined + rms
+    max_val = combined.max()
+    env = combined / max_val if max_val > 0 else combined
+    env = np.maximum(np.clip(env, 0.0, 1.0), 0.05)
+    return env.tolist(), max_len, sample_rate
+
+
+def synth_song(folder, stems, seconds, sample_rate=44100):
+    from scipy.io import wavfile
+    rng = np.random.default_rng(11)
+    frames = int(seconds * sample_rate)
+    contour = 0.3 + 0.7 * np.abs(np.sin(np.linspace(0, 3 * np.pi, frames)))
+    os.makedirs(folder, exist_ok=True)
+    paths = []
+    for k in range(stems):
+        n = frames if k != stems - 1 else frames * 3 // 4  # The last stem ends early
+        data = rng.standard_normal(n) * contour[:n] * (2000 + 600 * k)
+        if k % 3 == 2:
+            data = np.stack([data, data * 0.5], axis=1)
+        path = os.path.join(folder, f"{STEM_NAMES[k % len(STEM_NAMES)]}.wav")
+        wavfile.write(path, sample_rate, data.astype(np.int16))
+        paths.append(path)
+    return paths
+
+
+class DecodeCounter:
+    """Frames decoded from WAV files (WavReader and scipy's wavfile.read)."""
+
+    def __init__(self):
+        import scipy.io.wavfile
+        from audio import wavstream
+        self.frames = 0
+        counter = self
+        read, wav_read = wavstream.WavReader.read, scipy.io.wavfile.read
+
+        def counted_read(reader, start, count):
+            out = read(reader, start, count)
+            counter.frames += len(out)
+            return out
+
+        def counted_wav_read(*args, **kwargs):
+            rate, data = wav_read(*args, **kwargs)
+            if not kwargs.get('mmap'):
+                counter.frames += len(data)
+            return rate, data
+
+        wavstream.WavReader.read = counted_read
+        scipy.io.wavfile.read = counted_wav_read
+
+    def take(self):
+        frames, self.frames = self.frames, 0
+        return frames
+
+
+def set_cache(work, name):
+    """Point the audio cache at an empty folder (QStandardPaths reads XDG_CACHE_HOME every call)."""
+    os.environ['XDG_CACHE_HOME'] = os.path.join(work, name)
+
+
+def settle(app, ingest, paths, timeout=120.0):
+    deadline = time.monotonic() + timeout
+    while not ingest.settled(paths) and time.monotonic() < deadline:
+        app.processEvents()
+        time.sleep(0.002)
+    app.processEvents()
+
+
+def cache_files(paths):
+    from audio.library import audio_cache_dir, cache_key_for
+    return [os.path.join(audio_cache_dir(), f"{cache_key_for(p)}.npz") for p in paths]
+
+
+def same_cache(a, b):
+    with np.load(a) as x, np.load(b) as y:
+        return (np.array_equal(x['samples'], y['samples']) and int(x['sample_rate']) == int(y['sample_rate'])
+                and bool(x['route_left']) == bool(y['route_left']))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Decode-once ingest against the previous song form flow")
+    parser.add_argument('--stems', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=60.0, help="Stem length")
+    parser.add_argument('--out', help="Write results as JSON to this path")
+    args = parser.parse_args(argv)
+
+    work = tempfile.mkdtemp(prefix="ingest_bench_")
+    os.environ['XDG_DATA_HOME'] = os.path.join(work, 'data')
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from bench import fake_sounddevice
+    sys.modules.setdefault('sounddevice', fake_sounddevice)
+    from PyQt5.QtCore import QCoreApplication
+    app = QCoreApplication.instance() or QCoreApplication(['bench'])
+    from audio.ingest import StemIngest, ingest_stem
+    from audio.library import audio_cache_dir
+    from audio.wavstream import WavReader, combine_envelopes
+    from ui.tracks_panel import AudioOptimizeWorker
+    counter = DecodeCounter()
+
+    failed = False
+    checks = []
+
+    def check(name, ok, detail):
+        nonlocal failed
+        failed = failed or not ok
+        checks.append({'check': name, 'ok': bool(ok), 'detail': detail})
+        print(f"{name:<16} {detail:<64} {'OK' if ok else 'FAIL'}")
+
+    try:
+        paths = synth_song(os.path.join(work, 'Musica'), args.stems, args.seconds)
+        stem_frames = 0
+        for p in paths:
+            with WavReader(p) as r:
+                stem_frames += r.frames
+
+        # Previous flow: envelope on OK, then the optimizer in the background
+        set_cache(work, 'cache-old')
+        counter.take()
+        t0 = time.perf_counter()
+        old_env = legacy_form_envelope(paths)
+        old_ok = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        AudioOptimizeWorker({'tracks': paths}, "bench").run()
+        old_optimize = time.perf_counter() - t0
+        old_decoded = counter.take()
+        old_files = cache_files(paths)
+
+        # Ingest: starts when the tracks are chosen
+        set_cache(work, 'cache-new')
+        ingest = StemIngest()
+        t0 = time.perf_counter()
+        ingest.add(paths)
+        settle(app, ingest, paths)
+        new_ingest = time.perf_counter() - t0
+        results = [ingest.results[p] for p in paths]
+        t0 = time.perf_counter()
+        new_env, new_total = combine_envelopes([(r['frames'], r['envelope']) for r in results])
+        new_ok = time.perf_counter() - t0
+        new_decoded = counter.take()
+        t0 = time.perf_counter()
+        AudioOptimizeWorker({'tracks': paths}, "bench").run()
+        new_optimize = time.perf_counter() - t0
+        after_decoded = counter.take()
+        ingest.shutdown()
+        new_files = cache_files(paths)
+
+        print(f"previous: OK waits {old_ok * 1000:.0f} ms (envelope), optimizer {old_optimize * 1000:.0f} ms, "
+              f"{old_decoded / stem_frames:.1f}x the frames decoded")
+        print(f"ingest:   {new_ingest * 1000:.0f} ms from choosing the tracks, OK waits {new_ok * 1000:.1f} ms once done, "
+              f"optimizer {new_optimize * 1000:.0f} ms, {new_decoded / stem_frames:.1f}x the frames decoded")
+        check("decode once", new_decoded == stem_frames and after_decoded == 0,
+              f"{new_decoded} of {stem_frames} frames, {after_decoded} decoded by the optimizer afterwards")
+        check("cache", all(same_cache(a, b) for a, b in zip(old_files, new_files)),
+              f"{len(paths)} cache files compared")
+
+        short = os.path.basename(paths[-1])
+        same_length = [p for p in paths if os.path.basename(p) != short]
+        exact_env, _ = combine_envelopes([(ingest.results[p]['frames'], ingest.results[p]['envelope']) for p in same_length])
+        exact = float(np.max(np.abs(np.array(exact_env) - np.array(legacy_form_envelope(same_length)[0]))))
+        diff = float(np.max(np.abs(np.array(new_env) - np.array(old_env[0]))))
+        check("envelope", exact < 1e-4 and diff < ENVELOPE_TOLERANCE and new_total == old_env[1]
+              and results[-1]['sample_rate'] == old_env[2],
+              f"max diff {exact:.0e} ({diff:.3f} with a shorter stem)")
+
+        set_cache(work, 'cache-budget')
+        counter.take()
+        twice = ingest_stem(paths[0], keep_decoded=0)
+        reads = counter.take()
+        with WavReader(paths[0]) as r:
+            frames0 = r.frames
+        check("over the budget", reads == 2 * frames0 and same_cache(twice['npz_path'], new_files[0]),
+              f"{reads / frames0:.0f} reads of the stem, same cache file")
+
+        # Cancel: the first stem while it is read, the second while it waits
+        set_cache(work, 'cache-cancel')
+        ingest = StemIngest()
+        ingest.add(paths[:3])
+        deadline = time.monotonic() + 10
+        while ingest.state(paths[0]) != 'running' and time.monotonic() < deadline:
+            time.sleep(0.001)
+        ingest.cancel(paths[0])
+        ingest.cancel(paths[1])
+        settle(app, ingest, [paths[2]])
+        time.sleep(0.1)
+        app.processEvents()
+        leftovers = [n for n in os.listdir(audio_cache_dir()) if n.endswith('.part')] if os.path.isdir(audio_cache_dir()) else []
+        cancelled = cache_files(paths[:2])
+        ok = (paths[0] not in ingest.results and paths[1] not in ingest.results and paths[2] in ingest.results
+              and not any(os.path.exists(f) for f in cancelled) and not leftovers)
+        ingest.shutdown()
+        check("cancel", ok, f"{len(leftovers)} temp file(s), results for {len(ingest.results)} of 3 stems")
+
+        results_json = {
+            'stems': args.stems, 'stem_seconds': args.seconds,
+            'previous': {'ok_wait_ms': old_ok * 1000.0, 'optimize_ms': old_optimize * 1000.0,
+                         'decoded_ratio': old_decoded / stem_frames},
+            'ingest': {'ingest_ms': new_ingest * 1000.0, 'ok_wait_ms': new_ok * 1000.0,
+                       'optimize_ms': new_optimize * 1000.0, 'decoded_ratio': new_decoded / stem_frames},
+        }
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump({'checks': checks, 'results': results_json}, f, indent=2)
+        print(f"\nResults written to {args.out}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,218 @@
+# Scan, search and pick timings of the local stem library (audio/library.py).
+#
+# Builds a synthetic library: N song folders of M WAV stems (mono and stereo, one shorter stem per
+# song, accented folder names), in a temporary folder with its own audio cache. It then times the
+# cold scan (index + analysis of every stem), a rescan with nothing changed and the search, and
+# compares adding a library song (envelope from the database, warm caches) with adding the same
+# stems from outside the library (a full decode for the envelope and AudioOptimizeWorker optimization).
+# Checks (the script exits 1 if one fails):
+#   - rescan: nothing is read again when nothing changed;
+#   - search: accents and case are ignored, every word must match, stem names are searchable;
+#   - envelope: the database envelope matches the one computed from the samples (exactly when
+#     they are as long as the song, within ENVELOPE_TOLERANCE with a shorter stem);
+#   - warm caches: the optimizer finds every cache file of a library song and leaves it untouched;
+#   - changes: a rewritten stem is analyzed again, a deleted one leaves the song, a folder that is
+#     offline keeps its stems;
+#   - remember: the name, key and track order of a song added to a service come back.
+#
+#   python -m bench.library_bench
+#   python -m bench.library_bench --songs 200 --stems 8 --out library.json
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from bench.ingest_bench import legacy_form_envelope  # noqa: E402
+
+STEM_NAMES = ("Click", "Guia", "Bateria", "Baixo", "Guitarra", "Teclas", "Vozes", "Pad")
+SONG_NAMES = ("Coração Grato", "Águas Profundas", "Graça", "Aleluia", "Te Louvarei", "Fiel", "Santo", "Bondade")
+ENVELOPE_TOLERANCE = 0.05  # Largest difference from the decoded envelope when a stem is shorter than its song
+QUERIES = ("", "coracao", "AGUAS 01", "baixo", "grac 1", "baixo guia", "nada disso")
+
+
+def song_dir_name(i):
+    return f"{i + 1:03d} - {SONG_NAMES[i % len(SONG_NAMES)]}"
+
+
+def synth_library(folder, songs, stems, seconds, sample_rate=44100):
+    """Song folders of stems with a loudness contour (so envelopes differ along the song)."""
+    from scipy.io import wavfile
+    rng = np.random.default_rng(9)
+    frames = int(seconds * sample_rate)
+    contour = 0.3 + 0.7 * np.abs(np.sin(np.linspace(0, 3 * np.pi, frames)))
+    for i in range(songs):
+        song_dir = os.path.join(folder, song_dir_name(i))
+        os.makedirs(song_dir, exist_ok=True)
+        for k in range(stems):
+            n = frames if k != stems - 1 else frames * 3 // 4  # The last stem ends early
+            gain = 2000 + 600 * k
+            data = rng.standard_normal(n) * contour[:n] * gain
+            if k % 3 == 2:
+                data = np.stack([data, data * 0.5], axis=1)  # Some stereo stems
+            wavfile.write(os.path.join(song_dir, f"{STEM_NAMES[k % len(STEM_NAMES)]}.wav"), sample_rate,
+                          data.astype(np.int16))
+
+
+def optimize(song_data):
+    from ui.tracks_panel import AudioOptimizeWorker
+    worker = AudioOptimizeWorker(song_data, "bench")
+    t0 = time.perf_counter()
+    worker.run()
+    return time.perf_counter() - t0, worker
+
+
+def timed_scan(lib):
+    t0 = time.perf_counter()
+    stats = lib.scan()
+    return time.perf_counter() - t0, stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stem library scan, search and pick timings")
+    parser.add_argument('--songs', type=int, default=60)
+    parser.add_argument('--stems', type=int, default=6)
+    parser.add_argument('--seconds', type=float, default=4.0, help="Stem length")
+    parser.add_argument('--search-budget-ms', type=float, default=20.0, help="Slowest accepted search")
+    parser.add_argument('--out', help="Write results as JSON to this path")
+    args = parser.parse_args(argv)
+
+    work = tempfile.mkdtemp(prefix="library_bench_")
+    # Fresh app data and audio cache (the library and the optimizer must share the cache)
+    os.environ['XDG_DATA_HOME'] = os.path.join(work, 'data')
+    os.environ['XDG_CACHE_HOME'] = os.path.join(work, 'cache')
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from bench import fake_sounddevice
+    sys.modules.setdefault('sounddevice', fake_sounddevice)
+    from PyQt5.QtCore import QCoreApplication
+    app = QCoreApplication.instance() or QCoreApplication(['bench'])  # noqa: F841
+    from audio.library import StemLibrary
+
+    failed = False
+    checks = []
+
+    def check(name, ok, detail):
+        nonlocal failed
+        failed = failed or not ok
+        checks.append({'check': name, 'ok': bool(ok), 'detail': detail})
+        print(f"{name:<16} {detail:<60} {'OK' if ok else 'FAIL'}")
+
+    try:
+        folder = os.path.join(work, 'Musicas')
+        synth_library(folder, args.songs, args.stems, args.seconds)
+        outside = os.path.join(work, 'Downloads', song_dir_name(1))
+        shutil.copytree(os.path.join(folder, song_dir_name(1)), outside)
+        lib = StemLibrary(os.path.join(work, 'library.sqlite3'))
+        lib.add_folder(folder)
+
+        stems = args.songs * args.stems
+        cold, cold_stats = timed_scan(lib)
+        print(f"cold scan: {stems} stems in {cold:.2f} s (index {cold_stats['index_seconds'] * 1000:.0f} ms, "
+              f"{cold_stats['analyzed']} analyzed, {cold / max(1, stems) * 1000:.1f} ms per stem)")
+        warm, warm_stats = timed_scan(lib)
+        print(f"rescan:    {warm * 1000:.1f} ms")
+        check("rescan", warm_stats['new'] == warm_stats['changed'] == warm_stats['analyzed'] == 0,
+              f"{warm * 1000:.0f} ms, {warm_stats['analyzed']} analyzed again")
+
+        search_ms = {}
+        for query in QUERIES:
+            times = []
+            for _ in range(30):
+                t0 = time.perf_counter()
+                found = lib.search(query)
+                times.append((time.perf_counter() - t0) * 1000.0)
+            search_ms[query] = {'median': float(np.median(times)), 'max': float(np.max(times)), 'results': len(found)}
+        slowest = max(v['max'] for v in search_ms.values())
+        print("search:    " + ", ".join(f"'{q}' {v['results']} in {v['median']:.2f} ms" for q, v in search_ms.items()))
+        names = [s['name'] for s in lib.search("coracao")]
+        ok = (bool(names) and all(n.endswith("Coração Grato") for n in names)
+              and [s['name'] for s in lib.search("AGUAS 002")] == [song_dir_name(1)]
+              and len(lib.search("baixo guia")) == min(args.songs, 100) and not lib.search("nada disso"))
+        check("search", ok and slowest <= args.search_budget_ms, f"slowest {slowest:.2f} ms, {len(names)} 'coracao'")
+
+        entry = lib.song(os.path.join(folder, song_dir_name(1)))
+        t0 = time.perf_counter()
+        from_db = lib.song_envelope(entry['tracks'])
+        db_ms = (time.perf_counter() - t0) * 1000.0
+        t0 = time.perf_counter()
+        from_form = legacy_form_envelope(entry['tracks'])
+        form_ms = (time.perf_counter() - t0) * 1000.0
+        diff = float(np.max(np.abs(np.array(from_db[0]) - np.array(from_form[0]))))
+        # Stems as long as the song give the same blocks; the shorter one is resampled
+        short = f"{STEM_NAMES[(args.stems - 1) % len(STEM_NAMES)]}.wav"
+        same_length = [t for t in entry['tracks'] if os.path.basename(t) != short]
+        exact = float(np.max(np.abs(np.array(lib.song_envelope(same_length)[0])
+                                    - np.array(legacy_form_envelope(same_length)[0]))))
+        check("envelope", len(from_db[0]) == len(from_form[0]) and from_db[1:] == tuple(from_form[1:])
+              and exact < 1e-4 and diff < ENVELOPE_TOLERANCE,
+              f"max diff {exact:.0e} ({diff:.3f} with a shorter stem); database {db_ms:.1f} ms, decoding {form_ms:.0f} ms")
+
+        npz_times = {}
+        opt_worker = None
+        warm_opt, opt_worker = optimize({'tracks': entry['tracks']})
+        for path in entry['tracks']:
+            npz = opt_worker._npz_path(path)
+            npz_times[path] = os.path.getmtime(npz) if os.path.exists(npz) else None
+        time.sleep(0.05)
+        warm_opt, _ = optimize({'tracks': entry['tracks']})
+        untouched = all(t is not None and os.path.getmtime(opt_worker._npz_path(p)) == t for p, t in npz_times.items())
+        outside_tracks = sorted(os.path.join(outside, n) for n in os.listdir(outside))
+        cold_opt, _ = optimize({'tracks': outside_tracks})
+        check("warm caches", untouched and all(t is not None for t in npz_times.values()),
+              f"optimizer {warm_opt * 1000:.0f} ms (cold copy {cold_opt * 1000:.0f} ms)")
+
+        # A rewritten stem, a deleted one, an offline folder
+        song3 = os.path.join(folder, song_dir_name(2))
+        rewritten = os.path.join(song3, "Guia.wav")
+        with open(rewritten, 'r+b') as f:
+            f.seek(-2000, os.SEEK_END)
+            f.write(os.urandom(2000))
+        os.remove(os.path.join(song3, "Click.wav"))
+        _, stats = timed_scan(lib)
+        stems3 = lib.song(song3)['stems']
+        other = os.path.join(work, 'Externo')
+        synth_library(other, 2, 2, 1.0)
+        lib.add_folder(other)
+        timed_scan(lib)
+        before = lib.stats()['stems']
+        shutil.move(other, other + "-desligado")
+        _, offline_stats = timed_scan(lib)
+        kept = lib.stats()['stems'] == before and offline_stats['removed'] == 0
+        check("changes", stats['changed'] == 1 and stats['analyzed'] == 1 and stats['removed'] == 1
+              and stems3 == args.stems - 1 and kept,
+              f"{stats['changed']} changed, {stats['analyzed']} analyzed, {stats['removed']} removed, offline kept: {kept}")
+
+        order = list(reversed(entry['tracks']))
+        remembered = lib.remember_song({'name': "Águas (ao vivo)", 'key': "D", 'bpm': "68", 'tracks': order})
+        again = lib.song(entry['dir'])
+        top = lib.search("")[0]
+        check("remember", remembered and again['name'] == "Águas (ao vivo)" and again['key'] == "D"
+              and again['tracks'] == order and top['dir'] == entry['dir'] and lib.search("ao vivo"),
+              f"uses {again['uses']}, first in the recent list: {top['dir'] == entry['dir']}")
+        lib.close()
+
+        results = {
+            'songs': args.songs, 'stems': stems, 'stem_seconds': args.seconds,
+            'cold_scan_s': cold, 'index_s': cold_stats['index_seconds'], 'rescan_ms': warm * 1000.0,
+            'search_ms': search_ms,
+            'pick': {'envelope_db_ms': db_ms, 'envelope_decode_ms': form_ms,
+                     'optimize_warm_ms': warm_opt * 1000.0, 'optimize_cold_ms': cold_opt * 1000.0},
+        }
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump({'checks': checks, 'results': results}, f, indent=2)
+        print(f"\nResults written to {args.out}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,160 @@
+# Checks and timing of the master lookahead limiter against the previous master path.
+#
+# Checks (the script exits 1 if one fails):
+#   - transparency: a mix under the ceiling comes out bit-exact, delayed by the lookahead;
+#   - ceiling: hot noise, sines and isolated transients never exceed the ceiling;
+#   - block size: the output is bit-identical however the signal is cut into blocks.
+# Then it times one block (default 2048 stereo frames) of the limiter against the previous master
+# path (masked soft limiter + block renormalization), interleaved in the same process:
+#
+#   python -m bench.limiter_bench
+#   python -m bench.limiter_bench --block 512 2048 --out limiter.json
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from bench import fake_sounddevice
+
+sys.modules['sounddevice'] = fake_sounddevice
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from audio.player import AudioPlayer  # noqa: E402
+from audio.limiter import LookaheadLimiter  # noqa: E402
+
+RATE = 44100
+CEILING = 0.99
+
+
+def legacy_master(block, threshold=CEILING):
+    """The master path before the lookahead limiter."""
+    block = AudioPlayer._apply_soft_limiter(None, block, threshold=threshold, knee_width=0.10)
+    max_val = np.max(np.abs(block))
+    if max_val > 1.0:
+        block = block * (1.0 / max_val)
+    return block
+
+
+def run_limiter(signal, block_sizes, channels=2):
+    limiter = LookaheadLimiter(channels, RATE, ceiling=CEILING)
+    out = np.empty_like(signal)
+    pos = 0
+    i = 0
+    while pos < len(signal):
+        n = min(block_sizes[i % len(block_sizes)], len(signal) - pos)
+        out[pos:pos + n] = limiter.process(signal[pos:pos + n].copy())
+        pos += n
+        i += 1
+    return out, limiter.latency
+
+
+def test_signals(seconds, seed=5):
+    rng = np.random.default_rng(seed)
+    n = int(seconds * RATE)
+    t = np.arange(n) / RATE
+    noise = rng.standard_normal((n, 2)).astype(np.float32) * 0.6
+    sine = np.stack([1.6 * np.sin(2 * np.pi * 110 * t), 1.2 * np.sin(2 * np.pi * 220 * t)], axis=1).astype(np.float32)
+    clicks = (0.3 * rng.standard_normal((n, 2))).astype(np.float32)
+    clicks[rng.integers(0, n, 40)] = 4.0  # Single-sample transients, the hardest case for a lookahead
+    burst = noise * 0.2
+    burst[n // 3:n // 3 + RATE // 10] *= 12.0  # 100 ms very loud passage inside a quiet one
+    return {'noise +6dB': noise, 'sines': sine, 'transients': clicks, 'burst': burst}
+
+
+def checks(seconds):
+    results = []
+    rng = np.random.default_rng(11)
+    ragged = [int(b) for b in rng.integers(1, 3000, 64)]
+
+    quiet = (rng.uniform(-0.9, 0.9, (int(seconds * RATE), 2))).astype(np.float32)
+    out, latency = run_limiter(quiet, [2048])
+    exact = bool(np.array_equal(out[latency:], quiet[:len(quiet) - latency])) and not np.any(out[:latency])
+    results.append(('transparent under the ceiling (bit-exact, delayed)', exact, f"latency {latency} frames"))
+
+    for name, signal in test_signals(seconds).items():
+        out, latency = run_limiter(signal, [2048])
+        peak = float(np.max(np.abs(out)))
+        results.append((f"ceiling: {name}", peak <= CEILING + 1e-6,
+                        f"in {np.max(np.abs(signal)):.2f} -> out {peak:.4f}"))
+        other, _ = run_limiter(signal, ragged)
+        diff = float(np.max(np.abs(other - out)))
+        results.append((f"block-size independent: {name}", diff == 0.0, f"max diff {diff:.1e}"))
+    return results
+
+
+def time_block(block_size, repeats, hot):
+    rng = np.random.default_rng(3)
+    level = 0.8 if hot else 0.3
+    blocks = [(rng.standard_normal((block_size, 2)) * level).astype(np.float32) for _ in range(16)]
+    limiter = LookaheadLimiter(2, RATE, ceiling=CEILING)
+    limiter.process(blocks[0].copy())
+    times = {'lookahead': [], 'legacy': []}
+    for r in range(repeats):
+        src = blocks[r % len(blocks)]
+        for name in ('lookahead', 'legacy') if r % 2 else ('legacy', 'lookahead'):
+            block = src.copy()
+            t0 = time.perf_counter()
+            if name == 'lookahead':
+                limiter.process(block)
+            else:
+                legacy_master(block)
+            times[name].append(time.perf_counter() - t0)
+
+    tracemalloc.start()
+    block = blocks[1].copy()
+    for _ in range(32):
+        block[:] = blocks[2]
+        limiter.process(block)
+    tracemalloc.reset_peak()
+    block[:] = blocks[3]
+    before = tracemalloc.get_traced_memory()[0]
+    limiter.process(block)
+    alloc = tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+    return {
+        'block': block_size,
+        'signal': 'hot' if hot else 'quiet',
+        'lookahead_us': float(np.median(times['lookahead']) * 1e6),
+        'legacy_us': float(np.median(times['legacy']) * 1e6),
+        'lookahead_alloc_bytes': int(alloc),
+        'deadline_us': block_size / RATE * 1e6,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Master lookahead limiter checks and timing")
+    parser.add_argument('--seconds', type=float, default=10.0, help="Length of the check signals")
+    parser.add_argument('--block', type=int, nargs='+', default=[2048])
+    parser.add_argument('--repeats', type=int, default=400)
+    parser.add_argument('--out', help="Write results as JSON to this path")
+    args = parser.parse_args(argv)
+
+    failed = False
+    check_rows = []
+    for name, ok, detail in checks(args.seconds):
+        failed = failed or not ok
+        check_rows.append({'check': name, 'ok': ok, 'detail': detail})
+        print(f"{name:<52} {detail:<28} {'OK' if ok else 'FAIL'}")
+
+    print()
+    timings = []
+    for block_size in args.block:
+        for hot in (False, True):
+            r = time_block(block_size, args.repeats, hot)
+            timings.append(r)
+            print(f"{r['block']:5d} frames {r['signal']:<5}  lookahead {r['lookahead_us']:7.1f} us  "
+                  f"legacy {r['legacy_us']:7.1f} us  (deadline {r['deadline_us']:.0f} us, "
+                  f"limiter allocates {r['lookahead_alloc_bytes']} bytes/block)")
+
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump({'checks': check_rows, 'timing': timings}, f, indent=2)
+        print(f"\nResults written to {args.out}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,174 @@
+# Peak memory of the stem optimizer (audio_opt cache) on a long synthetic WAV.
+#
+# Writes a stereo 16-bit stem of --minutes length (in chunks, so the bench itself stays small),
+# then measures the tracemalloc peak of the streaming optimizer and, optionally, of the previous
+# whole-array implementation on a shorter stem (it needs ~2.5x the decoded size in RAM).
+# It also optimizes a short 24-bit WAVE_FORMAT_EXTENSIBLE stem (the usual DAW export, which scipy
+# cannot memory-map) and compares the cache with scipy's whole-file read; the script exits 1 if
+# they differ:
+#
+#   python -m bench.optimize_memory --minutes 60
+#   python -m bench.optimize_memory --minutes 60 --legacy-minutes 5 --out optimize.json
+import argparse
+import json
+import os
+import struct
+import sys
+import tempfile
+import time
+import tracemalloc
+import wave
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scipy.io import wavfile  # noqa: E402
+from audio.wavstream import optimize_to_cache, CHUNK_FRAMES  # noqa: E402
+
+MB = 1024.0 * 1024.0
+
+
+def write_stem(path, minutes, rate=44100, chunk=CHUNK_FRAMES, seed=5):
+    """Noise + tone stem written chunk by chunk (peak above the 0.9 target, so pass 2 scales)."""
+    rng = np.random.default_rng(seed)
+    frames = int(minutes * 60 * rate)
+    with wave.open(path, 'wb') as w:
+        w.setnchannels(2)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        for start in range(0, frames, chunk):
+            n = min(chunk, frames - start)
+            t = (np.arange(start, start + n) / float(rate))[:, None]
+            x = 0.5 * np.sin(2 * np.pi * 220.0 * t) + 0.2 * rng.standard_normal((n, 2))
+            w.writeframesraw((np.clip(x, -1.0, 1.0) * 32767).astype('<i2').tobytes())
+    return frames
+
+
+def write_extensible_stem(path, seconds, rate=48000, seed=7):
+    """Stereo 24-bit PCM stem with a WAVE_FORMAT_EXTENSIBLE fmt chunk (peak above the 0.9 target)."""
+    rng = np.random.default_rng(seed)
+    frames = int(seconds * rate)
+    t = (np.arange(frames) / float(rate))[:, None]
+    x = np.clip(0.7 * np.sin(2 * np.pi * 110.0 * t) + 0.1 * rng.standard_normal((frames, 2)), -1.0, 1.0)
+    ints = np.round(x * 8388607).astype('<i4')
+    data = ints.view(np.uint8).reshape(-1, 4)[:, :3].tobytes()
+    pcm_guid = b'\x01\x00\x00\x00\x00\x00\x10\x00\x80\x00\x00\xaa\x00\x38\x9b\x71'
+    fmt = struct.pack('<HHIIHHHHI16s', 0xFFFE, 2, rate, rate * 6, 6, 24, 22, 24, 3, pcm_guid)
+    with open(path, 'wb') as f:
+        f.write(b'RIFF' + struct.pack('<I', 4 + 8 + len(fmt) + 8 + len(data)) + b'WAVE')
+        f.write(b'fmt ' + struct.pack('<I', len(fmt)) + fmt)
+        f.write(b'data' + struct.pack('<I', len(data)) + data)
+    return frames
+
+
+def run_extensible(workdir, seconds=10.0):
+    """Cache of a 24-bit extensible stem against scipy's (non memory-mapped) read of the same file."""
+    wav_path = os.path.join(workdir, "extensible.wav")
+    npz_path = os.path.join(workdir, "extensible.npz")
+    frames = write_extensible_stem(wav_path, seconds)
+    error = None
+    try:
+        optimize_to_cache(wav_path, npz_path)
+        _sr, expected = wavfile.read(wav_path)
+        expected = expected.astype(np.float32) / 2147483648.0
+        peak = float(np.max(np.abs(expected)))
+        expected = np.clip(expected * np.float32(0.90 / peak), -1.0, 1.0) if peak > 0.90 else expected
+        with np.load(npz_path) as data:
+            samples = data['samples']
+        diff = float(np.max(np.abs(samples - expected))) if samples.shape == expected.shape else float('inf')
+    except Exception as e:
+        error, diff = str(e), float('inf')
+    finally:
+        for p in (wav_path, npz_path):
+            try:
+                os.remove(p)
+            except Exception:
+                pass
+    return {'frames': frames, 'max_diff': diff, 'error': error, 'ok': error is None and diff < 1e-6}
+
+
+def legacy_optimize(path, npz_path):
+    """The previous AudioOptimizeWorker body: whole stem in memory, several full-size temporaries."""
+    sr, samples = wavfile.read(path)
+    if samples.dtype != np.float32 and samples.dtype != np.float64:
+        samples = samples.astype(np.float32) / 32768.0
+    if len(samples.shape) == 1:
+        samples = np.column_stack((samples, samples))
+    peak = float(np.max(np.abs(samples))) if samples.size > 0 else 0.0
+    if peak > 0.90:
+        samples = samples * (0.90 / peak)
+    samples = np.clip(samples, -1.0, 1.0)
+    np.savez(npz_path, samples=samples.astype(np.float32), sample_rate=int(sr))
+
+
+def measure(fn, *args):
+    tracemalloc.start()
+    try:
+        started = time.perf_counter()
+        fn(*args)
+        elapsed = time.perf_counter() - started
+        _current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak, elapsed
+
+
+def run(kind, minutes, workdir):
+    wav_path = os.path.join(workdir, f"{kind}.wav")
+    npz_path = os.path.join(workdir, f"{kind}.npz")
+    frames = write_stem(wav_path, minutes)
+    decoded = frames * 2 * 4  # float32 stereo
+    fn = optimize_to_cache if kind == 'streaming' else legacy_optimize
+    try:
+        peak, elapsed = measure(fn, wav_path, npz_path)
+        with np.load(npz_path) as data:
+            ok = data['samples'].shape == (frames, 2) if minutes <= 10 else True
+    finally:
+        for p in (wav_path, npz_path):
+            try:
+                os.remove(p)
+            except Exception:
+                pass
+    return {
+        'implementation': kind,
+        'minutes': minutes,
+        'decoded_mb': decoded / MB,
+        'peak_mb': peak / MB,
+        'peak_ratio': peak / float(decoded),
+        'seconds': elapsed,
+        'ok': bool(ok),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Peak memory of the stem optimizer")
+    parser.add_argument('--minutes', type=float, default=60.0, help="Stem length for the streaming optimizer")
+    parser.add_argument('--legacy-minutes', type=float, default=0.0,
+                        help="Also measure the whole-array implementation on a stem this long")
+    parser.add_argument('--dir', help="Scratch directory for the WAV/cache files (default: system temp)")
+    parser.add_argument('--out', help="Write results as JSON to this path")
+    args = parser.parse_args(argv)
+
+    results = []
+    with tempfile.TemporaryDirectory(dir=args.dir) as workdir:
+        runs = [('streaming', args.minutes)]
+        if args.legacy_minutes > 0:
+            runs = [('legacy', args.legacy_minutes), ('streaming', args.legacy_minutes)] + runs
+        for kind, minutes in runs:
+            r = run(kind, minutes, workdir)
+            results.append(r)
+            print(f"{kind:<10} {minutes:5.0f} min  decoded {r['decoded_mb']:8.1f} MB  "
+                  f"peak {r['peak_mb']:8.1f} MB ({r['peak_ratio']:.2f}x)  {r['seconds']:6.1f} s")
+        extensible = run_extensible(workdir)
+        detail = extensible['error'] or f"max diff {extensible['max_diff']:.0e} from scipy's read"
+        print(f"24-bit extensible: {detail}  {'OK' if extensible['ok'] else 'FAIL'}")
+
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump({'chunk_frames': CHUNK_FRAMES, 'runs': results, 'extensible': extensible}, f, indent=2)
+        print(f"\nResults written to {args.out}")
+    return 0 if extensible['ok'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
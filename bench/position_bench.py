@@ -0,0 +1,217 @@
+# Playback position changes in the audio callback (seek crossfade, AudioPlayer._render_block).
+#
+# Plays a ramp stem (sample k has the value k / 2**20, at unity volume with the limiter off, so the
+# output gives back the exact source index of every frame) through AudioPlayer's real
+# audio_callback and the fake sounddevice backend, one block at a time. Checks (the script exits 1
+# if one fails):
+#   - seek crossfade: a seek queued during playback lands at the next block; its first `xfade`
+#     frames are new * sin + old * cos (equal-power, old = where playback was), the rest of the
+#     block and the next one continue from the target sample;
+#   - loops (AudioPlayer._plan_segments): a loop longer than a block and one shorter than a block
+#     wrap at the exact sample, across and inside blocks;
+#   - armed jump: a jump armed at 120 BPM lands on the next bar line (sample 88200), and so does
+#     a saved loop recalled from outside its region (AudioPlayer.arm_loop_region);
+#   - loop and jump: an armed jump into a looped section and the loop wrap after it, inside
+#     one block, both apply in order.
+# Each case compares every output frame's source index with a frame-by-frame reference.
+#
+#   python -m bench.position_bench
+#   python -m bench.position_bench --blocksize 512 --out position.json
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+from bench import fake_sounddevice
+
+sys.modules['sounddevice'] = fake_sounddevice
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from audio.player import AudioPlayer  # noqa: E402
+from audio.timing import next_bar_boundary  # noqa: E402
+from audio.track import Track  # noqa: E402
+
+RATE = 44100
+SCALE = 2 ** 20  # Ramp step: indices below 2**20 (23 s) are exact in float32
+
+
+def ramp(start, frames):
+    return (np.arange(start, start + frames, dtype=np.float32) / np.float32(SCALE))
+
+
+def ramp_player(seconds):
+    player = AudioPlayer()
+    frames = min(int(seconds * RATE), SCALE - 1)
+    samples = np.repeat(ramp(0, frames)[:, None], 2, axis=1)
+    player.tracks = [Track("ramp.wav", RATE, samples, volume=1.0)]
+    player.set_limiter_enabled(False)
+    player.set_auto_tune(False)
+    return player
+
+
+def indices(out):
+    """Source index of every output frame of a ramp stem."""
+    return np.rint(np.asarray(out, dtype=np.float64) * SCALE).astype(np.int64)
+
+
+def reference(position, frames, loop=None, jump=None):
+    """Source indices of `frames` frames played from position one frame at a time: an armed jump
+    (at, target) fires once playback reaches `at` (before a loop wrap at the same frame), a loop
+    (start, end) wraps when playback reaches its end."""
+    out = []
+    while len(out) < frames:
+        if jump is not None and position >= jump[0]:
+            position, jump = jump[1], None
+        elif loop is not None and position == loop[1]:
+            position = loop[0]
+        else:
+            out.append(position)
+            position += 1
+    return np.asarray(out, dtype=np.int64)
+
+
+class Playback:
+    """A player's stream callback driven by hand; block() returns the next outdata (left channel)."""
+
+    def __init__(self, player, blocksize):
+        self.player = player
+        player.fixed_level = (int(blocksize), 'high')
+        previous = len(fake_sounddevice.streams)
+        player.play_all()
+        self.stream = fake_sounddevice.wait_for_stream(previous)
+        if self.stream is None:
+            player.stop()
+            raise RuntimeError("Player did not open a stream")
+        self.outdata = np.zeros((int(self.stream.blocksize), 2), dtype=np.float32)
+
+    def block(self):
+        self.stream.callback(self.outdata, len(self.outdata), None, None)
+        return self.outdata[:, 0].copy()
+
+    def blocks(self, count):
+        return np.concatenate([self.block() for _ in range(count)])
+
+    def close(self):
+        self.player.stop()
+
+
+def seek_checks(blocksize, seconds=10.0):
+    player = ramp_player(seconds)
+    playback = Playback(player, blocksize)
+    n = len(playback.outdata)
+    try:
+        for _ in range(4):
+            playback.block()
+        old = player.current_position
+        target = int(RATE * 5.0) + 123
+        player.seek_to_sample(target)
+        first, second = playback.block(), playback.block()
+    finally:
+        playback.close()
+
+    xfade = min(n, int(RATE * player.seek_crossfade_ms / 1000.0))
+    t = (np.arange(xfade, dtype=np.float32) + 0.5) / np.float32(xfade)
+    fade_in = np.sin(t * (np.pi / 2.0)).astype(np.float32)
+    fade_out = np.cos(t * (np.pi / 2.0)).astype(np.float32)
+    reference = ramp(target, xfade) * fade_in + ramp(old, xfade) * fade_out
+    err = float(np.max(np.abs(first[:xfade] - reference)))
+    follows = np.array_equal(first[xfade:], ramp(target + xfade, n - xfade)) and \
+        np.array_equal(second, ramp(target + n, n))
+    return [
+        ('seek crossfade', err < 1e-6, f"{xfade} frames from {old} into {target}, max diff {err:.1e}"),
+        ('seek continues', follows, f"rest of the block and the next from {target + xfade}"),
+    ]
+
+
+def run_case(blocksize, position, blocks, loop=None, bpm=None, jump_to=None, armed_loop=None):
+    """Play from position with a loop region and/or a bar-quantized jump armed before the first
+    block, or a loop region entered at the next bar (armed_loop, as a saved loop is recalled).
+    Returns (played indices, reference indices, armed jump)."""
+    player = ramp_player(10.0)
+    player.seek_to_sample(position)
+    if bpm is not None:
+        player.set_tempo(bpm)
+    playback = Playback(player, blocksize)
+    try:
+        if loop is not None and not player.set_loop_region(*loop):
+            raise RuntimeError(f"Loop {loop} was refused")
+        jump = None
+        if jump_to is not None:
+            if not player.arm_jump(jump_to):
+                raise RuntimeError("Jump was not armed")
+            jump = player._armed_jump
+        if armed_loop is not None:
+            if not player.arm_loop_region(*armed_loop):
+                raise RuntimeError(f"Loop {armed_loop} was refused")
+            loop, jump = player.loop_region, player._armed_jump
+        played = indices(playback.blocks(blocks))
+    finally:
+        playback.close()
+    return played, reference(position, len(played), loop, jump), jump
+
+
+def loop_checks(blocksize):
+    results = []
+    for name, loop in (('loop over blocks', (12000, 17000)), ('loop inside a block', (30000, 30000 + blocksize // 3))):
+        position = loop[0] - 2 * blocksize // 3
+        played, expected, _ = run_case(blocksize, position, 3 * (loop[1] - loop[0]) // blocksize + 8, loop=loop)
+        wraps = int(np.count_nonzero(np.diff(expected) < 0))
+        results.append((name, np.array_equal(played, expected),
+                         f"{loop[1] - loop[0]}-frame loop, {wraps} wraps over {len(played)} frames"))
+    return results
+
+
+def jump_checks(blocksize, bpm=120.0):
+    results = []
+    position, target = 0, int(RATE * 7.0)
+    played, expected, jump = run_case(blocksize, position, 88200 // blocksize + 4, bpm=bpm, jump_to=target)
+    bar = next_bar_boundary(position, bpm, RATE, guard=2048)
+    lands = jump == (bar, target) and bar == 88200 and np.array_equal(played, expected)
+    results.append(('armed jump on the bar', lands, f"armed {jump}, bar line {bar}"))
+
+    # Jump into the last frames of a looped section: the jump fires on the bar line a quarter into
+    # its block and the loop wraps a third of a block later, in the same block
+    bar = 88200
+    loop = (target - 3000, target + blocksize // 3)
+    position = bar - (2048 // blocksize + 1) * blocksize - blocksize // 4
+    played, expected, jump = run_case(blocksize, position, 2048 // blocksize + 4, loop=loop, bpm=bpm, jump_to=target)
+    wrap = int(np.flatnonzero(np.diff(expected) < 0)[0])
+    jumped = int(np.flatnonzero(expected == target)[0])
+    same = wrap // blocksize == jumped // blocksize
+    results.append(('loop and jump in a block', same and jump[0] == bar and np.array_equal(played, expected),
+                    f"wrap at frame {wrap}, jump at frame {jumped} (block {jumped // blocksize})"))
+
+    # A saved loop recalled from outside its region: entered at the next bar line, then looped
+    loop = (int(RATE * 6.0), int(RATE * 6.0) + 5000)
+    played, expected, jump = run_case(blocksize, 0, (88200 + 12000) // blocksize + 2, bpm=bpm, armed_loop=loop)
+    results.append(('saved loop at the bar', jump == (88200, loop[0]) and np.array_equal(played, expected),
+                    f"armed {jump}, loop {loop}"))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Playback position changes in the audio callback")
+    parser.add_argument('--blocksize', type=int, default=777, help="Stream block size of the driven callback")
+    parser.add_argument('--out', help="Write results as JSON to this path")
+    args = parser.parse_args(argv)
+
+    results = seek_checks(args.blocksize)
+    results += loop_checks(args.blocksize)
+    results += jump_checks(args.blocksize)
+
+    failed = False
+    for name, ok, detail in results:
+        failed = failed or not ok
+        print(f"{name:<28} {detail:<60} {'OK' if ok else 'FAIL'}")
+
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump({'blocksize': args.blocksize,
+                       'checks': [{'check': n, 'ok': bool(ok), 'detail': d} for n, ok, d in results]}, f, indent=2)
+        print(f"\nResults written to {args.out}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
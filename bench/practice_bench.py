@@ -0,0 +1,241 @@
+# Checks and CPU cost of practice mode (time-stretched playback, audio/practice.py).
+#
+# Checks (the script exits 1 if one fails):
+#   - pitch: a stretched tone keeps its frequency, and the output is 1/speed as long;
+#   - metronome: the clicks replacing the click stem are one beat / speed apart;
+#   - position: the song position reported while playing advances by speed per output frame;
+#   - switch: an engine priming while the callback still plays at normal speed (HPF on every
+#     track) leaves the callback's mix bit-identical and its filters never restart, and the first
+#     practice block crossfades from the live mix (no step larger than the song's own).
+# Then it reports the CPU time of stretching one stereo stem per second of output (what a
+# per-stem stretch would cost for each stem) and of the whole producer step (mixing N stems,
+# stretching the mixed bus once and adding the metronome), as a share of real time:
+#
+#   python -m bench.practice_bench
+#   python -m bench.practice_bench --speeds 0.9 0.8 --tracks 8 32 --out practice.json
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from bench import fake_sounddevice
+
+sys.modules['sounddevice'] = fake_sounddevice
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from audio.player import AudioPlayer  # noqa: E402
+from audio.practice import PracticeEngine, PRACTICE_HOP  # noqa: E402
+from audio.dsp import TrackDSP  # noqa: E402
+from audio.track import Track  # noqa: E402
+from audio.transpose import PhaseVocoder  # noqa: E402
+from bench.audio_bench import synth_tracks  # noqa: E402
+
+RATE = 44100
+BPM = 120.0
+
+
+def song_player(tracks, seconds, click=True):
+    """Player with synthetic stems; the first one is named as a click stem at BPM."""
+    player = AudioPlayer()
+    stems = synth_tracks(tracks, seconds, RATE)
+    if click:
+        stems[0] = Track("Click.wav", RATE, stems[0].samples, left_hint=True)
+    player.tracks = stems
+    player.set_tempo(BPM)
+    return player
+
+
+def run_engine(player, speed, frames):
+    """Drive the producer directly (no thread) and read its output like the callback does."""
+    engine = PracticeEngine(player, speed, 2, 0)
+    out = []
+    produced = 0
+    while produced < frames and not engine._at_end:
+        block = engine._produce()
+        if block is not None:
+            engine.ring.write(block)
+            buf = np.zeros((len(block), 2), dtype=np.float32)
+            engine.render(buf, len(block))
+            out.append(buf)
+            produced += len(block)
+    return engine, np.concatenate(out)
+
+
+def dominant_hz(x):
+    spec = np.abs(np.fft.rfft(x * np.hanning(len(x))))
+    k = int(np.argmax(spec[1:])) + 1
+    # Parabolic interpolation of the peak bin
+    a, b, c = np.log(spec[k - 1:k + 2] + 1e-12)
+    return (k + 0.5 * (a - c) / (a - 2 * b + c)) * RATE / len(x)
+
+
+def checks(speeds):
+    results = []
+    n = RATE * 4
+    t = np.arange(n) / RATE
+    tone = np.stack([0.4 * np.sin(2 * np.pi * 440.0 * t)] * 2, axis=1)
+    for speed in speeds:
+        hop_a = int(round(PRACTICE_HOP * speed))
+        vocoder = PhaseVocoder(2, hop_a, PRACTICE_HOP)
+        blocks = [b for b in (vocoder.feed(tone[i:i + 2048]) for i in range(0, n, 2048)) if b is not None]
+        blocks += vocoder.flush(n)
+        y = np.concatenate(blocks)
+        hz = dominant_hz(y[RATE:3 * RATE, 0])
+        ratio = len(y) / float(n)
+        ok = abs(hz - 440.0) < 1.0 and abs(ratio - PRACTICE_HOP / float(hop_a)) < 0.05
+        results.append((f"pitch and length at {speed:.2f}", ok, f"{hz:.1f} Hz, x{ratio:.3f}"))
+
+        player = song_player(2, 12)
+        player.set_mute(1, True)  # Only the metronome left
+        engine, y = run_engine(player, speed, int(10 * RATE / speed))
+        env = np.abs(y[:, 0])
+        onsets = np.flatnonzero((env[1:] > 0.2) & (env[:-1] <= 0.2))
+        onsets = onsets[np.insert(np.diff(onsets) > RATE // 10, 0, True)]
+        expected = RATE * 60.0 / BPM / engine.speed
+        # Same click sound a bar apart (accent and beat clicks cross the threshold at other phases)
+        bar = player.beats_per_bar
+        spacing = (onsets[bar:] - onsets[:-bar]) / float(bar)
+        ok = len(spacing) > 4 and float(np.max(np.abs(spacing - expected))) * bar < 2.0
+        results.append((f"metronome at {speed:.2f}", ok, f"{np.mean(spacing):.1f} vs {expected:.1f} frames"))
+
+        played = len(y)
+        drift = abs(engine.position - played * engine.speed)
+        results.append((f"position at {speed:.2f}", drift <= 1.0, f"off by {drift:.1f} frames"))
+    return results
+
+
+def tone_player(tracks=4, seconds=8):
+    """Player of sine stems with a high-pass insert on every track (filter state in every block)."""
+    player = AudioPlayer()
+    t = np.arange(int(seconds * RATE)) / RATE
+    stems = []
+    for k in range(tracks):
+        x = (0.15 * np.sin(2 * np.pi * (110.0 + 30.0 * k) * t)).astype(np.float32)
+        stems.append(Track(f"Tom {k + 1}.wav", RATE, np.stack([x, x], axis=1)))
+    player.tracks = stems
+    player.limiter_enabled = False
+    for i in range(tracks):
+        player.set_track_dsp(i, {"hpf": 60.0})
+    return player
+
+
+def switch_checks(speed, block=512):
+    """Going from normal speed to practice while playing, with the producer and the callback
+    interleaved: compared with a player that never switches."""
+    player, reference = tone_player(), tone_player()
+    chains = {id(c) for c in player.params.dsp}
+    restarts = [0]
+    process = TrackDSP.process
+
+    def counted_process(chain, data, position):
+        if id(chain) in chains and chain._position is not None and position != chain._position:
+            restarts[0] += 1
+        return process(chain, data, position)
+
+    def render(p):
+        out = np.zeros((block, 2), dtype=np.float32)
+        p._render_block(out, block, 2)
+        return out
+
+    TrackDSP.process = counted_process
+    try:
+        live = [render(player) for _ in range(20)]
+        for _ in range(20):
+            render(reference)
+        player.practice_speed = speed
+        engine = PracticeEngine(player, speed, 2, player.current_position)
+        engine.from_live = True
+        identical = True
+        while engine.ring.available() < 2 * block:
+            produced = engine._produce()
+            if produced is not None:
+                engine.ring.write(produced)
+            a, b = render(player), render(reference)
+            identical = identical and np.array_equal(a, b)
+            live.append(a)
+        player._practice = engine
+        first = render(player)
+    finally:
+        TrackDSP.process = process
+    y = np.concatenate(live + [first])[:, 0]
+    steps = np.abs(np.diff(y))
+    steady, switch = float(steps[:-block].max()), float(steps[-block - 1:].max())
+    return [
+        (f"switch mix at {speed:.2f}", identical and restarts[0] == 0,
+         f"{'identical' if identical else 'changed'}, {restarts[0]} filter restarts"),
+        (f"switch fade at {speed:.2f}", switch <= steady, f"step {switch:.4f} (song {steady:.4f})"),
+    ]
+
+
+def time_stem(speed, seconds):
+    """CPU time to stretch one stereo stem, per second of stretched output."""
+    rng = np.random.default_rng(7)
+    n = int(seconds * RATE)
+    stem = (0.2 * rng.standard_normal((n, 2))).astype(np.float32)
+    vocoder = PhaseVocoder(2, int(round(PRACTICE_HOP * speed)), PRACTICE_HOP)
+    produced = 0
+    t0 = time.perf_counter()
+    for i in range(0, n, 2048):
+        block = vocoder.feed(stem[i:i + 2048])
+        if block is not None:
+            produced += len(block)
+    elapsed = time.perf_counter() - t0
+    return elapsed / (produced / float(RATE))
+
+
+def time_engine(tracks, speed, seconds):
+    """CPU time of the producer (mix, stretch, metronome) per second of output, and its worst step."""
+    player = song_player(tracks, seconds)
+    engine = PracticeEngine(player, speed, 2, 0)
+    steps = []
+    produced = 0
+    while not engine._at_end:
+        t0 = time.perf_counter()
+        block = engine._produce()
+        steps.append(time.perf_counter() - t0)
+        if block is not None:
+            produced += len(block)
+    return sum(steps) / (produced / float(RATE)), max(steps[8:] or steps)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Practice mode (time-stretch) checks and CPU cost")
+    parser.add_argument('--speeds', type=float, nargs='+', default=[0.9, 0.8, 0.75])
+    parser.add_argument('--tracks', type=int, nargs='+', default=[8, 16, 32])
+    parser.add_argument('--seconds', type=float, default=20.0, help="Length of the timed stems")
+    parser.add_argument('--out', help="Write results as JSON to this path")
+    args = parser.parse_args(argv)
+
+    failed = False
+    check_rows = []
+    for name, ok, detail in checks(args.speeds) + switch_checks(args.speeds[0]):
+        failed = failed or not ok
+        check_rows.append({'check': name, 'ok': ok, 'detail': detail})
+        print(f"{name:<28} {detail:<32} {'OK' if ok else 'FAIL'}")
+
+    print()
+    timings = []
+    for speed in args.speeds:
+        per_stem = time_stem(speed, args.seconds)
+        print(f"speed {speed:.2f}: stretching one stereo stem costs {per_stem * 1000.0:6.1f} ms CPU "
+              f"per second of output ({100.0 * per_stem:4.1f}% of a core)")
+        for tracks in args.tracks:
+            cost, worst = time_engine(tracks, speed, args.seconds)
+            timings.append({'speed': speed, 'tracks': tracks, 'stem_stretch_ms_per_s': per_stem * 1000.0,
+                            'engine_ms_per_s': cost * 1000.0, 'engine_worst_step_ms': worst * 1000.0,
+                            'per_stem_stretch_ms_per_s': per_stem * 1000.0 * tracks})
+            print(f"  {tracks:3d} stems: producer {cost * 1000.0:6.1f} ms/s ({100.0 * cost:4.1f}% of a core, "
+                  f"worst step {worst * 1000.0:5.1f} ms); stretching each stem would be "
+                  f"{per_stem * tracks * 1000.0:7.1f} ms/s")
+
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump({'checks': check_rows, 'timing': timings}, f, indent=2)
+        print(f"\nResults written to {args.out}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
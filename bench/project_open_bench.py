@@ -0,0 +1,281 @@
+# Time to interactive of opening a project, staged (ui/project_open.py) against the previous
+# synchronous open (cards with their banners, then the first song's stems, all on the GUI thread).
+#
+# Builds a synthetic project: N songs of M mono WAV stems with a banner each. The stems of one song
+# are moved to another folder and one stem of another song is deleted. Each open runs in a fresh
+# process (offscreen Qt, fake sounddevice, empty audio cache) and reports, from the start of the
+# open: first card, all cards, file check done and first song selected and loaded (interactive),
+# plus how long the open call blocked the GUI thread and the longest event-loop stall until it
+# was interactive. The staged run also checks (the script exits 1 if one fails):
+#   - the missing stems are reported up front: all of them and nothing else;
+#   - the moved stems get their new paths as suggestions and the deleted one gets none;
+#   - relinking points the songs at the new paths, moves the card and autosaves the song;
+#   - every card got its banner.
+#
+#   python -m bench.project_open_bench
+#   python -m bench.project_open_bench --songs 40 --runs 5 --out project_open.json
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+STEM_NAMES = ("Click", "Guia", "Bateria", "Baixo", "Guitarra", "Teclas", "Vozes", "Pad")
+MOVED_SONG = 5
+DELETED_SONG = 9
+
+
+def synth_project(folder, songs, stems, seconds, sample_rate=44100):
+    """Write the project, its stems and banners; returns (project path, expectations)."""
+    from scipy.io import wavfile
+    from PyQt5.QtGui import QImage, QColor, QGuiApplication
+    app = QGuiApplication.instance() or QGuiApplication(['bench', '-platform', 'offscreen'])
+    rng = np.random.default_rng(5)
+    song_list = []
+    for i in range(songs):
+        song_dir = os.path.join(folder, 'stems', f"{i + 1:02d} - Musica {i + 1}")
+        os.makedirs(song_dir, exist_ok=True)
+        tracks = []
+        for k in range(stems):
+            name = STEM_NAMES[k % len(STEM_NAMES)] + ("" if k < len(STEM_NAMES) else f" {k}")
+            path = os.path.join(song_dir, f"{name}.wav")
+            data = (rng.standard_normal(int(seconds * sample_rate)) * 3000).astype(np.int16)
+            wavfile.write(path, sample_rate, data)
+            tracks.append(path)
+        banner = os.path.join(folder, 'banners', f"{i + 1:02d}.png")
+        os.makedirs(os.path.dirname(banner), exist_ok=True)
+        image = QImage(1920, 1080, QImage.Format_RGB32)
+        image.fill(QColor.fromHsv((i * 37) % 360, 160, 200))
+        image.save(banner)
+        song_list.append({"name": f"Música {i + 1}", "key": "G", "bpm": 70 + i, "tracks": tracks,
+                          "banner_image": banner})
+    path = os.path.join(folder, 'Culto.wproj')
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({"version": 1, "worship": {"name": "Culto", "date": "2026-10-19"}, "songs": song_list}, f)
+    moved = {}
+    if songs > MOVED_SONG:
+        old_dir = os.path.dirname(song_list[MOVED_SONG]["tracks"][0])
+        new_dir = os.path.join(folder, 'movidas', os.path.basename(old_dir))
+        os.makedirs(os.path.dirname(new_dir), exist_ok=True)
+        shutil.move(old_dir, new_dir)
+        moved = {t: os.path.join(new_dir, os.path.basename(t)) for t in song_list[MOVED_SONG]["tracks"]}
+    deleted = []
+    if songs > DELETED_SONG:
+        deleted = [song_list[DELETED_SONG]["tracks"][-1]]
+        os.remove(deleted[0])
+    del app
+    return path, {'moved': moved, 'deleted': deleted}
+
+
+def legacy_open(window, path):
+    """The synchronous open this replaces."""
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    window.worship_data = data.get("worship", {})
+    window.songs = data.get("songs", [])
+    window.create_main_view()
+    window.project_path = path
+    window.autosave.start(path, saved=True)
+    for song in window.songs:
+        window.tracks_panel.add_song_card(song.get("name"), song.get("key"), song.get("bpm"),
+                                          song.get("banner_image"), song)
+    if window.songs:
+        window.on_song_selected(window.songs[0])
+    window.tracks_panel.start_optimization_for_all_songs(window.songs)
+
+
+def child(mode, project, expect_path):
+    """One open in this process; prints the result as JSON."""
+    from bench import fake_sounddevice
+    sys.modules['sounddevice'] = fake_sounddevice
+    from PyQt5.QtWidgets import QApplication
+    app = QApplication([sys.argv[0]])
+    from ui.main_window import MainWindow
+    import ui.tracks_panel  # noqa: F401  (preloaded after the first frame in the app)
+    import ui.project_open  # noqa: F401
+    window = MainWindow()
+    window.show()
+    for _ in range(20):
+        app.processEvents()
+    with open(expect_path, encoding='utf-8') as f:
+        expect = json.load(f)
+
+    started = time.perf_counter()
+    result = {'mode': mode}
+    if mode == 'old':
+        legacy_open(window, project)
+        blocked = time.perf_counter() - started
+        result.update(blocked_ms=blocked * 1000.0, max_stall_ms=blocked * 1000.0)
+        for stage in ('first_card', 'cards', 'first_song'):
+            result[f'{stage}_ms'] = blocked * 1000.0
+        result['checked_ms'] = None
+    else:
+        window.load_project_file(project)
+        result['blocked_ms'] = (time.perf_counter() - started) * 1000.0
+        opener = window.project_opener
+        stall = 0.0
+        deadline = time.monotonic() + 120.0
+        while time.monotonic() < deadline:
+            t0 = time.perf_counter()
+            interactive = 'first_song' in opener.timings
+            app.processEvents()
+            if not interactive:
+                stall = max(stall, time.perf_counter() - t0)
+            if all(k in opener.timings for k in ('cards', 'checked', 'first_song')) and opener._thread is None:
+                break
+            time.sleep(0.0005)
+        result['max_stall_ms'] = max(stall * 1000.0, result['blocked_ms'])
+        for stage in ('first_card', 'cards', 'checked', 'first_song'):
+            t = opener.timings.get(stage)
+            result[f'{stage}_ms'] = None if t is None else t * 1000.0
+        result['checks'] = staged_checks(app, window, opener, expect)
+    result['first_song_tracks'] = len(window.tracks_panel.audio_manager.current_player.tracks) \
+        if window.tracks_panel.audio_manager.current_player else 0
+    print(json.dumps(result))
+    sys.stdout.flush()
+    os._exit(0)  # Optimizer threads are still running: leave without tearing them down
+
+
+def staged_checks(app, window, opener, expect):
+    from ui.project_open import MissingStemsDialog
+    checks = []
+    report = opener.report or {}
+    expected_missing = set(expect['moved']) | set(expect['deleted'])
+    checks.append(("missing reported", set(report.get('missing', [])) == expected_missing
+                   and set(report.get('problems', {})) == expected_missing,
+                   f"{len(report.get('missing', []))} of {len(expected_missing)} in {report.get('seconds', 0) * 1000:.0f} ms"))
+    suggestions = report.get('suggestions', {})
+    ok = all(suggestions.get(old) == new for old, new in expect['moved'].items()) \
+        and not any(p in suggestions for p in expect['deleted'])
+    checks.append(("suggestions", ok, f"{len(suggestions)} suggested, {len(expect['moved'])} moved"))
+
+    cards = window.tracks_panel.song_cards
+    banners = sum(1 for c in cards if c.banner_pixmap is not None and not c.banner_pixmap.isNull())
+    checks.append(("banners", len(cards) == len(window.songs) and banners == len(cards), f"{banners}/{len(window.songs)}"))
+
+    dialog = window.findChild(MissingStemsDialog)
+    relinked = False
+    if dialog is not None and expect['moved']:
+        song = window.songs[MOVED_SONG]
+        dialog.apply()
+        app.processEvents()
+        card = window.tracks_panel.song_card_map.get(window.tracks_panel._get_song_id(song))
+        relinked = (song["tracks"] == [expect['moved'][t] for t in expect['moved']]
+                    and card is not None and card.missing_stems == 0
+                    and window.autosave.is_dirty())
+    deleted_card = window.tracks_panel.song_card_map.get(window.tracks_panel._get_song_id(window.songs[DELETED_SONG])) \
+        if expect['deleted'] else None
+    relinked = relinked and (deleted_card is None or deleted_card.missing_stems == 1)
+    checks.append(("relink", relinked or not expect['moved'], "moved song relinked, card and autosave updated"))
+    return checks
+
+
+def run_once(mode, project, expect_path):
+    env = dict(os.environ)
+    env.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    # Fresh audio cache and app data (no recovery prompt) per run
+    scratch = tempfile.mkdtemp(prefix="project_open_run_")
+    env['XDG_CACHE_HOME'] = os.path.join(scratch, 'cache')
+    env['XDG_DATA_HOME'] = os.path.join(scratch, 'data')
+    env['XDG_CONFIG_HOME'] = os.path.join(scratch, 'config')
+    try:
+        proc = subprocess.run([sys.executable, '-m', 'bench.project_open_bench', '--child', mode,
+                               '--project', project, '--expect', expect_path],
+                              cwd=ROOT, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                              universal_newlines=True, timeout=300)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    for line in reversed(proc.stdout.splitlines()):
+        if line.startswith('{'):
+            return json.loads(line)
+    raise RuntimeError(f"{mode} run printed no result (exit {proc.returncode}):\n{proc.stderr[-2000:]}")
+
+
+def median(values):
+    values = sorted(v for v in values if v is not None)
+    if not values:
+        return None
+    mid = len(values) // 2
+    return values[mid] if len(values) % 2 else 0.5 * (values[mid - 1] + values[mid])
+
+
+def fmt(ms):
+    return "      -" if ms is None else f"{ms:7.1f}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time to interactive of opening a project")
+    parser.add_argument('--songs', type=int, default=20)
+    parser.add_argument('--stems', type=int, default=8, help="Stems per song")
+    parser.add_argument('--seconds', type=float, default=10.0, help="Length of each stem")
+    parser.add_argument('--runs', type=int, default=3, help="Runs per mode (alternating)")
+    parser.add_argument('--out', help="Write results as JSON to this path")
+    parser.add_argument('--child', choices=('old', 'new'), help=argparse.SUPPRESS)
+    parser.add_argument('--project', help=argparse.SUPPRESS)
+    parser.add_argument('--expect', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.child:
+        return child(args.child, args.project, args.expect)
+
+    folder = tempfile.mkdtemp(prefix="project_open_bench_")
+    failed = False
+    try:
+        os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+        project, expect = synth_project(folder, args.songs, args.stems, args.seconds)
+        expect_path = os.path.join(folder, 'expect.json')
+        with open(expect_path, 'w', encoding='utf-8') as f:
+            json.dump(expect, f)
+        print(f"{args.songs} songs x {args.stems} stems of {args.seconds:.0f} s, "
+              f"{len(expect['moved'])} moved, {len(expect['deleted'])} deleted")
+        print(f"{'':10} {'blocked':>7} {'stall':>7} {'1st card':>8} {'cards':>7} {'checked':>7} {'interactive':>11}  (ms)")
+        runs = {'old': [], 'new': []}
+        for i in range(max(1, args.runs)):
+            for mode in (('old', 'new') if i % 2 == 0 else ('new', 'old')):
+                r = run_once(mode, project, expect_path)
+                runs[mode].append(r)
+                print(f"{mode} run {i + 1}: {fmt(r['blocked_ms'])} {fmt(r['max_stall_ms'])} {fmt(r['first_card_ms']):>8} "
+                      f"{fmt(r['cards_ms'])} {fmt(r['checked_ms'])} {fmt(r['first_song_ms']):>11}")
+        summary = {}
+        for mode, rows in runs.items():
+            summary[mode] = {k: median([r[k] for r in rows])
+                             for k in ('blocked_ms', 'max_stall_ms', 'first_card_ms', 'cards_ms', 'checked_ms', 'first_song_ms')}
+        print()
+        for mode in ('old', 'new'):
+            s = summary[mode]
+            print(f"{mode} median: {fmt(s['blocked_ms'])} {fmt(s['max_stall_ms'])} {fmt(s['first_card_ms']):>8} "
+                  f"{fmt(s['cards_ms'])} {fmt(s['checked_ms'])} {fmt(s['first_song_ms']):>11}")
+
+        print()
+        check_rows = []
+        for r in runs['new']:
+            for name, ok, detail in r['checks']:
+                failed = failed or not ok
+                check_rows.append({'check': name, 'ok': ok, 'detail': detail})
+        for row in check_rows[:len(runs['new'][0]['checks'])]:
+            print(f"{row['check']:<18} {row['detail']:<48} {'OK' if row['ok'] else 'FAIL'}")
+        if any(not row['ok'] for row in check_rows):
+            print("FAIL: a staged open check failed")
+        tracks = {r['first_song_tracks'] for rows in runs.values() for r in rows}
+        if len(tracks) != 1 or 0 in tracks:
+            print(f"FAIL: the first song did not load the same stems in both modes ({sorted(tracks)})")
+            failed = True
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump({'summary': summary, 'runs': runs, 'checks': check_rows}, f, indent=2)
+        print(f"\nResults written to {args.out}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,128 @@
+# Offline mix export (audio/render.py) against the live audio callback, and its speed.
+#
+# Plays synthetic stems (one with an HPF/pan insert) through AudioPlayer's real audio_callback and
+# the fake sounddevice backend at the stream block size, captures every outdata block, and renders
+# the same mix offline with render_blocks() from an offline_player() copy (what an export uses).
+# Checks (the script exits 1 if one fails):
+#   - callback: the offline blocks are bit-identical to the captured outdata once the limiter's
+#     lookahead (master_latency()) is taken off it, with LR and the limiter on and off;
+#   - block size: renders at different block sizes are bit-identical.
+# Then it reports how much faster than real time a render runs:
+#
+#   python -m bench.render_bench
+#   python -m bench.render_bench --tracks 16 --seconds 60 --out render.json
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from bench import fake_sounddevice
+
+sys.modules['sounddevice'] = fake_sounddevice
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from audio.player import AudioPlayer  # noqa: E402
+from audio.render import RENDER_BLOCK, offline_player, render_blocks  # noqa: E402
+from bench.audio_bench import synth_tracks  # noqa: E402
+
+RATE = 44100
+BLOCK_SIZES = (RENDER_BLOCK, 2048, 777)
+
+
+def song_player(tracks, seconds, lr, limiter):
+    player = AudioPlayer()
+    player.tracks = synth_tracks(tracks, seconds, RATE)
+    player.set_track_dsp(0, {"hpf": 80.0, "pan": -0.3})
+    player.set_lr_mode(lr)
+    player.set_limiter_enabled(limiter)
+    return player
+
+
+def capture_callback(player, blocksize):
+    """Every outdata block of a whole playback, driven through the player's stream callback."""
+    player.set_auto_tune(False)
+    player.fixed_level = (int(blocksize), 'high')
+    previous = len(fake_sounddevice.streams)
+    player.play_all()
+    stream = fake_sounddevice.wait_for_stream(previous)
+    if stream is None:
+        player.stop()
+        raise RuntimeError("Player did not open a stream")
+    outdata = np.zeros((int(stream.blocksize), int(stream.channels or 2)), dtype=np.float32)
+    blocks = []
+    try:
+        while True:
+            try:
+                stream.callback(outdata, len(outdata), None, None)
+            except fake_sounddevice.CallbackStop:
+                blocks.append(outdata.copy())
+                break
+            blocks.append(outdata.copy())
+        latency = player.master_latency()
+    finally:
+        player.stop()
+    return np.concatenate(blocks), latency
+
+
+def render(source, block_size):
+    return np.concatenate(list(render_blocks(offline_player(source), block_size)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline export against the live callback, and its speed")
+    parser.add_argument('--tracks', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=10.0, help="Stem length")
+    parser.add_argument('--blocksize', type=int, default=2048, help="Stream block size of the captured playback")
+    parser.add_argument('--out', help="Write results as JSON to this path")
+    args = parser.parse_args(argv)
+
+    failed = False
+    checks = []
+
+    def check(name, ok, detail):
+        nonlocal failed
+        failed = failed or not ok
+        checks.append({'check': name, 'ok': bool(ok), 'detail': detail})
+        print(f"{name:<28} {detail:<52} {'OK' if ok else 'FAIL'}")
+
+    timings = []
+    for lr, limiter in itertools.product((False, True), (True, False)):
+        label = f"lr {'on' if lr else 'off'}, limiter {'on' if limiter else 'off'}"
+        player = song_player(args.tracks, args.seconds, lr, limiter)
+        length = player._song_length()
+        offline = render(player, RENDER_BLOCK)
+        live, latency = capture_callback(player, args.blocksize)
+        # outdata is the mix delayed by the limiter lookahead; the export is not
+        n = min(len(offline), len(live) - latency)
+        same = len(offline) == length and n > 0 and np.array_equal(live[latency:latency + n], offline[:n])
+        check(f"callback ({label})", same, f"{n} frames compared, lookahead {latency} frames")
+
+        player = song_player(args.tracks, args.seconds, lr, limiter)
+        renders = {}
+        for block_size in BLOCK_SIZES:
+            t0 = time.perf_counter()
+            renders[block_size] = render(player, block_size)
+            timings.append({'lr': lr, 'limiter': limiter, 'block': block_size,
+                            'rtf': (length / float(RATE)) / (time.perf_counter() - t0)})
+        reference = renders[RENDER_BLOCK]
+        same = all(np.array_equal(reference, r) for r in renders.values())
+        check(f"block size ({label})", same, ", ".join(str(b) for b in BLOCK_SIZES))
+
+    print()
+    for t in timings:
+        print(f"lr {'on ' if t['lr'] else 'off'} limiter {'on ' if t['limiter'] else 'off'} "
+              f"block {t['block']:6d}: {t['rtf']:6.1f}x real time")
+
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump({'tracks': args.tracks, 'seconds': args.seconds, 'checks': checks, 'timing': timings},
+                      f, indent=2)
+        print(f"\nResults written to {args.out}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,120 @@
+# Memory and cache size of a setlist's stems, as loaded by AudioPlayer.
+#
+# Loads every song of a .wproj project (or a synthetic setlist of typical multitrack songs, where
+# click, guide and bass stems are mono) through the real track loader and optimizer, and reports
+# the bytes held in memory and on disk against the same stems duplicated to stereo:
+#
+#   python -m bench.setlist_memory --project culto.wproj
+#   python -m bench.setlist_memory --songs 8 --minutes 5 --out setlist.json
+import argparse
+import json
+import os
+import sys
+import tempfile
+import wave
+
+import numpy as np
+
+from bench import fake_sounddevice
+
+sys.modules['sounddevice'] = fake_sounddevice
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from audio.player import AudioPlayer  # noqa: E402
+from audio.wavstream import optimize_to_cache  # noqa: E402
+
+MB = 1024.0 * 1024.0
+
+# (stem name, channels) of a typical worship multitrack
+SYNTH_STEMS = (
+    ('Click', 1), ('Guia', 1), ('Bass', 1), ('Kick', 1),
+    ('Drums', 2), ('Keys', 2), ('Pad', 2), ('Gtr', 2), ('BGV', 2),
+)
+
+
+def write_synth_setlist(workdir, songs, minutes, rate=44100, seed=3):
+    rng = np.random.default_rng(seed)
+    frames = int(minutes * 60 * rate)
+    setlist = []
+    for s in range(songs):
+        paths = []
+        for name, channels in SYNTH_STEMS:
+            path = os.path.join(workdir, f"song{s + 1}_{name}.wav")
+            with wave.open(path, 'wb') as w:
+                w.setnchannels(channels)
+                w.setsampwidth(2)
+                w.setframerate(rate)
+                for start in range(0, frames, 1 << 18):
+                    n = min(1 << 18, frames - start)
+                    x = 0.2 * rng.standard_normal((n, channels))
+                    w.writeframesraw((x * 32767).astype('<i2').tobytes())
+            paths.append(path)
+        setlist.append({'name': f"Song {s + 1}", 'tracks': paths})
+    return setlist
+
+
+def measure(setlist, workdir):
+    rows = []
+    cache_dir = os.path.join(workdir, 'cache')
+    os.makedirs(cache_dir, exist_ok=True)
+    for song in setlist:
+        player = AudioPlayer()
+        for path in song.get('tracks', []):
+            player.load_track(path)
+        memory = sum(t.samples.nbytes for t in player.tracks)
+        stereo_memory = sum(len(t.samples) * 2 * 4 for t in player.tracks)
+        mono = sum(1 for t in player.tracks if t.channels == 1)
+        disk = stereo_disk = 0
+        for i, t in enumerate(player.tracks):
+            npz_path = os.path.join(cache_dir, f"{len(rows)}_{i}.npz")
+            optimize_to_cache(t.file_path, npz_path)
+            size = os.path.getsize(npz_path)
+            disk += size
+            # A stereo cache file stores the same header/metadata plus twice the frames
+            stereo_disk += size + (len(t.samples) * 4 if t.channels == 1 else 0)
+            os.remove(npz_path)
+        rows.append({
+            'song': song.get('name') or song.get('title') or f"#{len(rows) + 1}",
+            'tracks': len(player.tracks),
+            'mono_tracks': mono,
+            'memory_mb': memory / MB,
+            'stereo_memory_mb': stereo_memory / MB,
+            'cache_mb': disk / MB,
+            'stereo_cache_mb': stereo_disk / MB,
+        })
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Memory and cache size of a setlist's stems")
+    parser.add_argument('--project', help="A .wproj project to measure (default: a synthetic setlist)")
+    parser.add_argument('--songs', type=int, default=6, help="Synthetic setlist: number of songs")
+    parser.add_argument('--minutes', type=float, default=5.0, help="Synthetic setlist: song length")
+    parser.add_argument('--out', help="Write results as JSON to this path")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        if args.project:
+            with open(args.project, 'r', encoding='utf-8') as f:
+                setlist = json.load(f).get('songs', [])
+        else:
+            setlist = write_synth_setlist(workdir, args.songs, args.minutes)
+        rows = measure(setlist, workdir)
+
+    for r in rows:
+        print(f"{r['song'][:28]:<28} {r['tracks']:3d} tracks ({r['mono_tracks']} mono)  "
+              f"memory {r['memory_mb']:7.1f} MB (stereo {r['stereo_memory_mb']:7.1f})  "
+              f"cache {r['cache_mb']:7.1f} MB (stereo {r['stereo_cache_mb']:7.1f})")
+    total = {k: sum(r[k] for r in rows) for k in ('memory_mb', 'stereo_memory_mb', 'cache_mb', 'stereo_cache_mb')}
+    saved = total['stereo_memory_mb'] - total['memory_mb']
+    print(f"\nSetlist: memory {total['memory_mb']:.1f} MB instead of {total['stereo_memory_mb']:.1f} MB "
+          f"({saved:.1f} MB saved), cache {total['cache_mb']:.1f} MB instead of {total['stereo_cache_mb']:.1f} MB")
+
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump({'songs': rows, 'total': total}, f, indent=2)
+        print(f"Results written to {args.out}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,197 @@
+# Time to first window of the app (regression check for the startup path, see ui/startup.py).
+#
+# Runs `main.py --startup-check` several times in fresh processes, cold (icon and stylesheet
+# cache cleared first, see ui/resources.py) and warm. Each run prints the time from the top of
+# main.py to the end of the first paint, the deferred modules (numpy, scipy, the audio engine,
+# MIDI, ...) that were imported before it, the time spent on the stylesheet and icons, and when
+# the background preload finished. The script exits 1 if a median time to first window is over
+# the budget, if a deferred module was imported before the first window, or if a warm start
+# compiled the stylesheet or rendered an icon again. Without a display Qt runs offscreen.
+#
+# The first window requests no icon, so the icon cache is also timed on its own: fresh processes
+# ask ui/resources.svg_pixmap() for the header and main-view SVGs (sizes and colors as the app
+# requests them), cold after clear_cache() and warm. It fails if the cold pass does not render
+# every icon, or if the warm pass renders one again instead of loading it from the disk cache, or
+# loads different pixels.
+#
+#   python -m bench.startup_bench
+#   python -m bench.startup_bench --runs 10 --budget-ms 800 --out startup.json
+#
+# For the import profile of the same path: python main.py --profile-imports
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# (file, size, color) of the SVGs the header (ui/header.py) and the main view (MainWindow.get_icon)
+# request; files missing from the install are skipped
+ICONS = (
+    ('save.svg', 24, None),
+    ('settings.svg', 22, None),
+    ('play_arrow_24dp_E3E3E3_FILL0_wght400_GRAD0_opsz24.svg', 24, '#FFFFFF'),
+    ('pause_24dp_E3E3E3_FILL0_wght400_GRAD0_opsz24.svg', 24, '#FFFFFF'),
+    ('restart_24dp_E3E3E3_FILL0_wght400_GRAD0_opsz24.svg', 24, '#FFFFFF'),
+    ('refresh_24dp_E3E3E3_FILL0_wght400_GRAD0_opsz24.svg', 24, '#FFFFFF'),
+)
+
+
+def run_once(cold=False):
+    """One startup check in a new process: its JSON result plus the process wall time (ms)."""
+    env = dict(os.environ)
+    env.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    cmd = [sys.executable, os.path.join(ROOT, 'main.py'), '--startup-check']
+    if cold:
+        cmd.append('--cold-start')
+    t0 = time.perf_counter()
+    proc = subprocess.run(cmd, cwd=ROOT, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                          universal_newlines=True, timeout=120)
+    wall = (time.perf_counter() - t0) * 1000.0
+    for line in reversed(proc.stdout.splitlines()):
+        if line.startswith('{'):
+            result = json.loads(line)
+            result['process_ms'] = wall
+            return result
+    raise RuntimeError(f"main.py --startup-check printed no result (exit {proc.returncode}):\n{proc.stderr[-2000:]}")
+
+
+def icon_pass(cold):
+    """--icon-pass: request ICONS through the icon cache in this process and print the timings."""
+    import hashlib
+    sys.path.insert(0, ROOT)
+    from PyQt5.QtCore import QSize
+    from PyQt5.QtGui import QGuiApplication, QImage
+    from ui import resources
+
+    app = QGuiApplication(sys.argv[:1])  # noqa: F841 (pixmaps need an application)
+    if cold:
+        resources.clear_cache()
+    t0 = time.perf_counter()
+    pixmaps = [resources.svg_pixmap(name, QSize(size, size), color) for name, size, color in ICONS
+               if resources.find_resource(name)]
+    elapsed = (time.perf_counter() - t0) * 1000.0
+    digest = hashlib.sha1()
+    for pm in pixmaps:
+        image = pm.toImage().convertToFormat(QImage.Format_ARGB32) if pm is not None else QImage()
+        digest.update(image.constBits().asstring(image.sizeInBytes()) if not image.isNull() else b'-')
+    print(json.dumps({'icons': len(pixmaps), 'ms': elapsed, 'pixels': digest.hexdigest(),
+                      'resources': resources.stats()}), flush=True)
+    return 0
+
+
+def run_icon_pass(cold):
+    env = dict(os.environ)
+    env.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    cmd = [sys.executable, '-m', 'bench.startup_bench', '--icon-pass', 'cold' if cold else 'warm']
+    proc = subprocess.run(cmd, cwd=ROOT, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                          universal_newlines=True, timeout=120)
+    for line in reversed(proc.stdout.splitlines()):
+        if line.startswith('{'):
+            return json.loads(line)
+    raise RuntimeError(f"icon pass printed no result (exit {proc.returncode}):\n{proc.stderr[-2000:]}")
+
+
+def median(values):
+    values = sorted(values)
+    mid = len(values) // 2
+    return values[mid] if len(values) % 2 else 0.5 * (values[mid - 1] + values[mid])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time to first window of the app")
+    parser.add_argument('--runs', type=int, default=5, help="Runs per phase (cold and warm)")
+    parser.add_argument('--budget-ms', type=float, default=1000.0,
+                        help="Largest accepted median time to first window")
+    parser.add_argument('--out', help="Write results as JSON to this path")
+    parser.add_argument('--icon-pass', choices=('cold', 'warm'), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.icon_pass:
+        return icon_pass(args.icon_pass == 'cold')
+
+    failed = False
+    phases = {}
+    for phase in ('cold', 'warm'):
+        runs = []
+        for i in range(max(1, args.runs)):
+            result = run_once(cold=phase == 'cold')
+            runs.append(result)
+            ready = result.get('engine_ready_ms')
+            res = result.get('resources', {})
+            print(f"{phase} run {i + 1}: first window {result['first_window_ms']:7.1f} ms (stylesheet "
+                  f"{res.get('stylesheet_ms', 0.0):5.1f} ms {res.get('stylesheet')}, icons "
+                  f"{res.get('icons_ms', 0.0):5.1f} ms), engine ready "
+                  f"{'-' if ready is None else f'{ready:7.1f} ms'}, process {result['process_ms']:7.1f} ms")
+
+        first = [r['first_window_ms'] for r in runs]
+        ready = [r['engine_ready_ms'] for r in runs if r.get('engine_ready_ms') is not None]
+        early = sorted({m for r in runs for m in r.get('early_modules', [])})
+        summary = {
+            'first_window_ms_median': median(first),
+            'first_window_ms_max': max(first),
+            'engine_ready_ms_median': median(ready) if ready else None,
+            'process_ms_median': median([r['process_ms'] for r in runs]),
+            'stylesheet_ms_median': median([r.get('resources', {}).get('stylesheet_ms', 0.0) for r in runs]),
+            'early_modules': early,
+            'preload_errors': runs[-1].get('preload_errors') or {},
+        }
+        phases[phase] = {'runs': runs, 'summary': summary}
+        print(f"{phase}: first window median {summary['first_window_ms_median']:.1f} ms, max "
+              f"{summary['first_window_ms_max']:.1f} ms (budget {args.budget_ms:.0f} ms), stylesheet "
+              f"{summary['stylesheet_ms_median']:.1f} ms"
+              + (f", engine ready {summary['engine_ready_ms_median']:.1f} ms" if ready else ""))
+        print()
+
+        if summary['first_window_ms_median'] > args.budget_ms:
+            print(f"FAIL: {phase} time to first window over the {args.budget_ms:.0f} ms budget")
+            failed = True
+        if early:
+            print(f"FAIL: imported before the first window ({phase}): {', '.join(early)}")
+            failed = True
+        if phase == 'warm':
+            missed = [r.get('resources', {}) for r in runs]
+            if any(m.get('stylesheet') != 'disk' or m.get('icons_rendered') for m in missed):
+                print("FAIL: a warm start compiled the stylesheet or rendered icons again")
+                failed = True
+
+    icon_runs = []
+    for i in range(max(1, args.runs)):
+        cold, warm = run_icon_pass(cold=True), run_icon_pass(cold=False)
+        icon_runs.append({'cold': cold, 'warm': warm})
+        print(f"icons run {i + 1}: {cold['icons']} icons, cold {cold['ms']:6.1f} ms "
+              f"({cold['resources']['icons_rendered']} rendered), warm {warm['ms']:6.1f} ms "
+              f"({warm['resources']['icons_from_disk']} from disk, {warm['resources']['icons_rendered']} rendered)")
+    icons = {
+        'runs': icon_runs,
+        'cold_ms_median': median([r['cold']['ms'] for r in icon_runs]),
+        'warm_ms_median': median([r['warm']['ms'] for r in icon_runs]),
+    }
+    print(f"icons: cold median {icons['cold_ms_median']:.1f} ms, warm median {icons['warm_ms_median']:.1f} ms")
+    print()
+    for r in icon_runs:
+        cold, warm = r['cold'], r['warm']
+        if not cold['icons'] or cold['resources']['icons_rendered'] != cold['icons']:
+            print("FAIL: the cold icon pass did not render every icon")
+            failed = True
+            break
+        if warm['resources']['icons_rendered'] or warm['resources']['icons_from_disk'] != warm['icons'] \
+                or warm['pixels'] != cold['pixels']:
+            print("FAIL: the warm icon pass did not load every icon, unchanged, from the disk cache")
+            failed = True
+            break
+
+    for name, error in phases['warm']['summary']['preload_errors'].items():
+        print(f"preload of {name} failed: {error}")
+    if not failed:
+        print("OK")
+
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump({'budget_ms': args.budget_ms, **phases, 'icons': icons}, f, indent=2)
+        print(f"\nResults written to {args.out}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
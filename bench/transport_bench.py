@@ -0,0 +1,204 @@
+# Sample-accurate song transitions (audio/transport.py, AudioManager.queue_song_transition).
+#
+# The scheduler is driven with a hand-stepped clock first, then two players with constant (DC)
+# stems go through a real transition: the outgoing player's audio_callback is driven through the
+# fake sounddevice backend block by block and every outdata block is captured, so each output
+# sample shows which gain each song had. Checks (the script exits 1 if one fails):
+#   - scheduler: events fire in the block that contains them, at offset `at - block start`; a
+#     cancelled event never fires; an event already in the past fires at offset 0;
+#   - crossfade: the outgoing song stops and the incoming one starts on the bar line, and the
+#     output is the two songs weighted by GainRamp's equal-power curves from that sample on;
+#   - count-in: the incoming song starts at `at + beats * beat`, silent until then apart from
+#     the clicks, at full level from that sample;
+#   - cancel: a cancelled transition never fires (the outgoing song plays on unchanged).
+#
+#   python -m bench.transport_bench
+#   python -m bench.transport_bench --blocksize 512 --out transport.json
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+from bench import fake_sounddevice
+
+sys.modules['sounddevice'] = fake_sounddevice
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from audio.manager import AudioManager, TRANSITION_DECLICK, TRANSITION_GUARD  # noqa: E402
+from audio.player import AudioPlayer  # noqa: E402
+from audio.timing import beat_length_samples, next_bar_boundary  # noqa: E402
+from audio.track import Track  # noqa: E402
+from audio.transport import GainRamp, TransportScheduler  # noqa: E402
+
+RATE = 44100
+BPM = 120.0
+OUT_LEVEL, IN_LEVEL = 0.5, 0.25  # DC level of the outgoing / incoming stems
+
+
+def dc_player(level, seconds):
+    player = AudioPlayer()
+    samples = np.full((int(seconds * RATE), 2), level, dtype=np.float32)
+    player.tracks = [Track(f"dc_{level}.wav", RATE, samples)]
+    player.set_limiter_enabled(False)
+    player.set_auto_tune(False)
+    return player
+
+
+def scheduler_checks(blocksize):
+    """Drive a TransportScheduler by hand: [(name, ok, detail)]."""
+    sched = TransportScheduler()
+    times = [0, 1, blocksize - 1, blocksize, 5 * blocksize + 17, 10 * blocksize + blocksize // 2]
+    events = [sched.schedule(at, 'notify') for at in times]
+    cancelled = sched.schedule(3 * blocksize + 5, 'notify')
+    sched.cancel(cancelled)
+    fired = {}
+    while sched.clock < 12 * blocksize:
+        start = sched.clock
+        for offset, event in sched.process_block(blocksize):
+            fired[id(event)] = (start, offset)
+    landed = all(id(e) in fired and sum(fired[id(e)]) == e.at and fired[id(e)][0] <= e.at < fired[id(e)][0] + blocksize
+                 for e in events)
+    results = [('scheduler offsets', landed, f"{len(fired)}/{len(events)} events at `at - block start`"),
+               ('scheduler cancel', id(cancelled) not in fired, "cancelled event not fired")]
+
+    late = sched.schedule(sched.clock - 3 * blocksize, 'notify')
+    due = sched.process_block(blocksize)
+    results.append(('scheduler past event', due == [(0, late)], f"fired as {[(o, e.at) for o, e in due]}"))
+    return results
+
+
+class Session:
+    """Two DC songs on one AudioManager; drive() steps the outgoing player's stream callback."""
+
+    def __init__(self, blocksize):
+        self.manager = AudioManager()
+        self.songs = [{'name': 'A', 'tracks': [], 'bpm': str(BPM)}, {'name': 'B', 'tracks': [], 'bpm': str(BPM)}]
+        self.players = [dc_player(OUT_LEVEL, 6.0), dc_player(IN_LEVEL, 6.0)]
+        for song, player in zip(self.songs, self.players):
+            player.fixed_level = (int(blocksize), 'high')
+            self.manager.adopt_player(song, player)
+        self.manager.set_current_song(self.songs[0])
+        previous = len(fake_sounddevice.streams)
+        self.manager.play_current_song()
+        self.stream = fake_sounddevice.wait_for_stream(previous)
+        if self.stream is None:
+            raise RuntimeError("Player did not open a stream")
+        self.outdata = np.zeros((int(self.stream.blocksize), 2), dtype=np.float32)
+        self.blocks = []
+
+    def drive(self, until):
+        """Run callbacks until `until` frames were captured (or the stream stops)."""
+        while len(self.blocks) * len(self.outdata) < until:
+            try:
+                self.stream.callback(self.outdata, len(self.outdata), None, None)
+            except fake_sounddevice.CallbackStop:
+                self.blocks.append(self.outdata.copy())
+                break
+            self.blocks.append(self.outdata.copy())
+        return np.concatenate(self.blocks)[:, 0]
+
+    def close(self):
+        self.manager.stop_all()
+
+
+def queue(session, **kwargs):
+    """Queue song B after a few blocks of song A; returns (at, start event time, bar boundary)."""
+    captured = session.drive(5 * len(session.outdata))
+    clock, position = session.players[0]._clock_anchor
+    expected = clock + next_bar_boundary(position, BPM, RATE, guard=TRANSITION_GUARD) - position
+    if not session.manager.queue_song_transition(session.songs[1], **kwargs):
+        raise RuntimeError("Transition was not queued")
+    events = session.manager.pending_transition[1]
+    stop = next(e for e in events if e.kind == 'stop')
+    start = next(e for e in events if e.kind == 'start' and e.player is session.players[1])
+    return len(captured), stop, start, expected
+
+
+def crossfade_checks(blocksize, crossfade_ms=50):
+    session = Session(blocksize)
+    try:
+        _, stop, start, expected = queue(session, crossfade_ms=crossfade_ms)
+        fade = max(TRANSITION_DECLICK, int(RATE * crossfade_ms / 1000.0))
+        out = session.drive(stop.at + fade + 4 * blocksize)
+        n = len(out)
+        gain_out = GainRamp(fade, False, stop.at).gains(n)[:, 0]
+        gain_in = GainRamp(fade, True, start.at).gains(n)[:, 0]
+        level_out = np.float32(OUT_LEVEL) * np.float32(session.players[0].tracks[0].volume)
+        level_in = np.float32(IN_LEVEL) * np.float32(session.players[1].tracks[0].volume)
+        reference = level_out * gain_out + level_in * gain_in
+        err = float(np.max(np.abs(out - reference)))
+        on_bar = stop.at == expected and start.at == stop.at and stop.fade == fade and start.fade == fade
+        took_over = session.manager.current_player is session.players[1] and not session.players[0].is_playing()
+        return [
+            ('crossfade on the bar line', on_bar,
+             f"at {stop.at} (bar {expected}), offset {stop.at % blocksize} in its block"),
+            ('crossfade gains', err < 1e-6 and out[stop.at - 1] == level_out,
+             f"max diff {err:.1e} from GainRamp over {fade} frames"),
+            ('crossfade hand-over', took_over, "incoming song is current, outgoing stopped"),
+        ]
+    finally:
+        session.close()
+
+
+def count_in_checks(blocksize, beats=2):
+    session = Session(blocksize)
+    try:
+        _, stop, start, expected = queue(session, count_in_beats=beats)
+        beat = beat_length_samples(BPM, RATE)
+        start_at = stop.at + int(round(beats * beat))
+        out = session.drive(start_at + 4 * blocksize)
+        level_in = np.float32(IN_LEVEL) * np.float32(session.players[1].tracks[0].volume)
+        # Between the end of the last click (30 ms) and the start only silence
+        quiet_from = stop.at + int(round((beats - 1) * beat)) + int(RATE * 0.03) + 1
+        silent = not np.any(out[quiet_from:start_at])
+        starts = bool(np.all(out[start_at:start_at + 2 * blocksize] == level_in))
+        return [
+            ('count-in start', stop.at == expected and start.at == start_at,
+             f"start at {start.at} = {stop.at} + {beats} x {beat:.0f}"),
+            ('count-in output', silent and starts, f"silent before {start_at}, full level from it"),
+        ]
+    finally:
+        session.close()
+
+
+def cancel_checks(blocksize):
+    session = Session(blocksize)
+    try:
+        _, stop, start, _ = queue(session, crossfade_ms=50)
+        session.manager.cancel_song_transition()
+        out = session.drive(start.at + 4 * blocksize)
+        level_out = np.float32(OUT_LEVEL) * np.float32(session.players[0].tracks[0].volume)
+        unchanged = bool(np.all(out == level_out)) and session.manager.current_player is session.players[0]
+        return [('cancel', unchanged and not session.players[1].is_playing(),
+                 f"{len(out)} frames of the outgoing song only, past {stop.at}")]
+    finally:
+        session.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sample-accurate song transitions")
+    parser.add_argument('--blocksize', type=int, default=777, help="Stream block size of the driven callback")
+    parser.add_argument('--out', help="Write results as JSON to this path")
+    args = parser.parse_args(argv)
+
+    results = scheduler_checks(args.blocksize)
+    results += crossfade_checks(args.blocksize)
+    results += count_in_checks(args.blocksize)
+    results += cancel_checks(args.blocksize)
+
+    failed = False
+    for name, ok, detail in results:
+        failed = failed or not ok
+        print(f"{name:<28} {detail:<60} {'OK' if ok else 'FAIL'}")
+
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump({'blocksize': args.blocksize,
+                       'checks': [{'check': n, 'ok': bool(ok), 'detail': d} for n, ok, d in results]}, f, indent=2)
+        print(f"\nResults written to {args.out}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,166 @@
+# Key transposition (audio/transpose.py) and the player's switch to the rendered variants.
+#
+# Checks (the script exits 1 if one fails):
+#   - pitch: a 440 Hz sine shifted by +2, -3 and +12 semitones lands on 440 * 2^(n/12) (within
+#     5 cents) and keeps its length exactly;
+#   - transients: the bursts of a click-like stem stay where they were (within 10 ms, no drift
+#     along the stem), so a click stays on the beat of the transposed song;
+#   - round trip: on a song of WAV stems (a pitched stem and a click stem), transpose_stems()
+#     renders the `_t+N.npz` variants, set_transpose() loads them (same length, new pitch, the
+#     click stem untouched), refuses an offset whose variants are missing, and goes back to the
+#     original samples at 0.
+# The audio cache is pointed at a temporary folder, so the user's cache is left alone.
+#
+#   python -m bench.transpose_bench
+#   python -m bench.transpose_bench --seconds 10 --out transpose.json
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+from scipy.io import wavfile
+
+from bench import fake_sounddevice
+
+sys.modules['sounddevice'] = fake_sounddevice
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from audio.player import AudioPlayer  # noqa: E402
+from audio.transpose import pitch_shift_blocks, transpose_stems  # noqa: E402
+
+RATE = 44100
+TONE = 440.0
+SHIFTS = (2, -3, 12)
+PITCH_CENTS = 5.0
+ONSET_MS = 10.0
+
+
+def sine(seconds, channels=1):
+    t = np.arange(int(seconds * RATE)) / float(RATE)
+    mono = (0.5 * np.sin(2 * np.pi * TONE * t)).astype(np.float32)
+    return np.repeat(mono[:, None], channels, axis=1)
+
+
+def click_stem(seconds, spacing=0.5):
+    """10 ms decaying 1 kHz bursts every `spacing` seconds (mono); returns (samples, onsets)."""
+    x = np.zeros((int(seconds * RATE), 1), dtype=np.float32)
+    n = RATE // 100
+    burst = (np.sin(2 * np.pi * 1000.0 * np.arange(n) / RATE) * np.exp(-np.arange(n) / 60.0)).astype(np.float32)
+    onsets = np.arange(int(spacing * RATE / 2), len(x) - n - int(spacing * RATE / 2), int(spacing * RATE))
+    for o in onsets:
+        x[o:o + n, 0] += burst
+    return x, onsets
+
+
+def shift(x, semitones, chunk=8192):
+    chunks = (x[i:i + chunk] for i in range(0, len(x), chunk))
+    return np.concatenate(list(pitch_shift_blocks(chunks, len(x), x.shape[1], semitones)))
+
+
+def frequency(x):
+    """Frequency of the strongest partial of the middle half (Hann window, parabolic peak)."""
+    x = np.asarray(x, dtype=np.float64)[len(x) // 4:3 * len(x) // 4, 0]
+    spectrum = np.abs(np.fft.rfft(x * np.hanning(len(x))))
+    k = int(np.argmax(spectrum))
+    a, b, c = np.log(spectrum[k - 1:k + 2])
+    return (k + 0.5 * (a - c) / (a - 2 * b + c)) * RATE / len(x)
+
+
+def cents(f, semitones):
+    return 1200.0 * np.log2(f / (TONE * 2.0 ** (semitones / 12.0)))
+
+
+def onset_shifts(x, reference, onsets):
+    """Offset (frames) of each burst's envelope peak in x against the same peak in reference."""
+    def peaks(y):
+        env = np.convolve(np.abs(np.asarray(y, dtype=np.float64)[:, 0]), np.ones(64) / 64.0, 'same')
+        w = RATE // 20
+        return np.array([int(np.argmax(env[o - w:o + w])) for o in onsets])
+    return peaks(x) - peaks(reference)
+
+
+def signal_checks(seconds):
+    results = []
+    tone = sine(seconds)
+    clicks, onsets = click_stem(seconds)
+    for n in SHIFTS:
+        t0 = time.perf_counter()
+        out = shift(tone, n)
+        elapsed = time.perf_counter() - t0
+        f = frequency(out)
+        error = cents(f, n)
+        results.append((f"pitch {n:+d}", len(out) == len(tone) and abs(error) < PITCH_CENTS,
+                        f"{f:7.2f} Hz ({error:+.2f} cents), {len(out)} frames, {seconds / elapsed:.0f}x real time"))
+        moved = onset_shifts(shift(clicks, n), clicks, onsets) * 1000.0 / RATE
+        worst = float(np.max(np.abs(moved)))
+        results.append((f"transients {n:+d}", worst < ONSET_MS,
+                        f"{len(onsets)} bursts, worst {worst:.1f} ms, mean {float(np.mean(moved)):+.1f} ms"))
+    return results
+
+
+def round_trip_checks(work, seconds):
+    """Render variants of a two-stem song and switch the player between keys."""
+    keys, click = os.path.join(work, 'keys.wav'), os.path.join(work, 'click.wav')
+    wavfile.write(keys, RATE, sine(seconds, channels=2))
+    wavfile.write(click, RATE, click_stem(seconds)[0][:, 0])
+    player = AudioPlayer()
+    if not (player.load_track(keys) and player.load_track(click)):
+        raise RuntimeError("Could not load the synthetic stems")
+    original = [np.array(t.samples) for t in player.tracks]
+    click_samples = player.tracks[1].samples
+
+    results = []
+    refused = not player.set_transpose(-3) and player.transpose == 0
+    results.append(('missing variant refused', refused, "set_transpose(-3) before rendering"))
+    for n in (2, -3):
+        jobs = player.transpose_jobs(n)
+        rendered = transpose_stems(jobs, n, sample_format=player.sample_format, max_workers=1)
+        names = [os.path.basename(npz) for _, npz in jobs]
+        ok = len(jobs) == 1 and jobs[0][0] == keys and names[0].endswith(f"_t{n:+d}.npz") \
+            and all(not isinstance(r, Exception) for r in rendered.values()) and player.set_transpose(n)
+        pitched = player.tracks[0].samples
+        f = frequency(pitched)
+        ok = ok and player.transpose == n and len(pitched) == len(original[0]) \
+            and abs(cents(f, n)) < PITCH_CENTS and player.tracks[1].samples is click_samples
+        results.append((f"round trip {n:+d}", ok,
+                        f"{', '.join('<key>_' + name.rsplit('_', 1)[-1] for name in names) or 'no job'}: "
+                        f"{f:.2f} Hz, click stem kept"))
+    back = player.set_transpose(0) and all(np.array_equal(np.array(t.samples), o)
+                                           for t, o in zip(player.tracks, original))
+    results.append(('back to the original key', back, "samples equal to the first load"))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Key transposition and the player's variant switch")
+    parser.add_argument('--seconds', type=float, default=4.0, help="Length of the synthetic stems")
+    parser.add_argument('--out', help="Write results as JSON to this path")
+    args = parser.parse_args(argv)
+
+    work = tempfile.mkdtemp(prefix="transpose_bench_")
+    # QStandardPaths reads XDG_CACHE_HOME every call: the player's audio cache goes to `work`
+    os.environ['XDG_CACHE_HOME'] = os.path.join(work, 'cache')
+    try:
+        results = signal_checks(args.seconds)
+        results += round_trip_checks(work, args.seconds)
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+    failed = False
+    for name, ok, detail in results:
+        failed = failed or not ok
+        print(f"{name:<28} {detail:<70} {'OK' if ok else 'FAIL'}")
+
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump({'seconds': args.seconds,
+                       'checks': [{'check': n, 'ok': bool(ok), 'detail': d} for n, ok, d in results]}, f, indent=2)
+        print(f"\nResults written to {args.out}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,19 +1,33 @@
 import sys
+import os
+import time
+_STARTED = time.perf_counter()  # Origin of the time-to-first-window check
 from PyQt5.QtWidgets import QApplication
 from PyQt5.QtCore import Qt
 from PyQt5.QtGui import QIcon, QPixmap
 from ui.main_window import MainWindow
-import qdarkstyle
+from ui import startup, resources
 
 if __name__ == "__main__":
+    # Import profile of the startup path (python -X importtime, split at the first window)
+    if '--profile-imports' in sys.argv:
+        sys.exit(startup.profile_imports(os.path.abspath(__file__)))
+
     # Enable high DPI scaling and high-DPI pixmaps for crisp icons on retina displays
     QApplication.setAttribute(Qt.AA_EnableHighDpiScaling, True)
     QApplication.setAttribute(Qt.AA_UseHighDpiPixmaps, True)
     app = QApplication(sys.argv)
-    
-    # Apply dark theme
-    app.setStyleSheet(qdarkstyle.load_stylesheet_pyqt5())
-    
+
+    # Cold start for bench/startup_bench.py: drop the cached icons and stylesheet first
+    if '--cold-start' in sys.argv:
+        resources.clear_cache()
+
+    # Apply dark theme (qdarkstyle, compiled once and cached, see ui/resources.py)
+    app.setStyleSheet(resources.load_stylesheet())
+
     window = MainWindow()
     window.show()
+    # Print startup timings as JSON and quit (see bench/startup_bench.py)
+    if '--startup-check' in sys.argv:
+        startup.report_startup(app, window, _STARTED)
     sys.exit(app.exec_())
@@ -2,14 +2,23 @@ from PyQt5.QtCore import QObject, pyqtSignal
 import threading
 import time
 
-try:
-    import mido
-    try:
-        mido.set_backend('mido.backends.rtmidi')
-    except Exception:
-        pass
-except Exception:
-    mido = None
+_mido = None
+
+
+def _load_mido():
+    """mido with the rtmidi backend, imported on first use; None when it is not installed."""
+    global _mido
+    if _mido is None:
+        try:
+            import mido
+            try:
+                mido.set_backend('mido.backends.rtmidi')
+            except Exception:
+                pass
+            _mido = mido
+        except Exception:
+            _mido = False
+    return _mido or None
 
 
 class MidiManager(QObject):
@@ -22,9 +31,10 @@ class MidiManager(QObject):
         self._stop = threading.Event()
 
     def available(self):
-        return mido is not None
+        return _load_mido() is not None
 
     def list_input_names(self):
+        mido = _load_mido()
         if mido is None:
             return []
         try:
@@ -33,6 +43,7 @@ class MidiManager(QObject):
             return []
 
     def list_output_names(self):
+        mido = _load_mido()
         if mido is None:
             return []
         try:
@@ -41,7 +52,7 @@ class MidiManager(QObject):
             return []
 
     def start_listening(self, input_name: str):
-        if mido is None:
+        if _load_mido() is None:
             return False
         try:
             self.stop()
@@ -64,7 +75,7 @@ class MidiManager(QObject):
     def _worker(self):
         port = None
         try:
-            port = mido.open_input(self.input_name)
+            port = _load_mido().open_input(self.input_name)
             while not self._stop.is_set():
                 try:
                     for msg in port.iter_pending():
@@ -0,0 +1,314 @@
+# Background autosave of the open project (.wproj), also used by "Salvar Projeto".
+# Edits mark sections of the project dirty: one song (and with it the song list) or the routing
+# presets. The worship data is written when the project starts and again after a failed write. A burst of edits becomes one write AUTOSAVE_DELAY after the last edit (at most
+# AUTOSAVE_MAX_DELAY after the first). At that point the GUI thread only collects references to the dirty
+# sections. A writer thread turns them into JSON, reuses the text of every section that did not
+# change, and replaces the file atomically: it writes a temp file in the same folder, fsyncs it,
+# renames it over the project and fsyncs the folder. A crash during a write therefore leaves the
+# previous project or the new one, never a truncated file.
+# The writer reads sections that the GUI may still be editing. Every edit marks its section again,
+# so the next write catches up. A section whose size changes during a dump (RuntimeError) is
+# dumped again. Each section is dumped in a single call to the C JSON encoder, and the writer
+# yields the GIL between sections. The GUI thread is therefore held up for about one song's dump
+# at most (see bench/autosave_bench.py).
+# Projects that were never saved to a file are autosaved to a recovery file, which the app
+# offers to reopen on the next launch.
+import json
+import os
+import threading
+import time
+from PyQt5.QtCore import QObject, QTimer, QStandardPaths, pyqtSignal
+
+PROJECT_VERSION = 1
+AUTOSAVE_DELAY = 2.0        # Seconds without edits before a write
+AUTOSAVE_MAX_DELAY = 10.0   # Longest a dirty project waits while edits keep coming
+DUMP_RETRIES = 3            # Dumps of a section edited while it was being serialized
+WRITER_YIELD = 0.0002       # Writer pause between sections (a 0 s sleep does not hand over the GIL)
+
+
+def recovery_path():
+    """Autosave target of a project that has no file yet."""
+    try:
+        base = QStandardPaths.writableLocation(QStandardPaths.AppDataLocation)
+        if not base:
+            base = os.path.expanduser('~/Library/Application Support/AppPythonAdrian')
+    except Exception:
+        base = os.path.expanduser('~/Library/Application Support/AppPythonAdrian')
+    return os.path.join(base, 'autosave', 'recovery.wproj')
+
+
+def write_atomic(path, text):
+    """Replace path with text: temp file in the same folder, fsync, rename, fsync of the folder."""
+    folder = os.path.dirname(os.path.abspath(path))
+    os.makedirs(folder, exist_ok=True)
+    tmp = os.path.join(folder, f".{os.path.basename(path)}.{os.getpid()}.tmp")
+    data = text.encode('utf-8')
+    try:
+        with open(tmp, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+    if hasattr(os, 'O_DIRECTORY'):
+        # The rename itself is durable once the folder is synced (not available on Windows)
+        try:
+            fd = os.open(folder, os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        except OSError:
+            pass
+
+
+def _dump(section):
+    for attempt in range(DUMP_RETRIES):
+        try:
+            return json.dumps(section, ensure_ascii=False)
+        except RuntimeError:
+            # Changed size while being encoded (edited on the GUI thread): let the edit finish
+            if attempt == DUMP_RETRIES - 1:
+                raise
+            time.sleep(0.001)
+
+
+class ProjectAutosave(QObject):
+    """Dirty tracking and background writes of the open project.
+    worship(), songs() and routing() return the project's current sections (routing() may return
+    None); they are called on the GUI thread only.
+    """
+    saved = pyqtSignal(str, float)   # path, seconds the writer spent
+    failed = pyqtSignal(str, str)    # path, error message
+
+    def __init__(self, worship, songs, routing, parent=None):
+        super().__init__(parent)
+        self._worship = worship
+        self._songs = songs
+        self._routing = routing
+        self.path = None            # Project file; None writes the recovery file
+        self.active = False         # A project is open
+        self._dirty = set()         # 'routing', 'order'
+        self._dirty_songs = {}      # id(song) -> song
+        self._sent = {}             # id(song) -> song the writer has the text of (keeps ids unique)
+        self._sent_sections = set()  # 'worship'/'routing' once the writer has their text
+        self._reset = False
+        self._deadline = None
+        self.flush_ms = 0.0         # GUI-thread time of the last flush
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self.flush)
+        # Writer thread state, guarded by _cond
+        self._cond = threading.Condition()
+        self._job = None
+        self._busy = False
+        self._running = True
+        self._thread = None
+        # Writer-only state: JSON text of each section from the last write
+        self._texts = {}
+        self._song_texts = {}
+        self._retry = set()
+        self._retry_sections = {}   # 'worship'/'routing' of a failed write -> section to dump again
+        self.last_sections = 0      # Sections serialized by the last write (the rest were reused)
+
+    @property
+    def target(self):
+        return self.path or recovery_path()
+
+    def start(self, path=None, saved=False):
+        """Track a project from scratch: one just created, or (saved) one just read from its file."""
+        if self.active:
+            self.flush()
+        self.path = path
+        self.active = True
+        self._sent = {}
+        self._sent_sections = set()
+        self._dirty_songs = {}
+        self._reset = True
+        self._dirty = set()
+        if not saved:
+            self._dirty.add('order')
+            self._schedule()
+
+    def stop(self):
+        """The project was closed: write what is pending and stop tracking."""
+        self.flush()
+        self.active = False
+        self._timer.stop()
+
+    def mark_song(self, song):
+        self._dirty_songs[id(song)] = song
+        self._dirty.add('order')
+        self._schedule()
+
+    def mark_routing(self):
+        self._dirty.add('routing')
+        self._schedule()
+
+    def is_dirty(self):
+        return bool(self._dirty or self._dirty_songs)
+
+    def _schedule(self):
+        if not self.active:
+            return
+        now = time.monotonic()
+        if self._deadline is None:
+            self._deadline = now + AUTOSAVE_MAX_DELAY
+        delay = max(0.0, min(AUTOSAVE_DELAY, self._deadline - now))
+        self._timer.start(int(delay * 1000))
+
+    def save_as(self, path):
+        """Write the whole project to path now (in the background) and autosave there from now on."""
+        self.path = path
+        self.active = True
+        self.flush(force=True)
+
+    def flush(self, force=False):
+        """Hand the dirty sections to the writer (GUI thread; references only, no serialization)."""
+        started = time.perf_counter()
+        self._timer.stop()
+        self._deadline = None
+        if not self.active or not (force or self.is_dirty()):
+            return
+        songs = []
+        sent = {}
+        dirty_songs = self._dirty_songs
+        for song in self._songs():
+            key = id(song)
+            if self._sent.get(key) is not song:
+                dirty_songs[key] = song  # New to the writer
+            songs.append((key, song))
+            sent[key] = song
+        # Sections the writer has no text of yet count as dirty
+        dirty = self._dirty | ({'worship', 'routing'} - self._sent_sections)
+        self._sent_sections = {'worship', 'routing'}
+        job = {
+            'path': self.target,
+            'reset': self._reset,
+            'worship': self._worship() if 'worship' in dirty else None,
+            'routing': self._routing() if 'routing' in dirty else None,
+            'routing_dirty': 'routing' in dirty,
+            'songs': songs,
+            'dirty_songs': set(dirty_songs),
+        }
+        self._sent = sent
+        self._dirty = set()
+        self._dirty_songs = {}
+        self._reset = False
+        with self._cond:
+            if self._job is not None:
+                job = self._merge(self._job, job)
+            self._job = job
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="ProjectAutosave", daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+        self.flush_ms = (time.perf_counter() - started) * 1000.0
+
+    @staticmethod
+    def _merge(old, new):
+        """A job the writer has not started yet, updated with a newer one."""
+        merged = dict(new)
+        merged['reset'] = old['reset'] or new['reset']
+        if new['worship'] is None:
+            merged['worship'] = old['worship']
+        if not new['routing_dirty']:
+            merged['routing'] = old['routing']
+            merged['routing_dirty'] = old['routing_dirty']
+        merged['dirty_songs'] = old['dirty_songs'] | new['dirty_songs']
+        return merged
+
+    def wait(self, timeout=None):
+        """Block until every handed-over write is done. Returns False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._job is not None or self._busy:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def shutdown(self, timeout=5.0):
+        """Write what is pending and stop the writer (on app exit)."""
+        self.flush()
+        self.wait(timeout)
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._job is None and self._running:
+                    self._cond.wait()
+                if self._job is None:
+                    return
+                job, self._job = self._job, None
+                self._busy = True
+            try:
+                self._write(job)
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
+
+    def _write(self, job):
+        started = time.perf_counter()
+        path = job['path']
+        if job['reset']:
+            self._texts = {}
+            self._song_texts = {}
+            self._retry = set()
+            self._retry_sections = {}
+        texts = self._texts
+        song_texts = self._song_texts
+        dirty_songs = job['dirty_songs'] | self._retry
+        # The GUI thread hands each section over once: one a failed write did not store is kept here
+        sections = dict(self._retry_sections)
+        if job['worship'] is not None:
+            sections['worship'] = job['worship']
+        if job['routing_dirty']:
+            sections['routing'] = job['routing']
+        dumped = 0
+        try:
+            if 'worship' in sections:
+                texts['worship'] = _dump(sections['worship'])
+                dumped += 1
+            if 'routing' in sections:
+                texts['routing'] = _dump(sections['routing']) if sections['routing'] is not None else None
+                dumped += 1
+            parts = []
+            for key, song in job['songs']:
+                if key in dirty_songs or key not in song_texts:
+                    song_texts[key] = _dump(song)
+                    dumped += 1
+                    # Let the GUI thread run between sections (the dumps hold the GIL)
+                    time.sleep(WRITER_YIELD)
+                parts.append(song_texts[key])
+            keep = {key for key, _ in job['songs']}
+            for key in [k for k in song_texts if k not in keep]:
+                del song_texts[key]
+            text = (f'{{"version": {PROJECT_VERSION}, "worship": {texts.get("worship") or "{}"}, '
+                    f'"songs": [{", ".join(parts)}]')
+            if texts.get('routing') is not None:
+                text += f', "routing": {texts["routing"]}'
+            text += '}'
+            time.sleep(WRITER_YIELD)
+            write_atomic(path, text)
+        except Exception as e:
+            # Written again (with these sections) on the next flush
+            self._retry = dirty_songs
+            self._retry_sections = sections
+            print(f"[Autosave] Could not save {path}: {e}")
+            self.failed.emit(path, str(e))
+            return
+        self._retry = set()
+        self._retry_sections = {}
+        self.last_sections = dumped
+        self.saved.emit(path, time.perf_counter() - started)
@@ -1,11 +1,8 @@
 from PyQt5.QtWidgets import QWidget, QHBoxLayout, QLabel, QPushButton
 from PyQt5.QtCore import pyqtSignal, Qt, QSize
-from PyQt5.QtGui import QFont, QIcon
-import os
-try:
-    import qtawesome
-except Exception:
-    qtawesome = None
+from PyQt5.QtGui import QFont
+from ui.startup import optional_module
+from ui import resources
 
 class HeaderWidget(QWidget):
     addSongRequested = pyqtSignal()
@@ -186,14 +183,12 @@ class HeaderWidget(QWidget):
 
     def _load_save_icon(self, size):
         try:
-            base_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-            for folder in [base_path, os.path.join(base_path, 'Resources')]:
-                path = os.path.join(folder, 'save.svg')
-                if os.path.exists(path):
-                    icon = QIcon(path)
-                    return icon
+            icon = resources.svg_icon('save.svg', size)
+            if icon:
+                return icon
         except Exception:
             pass
+        qtawesome = optional_module('qtawesome')
         if qtawesome:
             for name in ['fa5s.save', 'fa.save', 'mdi.content-save']:
                 try:
@@ -204,14 +199,12 @@ class HeaderWidget(QWidget):
 
     def _load_settings_icon(self, size):
         try:
-            base_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-            for folder in [base_path, os.path.join(base_path, 'Resources')]:
-                path = os.path.join(folder, 'settings.svg')
-                if os.path.exists(path):
-                    icon = QIcon(path)
-                    return icon
+            icon = resources.svg_icon('settings.svg', size)
+            if icon:
+                return icon
         except Exception:
             pass
+        qtawesome = optional_module('qtawesome')
         if qtawesome:
             for name in ['fa5s.cog', 'fa.cog', 'mdi.cog']:
                 try:
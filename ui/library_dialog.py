@@ -0,0 +1,193 @@
+# Song picker of the local stem library (audio/library.py), opened from the song form.
+# The search runs on every keystroke against the SQLite index (a few ms for a few hundred songs);
+# the scan of the library folders keeps running in the background and its progress is shown here.
+import os
+from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, QPushButton, QListWidget,
+                             QListWidgetItem, QFileDialog, QInputDialog)
+from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtGui import QFont, QFontMetrics
+from audio import library
+
+STATUS_POLL_MS = 300
+
+
+def _duration_text(seconds):
+    seconds = int(round(seconds or 0))
+    return f"{seconds // 60}:{seconds % 60:02d}"
+
+
+class LibraryDialog(QDialog):
+    """Search the library and pick a song; selected_song() is the picked song (with its tracks)."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Biblioteca")
+        self.setModal(True)
+        self.setMinimumSize(880, 520)
+        self.setStyleSheet("""
+            QDialog { background-color: #181818; }
+            QLabel { color: #FFFFFF; }
+            QLineEdit {
+                background-color: #2A2A2A; color: #FFFFFF; border: none;
+                border-radius: 10px; padding: 10px 14px; font-size: 13px;
+            }
+            QListWidget {
+                background-color: #2A2A2A; color: #FFFFFF; border: none;
+                border-radius: 10px; padding: 6px;
+            }
+            QListWidget::item { padding: 6px; }
+            QListWidget::item:selected { background-color: #3A3A3A; }
+            QPushButton {
+                background-color: #FFFFFF; color: #000000; border: none;
+                border-radius: 14px; padding: 6px 18px; font-weight: 600;
+            }
+            QPushButton:hover { background-color: #B3B3B3; }
+            QPushButton:disabled { background-color: #555555; color: #999999; }
+        """)
+        self.library = library.shared()
+        self._song = None
+        self._last_status = None
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(20, 18, 20, 18)
+        layout.setSpacing(12)
+        title = QLabel("Biblioteca de Músicas")
+        title.setFont(QFont("SF Pro Display", 16, QFont.Bold))
+        layout.addWidget(title)
+        self.search_input = QLineEdit()
+        self.search_input.setPlaceholderText("Buscar por música, tom ou faixa...")
+        self.search_input.textChanged.connect(self.refresh)
+        layout.addWidget(self.search_input)
+        self.list = QListWidget()
+        self.list.itemDoubleClicked.connect(lambda _item: self.choose())
+        self.list.currentRowChanged.connect(lambda _row: self._update_buttons())
+        layout.addWidget(self.list, 1)
+        self.status = QLabel()
+        self.status.setWordWrap(True)
+        self.status.setStyleSheet("color: #B3B3B3;")
+        layout.addWidget(self.status)
+
+        buttons = QHBoxLayout()
+        add_btn = QPushButton("Adicionar pasta...")
+        remove_btn = QPushButton("Remover pasta...")
+        refresh_btn = QPushButton("Atualizar")
+        cancel_btn = QPushButton("Cancelar")
+        self.use_btn = QPushButton("Usar música")
+        add_btn.clicked.connect(self.add_folder)
+        remove_btn.clicked.connect(self.remove_folder)
+        refresh_btn.clicked.connect(self.rescan)
+        cancel_btn.clicked.connect(self.reject)
+        self.use_btn.clicked.connect(self.choose)
+        bold = QFont(self.font())
+        bold.setBold(True)
+        for button in (add_btn, remove_btn, refresh_btn, cancel_btn, self.use_btn):
+            # The style sheet's bold text is wider than the size hint assumes
+            button.setMinimumWidth(QFontMetrics(bold).horizontalAdvance(button.text()) + 40)
+        buttons.addWidget(add_btn)
+        buttons.addWidget(remove_btn)
+        buttons.addWidget(refresh_btn)
+        buttons.addStretch(1)
+        buttons.addWidget(cancel_btn)
+        buttons.addWidget(self.use_btn)
+        layout.addLayout(buttons)
+
+        self._poll = QTimer(self)
+        self._poll.timeout.connect(self.update_status)
+        self._poll.start(STATUS_POLL_MS)
+        self.refresh()
+        self.update_status()
+        self.search_input.setFocus()
+
+    def refresh(self):
+        """Run the search again (keeps the selected song selected)."""
+        current = self.list.currentItem()
+        selected = current.data(Qt.UserRole) if current is not None else None
+        self.list.clear()
+        songs = self.library.search(self.search_input.text()) if self.library is not None else []
+        for song in songs:
+            details = [f"{song['stems']} faixa(s)", _duration_text(song['duration'])]
+            if song['key']:
+                details.append(f"Tom {song['key']}")
+            if song['bpm']:
+                details.append(f"{song['bpm']} BPM")
+            if song['uses']:
+                details.append(f"usada {song['uses']}x")
+            if song['analyzed'] < song['stems']:
+                details.append(f"preparando {song['analyzed']}/{song['stems']}")
+            item = QListWidgetItem(f"{song['name']}\n    {' · '.join(details)}")
+            item.setData(Qt.UserRole, song['dir'])
+            item.setToolTip(song['dir'])
+            self.list.addItem(item)
+            if song['dir'] == selected:
+                self.list.setCurrentItem(item)
+        if self.list.currentRow() < 0 and self.list.count():
+            self.list.setCurrentRow(0)
+        self._update_buttons()
+
+    def _update_buttons(self):
+        self.use_btn.setEnabled(self.list.currentItem() is not None)
+
+    def update_status(self):
+        if self.library is None:
+            self.status.setText("Não foi possível abrir a biblioteca.")
+            return
+        scanner = library.current_scan()
+        state = scanner.status() if scanner is not None else None
+        counts = self.library.stats()
+        folders = len(self.library.folders())
+        if not folders:
+            text = "Nenhuma pasta na biblioteca. Adicione as pastas onde ficam as suas músicas."
+        else:
+            text = f"{counts['songs']} música(s), {counts['stems']} faixa(s) em {folders} pasta(s)."
+            if state is not None and not state['finished']:
+                if state['paused']:
+                    text += " Preparação pausada durante a reprodução."
+                elif state['stage'] == 'index':
+                    text += " Procurando faixas..."
+                else:
+                    text += f" Preparando faixas: {state['done']}/{state['total']}."
+        self.status.setText(text)
+        # New songs or analysis progress: update the list (not on every poll)
+        key = (counts['songs'], counts['stems'], counts['analyzed'] // 10)
+        if key != self._last_status:
+            if self._last_status is not None:
+                self.refresh()
+            self._last_status = key
+
+    def add_folder(self):
+        folder = QFileDialog.getExistingDirectory(self, "Pasta de Músicas", os.path.expanduser("~"))
+        if folder and self.library is not None:
+            self.library.add_folder(folder)
+            library.start_scan()
+            self.update_status()
+
+    def remove_folder(self):
+        if self.library is None:
+            return
+        folders = self.library.folders()
+        if not folders:
+            return
+        folder, ok = QInputDialog.getItem(self, "Remover Pasta", "Pasta:", folders, 0, False)
+        if ok and folder:
+            self.library.remove_folder(folder)
+            self.refresh()
+            self.update_status()
+
+    def rescan(self):
+        library.start_scan()
+        self.update_status()
+
+    def choose(self):
+        item = self.list.currentItem()
+        if item is None or self.library is None:
+            return
+        self._song = self.library.song(item.data(Qt.UserRole))
+        if self._song and self._song['tracks']:
+            self.accept()
+
+    def selected_song(self):
+        return self._song
+
+    def done(self, result):
+        self._poll.stop()
+        super().done(result)
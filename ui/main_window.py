@@ -1,22 +1,21 @@
 import sys
 from PyQt5.QtWidgets import (QMainWindow, QPushButton, QVBoxLayout, QWidget, QMessageBox, 
                              QStackedWidget, QHBoxLayout, QLabel, QFileDialog, QStyle, QApplication, QDialog)
-from PyQt5.QtCore import Qt, QPoint, pyqtSignal, QSize, QRectF, QByteArray, QTimer, QSettings, QStandardPaths, QUrl
+from PyQt5.QtCore import Qt, QPoint, pyqtSignal, QSize, QTimer, QSettings, QStandardPaths, QUrl
 from PyQt5.QtGui import QIcon, QPixmap, QPainter, QColor, QPolygon, QFont, QGuiApplication
-from PyQt5.QtSvg import QSvgRenderer
 import os
-try:
-    import qtawesome
-except Exception:
-    qtawesome = None
+import time
 from ui.worship_form import WorshipForm
-from ui.song_form import SongForm
-from ui.tracks_panel import TracksPanel, TrackControl
 from ui.header import HeaderWidget
-from ui.settings_dialog import SettingsDialog
-from midi.manager import MidiManager
+# The song/track views, settings, MIDI and SVG icons are imported where they are first used (and
+# preloaded after the first frame): the initial view is shown before the audio engine loads
+from ui.startup import after_first_paint, optional_module, ModulePreloader
+from ui import resources
+from ui.autosave import ProjectAutosave, recovery_path
 import json
 
+LIBRARY_SCAN_DELAY_MS = 3000
+
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -41,6 +40,14 @@ class MainWindow(QMainWindow):
         self.worship_data = None
         self.songs = []  # List to store all songs
         self.current_song = None  # Currently selected song
+        self.project_path = None  # File the project was opened from or saved to
+        self.project_opener = None  # Staged open of the last project (ui/project_open.py)
+        # Edits are autosaved in the background (to the project file, or a recovery file until it has one)
+        self._manual_save_path = None
+        self.autosave = ProjectAutosave(lambda: self.worship_data or {}, lambda: self.songs,
+                                        self._routing_state, self)
+        self.autosave.saved.connect(self._on_project_saved)
+        self.autosave.failed.connect(self._on_project_save_failed)
         # Settings
         try:
             settings = QSettings('AdoraPlay', 'AppPythonAdrian')
@@ -52,26 +59,18 @@ class MainWindow(QMainWindow):
             self.current_input_device = settings.value('audio_input_device', -1, type=int)
             if self.current_input_device == -1:
                 self.current_input_device = None
+            self.current_secondary_device = settings.value('audio_secondary_device', -1, type=int)
+            if self.current_secondary_device == -1:
+                self.current_secondary_device = None
         except Exception:
             self.lr_enabled = False
             self.current_output_device = None
             self.current_input_device = None
-        # MIDI manager
-        try:
-            self.midi_manager = MidiManager()
-            try:
-                settings = QSettings('AdoraPlay', 'AppPythonAdrian')
-                midi_name = settings.value('midi_input_name', '', type=str)
-                if midi_name:
-                    self.midi_manager.start_listening(midi_name)
-            except Exception:
-                pass
-            try:
-                self.midi_manager.messageReceived.connect(self.on_midi_message)
-            except Exception:
-                pass
-        except Exception:
-            self.midi_manager = None
+            self.current_secondary_device = None
+        # MIDI manager and the audio engine preload start once the first frame is on screen
+        self.midi_manager = None
+        self.preloader = None
+        after_first_paint(self, self.start_background_services)
         # MIDI mapping state
         self.midi_mappings = {}
         self.midi_mapping_active = False
@@ -91,6 +90,46 @@ class MainWindow(QMainWindow):
         except Exception:
             pass
 
+    def start_background_services(self):
+        """Start MIDI listening and import the audio engine in the background (after the first frame)."""
+        try:
+            from midi.manager import MidiManager
+            self.midi_manager = MidiManager()
+            try:
+                settings = QSettings('AdoraPlay', 'AppPythonAdrian')
+                midi_name = settings.value('midi_input_name', '', type=str)
+                if midi_name:
+                    self.midi_manager.start_listening(midi_name)
+            except Exception:
+                pass
+            try:
+                self.midi_manager.messageReceived.connect(self.on_midi_message)
+            except Exception:
+                pass
+        except Exception:
+            self.midi_manager = None
+        self.preloader = ModulePreloader().start()
+        if os.path.exists(recovery_path()):
+            QTimer.singleShot(0, self.offer_project_recovery)
+        # The library scan reads every new stem: let the startup I/O settle first
+        QTimer.singleShot(LIBRARY_SCAN_DELAY_MS, self.start_library_scan)
+
+    def start_library_scan(self):
+        """Index the stem library folders in the background (audio/library.py)."""
+        try:
+            from audio import library
+            library.pause_scan(self._is_playing())
+            library.start_scan()
+        except Exception as e:
+            print(f"[Library] Could not start the scan: {e}")
+
+    def _is_playing(self):
+        panel = getattr(self, 'tracks_panel', None)
+        try:
+            return bool(panel and panel.audio_manager.is_playing())
+        except Exception:
+            return False
+
     def _ensure_midi_listening(self):
         try:
             if not self.midi_manager or not self.midi_manager.available():
@@ -291,8 +330,18 @@ class MainWindow(QMainWindow):
         # Removed the song carousel to keep a single card container (image cards in TracksPanel)
         
         # Tracks panel (initially empty)
+        from ui.tracks_panel import TracksPanel
         self.tracks_panel = TracksPanel()
         self.tracks_panel.songCardSelected.connect(self.on_song_selected)
+        self.tracks_panel.trackFaderClicked.connect(self.on_track_fader_clicked)
+        self.tracks_panel.markerSelected.connect(self.on_marker_selected)
+        self.tracks_panel.savedLoopSelected.connect(self.on_saved_loop_selected)
+        self.tracks_panel.loopButtonClicked.connect(self.on_loop_button_clicked)
+        self.tracks_panel.audio_manager.songTransitioned.connect(self.on_song_transitioned)
+        self.tracks_panel.exportMixRequested.connect(self.export_song_mix)
+        self.tracks_panel.exportFinished.connect(self.on_export_finished)
+        self.tracks_panel.songEdited.connect(self.autosave.mark_song)
+        self.tracks_panel.routingEdited.connect(self.autosave.mark_routing)
         try:
             self.tracks_panel.audio_manager.playbackStateChanged.connect(self.on_playback_state_changed_main)
         except Exception:
@@ -309,6 +358,7 @@ class MainWindow(QMainWindow):
                 self.tracks_panel.audio_manager.set_output_device(int(out_id))
             if in_id is not None and int(in_id) >= 0:
                 self.tracks_panel.audio_manager.set_input_device(int(in_id))
+            self.tracks_panel.audio_manager.set_secondary_device(self.current_secondary_device)
         except Exception:
             pass
         try:
@@ -328,6 +378,9 @@ class MainWindow(QMainWindow):
         
     def back_to_initial(self):
         """Go back to the initial view"""
+        self.autosave.stop()
+        self._cancel_project_open()
+        self.project_path = None
         # Reset data
         self.worship_data = None
         self.songs = []
@@ -437,6 +490,11 @@ class MainWindow(QMainWindow):
             pass
 
     def on_playback_state_changed_main(self, is_playing):
+        try:
+            from audio import library
+            library.pause_scan(is_playing)
+        except Exception:
+            pass
         if is_playing:
             self.start_play_blink()
         else:
@@ -474,6 +532,13 @@ class MainWindow(QMainWindow):
                     self.tracks_panel.set_master_fader_blink(self._mapping_target_blink_on)
                 except Exception:
                     pass
+            elif action == 'loop_section':
+                try:
+                    self.tracks_panel.set_loop_button_blink(self._mapping_target_blink_on)
+                except Exception:
+                    pass
+            elif isinstance(action, str) and action.startswith(('marker:', 'loop:')):
+                pass
             elif hasattr(self, 'header_widget') and self.header_widget:
                 if action == 'pause':
                     self.header_widget.set_pause_blink(self._mapping_target_blink_on)
@@ -497,7 +562,11 @@ class MainWindow(QMainWindow):
         if hasattr(self, 'header_widget') and self.header_widget:
             self.header_widget.set_play_blink(False)
 
-    def on_song_selected(self, song_data):
+    def on_song_transitioned(self, song_data):
+        """A queued song took over playback: follow it in the UI without stopping audio."""
+        self.on_song_selected(song_data, stop_playback=False)
+
+    def on_song_selected(self, song_data, stop_playback=True):
         """Handle song selection from TracksPanel image cards"""
         try:
             # Check if reselecting the same song to avoid unnecessary rebuilds
@@ -513,16 +582,8 @@ class MainWindow(QMainWindow):
             if song_data:
                 # Stop any currently playing audio
                 if hasattr(self, 'tracks_panel') and self.tracks_panel:
-                    if old_id != new_id:
+                    if old_id != new_id and stop_playback:
                         self.tracks_panel.audio_manager.stop_all()
-                # Clear existing tracks
-                if old_id != new_id:
-                    for control in self.tracks_panel.track_controls:
-                        self.tracks_panel.tracks_layout.removeWidget(control)
-                        control.deleteLater()
-                    self.tracks_panel.track_controls.clear()
-                    self.tracks_panel.solo_states.clear()
-                    self.tracks_panel.original_mute_states.clear()
                 # Set the current song in the audio manager
                 self.tracks_panel.audio_manager.set_current_song(song_data)
                 # Connect VU meter signal from player to panel
@@ -531,42 +592,9 @@ class MainWindow(QMainWindow):
                 except Exception:
                     pass
                 
-                # Update track list and controls
+                # Rebind pooled track strips to the new song's tracks
                 if old_id != new_id:
-                    self.tracks_panel.tracks = song_data.get("tracks", [])
-                    for i, track_path in enumerate(self.tracks_panel.tracks):
-                        track_name = os.path.basename(track_path)
-                        track_control = TrackControl(i, track_name)
-                        track_control.volumeChanged.connect(self.tracks_panel.on_track_volume_changed)
-                        track_control.muteChanged.connect(self.tracks_panel.on_track_mute_changed)
-                        track_control.soloChanged.connect(self.tracks_panel.on_track_solo_changed)
-                        try:
-                            track_control.faderClicked.connect(self.on_track_fader_clicked)
-                        except Exception:
-                            pass
-                        player_tracks = getattr(self.tracks_panel.audio_manager.current_player, 'tracks', [])
-                        if 0 <= i < len(player_tracks):
-                            vol = player_tracks[i].get('volume')
-                            # Convert stored amplitude gain to slider percent using panel mapping
-                            try:
-                                pct = self.tracks_panel._gain_to_slider_pct(vol if vol is not None else 0.8)
-                                track_control.set_volume(pct / 100.0)
-                            except Exception:
-                                track_control.set_volume(vol if vol is not None else 0.8)
-                            track_control.set_muted(player_tracks[i].get('muted', False))
-                        # Estilo especial para o primeiro fader após o master
-                        if i == 0:
-                            try:
-                                track_control.setStyleSheet(
-                                    "background-color: #252525;"
-                                    "border-top-left-radius: 10px;"
-                                    "border-bottom-left-radius: 10px;"
-                                )
-                                track_control.setAttribute(Qt.WA_StyledBackground, True)
-                            except Exception:
-                                pass
-                        self.tracks_panel.track_controls.append(track_control)
-                        self.tracks_panel.tracks_layout.addWidget(track_control)
+                    self.tracks_panel.bind_tracks(song_data.get("tracks", []))
                 
                 # Highlight selected song card in UI (selection only, no re-emit)
                 self.tracks_panel.select_card_by_song(song_data)
@@ -578,11 +606,7 @@ class MainWindow(QMainWindow):
                         pass
             else:
                 # No song selected: clear tracks only
-                for control in self.tracks_panel.track_controls:
-                    self.tracks_panel.tracks_layout.removeWidget(control)
-                    control.deleteLater()
-                self.tracks_panel.track_controls.clear()
-                self.tracks_panel.tracks = []
+                self.tracks_panel.clear_tracks()
         except Exception as e:
             print(f"Error in on_song_selected: {e}")
             msg_box = QMessageBox()
@@ -646,6 +670,10 @@ class MainWindow(QMainWindow):
                     self.header_widget.set_restart_blink(False)
             except Exception:
                 pass
+            try:
+                self.tracks_panel.refresh_timeline_structure()
+            except Exception:
+                pass
         except Exception:
             pass
 
@@ -745,6 +773,21 @@ class MainWindow(QMainWindow):
                             self.tracks_panel.master_control.volume_fader.setValue(pct)
                     except Exception:
                         pass
+                elif isinstance(action, str) and action.startswith('marker:'):
+                    try:
+                        self.tracks_panel.jump_to_marker(int(action.split(':')[1]))
+                    except Exception:
+                        pass
+                elif isinstance(action, str) and action.startswith('loop:'):
+                    try:
+                        self.tracks_panel.loop_saved(int(action.split(':')[1]))
+                    except Exception:
+                        pass
+                elif action == 'loop_section':
+                    try:
+                        self.tracks_panel.toggle_loop_section()
+                    except Exception:
+                        pass
         except Exception:
             pass
 
@@ -772,6 +815,46 @@ class MainWindow(QMainWindow):
         except Exception:
             pass
 
+    def on_marker_selected(self, marker_index):
+        try:
+            if getattr(self, 'midi_mapping_active', False) and getattr(self, 'midi_mapping_selecting', False):
+                self.midi_mapping_target_action = f"marker:{int(marker_index)}"
+                self.midi_mapping_selecting = False
+                self._mapping_target_blink_on = True
+                if not self.mapping_target_blink_timer.isActive():
+                    self.mapping_target_blink_timer.start()
+                return
+            self.tracks_panel.jump_to_marker(int(marker_index))
+        except Exception:
+            pass
+
+    def on_saved_loop_selected(self, loop_index):
+        try:
+            if getattr(self, 'midi_mapping_active', False) and getattr(self, 'midi_mapping_selecting', False):
+                self.midi_mapping_target_action = f"loop:{int(loop_index)}"
+                self.midi_mapping_selecting = False
+                self._mapping_target_blink_on = True
+                if not self.mapping_target_blink_timer.isActive():
+                    self.mapping_target_blink_timer.start()
+                return
+            self.tracks_panel.loop_saved(int(loop_index))
+        except Exception:
+            pass
+
+    def on_loop_button_clicked(self):
+        try:
+            if getattr(self, 'midi_mapping_active', False) and getattr(self, 'midi_mapping_selecting', False):
+                self.midi_mapping_target_action = 'loop_section'
+                self.midi_mapping_selecting = False
+                self._mapping_target_blink_on = True
+                self.tracks_panel.set_loop_button_blink(True)
+                if not self.mapping_target_blink_timer.isActive():
+                    self.mapping_target_blink_timer.start()
+                return
+            self.tracks_panel.toggle_loop_section()
+        except Exception:
+            pass
+
     def _midi_to_slider_pct(self, msg):
         try:
             t = getattr(msg, 'type', '')
@@ -803,6 +886,7 @@ class MainWindow(QMainWindow):
         if file_paths:
             # Add tracks to the song data
             song_data["tracks"].extend(file_paths)
+            self.autosave.mark_song(song_data)
             print(f"Added tracks to song: {song_data['name']}")
             # Não lembramos diretório; sempre iniciamos em Downloads
             
@@ -898,14 +982,9 @@ class MainWindow(QMainWindow):
     def load_icon(self, filename, fallback=None):
         """Load icon from file if available; otherwise use a fallback drawing."""
         try:
-            base_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-            candidates = [
-                os.path.join(base_path, filename),
-                os.path.join(base_path, "Resources", filename),
-            ]
-            for path in candidates:
-                if os.path.exists(path):
-                    return QIcon(QPixmap(path))
+            path = resources.find_resource(filename)
+            if path:
+                return QIcon(QPixmap(path))
         except Exception:
             pass
         # Fallback to drawn icon
@@ -918,7 +997,11 @@ class MainWindow(QMainWindow):
         return QIcon()
 
     def get_icon(self, kind):
-        """Prefer provided SVG icons; then qtawesome in white; finally crisp drawn icons."""
+        """Prefer provided SVG icons; then qtawesome in white; finally crisp drawn icons.
+        Resolved once per kind, size and pixel ratio (see ui/resources.py)."""
+        return resources.cached_icon(('main', kind), QSize(24, 24), lambda: self._resolve_icon(kind))
+
+    def _resolve_icon(self, kind):
         # 1) Try explicit SVG filenames
         svg_map = {
             'play': ['play_arrow_24dp_E3E3E3_FILL0_wght400_GRAD0_opsz24.svg'],
@@ -938,6 +1021,7 @@ class MainWindow(QMainWindow):
         if icon:
             return icon
         # 3) Try qtawesome (FontAwesome/MDI) with forced white color
+        qtawesome = optional_module('qtawesome')
         if qtawesome:
             name_lists = {
                 'play': ['fa5s.play', 'fa.play', 'mdi.play'],
@@ -966,56 +1050,16 @@ class MainWindow(QMainWindow):
         return None
 
     def _try_svg_by_keywords(self, keywords, size):
-        if not keywords:
-            return None
-        try:
-            base_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-            for folder in [base_path, os.path.join(base_path, 'Resources')]:
-                if not os.path.isdir(folder):
-                    continue
-                for fn in os.listdir(folder):
-                    lower = fn.lower()
-                    if not lower.endswith('.svg'):
-                        continue
-                    if all(kw in lower for kw in keywords):
-                        icon = self.load_svg_icon(fn, size)
-                        if icon:
-                            return icon
-        except Exception:
-            pass
-        return None
+        path = resources.find_svg(keywords)
+        return self.load_svg_icon(path, size) if path else None
 
     def load_svg_icon(self, filename, size=QSize(36, 36)):
-        """Render an SVG to a high-DPI pixmap and wrap in QIcon."""
+        """SVG rendered in white (high contrast) to a high-DPI pixmap, wrapped in QIcon.
+        Rendered once per size; the pixmap is cached on disk between runs."""
         try:
-            base_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-            candidates = [
-                os.path.join(base_path, filename),
-                os.path.join(base_path, 'Resources', filename),
-            ]
-            for path in candidates:
-                if os.path.exists(path):
-                    # Read and force white color for fills/strokes to ensure high contrast
-                    try:
-                        with open(path, 'rb') as f:
-                            raw = f.read()
-                        text = raw.decode('utf-8', errors='ignore')
-                        for key in ['#E3E3E3', '#e3e3e3', '#000000']:
-                            text = text.replace(key, '#FFFFFF')
-                        data = QByteArray(text.encode('utf-8'))
-                        renderer = QSvgRenderer(data)
-                    except Exception:
-                        renderer = QSvgRenderer(path)
-                    pm, _ = self._make_hidpi_pixmap(size)
-                    painter = QPainter(pm)
-                    painter.setRenderHint(QPainter.Antialiasing)
-                    # Render to full device-pixel area for crisp output
-                    renderer.render(painter, QRectF(0, 0, pm.width(), pm.height()))
-                    painter.end()
-                    return QIcon(pm)
+            return resources.svg_icon(filename, size, color='#FFFFFF')
         except Exception:
-            pass
-        return None
+            return None
 
     def _make_hidpi_pixmap(self, size):
         """Create a transparent pixmap scaled for device pixel ratio for crisp icons."""
@@ -1038,6 +1082,8 @@ class MainWindow(QMainWindow):
             print(f"Worship Data: {self.worship_data}")
             # Build the main view and switch to it
             self.create_main_view()
+            self.project_path = None
+            self.autosave.start(None)
             try:
                 # Remove the form page
                 idx = self.stacked_widget.indexOf(form)
@@ -1078,6 +1124,7 @@ class MainWindow(QMainWindow):
                     msg_box.exec_()
                     return
                     
+            from ui.song_form import SongForm
             form = SongForm(self)
 
             def on_form_accepted():
@@ -1085,6 +1132,8 @@ class MainWindow(QMainWindow):
                 print(f"Song Data: {song_data}")
                 # Add song to our list
                 self.songs.append(song_data)
+                self.autosave.mark_song(song_data)
+                self.remember_in_library(song_data)
                 if hasattr(self, 'tracks_panel') and self.tracks_panel:
                     try:
                         song_id = self.tracks_panel._get_song_id(song_data)
@@ -1146,6 +1195,7 @@ class MainWindow(QMainWindow):
 
     def open_settings(self):
         try:
+            from ui.settings_dialog import SettingsDialog
             dlg = SettingsDialog(self)
             try:
                 # Ajuste para novo UI: SettingRow contém .toggle
@@ -1161,12 +1211,38 @@ class MainWindow(QMainWindow):
                     dlg.audioInputDeviceSelected.connect(self.set_audio_input_device)
                 if hasattr(dlg, 'midiInputDeviceSelected'):
                     dlg.midiInputDeviceSelected.connect(self.set_midi_input_device)
+                if hasattr(dlg, 'audioSecondaryDeviceSelected'):
+                    dlg.audioSecondaryDeviceSelected.connect(self.set_audio_secondary_device)
             except Exception:
                 pass
             try:
                 # Set current devices in the dialog
                 if hasattr(dlg, 'set_current_devices'):
-                    dlg.set_current_devices(self.current_output_device, self.current_input_device)
+                    dlg.set_current_devices(self.current_output_device, self.current_input_device,
+                                            self.current_secondary_device)
+            except Exception:
+                pass
+            try:
+                if hasattr(self, 'tracks_panel') and self.tracks_panel:
+                    dlg.set_stats_provider(self.tracks_panel.audio_manager.callback_stats)
+            except Exception:
+                pass
+            try:
+                if hasattr(self, 'tracks_panel') and self.tracks_panel:
+                    manager = self.tracks_panel.audio_manager
+                    dlg.set_routing_presets([p.name for p in manager.routing_presets],
+                                            manager.routing.name if manager.routing else None)
+                    dlg.routingPresetSelected.connect(manager.set_routing_by_name)
+                    dlg.routingPresetSelected.connect(lambda _: self.autosave.mark_routing())
+            except Exception:
+                pass
+            try:
+                from audio.storage import load_sample_format
+                settings = QSettings('AdoraPlay', 'AppPythonAdrian')
+                dlg.auto_latency.toggle.setChecked(settings.value('audio_auto_tune', True, type=bool))
+                dlg.auto_latency.toggle.toggled.connect(self.set_auto_tune)
+                dlg.compact_samples.toggle.setChecked(load_sample_format() != 'float32')
+                dlg.compact_samples.toggle.toggled.connect(self.set_compact_samples)
             except Exception:
                 pass
             try:
@@ -1194,6 +1270,35 @@ class MainWindow(QMainWindow):
         except Exception as e:
             print(f"Error setting LR mode: {e}")
     
+    def set_auto_tune(self, enabled: bool):
+        try:
+            settings = QSettings('AdoraPlay', 'AppPythonAdrian')
+            settings.setValue('audio_auto_tune', bool(enabled))
+            if hasattr(self, 'tracks_panel') and self.tracks_panel:
+                self.tracks_panel.audio_manager.set_auto_tune(enabled)
+        except Exception as e:
+            print(f"Error setting auto latency: {e}")
+
+    def set_compact_samples(self, enabled: bool):
+        try:
+            fmt = 'int16' if enabled else 'float32'
+            from audio.storage import save_sample_format
+            save_sample_format(fmt)
+            if hasattr(self, 'tracks_panel') and self.tracks_panel:
+                self.tracks_panel.audio_manager.set_sample_format(fmt)
+        except Exception as e:
+            print(f"Error setting sample format: {e}")
+
+    def set_audio_secondary_device(self, device_id):
+        try:
+            self.current_secondary_device = device_id
+            settings = QSettings('AdoraPlay', 'AppPythonAdrian')
+            settings.setValue('audio_secondary_device', -1 if device_id is None else int(device_id))
+            if hasattr(self, 'tracks_panel') and self.tracks_panel:
+                self.tracks_panel.audio_manager.set_secondary_device(device_id)
+        except Exception as e:
+            print(f"Error setting secondary output: {e}")
+
     def set_audio_output_device(self, device_id):
         try:
             print(f"[MainWindow] set_audio_output_device called with: {device_id}")
@@ -1246,39 +1351,32 @@ class MainWindow(QMainWindow):
     def save_project(self):
         try:
             worship = self.worship_data or {}
-            songs = self.songs[:]
-            data = {
-                "version": 1,
-                "worship": worship,
-                "songs": songs,
-            }
             default_name = "Projeto.wproj"
-            try:
-                name = (worship.get("name") or "Projeto").strip()
-                date = (worship.get("date") or "").strip()
-                base = f"{name} - {date}".strip().strip(" -")
-                safe = "".join(c for c in base if c.isalnum() or c in " _-")
-                default_name = f"{safe}.wproj"
-            except Exception:
-                pass
+            if self.project_path:
+                default_name = os.path.basename(self.project_path)
+            else:
+                try:
+                    name = (worship.get("name") or "Projeto").strip()
+                    date = (worship.get("date") or "").strip()
+                    base = f"{name} - {date}".strip().strip(" -")
+                    safe = "".join(c for c in base if c.isalnum() or c in " _-")
+                    default_name = f"{safe}.wproj"
+                except Exception:
+                    pass
+            start_dir = os.path.dirname(self.project_path) if self.project_path else self._start_dir()
             path, _ = self._run_native_file_dialog(lambda: QFileDialog.getSaveFileName(
                 self,
                 "Salvar Projeto",
-                os.path.join(self._start_dir(), default_name),
+                os.path.join(start_dir, default_name),
                 "Todos (*.*);;Projeto de Culto (*.wproj);;JSON (*.json)",
                 options=self._file_dialog_options()
             ))
             if not path:
                 return
-            try:
-                with open(path, 'w', encoding='utf-8') as f:
-                    json.dump(data, f, ensure_ascii=False, indent=2)
-            except Exception as e:
-                msg = QMessageBox(self)
-                msg.setWindowTitle("Erro ao Salvar")
-                msg.setText(f"Não foi possível salvar o projeto: {str(e)}")
-                msg.setIcon(QMessageBox.Critical)
-                msg.exec_()
+            # Written atomically in the background; errors come back through _on_project_save_failed
+            self.project_path = path
+            self._manual_save_path = path
+            self.autosave.save_as(path)
         except Exception as e:
             print(f"Error in save_project: {e}")
             msg = QMessageBox(self)
@@ -1287,6 +1385,132 @@ class MainWindow(QMainWindow):
             msg.setIcon(QMessageBox.Critical)
             msg.exec_()
 
+    def _routing_state(self):
+        if hasattr(self, 'tracks_panel') and self.tracks_panel:
+            return self.tracks_panel.audio_manager.routing_state()
+        return None
+
+    def _on_project_saved(self, path, seconds):
+        if path == self._manual_save_path:
+            self._manual_save_path = None
+        if path != recovery_path():
+            # The project has a file now: nothing left to recover
+            try:
+                os.remove(recovery_path())
+            except OSError:
+                pass
+
+    def _on_project_save_failed(self, path, error):
+        if path != self._manual_save_path:
+            return  # Autosave: printed by the writer, retried with the next edit
+        self._manual_save_path = None
+        msg = QMessageBox(self)
+        msg.setWindowTitle("Erro ao Salvar")
+        msg.setText(f"Não foi possível salvar o projeto: {error}")
+        msg.setIcon(QMessageBox.Critical)
+        msg.exec_()
+
+    def offer_project_recovery(self):
+        """Reopen the autosaved project of a session that ended before it was saved to a file."""
+        path = recovery_path()
+        if not os.path.exists(path) or self.worship_data is not None:
+            return
+        answer = QMessageBox.question(
+            self, "Recuperar Projeto",
+            "Há um projeto não salvo da última sessão. Deseja recuperá-lo?",
+            QMessageBox.Yes | QMessageBox.No, QMessageBox.Yes)
+        if answer == QMessageBox.Yes:
+            self.load_project_file(path, recovered=True)
+        else:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def closeEvent(self, event):
+        # Pending edits are written before the app exits
+        self._cancel_project_open(wait=True)
+        try:
+            from audio import library
+            library.stop_scan(wait=1.0)
+        except Exception:
+            pass
+        try:
+            self.autosave.shutdown()
+        except Exception as e:
+            print(f"Error saving on exit: {e}")
+        super().closeEvent(event)
+
+    def remember_in_library(self, song_data):
+        """Keep the name, key, BPM and banner of a library song for the next service."""
+        try:
+            from audio.library import shared
+            library = shared()
+            if library is not None:
+                library.remember_song(song_data)
+        except Exception as e:
+            print(f"[Library] Could not record {song_data.get('name')}: {e}")
+
+    def _safe_file_name(self, text, fallback):
+        safe = "".join(c for c in (text or "") if c.isalnum() or c in " _-").strip()
+        return safe or fallback
+
+    def export_song_mix(self, song_data):
+        """Export the mix of one song (or of every song when song_data is None) to WAV."""
+        try:
+            if song_data is not None:
+                default_name = f"{self._safe_file_name(song_data.get('name'), 'Mix')}.wav"
+                path, _ = self._run_native_file_dialog(lambda: QFileDialog.getSaveFileName(
+                    self,
+                    "Exportar Mix",
+                    os.path.join(self._start_dir(), default_name),
+                    "WAV (*.wav)",
+                    options=self._file_dialog_options()
+                ))
+                if not path:
+                    return
+                if not path.lower().endswith('.wav'):
+                    path += '.wav'
+                targets = [(song_data, path)]
+            else:
+                folder = self._run_native_file_dialog(lambda: QFileDialog.getExistingDirectory(
+                    self,
+                    "Exportar Mix de Todas as Músicas",
+                    self._start_dir(),
+                    options=self._file_dialog_options()
+                ))
+                if not folder:
+                    return
+                targets = []
+                for i, song in enumerate(self.songs):
+                    if song.get("tracks"):
+                        name = self._safe_file_name(song.get("name"), f"Musica {i + 1}")
+                        targets.append((song, os.path.join(folder, f"{i + 1:02d} - {name}.wav")))
+            if not self.tracks_panel.export_mixes(targets):
+                msg = QMessageBox(self)
+                msg.setWindowTitle("Exportar Mix")
+                msg.setText("Já existe uma exportação em andamento.")
+                msg.setIcon(QMessageBox.Information)
+                msg.exec_()
+        except Exception as e:
+            print(f"Error in export_song_mix: {e}")
+
+    def on_export_finished(self, results):
+        lines = []
+        failed = False
+        for report in results.values():
+            if isinstance(report, dict):
+                lines.append(f"{os.path.basename(report['path'])}: {report['duration']:.0f}s em "
+                             f"{report['elapsed']:.1f}s ({report['rtf']:.0f}x tempo real)")
+            else:
+                failed = True
+                lines.append(f"Erro: {report}")
+        msg = QMessageBox(self)
+        msg.setWindowTitle("Exportar Mix")
+        msg.setText("\n".join(lines) or "Nada para exportar.")
+        msg.setIcon(QMessageBox.Warning if failed else QMessageBox.Information)
+        msg.exec_()
+
     def open_project(self):
         try:
             path, _ = self._run_native_file_dialog(lambda: QFileDialog.getOpenFileName(
@@ -1299,6 +1523,20 @@ class MainWindow(QMainWindow):
             if not path:
                 return
             # Não lembramos diretório; sempre iniciamos em Downloads
+            self.load_project_file(path)
+        except Exception as e:
+            print(f"Error in open_project: {e}")
+            msg = QMessageBox(self)
+            msg.setWindowTitle("Erro")
+            msg.setText(f"Ocorreu um erro ao abrir: {str(e)}")
+            msg.setIcon(QMessageBox.Critical)
+            msg.exec_()
+
+    def load_project_file(self, path, recovered=False):
+        """Open a project file (recovered: the autosave of an unsaved project, which keeps no path).
+        The cards, file checks and the first song's stems then load in stages (ui/project_open.py)."""
+        started = time.perf_counter()
+        try:
             try:
                 with open(path, 'r', encoding='utf-8') as f:
                     data = json.load(f)
@@ -1314,6 +1552,12 @@ class MainWindow(QMainWindow):
             self.worship_data = worship
             self.songs = songs
             self.create_main_view()
+            self.project_path = None if recovered else path
+            self.autosave.start(self.project_path, saved=True)
+            try:
+                self.tracks_panel.audio_manager.load_routing_state(data.get("routing"))
+            except Exception as e:
+                print(f"Error loading routing presets: {e}")
             try:
                 # Restaura envelopes pré-computados no cache da timeline
                 for song in self.songs:
@@ -1328,21 +1572,16 @@ class MainWindow(QMainWindow):
                             }
                     except Exception:
                         pass
-                for song in self.songs:
-                    song_name = song.get("name", "Unknown Song")
-                    key = song.get("key", "Unknown Key")
-                    bpm = song.get("bpm", "Unknown BPM")
-                    banner_image = song.get("banner_image", None)
-                    self.tracks_panel.add_song_card(song_name, key, bpm, banner_image, song)
-                if self.songs:
-                    self.on_song_selected(self.songs[0])
-                # Start background optimization for all songs and show progress on cards
-                try:
-                    self.tracks_panel.start_optimization_for_all_songs(self.songs)
-                except Exception:
-                    pass
-            except Exception:
-                pass
+                # Cards, stem checks, banners and the first song load in stages; each song's
+                # optimizer starts once its stems are checked
+                from ui.project_open import ProjectOpener
+                self._cancel_project_open()
+                self.project_opener = ProjectOpener(self.tracks_panel, self.songs, self.project_path, started, self)
+                self.project_opener.firstSongReady.connect(self._on_first_song_ready)
+                self.project_opener.checked.connect(self._on_project_checked)
+                self.project_opener.start()
+            except Exception as e:
+                print(f"Error loading project songs: {e}")
         except Exception as e:
             print(f"Error in open_project: {e}")
             msg = QMessageBox(self)
@@ -1351,3 +1590,44 @@ class MainWindow(QMainWindow):
             msg.setIcon(QMessageBox.Critical)
             msg.exec_()
         
+
+    def _cancel_project_open(self, wait=False):
+        if self.project_opener is not None:
+            self.project_opener.cancel(wait)
+            self.project_opener = None
+
+    def _on_first_song_ready(self, song_data):
+        # Unless the user already picked a song while the project was opening
+        if self.sender() is self.project_opener and self.current_song is None:
+            self.on_song_selected(song_data)
+
+    def _on_project_checked(self, report):
+        opener = self.sender()
+        if opener is not self.project_opener:
+            return
+        if not report.get('problems'):
+            return
+        from ui.project_open import MissingStemsDialog
+        dialog = MissingStemsDialog(self.songs, report, self.project_path, self)
+        dialog.relinkRequested.connect(self.relink_stems)
+        # The optimizer of the songs with missing stems waits for the answer
+        dialog.finished.connect(lambda _result: opener.release_held())
+        dialog.show()
+
+    def relink_stems(self, mapping):
+        """Point the songs at the new paths ({old path: new path}) of moved stems."""
+        from audio.probe import relink_song
+        for song in self.songs:
+            old_id = self.tracks_panel._get_song_id(song)
+            if not relink_song(song, mapping):
+                continue
+            self.tracks_panel.rekey_song(old_id, song)
+            self.tracks_panel.audio_manager.forget_song(old_id)
+            card = self.tracks_panel.song_card_map.get(self.tracks_panel._get_song_id(song))
+            if card:
+                card.set_missing(sum(1 for t in song.get("tracks", []) if not os.path.exists(t)))
+            self.autosave.mark_song(song)
+            if song is self.current_song:
+                # Load it again from the new paths
+                self.current_song = None
+                self.on_song_selected(song)
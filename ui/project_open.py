@@ -0,0 +1,397 @@
+# Staged opening of a project (.wproj): the main view is usable while its files are checked.
+#   1. The song cards are added without their banners, about a frame's worth per event-loop
+#      turn, so the window repaints while a long set list fills in.
+#   2. A worker thread stats every stem and reads its WAV header on a thread pool (audio/probe.py),
+#      and decodes the banners there too (as QImage, which unlike QPixmap can be built off the GUI
+#      thread). Each song is reported as soon as its stems are checked; its card then shows the
+#      missing ones and its optimizer thread starts (once the first song is loaded).
+#   3. At the same time the first song's stems are loaded into a player on the pool. The window
+#      adopts it and selects the song when it is ready: that is when the project is interactive.
+#   4. Missing stems are listed once everything is checked, with relink suggestions
+#      (MissingStemsDialog); the optimizer of those songs waits for the answer.
+# timings holds the seconds from the start of the open to each stage (see bench/project_open_bench.py).
+import os
+import threading
+import time
+from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QListWidget,
+                             QListWidgetItem, QFileDialog)
+from PyQt5.QtCore import Qt, QObject, QThread, QTimer, pyqtSignal, QCoreApplication
+from PyQt5.QtGui import QFont, QImage
+from concurrent.futures import ThreadPoolExecutor
+from audio.probe import probe_stems, search_folders, suggest_relinks, PROBE_WORKERS
+from audio.render import player_for_song
+from ui import resources
+
+CARD_TICK_BUDGET = 0.016  # Seconds of card creation per event-loop turn (about a frame)
+CARD_SIZE = (320, 180)  # SongCardWidget size (banners are decoded at this size)
+
+PROBLEM_LABELS = {
+    'missing': "não encontrado",
+    'unsupported': "formato não suportado",
+    'truncated': "arquivo incompleto",
+}
+
+
+def problem_label(error):
+    return PROBLEM_LABELS.get(error, "arquivo ilegível")
+
+
+class ProjectOpenWorker(QObject):
+    songChecked = pyqtSignal(int, object)   # song index, {path: probe result}
+    bannerLoaded = pyqtSignal(int, object)  # song index, QImage scaled to the card
+    playerReady = pyqtSignal(int, object)   # song index, AudioPlayer with its stems loaded
+    checked = pyqtSignal(object)            # report of the whole project (see run)
+    finished = pyqtSignal()
+
+    def __init__(self, songs, project_path=None, first=None, lr_enabled=False, banner_size=CARD_SIZE):
+        super().__init__()
+        # Copies: the GUI thread may edit the songs while they are checked
+        self.songs = [(list(s.get("tracks", []) or []), s.get("banner_image")) for s in songs]
+        self.first = first
+        self.first_song = dict(songs[first]) if first is not None else None
+        self.project_path = project_path
+        self.lr_enabled = lr_enabled
+        self.banner_size = banner_size
+        self.gui_thread = QCoreApplication.instance().thread()
+        self.cancelled = False
+
+    def _load_first(self):
+        if self.cancelled:
+            return
+        try:
+            player = player_for_song(self.first_song, self.lr_enabled)
+            # Built on a pool thread: hand the QObject over to the GUI thread that will own it
+            player.moveToThread(self.gui_thread)
+            self.playerReady.emit(self.first, player)
+        except Exception as e:
+            print(f"[ProjectOpen] Could not load the first song: {e}")
+            self.playerReady.emit(self.first, None)
+
+    def _load_banner(self, index, path):
+        if self.cancelled or not path or not os.path.exists(path):
+            return
+        image = QImage(path)
+        if image.isNull():
+            return
+        w, h = self.banner_size
+        image = image.scaled(w, h, Qt.KeepAspectRatioByExpanding, Qt.SmoothTransformation)
+        self.bannerLoaded.emit(index, image)
+
+    def run(self):
+        started = time.perf_counter()
+        lock = threading.Lock()
+        remaining = [len(set(tracks)) for tracks, _ in self.songs]
+        songs_of = {}
+        for i, (tracks, _) in enumerate(self.songs):
+            for path in set(tracks):
+                songs_of.setdefault(path, []).append(i)
+        results = {}
+
+        def on_result(result):
+            with lock:
+                results[result['path']] = result
+                done = []
+                for i in songs_of[result['path']]:
+                    remaining[i] -= 1
+                    if remaining[i] == 0:
+                        done.append(i)
+                ready = [(i, {p: results[p] for p in self.songs[i][0]}) for i in done]
+            for i, checked in ready:
+                if not self.cancelled:
+                    self.songChecked.emit(i, checked)
+
+        try:
+            with ThreadPoolExecutor(max_workers=PROBE_WORKERS, thread_name_prefix="project_open") as pool:
+                # The first song goes first: it decides when the project is usable
+                if self.first_song is not None:
+                    pool.submit(self._load_first)
+                for i, (_, banner) in enumerate(self.songs):
+                    if banner:
+                        pool.submit(self._load_banner, i, banner)
+                for i, (tracks, _) in enumerate(self.songs):
+                    if not tracks:
+                        self.songChecked.emit(i, {})
+                probe_stems(list(songs_of), on_result=on_result)
+                problems = {p: r['error'] for p, r in results.items() if r['error']}
+                missing = [p for p, e in problems.items() if e == 'missing']
+                suggestions = {}
+                if missing and not self.cancelled:
+                    found = [p for p, r in results.items() if r['exists']]
+                    suggestions = suggest_relinks(missing, search_folders(missing, found, self.project_path), found)
+                report = {
+                    'songs': len(self.songs),
+                    'stems': len(results),
+                    'problems': problems,
+                    'missing': missing,
+                    'suggestions': suggestions,
+                    'seconds': time.perf_counter() - started,
+                }
+                if not self.cancelled:
+                    self.checked.emit(report)
+        except Exception as e:
+            print(f"[ProjectOpen] Could not check the project files: {e}")
+        self.finished.emit()
+
+
+class ProjectOpener(QObject):
+    """Fills the tracks panel with an opened project's songs in stages (see the module comment)."""
+    firstSongReady = pyqtSignal(object)  # song_data whose player is loaded
+    checked = pyqtSignal(object)         # ProjectOpenWorker report
+
+    def __init__(self, tracks_panel, songs, project_path=None, started=None, parent=None):
+        super().__init__(parent)
+        self.tracks_panel = tracks_panel
+        self.songs = songs
+        self.project_path = project_path
+        self.started = started if started is not None else time.perf_counter()
+        self.timings = {}
+        self.report = None
+        self.cancelled = False
+        self._added = 0
+        self._checked = {}     # song index -> {path: probe result}
+        self._banners = {}     # song index -> QImage not yet given to a card
+        self._held = []        # Songs with missing stems: optimized once the user answered
+        self._optimizing = set()
+        self._interactive = not songs  # The first song is selected
+        self._waiting = []     # Checked songs whose optimizer waits for the first song
+        self._tracks = []      # Stems of each song when the open started
+        self._thread = None
+        self._worker = None
+        self._timer = QTimer(self)
+        self._timer.setInterval(0)
+        self._timer.timeout.connect(self._add_cards)
+
+    def start(self):
+        self._timer.start()
+        dpr = resources.device_pixel_ratio()
+        self._tracks = [list(s.get("tracks", []) or []) for s in self.songs]
+        thread = QThread(self)
+        worker = ProjectOpenWorker(self.songs, self.project_path, first=0 if self.songs else None,
+                                   lr_enabled=self.tracks_panel.audio_manager.lr_enabled,
+                                   banner_size=(int(CARD_SIZE[0] * dpr), int(CARD_SIZE[1] * dpr)))
+        worker.moveToThread(thread)
+        thread.started.connect(worker.run)
+        worker.songChecked.connect(self._on_song_checked)
+        worker.bannerLoaded.connect(self._on_banner_loaded)
+        worker.playerReady.connect(self._on_player_ready)
+        worker.checked.connect(self._on_checked)
+        worker.finished.connect(thread.quit)
+        thread.finished.connect(self._on_thread_finished)
+        self._thread = thread
+        self._worker = worker
+        thread.start()
+
+    def _mark(self, stage):
+        self.timings.setdefault(stage, time.perf_counter() - self.started)
+
+    def cancel(self, wait=False):
+        """The project was closed before it finished opening: ignore the rest."""
+        self.cancelled = True
+        self._timer.stop()
+        if self._worker is not None:
+            self._worker.cancelled = True
+        if wait and self._thread is not None:
+            self._thread.wait(5000)
+
+    def _on_thread_finished(self):
+        self._worker = None
+        self._thread = None
+        if self.cancelled:
+            self.deleteLater()
+
+    def _card(self, index):
+        if index >= self._added:
+            return None
+        return self.tracks_panel.song_card_map.get(self.tracks_panel._get_song_id(self.songs[index]))
+
+    def _add_cards(self):
+        if self.cancelled:
+            return
+        first = self._added
+        tick_end = time.perf_counter() + CARD_TICK_BUDGET
+        for i in range(first, len(self.songs)):
+            if i > first and time.perf_counter() > tick_end:
+                break
+            song = self.songs[i]
+            # The banner arrives decoded from the worker
+            self.tracks_panel.add_song_card(song.get("name", "Unknown Song"), song.get("key", "Unknown Key"),
+                                            song.get("bpm", "Unknown BPM"), None, song)
+            self._added = i + 1
+            self._mark('first_card')
+            if i in self._banners:
+                self._on_banner_loaded(i, self._banners.pop(i))
+            if i in self._checked:
+                self._apply_check(i)
+        if self._added >= len(self.songs):
+            self._timer.stop()
+            self._mark('cards')
+
+    def _on_banner_loaded(self, index, image):
+        if self.cancelled:
+            return
+        card = self._card(index)
+        if card is None:
+            self._banners[index] = image
+            return
+        card.set_banner_image(self.songs[index].get("banner_image"), image)
+
+    def _on_song_checked(self, index, results):
+        if self.cancelled:
+            return
+        self._checked[index] = results
+        if index < self._added:
+            self._apply_check(index)
+
+    def _apply_check(self, index):
+        song = self.songs[index]
+        missing = sum(1 for r in self._checked[index].values() if r['error'] == 'missing')
+        card = self._card(index)
+        if card is not None:
+            card.set_missing(missing)
+        if missing:
+            self._held.append(song)
+        else:
+            self._optimize(song)
+
+    def _optimize(self, song):
+        if not self._interactive:
+            # The optimizers would compete with the first song's load
+            self._waiting.append(song)
+        elif id(song) not in self._optimizing:
+            self._optimizing.add(id(song))
+            self.tracks_panel.start_optimization_for_song(song)
+
+    def release_held(self):
+        """Start the optimizer of the songs that had missing stems (relinked or not)."""
+        held, self._held = self._held, []
+        for song in held:
+            self._optimize(song)
+
+    def _on_player_ready(self, index, player):
+        if self.cancelled or index >= len(self.songs):
+            return
+        song = self.songs[index]
+        # Only if the song still has the stems the player was loaded from (otherwise, or if the
+        # load failed, selecting the song loads it again)
+        if player is not None and list(song.get("tracks", []) or []) == self._tracks[index]:
+            self.tracks_panel.audio_manager.adopt_player(song, player)
+        self.firstSongReady.emit(song)
+        self._mark('first_song')
+        self._interactive = True
+        waiting, self._waiting = self._waiting, []
+        for song in waiting:
+            self._optimize(song)
+
+    def _on_checked(self, report):
+        if self.cancelled:
+            return
+        self.report = report
+        self._mark('checked')
+        self.checked.emit(report)
+
+
+class MissingStemsDialog(QDialog):
+    """Stems of the opened project that are missing or unreadable, with the files suggested in
+    their place. relinkRequested carries {old path: new path} of the suggestions kept checked."""
+    relinkRequested = pyqtSignal(dict)
+
+    def __init__(self, songs, report, project_path=None, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Arquivos do Projeto")
+        self.setModal(False)
+        self.setAttribute(Qt.WA_DeleteOnClose, True)
+        self.setMinimumWidth(620)
+        self.setStyleSheet("""
+            QDialog { background-color: #181818; }
+            QLabel { color: #FFFFFF; }
+            QListWidget {
+                background-color: #2A2A2A; color: #FFFFFF; border: none;
+                border-radius: 10px; padding: 6px;
+            }
+            QPushButton {
+                background-color: #FFFFFF; color: #000000; border: none;
+                border-radius: 14px; padding: 6px 18px; font-weight: 600;
+            }
+            QPushButton:hover { background-color: #B3B3B3; }
+        """)
+        self.songs = songs
+        self.problems = dict(report.get('problems') or {})
+        self.suggestions = dict(report.get('suggestions') or {})
+        self.project_path = project_path
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(20, 18, 20, 18)
+        layout.setSpacing(12)
+        missing = any(e == 'missing' for e in self.problems.values())
+        title = QLabel("Arquivos não encontrados" if missing else "Arquivos com problemas")
+        title.setFont(QFont("SF Pro Display", 16, QFont.Bold))
+        layout.addWidget(title)
+        self.summary = QLabel()
+        self.summary.setWordWrap(True)
+        self.summary.setStyleSheet("color: #B3B3B3;")
+        layout.addWidget(self.summary)
+        self.list = QListWidget()
+        layout.addWidget(self.list, 1)
+
+        buttons = QHBoxLayout()
+        browse_btn = QPushButton("Procurar pasta...")
+        continue_btn = QPushButton("Continuar")
+        self.relink_btn = QPushButton("Reassociar")
+        browse_btn.clicked.connect(self.browse)
+        continue_btn.clicked.connect(self.reject)
+        self.relink_btn.clicked.connect(self.apply)
+        buttons.addWidget(browse_btn)
+        buttons.addStretch(1)
+        buttons.addWidget(continue_btn)
+        buttons.addWidget(self.relink_btn)
+        layout.addLayout(buttons)
+        self.populate()
+
+    def _song_names(self, path):
+        return ", ".join(s.get("name", "") for s in self.songs if path in (s.get("tracks") or []))
+
+    def populate(self):
+        self.list.clear()
+        missing = [p for p, e in self.problems.items() if e == 'missing']
+        for path, error in sorted(self.problems.items(), key=lambda kv: (self._song_names(kv[0]), kv[0])):
+            text = f"{self._song_names(path)} — {os.path.basename(path)}: {problem_label(error)}"
+            item = QListWidgetItem()
+            new_path = self.suggestions.get(path)
+            if new_path:
+                text += f"\n    → {new_path}"
+                item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
+                item.setCheckState(Qt.Checked)
+            item.setData(Qt.UserRole, path)
+            item.setText(text)
+            self.list.addItem(item)
+        found = sum(1 for p in missing if p in self.suggestions)
+        self.summary.setText(f"{len(missing)} faixa(s) não encontrada(s); {found} com sugestão de novo local. "
+                             "Marque as sugestões a usar ou procure outra pasta.")
+        self.relink_btn.setEnabled(found > 0)
+
+    def browse(self):
+        start = os.path.dirname(self.project_path) if self.project_path else os.path.expanduser("~")
+        folder = QFileDialog.getExistingDirectory(self, "Procurar Faixas", start)
+        if folder:
+            self.search(folder)
+
+    def search(self, folder):
+        """Look for the stems without a suggestion under folder."""
+        missing = [p for p, e in self.problems.items() if e == 'missing' and p not in self.suggestions]
+        self.suggestions.update(suggest_relinks(missing, [folder]))
+        self.populate()
+
+    def selected_mapping(self):
+        mapping = {}
+        for row in range(self.list.count()):
+            item = self.list.item(row)
+            path = item.data(Qt.UserRole)
+            if path in self.suggestions and item.checkState() == Qt.Checked:
+                mapping[path] = self.suggestions[path]
+        return mapping
+
+    def apply(self):
+        mapping = self.selected_mapping()
+        if mapping:
+            self.relinkRequested.emit(mapping)
+        self.accept()
@@ -0,0 +1,292 @@
+# Process-wide cache of the UI's icons and stylesheet.
+# Icons are resolved and rasterized once per (source, size, device pixel ratio): the resource
+# folders are listed once, a rendered pixmap is kept in memory for the rest of the process and as
+# a PNG in the user cache folder between runs (keyed by the SVG's path, mtime and size, so editing
+# the file re-renders it). A warm start therefore loads PNGs and never imports QtSvg.
+# The qdarkstyle stylesheet is compiled once: its text, with the :/qss_icons images it references
+# copied next to it, is stored in the cache folder keyed by the installed qdarkstyle and Qt
+# versions. A warm start reads that file instead of importing qdarkstyle, qtpy and the compiled
+# resource module. stats() reports where each came from and the time spent (see --startup-check).
+import hashlib
+import importlib.util
+import json
+import os
+import re
+import shutil
+import sys
+import time
+from PyQt5.QtCore import Qt, QDir, QDirIterator, QFile, QRectF, QByteArray, QStandardPaths, QT_VERSION_STR
+from PyQt5.QtGui import QIcon, QPixmap, QPainter, QColor, QPalette, QGuiApplication
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESOURCE_DIRS = (APP_DIR, os.path.join(APP_DIR, 'Resources'))
+CACHE_VERSION = 1  # Bump when rendering changes so old cached pixmaps are not reused
+# Fill colors of the bundled Material SVGs, replaced when an icon is rendered in another color
+RECOLOR_KEYS = ('#E3E3E3', '#e3e3e3', '#000000')
+
+_files = None      # {lower-case file name: path} of the resource folders, listed once
+_pixmaps = {}      # Rendered SVG pixmaps by (path, mtime, size, dpr, color)
+_icons = {}        # Resolved icons by (key, size, dpr)
+_stats = {'icons_rendered': 0, 'icons_from_disk': 0, 'icons_from_memory': 0,
+          'icons_ms': 0.0, 'stylesheet': None, 'stylesheet_ms': 0.0}
+
+
+def cache_dir():
+    """Folder of the on-disk UI cache (created on first use)."""
+    try:
+        base = QStandardPaths.writableLocation(QStandardPaths.CacheLocation)
+        if not base:
+            base = os.path.expanduser('~/Library/Caches/AppPythonAdrian')
+        path = os.path.join(base, 'ui_cache')
+        os.makedirs(path, exist_ok=True)
+        return path
+    except Exception:
+        path = os.path.expanduser('~/Library/Caches/AppPythonAdrian/ui_cache')
+        try:
+            os.makedirs(path, exist_ok=True)
+        except Exception:
+            pass
+        return path
+
+
+def clear_cache():
+    """Delete the on-disk UI cache and forget everything cached in this process."""
+    global _files
+    shutil.rmtree(cache_dir(), ignore_errors=True)
+    _files = None
+    _pixmaps.clear()
+    _icons.clear()
+
+
+def stats():
+    return dict(_stats)
+
+
+def device_pixel_ratio():
+    try:
+        screen = QGuiApplication.primaryScreen()
+        return float(screen.devicePixelRatio()) if screen else 1.0
+    except Exception:
+        return 1.0
+
+
+def _resource_files():
+    global _files
+    if _files is None:
+        files = {}
+        for folder in RESOURCE_DIRS:
+            try:
+                names = os.listdir(folder)
+            except OSError:
+                continue
+            for name in names:
+                files.setdefault(name.lower(), os.path.join(folder, name))
+        _files = files
+    return _files
+
+
+def find_resource(filename):
+    """Path of a bundled resource file (app folder first, then Resources), or None."""
+    return _resource_files().get(filename.lower())
+
+
+def find_svg(keywords):
+    """First SVG resource whose name contains all keywords, or None."""
+    if not keywords:
+        return None
+    for lower, path in sorted(_resource_files().items()):
+        if lower.endswith('.svg') and all(kw in lower for kw in keywords):
+            return path
+    return None
+
+
+def _write_atomic(path, write):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        write(tmp)
+        os.replace(tmp, path)
+    except Exception as e:
+        print(f"[resources] Could not write {path}: {e}")
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+
+
+def _save_png(pm, path):
+    if not pm.save(path, 'PNG'):
+        raise OSError("PNG encoding failed")
+
+
+def _render_svg(path, width, height, color):
+    from PyQt5.QtSvg import QSvgRenderer
+    renderer = None
+    if color:
+        try:
+            with open(path, 'rb') as f:
+                text = f.read().decode('utf-8', errors='ignore')
+            for key in RECOLOR_KEYS:
+                text = text.replace(key, color)
+            renderer = QSvgRenderer(QByteArray(text.encode('utf-8')))
+        except Exception:
+            renderer = None
+    if renderer is None:
+        renderer = QSvgRenderer(path)
+    if not renderer.isValid():
+        return None
+    image = QPixmap(width, height)
+    image.fill(Qt.transparent)
+    painter = QPainter(image)
+    painter.setRenderHint(QPainter.Antialiasing)
+    renderer.render(painter, QRectF(0, 0, width, height))
+    painter.end()
+    return image
+
+
+def svg_pixmap(filename, size, color=None):
+    """High-DPI pixmap of an SVG resource (file name or path) at size, optionally recolored.
+    Rendered once per size and pixel ratio; None when the file is missing or invalid."""
+    path = filename if os.path.isabs(filename) else find_resource(filename)
+    if not path:
+        return None
+    started = time.perf_counter()
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    dpr = device_pixel_ratio()
+    width, height = int(size.width() * dpr), int(size.height() * dpr)
+    key = (path, st.st_mtime_ns, st.st_size, width, height, dpr, color)
+    pm = _pixmaps.get(key)
+    if pm is not None:
+        _stats['icons_from_memory'] += 1
+        return pm
+    digest = hashlib.sha1(repr(key + (CACHE_VERSION,)).encode('utf-8')).hexdigest()
+    png = os.path.join(cache_dir(), 'icons', f"{digest}.png")
+    pm = QPixmap(png) if os.path.exists(png) else None
+    if pm is not None and not pm.isNull():
+        _stats['icons_from_disk'] += 1
+    else:
+        try:
+            pm = _render_svg(path, width, height, color)
+        except Exception as e:
+            print(f"[resources] Could not render {path}: {e}")
+            pm = None
+        if pm is None:
+            return None
+        _stats['icons_rendered'] += 1
+        os.makedirs(os.path.dirname(png), exist_ok=True)
+        _write_atomic(png, lambda tmp: _save_png(pm, tmp))
+    pm.setDevicePixelRatio(dpr)
+    _pixmaps[key] = pm
+    _stats['icons_ms'] += (time.perf_counter() - started) * 1000.0
+    return pm
+
+
+def svg_icon(filename, size, color=None):
+    """QIcon of svg_pixmap(), or None."""
+    pm = svg_pixmap(filename, size, color)
+    return QIcon(pm) if pm is not None else None
+
+
+def cached_icon(key, size, resolve):
+    """Icon resolved once per (key, size, pixel ratio) by resolve() for the rest of the process."""
+    cache_key = (key, size.width(), size.height(), device_pixel_ratio())
+    icon = _icons.get(cache_key)
+    if icon is None:
+        icon = resolve()
+        if icon is None:
+            return None
+        _icons[cache_key] = icon
+    return icon
+
+
+def _stylesheet_key():
+    """Identity of the installed qdarkstyle (without importing it), Qt and the platform."""
+    spec = importlib.util.find_spec('qdarkstyle')
+    if spec is None or not spec.origin:
+        return None
+    package = os.path.dirname(spec.origin)
+    parts = [CACHE_VERSION, QT_VERSION_STR, sys.platform]
+    for name in ('__init__.py', os.path.join('dark', 'darkstyle_rc.py'), os.path.join('dark', 'darkstyle.qss')):
+        try:
+            st = os.stat(os.path.join(package, name))
+            parts.append((name, st.st_mtime_ns, st.st_size))
+        except OSError:
+            parts.append((name, None))
+    return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()[:16]
+
+
+def _compile_stylesheet(folder):
+    """Load the qdarkstyle stylesheet and copy the resource images it uses into folder.
+    Returns (stylesheet with url()s pointing at the copies, link color set on the palette)."""
+    import qdarkstyle
+    from PyQt5.QtWidgets import QApplication
+    text = qdarkstyle.load_stylesheet_pyqt5()
+    app = QApplication.instance()
+    link = app.palette().color(QPalette.Normal, QPalette.Link).name() if app else None
+    images = os.path.join(folder, 'images')
+    resource_dirs = {u.rsplit('/', 1)[0] for u in re.findall(r'url\("?(:/[^")]+)"?\)', text)}
+    for resource_dir in resource_dirs:
+        # Whole folders, so the @2x variants Qt picks on high-DPI screens are there too
+        target = os.path.join(images, resource_dir[2:])
+        os.makedirs(target, exist_ok=True)
+        it = QDirIterator(resource_dir, QDir.Files)
+        while it.hasNext():
+            source = it.next()
+            copy = os.path.join(target, os.path.basename(source))
+            if not os.path.exists(copy):
+                QFile.copy(source, copy)
+    prefix = QDir.fromNativeSeparators(images)
+
+    def local(m):
+        return f'url("{prefix}/{m.group(1)[2:]}")'
+
+    text = re.sub(r'url\("?(:/[^")]+)"?\)', local, text)
+    return text, link
+
+
+def load_stylesheet():
+    """The app stylesheet (qdarkstyle), compiled once and read from the cache afterwards.
+    Must be called after the QApplication exists (the link color is set on its palette)."""
+    started = time.perf_counter()
+    key = _stylesheet_key()
+    if key is None:
+        _stats['stylesheet'] = 'missing'
+        return ""
+    folder = os.path.join(cache_dir(), f"stylesheet-{key}")
+    path = os.path.join(folder, 'stylesheet.json')
+    data = None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if not os.path.isdir(os.path.join(folder, 'images')):
+            data = None
+        _stats['stylesheet'] = 'disk'
+    except Exception:
+        data = None
+    if data is None:
+        try:
+            text, link = _compile_stylesheet(folder)
+        except Exception as e:
+            print(f"[resources] Could not load the stylesheet: {e}")
+            _stats['stylesheet'] = 'failed'
+            return ""
+        data = {'stylesheet': text, 'link_color': link}
+        _write_atomic(path, lambda tmp: _dump_json(tmp, data))
+        _stats['stylesheet'] = 'compiled'
+    else:
+        # The palette fix qdarkstyle applies when it loads (link color)
+        from PyQt5.QtWidgets import QApplication
+        app = QApplication.instance()
+        if app and data.get('link_color'):
+            palette = app.palette()
+            palette.setColor(QPalette.Normal, QPalette.Link, QColor(data['link_color']))
+            app.setPalette(palette)
+    _stats['stylesheet_ms'] = (time.perf_counter() - started) * 1000.0
+    return data['stylesheet']
+
+
+def _dump_json(path, data):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
@@ -1,7 +1,8 @@
 from PyQt5.QtWidgets import QDialog, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QWidget, QScrollArea, QComboBox, QListWidget, QStyledItemDelegate, QStyleOptionViewItem, QCompleter, QStyle
-from PyQt5.QtCore import Qt, QSize, pyqtSignal, QPropertyAnimation, pyqtProperty, QRectF
+from PyQt5.QtCore import Qt, QSize, pyqtSignal, QPropertyAnimation, pyqtProperty, QRectF, QTimer
 from PyQt5.QtGui import QFont, QPainter, QColor, QPen, QLinearGradient, QPainterPath, QRegion
 import sounddevice as sd
+from audio.stats import audio_log_path, FLAG_UNDERFLOW, FLAG_ERROR
 try:
     import mido
 except Exception:
@@ -201,10 +202,52 @@ class SettingRow(QWidget):
         layout.addWidget(self.toggle)
 
 
+class AudioLoadGraph(QWidget):
+    """Bar graph of recent audio callback load (callback time / block duration)."""
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setFixedHeight(56)
+        self.setStyleSheet("background: transparent; border: none;")
+        self._loads = []
+        self._flags = []
+
+    def set_loads(self, loads, flags):
+        self._loads = loads
+        self._flags = flags
+        self.update()
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.Antialiasing, False)
+        w, h = self.width(), self.height()
+        painter.fillRect(0, 0, w, h, QColor("#121212"))
+        n = len(self._loads)
+        if n:
+            bar_w = max(1.0, w / float(n))
+            for i in range(n):
+                load = float(self._loads[i])
+                flags = int(self._flags[i]) if i < len(self._flags) else 0
+                if flags & (FLAG_UNDERFLOW | FLAG_ERROR) or load > 1.0:
+                    color = QColor("#e53935")
+                elif load > 0.6:
+                    color = QColor("#fbc02d")
+                else:
+                    color = QColor("#1db954")
+                bar_h = h if flags & FLAG_UNDERFLOW else int(min(1.0, load) * (h - 2))
+                painter.fillRect(QRectF(i * bar_w, h - bar_h, max(1.0, bar_w - 0.5), bar_h), color)
+        # Deadline (100% load) is the top edge; mark 60% as the comfort line
+        painter.setPen(QPen(QColor("#404040"), 1, Qt.DashLine))
+        y = int(h * 0.4)
+        painter.drawLine(0, y, w, y)
+        painter.end()
+
+
 class SettingsDialog(QDialog):
     audioOutputDeviceSelected = pyqtSignal(object)
     audioInputDeviceSelected = pyqtSignal(object)
     midiInputDeviceSelected = pyqtSignal(str)
+    routingPresetSelected = pyqtSignal(str)  # preset name, "" for the stereo mix
+    audioSecondaryDeviceSelected = pyqtSignal(object)  # device id, None for no secondary output
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setWindowTitle("Configurações")
@@ -377,6 +420,20 @@ class SettingsDialog(QDialog):
         )
         scroll_layout.addWidget(self.high_quality)
 
+        self.auto_latency = SettingRow(
+            "Latência Automática",
+            "Começa com blocos pequenos e aumenta se houver falhas no áudio (salvo por dispositivo)",
+            checked=True
+        )
+        scroll_layout.addWidget(self.auto_latency)
+
+        self.compact_samples = SettingRow(
+            "Memória Compacta",
+            "Guarda as faixas em 16 bits na memória e no cache (metade do espaço; vale para músicas carregadas depois)",
+            checked=False
+        )
+        scroll_layout.addWidget(self.compact_samples)
+
         audio_devices_label = QLabel("DISPOSITIVOS DE ÁUDIO")
         audio_devices_label.setFont(QFont("SF Pro Display", 11, QFont.Bold))
         audio_devices_label.setStyleSheet("color: #B3B3B3; padding-top: 8px;")
@@ -538,8 +595,75 @@ class SettingsDialog(QDialog):
         self.output_combo.setCompleter(completer_out)
         self.output_combo.setItemDelegate(TwoLineItemDelegate(self.output_combo))
         output_card_layout.addWidget(self.output_combo)
+
+        # Output routing preset (buses to device channels); the stereo mix when none is active
+        routing_label = QLabel("Roteamento de Saídas")
+        routing_label.setFont(QFont("SF Pro Display", 13, QFont.Medium))
+        routing_label.setStyleSheet("color: #FFFFFF; border: none; background: transparent;")
+        output_card_layout.addWidget(routing_label)
+        self.routing_combo = QComboBox()
+        self.routing_combo.setMinimumHeight(40)
+        self.routing_combo.setStyleSheet(self.output_combo.styleSheet())
+        self.routing_combo.addItem("Estéreo (padrão)", "")
+        self.routing_combo.currentIndexChanged.connect(self._on_routing_changed)
+        output_card_layout.addWidget(self.routing_combo)
+        secondary_label = QLabel("Saída Secundária (fones / click)")
+        secondary_label.setFont(QFont("SF Pro Display", 13, QFont.Medium))
+        secondary_label.setStyleSheet("color: #FFFFFF; border: none; background: transparent;")
+        output_card_layout.addWidget(secondary_label)
+        self.secondary_combo = QComboBox()
+        self.secondary_combo.setMinimumHeight(40)
+        self.secondary_combo.setStyleSheet(self.output_combo.styleSheet())
+        self.secondary_combo.setItemDelegate(TwoLineItemDelegate(self.secondary_combo))
+        output_card_layout.addWidget(self.secondary_combo)
+        routing_hint = QLabel("Clique com o botão direito em uma faixa para escolher seus buses. "
+                              "A saída secundária toca os buses de click/guia do roteamento ativo, "
+                              "sincronizada com a saída principal.")
+        routing_hint.setFont(QFont("SF Pro Display", 10))
+        routing_hint.setStyleSheet("color: #808080; border: none; background: transparent;")
+        routing_hint.setWordWrap(True)
+        output_card_layout.addWidget(routing_hint)
         scroll_layout.addWidget(output_card)
 
+        # Live callback instrumentation (underflows, deadline misses, latency)
+        perf_label = QLabel("DESEMPENHO DE ÁUDIO")
+        perf_label.setFont(QFont("SF Pro Display", 11, QFont.Bold))
+        perf_label.setStyleSheet("color: #B3B3B3; padding-top: 8px;")
+        scroll_layout.addWidget(perf_label)
+
+        perf_card = QWidget()
+        perf_card.setStyleSheet(
+            """
+            QWidget {
+                background-color: #1a1a1a;
+                border-radius: 12px;
+                border: 1px solid #282828;
+            }
+            """
+        )
+        perf_card_layout = QVBoxLayout(perf_card)
+        perf_card_layout.setContentsMargins(16, 12, 16, 12)
+        perf_card_layout.setSpacing(8)
+        self.perf_graph = AudioLoadGraph()
+        perf_card_layout.addWidget(self.perf_graph)
+        self.perf_text = QLabel("Sem reprodução")
+        self.perf_text.setFont(QFont("SF Pro Display", 11))
+        self.perf_text.setStyleSheet("color: #FFFFFF; border: none; background: transparent;")
+        self.perf_text.setWordWrap(True)
+        perf_card_layout.addWidget(self.perf_text)
+        log_text = QLabel(f"Log: {audio_log_path()}")
+        log_text.setFont(QFont("SF Pro Display", 10))
+        log_text.setStyleSheet("color: #808080; border: none; background: transparent;")
+        log_text.setWordWrap(True)
+        log_text.setTextInteractionFlags(Qt.TextSelectableByMouse)
+        perf_card_layout.addWidget(log_text)
+        scroll_layout.addWidget(perf_card)
+
+        self._stats_provider = None
+        self.perf_timer = QTimer(self)
+        self.perf_timer.setInterval(250)
+        self.perf_timer.timeout.connect(self._refresh_perf)
+
         divider3 = QWidget()
         divider3.setFixedHeight(1)
         divider3.setStyleSheet("background-color: #282828; margin: 16px 0;")
@@ -725,19 +849,66 @@ class SettingsDialog(QDialog):
         
         main_layout.addWidget(footer)
 
-    def set_current_devices(self, output_device_id, input_device_id):
+    def set_current_devices(self, output_device_id, input_device_id, secondary_device_id=None):
         """Set the currently selected devices (to be called before showing the dialog)"""
         try:
             self._desired_output_device = output_device_id
             self._desired_input_device = input_device_id
+            self._desired_secondary_device = secondary_device_id
         except Exception:
             pass
 
+    def set_routing_presets(self, names, active):
+        """Fill the routing combo (active: preset name or None) without emitting a selection."""
+        self.routing_combo.blockSignals(True)
+        try:
+            while self.routing_combo.count() > 1:
+                self.routing_combo.removeItem(1)
+            for name in names:
+                self.routing_combo.addItem(name, name)
+            idx = self.routing_combo.findData(active) if active else 0
+            self.routing_combo.setCurrentIndex(max(0, idx))
+        finally:
+            self.routing_combo.blockSignals(False)
+
+    def _on_routing_changed(self, index):
+        self.routingPresetSelected.emit(self.routing_combo.itemData(index) or "")
+
+    def set_stats_provider(self, provider):
+        """provider() returns the CallbackStats of the active stream (or None)."""
+        self._stats_provider = provider
+
+    def _refresh_perf(self):
+        try:
+            stats = self._stats_provider() if self._stats_provider else None
+            if stats is None or stats.written == 0:
+                self.perf_text.setText("Sem reprodução")
+                self.perf_graph.set_loads([], [])
+                return
+            loads, flags = stats.recent_loads(200)
+            self.perf_graph.set_loads(loads, flags)
+            snap = stats.snapshot()
+            text = (f"Latência {snap['latency_ms']:.1f} ms · bloco {snap['deadline_ms']:.1f} ms\n"
+                    f"Carga p50 {snap['load_p50'] * 100:.0f}% · p99 {snap['load_p99'] * 100:.0f}% · "
+                    f"máx {snap['load_max'] * 100:.0f}%\n"
+                    f"Underflows {snap['underflows']} · atrasos {snap['late_blocks']} · erros {snap['errors']}")
+            if snap['errors'] and snap['last_error']:
+                text += f"\nÚltimo erro: {snap['last_error']}"
+            self.perf_text.setText(text)
+        except Exception:
+            pass
+
+    def hideEvent(self, event):
+        self.perf_timer.stop()
+        super().hideEvent(event)
+
     def showEvent(self, event):
         super().showEvent(event)
         self.updateMask()
         self._populate_audio_devices()
         self._populate_midi_devices()
+        self._refresh_perf()
+        self.perf_timer.start()
 
     def paintEvent(self, event):
         painter = QPainter(self)
@@ -770,6 +941,7 @@ class SettingsDialog(QDialog):
                 try:
                     self.input_combo.currentIndexChanged.disconnect(self._on_input_changed)
                     self.output_combo.currentIndexChanged.disconnect(self._on_output_changed)
+                    self.secondary_combo.currentIndexChanged.disconnect(self._on_secondary_changed)
                 except Exception:
                     pass
             
@@ -781,6 +953,8 @@ class SettingsDialog(QDialog):
 
             self.input_combo.clear()
             self.output_combo.clear()
+            self.secondary_combo.clear()
+            self.secondary_combo.addItem("Nenhuma", -1)
 
             # Populate input devices with subtitle and default tag
             for idx, d in enumerate(devices):
@@ -811,6 +985,9 @@ class SettingsDialog(QDialog):
                     self.output_combo.model().setData(mo, is_def, Qt.UserRole + 3)
                     tip = f"{name}\nSaída • {subtitle}"
                     self.output_combo.setItemData(row, tip, Qt.ToolTipRole)
+                    self.secondary_combo.addItem(name, idx)
+                    ms = self.secondary_combo.model().index(self.secondary_combo.count() - 1, 0)
+                    self.secondary_combo.model().setData(ms, subtitle, Qt.UserRole + 2)
 
             # Select devices - prefer desired devices over defaults
             # Input device selection
@@ -837,11 +1014,16 @@ class SettingsDialog(QDialog):
                 if o >= 0:
                     self.output_combo.setCurrentIndex(o)
 
+            secondary = getattr(self, '_desired_secondary_device', None)
+            j = next((i for i in range(self.secondary_combo.count()) if self.secondary_combo.itemData(i) == secondary), 0)
+            self.secondary_combo.setCurrentIndex(j)
+
             # Connect signals only once
             if not self._signals_connected:
                 try:
                     self.input_combo.currentIndexChanged.connect(self._on_input_changed)
                     self.output_combo.currentIndexChanged.connect(self._on_output_changed)
+                    self.secondary_combo.currentIndexChanged.connect(self._on_secondary_changed)
                     self._signals_connected = True
                 except Exception:
                     pass
@@ -850,6 +1032,7 @@ class SettingsDialog(QDialog):
                 try:
                     self.input_combo.currentIndexChanged.connect(self._on_input_changed)
                     self.output_combo.currentIndexChanged.connect(self._on_output_changed)
+                    self.secondary_combo.currentIndexChanged.connect(self._on_secondary_changed)
                 except Exception:
                     pass
         except Exception:
@@ -873,6 +1056,10 @@ class SettingsDialog(QDialog):
         except Exception as e:
             print(f"[Settings] Error in _on_output_changed: {e}")
 
+    def _on_secondary_changed(self, idx):
+        device_id = self.secondary_combo.itemData(idx)
+        self.audioSecondaryDeviceSelected.emit(None if device_id is None or device_id < 0 else device_id)
+
     def _populate_midi_devices(self):
         try:
             self.midi_list.clear()
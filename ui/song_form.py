@@ -1,11 +1,9 @@
 from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, QPushButton, 
                              QFileDialog, QMessageBox, QGroupBox, QListWidget, QListWidgetItem, QWidget, QSizePolicy, QScrollArea, QFrame, QApplication)
-from PyQt5.QtCore import pyqtSignal, Qt, QPropertyAnimation, QEasingCurve, QTimer, pyqtProperty, QThread, QObject, QEvent, QStandardPaths, QSettings
+from PyQt5.QtCore import pyqtSignal, Qt, QPropertyAnimation, QEasingCurve, QTimer, pyqtProperty, QEvent, QStandardPaths, QSettings
 from PyQt5.QtGui import QFont, QPixmap, QPainter, QPen, QColor
 import os
 from ui.tracks_panel import SongCardWidget
-import numpy as np
-from scipy.io import wavfile
 
 class LoadingSpinner(QWidget):
     """Widget de loading circular animado"""
@@ -184,6 +182,10 @@ class SongForm(QDialog):
         
         # Store selected tracks
         self.selected_tracks = []
+        # Background decode-once ingest of the chosen tracks (audio/ingest.py)
+        self.ingest = None
+        self._track_status = {}
+        self._awaiting_ingest = False
         
         # Store banner image path
         self.banner_image_path = None
@@ -319,8 +321,14 @@ class SongForm(QDialog):
         # Padrão preto/cinza
         self.upload_button.clicked.connect(self.upload_tracks)
         
+        self.library_button = QPushButton("Da Biblioteca")
+        self.library_button.setFont(font)
+        self.library_button.setMinimumHeight(48)
+        self.library_button.clicked.connect(self.pick_from_library)
+        
         upload_layout.addWidget(self.upload_banner_button)
         upload_layout.addWidget(self.upload_button)
+        upload_layout.addWidget(self.library_button)
         media_layout.addLayout(upload_layout)
         
         # Campo URL da imagem
@@ -517,25 +525,77 @@ class SongForm(QDialog):
             pass
         
     def on_ok_clicked(self):
-        """Inicia loading e pré-computa a linha do tempo em background antes de aceitar"""
+        """Aguarda a preparação das faixas (iniciada ao escolhê-las) e monta a linha do tempo"""
         if self.is_loading:
             return
         self.start_loading()
-        if self.selected_tracks:
-            target_points = 1200
-            self._env_thread = QThread(self)
-            self._env_worker = FormEnvelopeWorker(self.selected_tracks, target_points)
-            self._env_worker.moveToThread(self._env_thread)
-            self._env_thread.started.connect(self._env_worker.run)
-            self._env_worker.done.connect(self._on_env_done)
-            self._env_worker.error.connect(self._on_env_error)
-            self._env_thread.finished.connect(self._cleanup_env)
-            self._env_thread.start()
+        # Waiting on the ingest can take a while if OK is clicked right after choosing the tracks
+        self.cancel_button.setEnabled(True)
+        self._awaiting_ingest = True
+        self._finish_if_ingested()
+
+    def _ingest_tracks(self, paths):
+        """Start preparing tracks in the background: cache file, routing and envelope in one read"""
+        if self.ingest is None:
+            from audio.ingest import StemIngest
+            self.ingest = StemIngest(self)
+            self.ingest.progress.connect(self._on_ingest_progress)
+            self.ingest.stemDone.connect(lambda path, _result: self._on_ingest_update(path))
+            self.ingest.stemFailed.connect(lambda path, _message: self._on_ingest_update(path))
+        self.ingest.add(paths)
+        for path in paths:
+            self._show_track_status(path)
+
+    def _track_status_text(self, path, fraction=None):
+        if self.ingest is None:
+            return ""
+        state = self.ingest.state(path)
+        if state == 'done':
+            return "pronta"
+        if state == 'failed':
+            return ""
+        if state == 'running':
+            return f"preparando {int(round((fraction or 0.0) * 100))}%"
+        return "na fila"
+
+    def _show_track_status(self, path, fraction=None):
+        label = self._track_status.get(path)
+        if label is not None:
+            label.setText(self._track_status_text(path, fraction))
+
+    def _on_ingest_progress(self, path, fraction):
+        self._show_track_status(path, fraction)
+
+    def _on_ingest_update(self, path):
+        self._show_track_status(path)
+        if self._awaiting_ingest:
+            self._finish_if_ingested()
+
+    def _finish_if_ingested(self):
+        """Accept once every track is prepared, with the envelope built from the stems' envelopes"""
+        tracks = list(self.selected_tracks)
+        if self.ingest is not None and not self.ingest.settled(tracks):
+            return
+        self._awaiting_ingest = False
+        results = [self.ingest.results[t] for t in tracks if self.ingest is not None and t in self.ingest.results]
+        if results:
+            from audio.wavstream import combine_envelopes
+            envelope, total = combine_envelopes([(r['frames'], r['envelope']) for r in results])
+            self._precomputed_envelope = envelope
+            self._precomputed_total_samples = int(total)
+            self._precomputed_sample_rate = int(results[-1]['sample_rate'])
         else:
             self._precomputed_envelope = []
             self._precomputed_total_samples = 0
             self._precomputed_sample_rate = 0
-            QTimer.singleShot(10, self.accept)
+        self.stop_loading()
+        QTimer.singleShot(10, self.accept)
+
+    def done(self, result):
+        if self.ingest is not None:
+            # Nothing is pending after OK; on cancel the remaining tracks are dropped
+            self.ingest.shutdown()
+        super().done(result)
     
     def start_loading(self):
         """Inicia o estado de loading"""
@@ -599,10 +659,37 @@ class SongForm(QDialog):
         if file_paths:
             self.selected_tracks.extend(file_paths)
             self.refresh_tracks_list()
+            self._ingest_tracks(file_paths)
             # Sempre iniciamos em Downloads; não lembrar diretório
         
         self.validate_form()
             
+    def pick_from_library(self):
+        """Escolher uma música da biblioteca: preenche os campos vazios e adiciona as faixas"""
+        from ui.library_dialog import LibraryDialog
+        dialog = LibraryDialog(self)
+        if dialog.exec_() != QDialog.Accepted or not dialog.selected_song():
+            return
+        song = dialog.selected_song()
+        if not self.name_input.text().strip():
+            self.name_input.setText(song['name'])
+        if not self.key_input.text().strip() and song['key']:
+            self.key_input.setText(song['key'])
+        if not self.bpm_input.text().strip() and song['bpm']:
+            self.bpm_input.setText(song['bpm'])
+        banner = song.get('banner_image')
+        if not (self.banner_image_path or self.banner_url_input.text().strip()) and banner:
+            if banner.startswith(('http://', 'https://')):
+                self.banner_url_input.setText(banner)
+            elif os.path.exists(banner):
+                self.banner_image_path = banner
+        added = [t for t in song['tracks'] if t not in self.selected_tracks]
+        self.selected_tracks.extend(added)
+        self.refresh_tracks_list()
+        self._ingest_tracks(added)
+        self.update_card_preview()
+        self.validate_form()
+
     def upload_banner_image(self):
         """Abrir diálogo para selecionar imagem do banner"""
         file_path, _ = self._run_native_file_dialog(lambda: QFileDialog.getOpenFileName(
@@ -641,6 +728,7 @@ class SongForm(QDialog):
     def refresh_tracks_list(self):
         """Atualiza a lista com as faixas selecionadas"""
         self.tracks_list.clear()
+        self._track_status = {}
         
         # Atualiza contador
         count = len(self.selected_tracks)
@@ -675,6 +763,11 @@ class SongForm(QDialog):
             label.setStyleSheet("color: #e0e0e0; font-size: 13px;")
             label.setWordWrap(True)
             
+            # Preparação em segundo plano
+            status = QLabel(self._track_status_text(path))
+            status.setStyleSheet("color: #888888; font-size: 12px;")
+            self._track_status[path] = status
+            
             # Botão remover
             remove_btn = QPushButton("✕")
             remove_btn.setFixedSize(36, 36)
@@ -698,6 +791,7 @@ class SongForm(QDialog):
             
             row_layout.addWidget(number_label)
             row_layout.addWidget(label, 1)
+            row_layout.addWidget(status)
             row_layout.addWidget(remove_btn)
             row.setLayout(row_layout)
             
@@ -708,7 +802,9 @@ class SongForm(QDialog):
     def remove_track(self, index):
         """Remove a faixa pelo índice e atualiza a lista"""
         if 0 <= index < len(self.selected_tracks):
-            del self.selected_tracks[index]
+            path = self.selected_tracks.pop(index)
+            if self.ingest is not None and path not in self.selected_tracks:
+                self.ingest.cancel(path)
             self.refresh_tracks_list()
             self.validate_form()
 
@@ -719,98 +815,3 @@ class SongForm(QDialog):
         bpm = self.bpm_input.text().strip()
         banner = self.banner_image_path or self.banner_url_input.text().strip() or None
         self.card_preview.update_info(name or "Nome da Música", key or "Tom", bpm or "BPM", banner)
-
-    def _on_env_done(self, envelope, total_samples, sample_rate):
-        self._precomputed_envelope = envelope or []
-        self._precomputed_total_samples = int(total_samples or 0)
-        self._precomputed_sample_rate = int(sample_rate or 0)
-        self.stop_loading()
-        try:
-            if self._env_thread:
-                self._env_thread.quit()
-                self._env_thread.wait(500)
-        except Exception:
-            pass
-        self.accept()
-
-    def _on_env_error(self, message):
-        self._precomputed_envelope = []
-        self._precomputed_total_samples = 0
-        self._precomputed_sample_rate = 0
-        self.stop_loading()
-        try:
-            if self._env_thread:
-                self._env_thread.quit()
-                self._env_thread.wait(500)
-        except Exception:
-            pass
-        self.accept()
-
-    def _cleanup_env(self):
-        self._env_thread = None
-        self._env_worker = None
-
-class FormEnvelopeWorker(QObject):
-    done = pyqtSignal(object, int, int)
-    error = pyqtSignal(str)
-
-    def __init__(self, file_paths, target_points=1000):
-        super().__init__()
-        self.file_paths = file_paths or []
-        self.target_points = max(100, int(target_points or 1000))
-
-    def run(self):
-        try:
-            if not self.file_paths:
-                self.done.emit([], 0, 0)
-                return
-            tracks = []
-            max_len = 0
-            sample_rate = 44100
-            for path in self.file_paths:
-                try:
-                    if not path.lower().endswith('.wav'):
-                        # Ignora formatos não suportados neste fallback
-                        continue
-                    sr, samples = wavfile.read(path)
-                    sample_rate = sr
-                    # Converter para float32 normalizado se necessário
-                    if samples.dtype != np.float32 and samples.dtype != np.float64:
-                        samples = samples.astype(np.float32) / 32768.0
-                    # Mono -> usar valores absolutos; Stereo -> média dos canais
-                    if len(samples.shape) == 1:
-                        mono = np.abs(samples)
-                    else:
-                        mono = np.mean(np.abs(samples), axis=1)
-                    tracks.append(mono)
-                    if len(mono) > max_len:
-                        max_len = len(mono)
-                except Exception:
-                    continue
-            if not tracks or max_len == 0:
-                self.done.emit([], 0, sample_rate)
-                return
-            block = max(1, max_len // self.target_points)
-            combined = None
-            for mono in tracks:
-                if len(mono) < max_len:
-                    pad = np.zeros(max_len - len(mono), dtype=mono.dtype)
-                    mono = np.concatenate([mono, pad])
-                trim_len = (len(mono) // block) * block
-                mono = mono[:trim_len]
-                mono_blocks = mono.reshape(-1, block)
-                rms = np.sqrt(np.mean(mono_blocks**2, axis=1))
-                if combined is None:
-                    combined = rms
-                else:
-                    combined = combined + rms
-            if combined is None or combined.size == 0:
-                self.done.emit([], max_len, sample_rate)
-                return
-            max_val = combined.max() if combined.size > 0 else 1.0
-            env = combined / max_val if max_val > 0 else combined
-            env = np.clip(env, 0.0, 1.0)
-            env = np.maximum(env, 0.05)
-            self.done.emit(env.tolist(), max_len, sample_rate)
-        except Exception as e:
-            self.error.emit(str(e))
@@ -0,0 +1,157 @@
+# Startup path: the first window does not wait for the audio engine.
+# main.py shows the initial view with little more than PyQt imported. The song/track views (and
+# with them numpy, scipy and sounddevice), MIDI and the icon font are imported on first use, and a
+# background thread imports them right after the first frame, so they are usually loaded before
+# the user opens a project. Python's per-module import locks make a view opened during the preload
+# simply wait for that module.
+# Also here: the time-to-first-window check (`main.py --startup-check`, used by
+# bench/startup_bench.py) and the import profile of the startup path (`main.py --profile-imports`,
+# a report of `python -X importtime`).
+import importlib
+import json
+import re
+import subprocess
+import sys
+import threading
+import time
+from PyQt5.QtCore import QObject, QEvent, QTimer
+
+# Imported in the background after the first frame (the views pull in the whole audio engine)
+# (the views first; scipy.signal, only needed once a filter is designed, last)
+BACKGROUND_MODULES = ('ui.tracks_panel', 'ui.project_open', 'ui.song_form', 'ui.library_dialog', 'ui.settings_dialog', 'scipy.signal')
+# Must not be imported before the first window is painted (QtSvg is, on a cold start only, to
+# render the header icons that ui/resources.py then caches)
+DEFERRED_MODULES = ('numpy', 'scipy', 'sounddevice', 'mido', 'qtawesome',
+                    'audio.player', 'ui.tracks_panel', 'midi.manager')
+# Written to stderr by --startup-check when the first window is painted (splits the import profile)
+FIRST_WINDOW_MARKER = "import time: ---- first window ----"
+
+_optional = {}
+
+
+def optional_module(name):
+    """Import an optional dependency on first use; None when it is not installed (cached)."""
+    if name not in _optional:
+        try:
+            _optional[name] = importlib.import_module(name)
+        except Exception:
+            _optional[name] = None
+    return _optional[name]
+
+
+class _FirstPaint(QObject):
+    def __init__(self, widget, callback):
+        super().__init__(widget)
+        self.callback = callback
+
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Paint and self.callback is not None:
+            callback, self.callback = self.callback, None
+            obj.removeEventFilter(self)
+            # Run once this paint is done, from the event loop
+            QTimer.singleShot(0, callback)
+        return False
+
+
+def after_first_paint(widget, callback):
+    """Call callback (on the GUI thread) right after the widget is painted for the first time."""
+    watcher = _FirstPaint(widget, callback)
+    widget.installEventFilter(watcher)
+    return watcher
+
+
+class ModulePreloader:
+    """Imports modules on a daemon thread; first use on the GUI thread then finds them loaded."""
+
+    def __init__(self, modules=BACKGROUND_MODULES):
+        self.modules = tuple(modules)
+        self.errors = {}
+        self.elapsed = None
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="ModulePreload", daemon=True)
+        self._thread.start()
+        return self
+
+    def is_alive(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self):
+        started = time.perf_counter()
+        for name in self.modules:
+            try:
+                importlib.import_module(name)
+            except Exception as e:
+                self.errors[name] = str(e)
+                print(f"[startup] Could not preload {name}: {e}")
+        self.elapsed = time.perf_counter() - started
+
+
+def report_startup(app, window, started):
+    """--startup-check: print the startup timings as one JSON line and quit.
+    first_window_ms counts from `started` (top of main.py) to the end of the first paint;
+    engine_ready_ms to the end of the background preload (None if it failed).
+    """
+    result = {}
+
+    def first_window():
+        result['first_window_ms'] = (time.perf_counter() - started) * 1000.0
+        result['early_modules'] = [m for m in DEFERRED_MODULES if m in sys.modules]
+        from ui import resources
+        result['resources'] = resources.stats()
+        print(FIRST_WINDOW_MARKER, file=sys.stderr, flush=True)
+        QTimer.singleShot(0, engine_ready)
+
+    def engine_ready():
+        preloader = getattr(window, 'preloader', None)
+        if preloader is None or preloader.is_alive():
+            QTimer.singleShot(10, engine_ready)
+            return
+        result['engine_ready_ms'] = None if preloader.errors else (time.perf_counter() - started) * 1000.0
+        result['preload_errors'] = preloader.errors
+        print(json.dumps(result), flush=True)
+        app.quit()
+
+    return after_first_paint(window, first_window)
+
+
+_IMPORTTIME_RE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|( *)(\S+)')
+
+
+def parse_importtime(text):
+    """Entries of a `python -X importtime` log: [(module, self_us, cumulative_us, depth, before_window)]."""
+    entries = []
+    before = True
+    for line in text.splitlines():
+        if line.startswith(FIRST_WINDOW_MARKER):
+            before = False
+            continue
+        m = _IMPORTTIME_RE.match(line)
+        if m:
+            depth = max(0, (len(m.group(3)) - 1) // 2)
+            entries.append((m.group(4), int(m.group(1)), int(m.group(2)), depth, before))
+    return entries
+
+
+def import_report(entries, top=25):
+    """Text report: import time before/after the first window and the slowest imports of each."""
+    lines = []
+    for before, title in ((True, "before the first window"), (False, "in the background")):
+        part = [e for e in entries if e[4] == before]
+        total = sum(e[1] for e in part) / 1000.0
+        lines.append(f"Imports {title}: {len(part)} modules, {total:.1f} ms")
+        for name, self_us, cumulative_us, depth, _ in sorted(part, key=lambda e: -e[2])[:top]:
+            lines.append(f"  {cumulative_us / 1000.0:8.1f} ms  (self {self_us / 1000.0:6.1f} ms)  {name}")
+        lines.append("")
+    return "\n".join(lines)
+
+
+def profile_imports(script, top=25):
+    """--profile-imports: run the startup check under -X importtime and print the report."""
+    cmd = [sys.executable, '-X', 'importtime', script, '--startup-check']
+    proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+    print(import_report(parse_importtime(proc.stderr), top))
+    if proc.stdout.strip():
+        print(proc.stdout.strip().splitlines()[-1])
+    return proc.returncode
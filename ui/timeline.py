@@ -1,16 +1,25 @@
-from PyQt5.QtWidgets import QWidget
+from PyQt5.QtWidgets import QWidget, QMenu
 from PyQt5.QtCore import Qt, pyqtSignal, QObject
-from PyQt5.QtGui import QPainter, QColor, QPen, QPainterPath
+from PyQt5.QtGui import QPainter, QColor, QPen, QPainterPath, QFont
 import numpy as np
 
 
 class TimelineWidget(QWidget):
     # Emite a fração (0..1) do ponto clicado para solicitar seek
     seekRequested = pyqtSignal(float)
+    markerClicked = pyqtSignal(int)            # marker index
+    addMarkerRequested = pyqtSignal(float)     # fraction
+    removeMarkerRequested = pyqtSignal(int)    # marker index
+    loopSectionRequested = pyqtSignal(float)   # fraction inside the section to loop
+    clearLoopRequested = pyqtSignal()
+    savedLoopRequested = pyqtSignal(int)     # index of a loop saved with the song
     def __init__(self, parent=None):
         super().__init__(parent)
         self._envelope = []
         self._playhead_frac = 0.0
+        self._markers = []      # [(fraction, name)]
+        self._loop = None       # (start_frac, end_frac)
+        self._saved_loops = []  # names of the loops saved with the song
         self.setMinimumHeight(100)
         self.setAttribute(Qt.WA_StyledBackground, True)
         self.setStyleSheet("background-color: #252525;")
@@ -23,8 +32,67 @@ class TimelineWidget(QWidget):
         self._playhead_frac = max(0.0, min(1.0, float(frac)))
         self.update()
 
+    def set_markers(self, markers):
+        """markers: list of (fraction, name) pairs."""
+        self._markers = list(markers or [])
+        self.update()
+
+    def set_loop_fraction(self, loop):
+        """loop: (start_frac, end_frac) or None."""
+        self._loop = loop
+        self.update()
+
+    def set_saved_loops(self, names):
+        """names: labels of the song's saved loops, in their stored order."""
+        self._saved_loops = list(names or [])
+
+    def _marker_at(self, x, y):
+        if y > 18:
+            return -1
+        w = max(1, self.width())
+        for i, (frac, _) in enumerate(self._markers):
+            if abs(int(frac * w) - x) <= 6:
+                return i
+        return -1
+
+    def contextMenuEvent(self, event):
+        try:
+            w = max(1, self.width())
+            frac = max(0.0, min(1.0, event.x() / float(w)))
+            marker_idx = self._marker_at(event.x(), event.y())
+            menu = QMenu(self)
+            add_action = menu.addAction("Adicionar marcador aqui")
+            remove_action = menu.addAction("Remover marcador") if marker_idx >= 0 else None
+            loop_action = menu.addAction("Loop desta seção")
+            clear_action = menu.addAction("Sair do loop") if self._loop else None
+            saved_actions = {}
+            if self._saved_loops:
+                saved_menu = menu.addMenu("Loops salvos")
+                for i, name in enumerate(self._saved_loops):
+                    saved_actions[saved_menu.addAction(name)] = i
+            chosen = menu.exec_(event.globalPos())
+            if chosen is None:
+                return
+            if chosen in saved_actions:
+                self.savedLoopRequested.emit(saved_actions[chosen])
+                return
+            if chosen == add_action:
+                self.addMarkerRequested.emit(frac)
+            elif chosen == remove_action:
+                self.removeMarkerRequested.emit(marker_idx)
+            elif chosen == loop_action:
+                self.loopSectionRequested.emit(frac)
+            elif chosen == clear_action:
+                self.clearLoopRequested.emit()
+        except Exception:
+            pass
+
     def mousePressEvent(self, event):
         if event.button() == Qt.LeftButton:
+            marker_idx = self._marker_at(event.x(), event.y())
+            if marker_idx >= 0:
+                self.markerClicked.emit(marker_idx)
+                return
             try:
                 w = max(1, self.width())
                 x = max(0, min(event.x(), w))
@@ -63,6 +131,26 @@ class TimelineWidget(QWidget):
         p.setPen(Qt.NoPen)
         p.setBrush(QColor(255, 255, 255, 200))
         p.drawPath(path)
+        # Loop region overlay
+        if self._loop:
+            lx0 = int(self._loop[0] * w)
+            lx1 = int(self._loop[1] * w)
+            p.fillRect(lx0, 0, max(1, lx1 - lx0), h, QColor(51, 153, 255, 60))
+            p.setPen(QPen(QColor("#3399ff"), 2))
+            p.drawLine(lx0, 0, lx0, h)
+            p.drawLine(lx1, 0, lx1, h)
+        # Markers with numbered flags
+        if self._markers:
+            p.setFont(QFont("Arial", 8, QFont.Bold))
+            for i, (frac, _) in enumerate(self._markers):
+                mx = int(frac * w)
+                p.setPen(QPen(QColor("#ffc107"), 1))
+                p.drawLine(mx, 0, mx, h)
+                p.setPen(Qt.NoPen)
+                p.setBrush(QColor("#ffc107"))
+                p.drawRect(mx, 0, 16, 14)
+                p.setPen(QColor("#000000"))
+                p.drawText(mx + 3, 11, str(i + 1))
         ph_x = int(self._playhead_frac * w)
         p.setPen(QPen(QColor("#49c149"), 2))
         p.drawLine(ph_x, 0, ph_x, h)
@@ -84,14 +172,14 @@ class TimelineWorker(QObject):
             if not tracks:
                 self.envelopeReady.emit([], 0, 0, self.song_id)
                 return
-            max_len = max(len(t['samples']) for t in tracks)
-            sample_rate = tracks[0].get('sample_rate', 44100)
+            max_len = max(len(t.samples) for t in tracks)
+            sample_rate = tracks[0].sample_rate
             block = max(1, max_len // self.target_points)
             combined = None
             for t in tracks:
-                samples = t['samples']
-                vol = t.get('volume', 0.8)
-                muted = t.get('muted', False)
+                samples = t.samples
+                vol = t.volume
+                muted = t.muted
                 if muted:
                     continue
                 try:
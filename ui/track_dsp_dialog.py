@@ -0,0 +1,150 @@
+from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QGridLayout, QLabel, QPushButton,
+                             QCheckBox, QSpinBox, QDoubleSpinBox, QSlider)
+from PyQt5.QtCore import Qt, pyqtSignal
+from PyQt5.QtGui import QFont
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from audio.dsp import normalize_dsp, HPF_RANGE, EQ_BANDS, EQ_GAIN_RANGE, EQ_Q_RANGE, DEFAULT_EQ
+
+DEFAULT_HPF = 80
+
+
+class TrackDSPDialog(QDialog):
+    """Insert chain of one track: high-pass, parametric EQ bands and pan.
+    Every edit emits settingsChanged with the full settings dict, so changes are heard live.
+    """
+    settingsChanged = pyqtSignal(dict)
+
+    def __init__(self, track_name, settings=None, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle(f"Processamento — {track_name}")
+        self.setModal(False)
+        self.setAttribute(Qt.WA_DeleteOnClose, True)
+        self.setStyleSheet("""
+            QDialog { background-color: #181818; }
+            QLabel, QCheckBox { color: #FFFFFF; }
+            QSpinBox, QDoubleSpinBox {
+                background-color: #2A2A2A; color: #FFFFFF; border: none;
+                border-radius: 6px; padding: 4px 6px;
+            }
+            QPushButton {
+                background-color: #FFFFFF; color: #000000; border: none;
+                border-radius: 14px; padding: 6px 18px; font-weight: 600;
+            }
+            QPushButton:hover { background-color: #B3B3B3; }
+        """)
+        self._loading = False
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(20, 18, 20, 18)
+        layout.setSpacing(14)
+
+        title = QLabel(track_name)
+        title.setFont(QFont("SF Pro Display", 16, QFont.Bold))
+        layout.addWidget(title)
+
+        # Filtro passa-altas
+        hpf_row = QHBoxLayout()
+        self.hpf_enabled = QCheckBox("Passa-altas")
+        self.hpf_freq = QSpinBox()
+        self.hpf_freq.setRange(int(HPF_RANGE[0]), int(HPF_RANGE[1]))
+        self.hpf_freq.setSuffix(" Hz")
+        self.hpf_freq.setValue(DEFAULT_HPF)
+        hpf_row.addWidget(self.hpf_enabled)
+        hpf_row.addStretch(1)
+        hpf_row.addWidget(self.hpf_freq)
+        layout.addLayout(hpf_row)
+
+        # Equalizador paramétrico
+        grid = QGridLayout()
+        grid.setHorizontalSpacing(10)
+        for col, text in enumerate(("Banda", "Frequência", "Ganho", "Q")):
+            header = QLabel(text)
+            header.setStyleSheet("color: #B3B3B3;")
+            grid.addWidget(header, 0, col)
+        self.bands = []
+        for i in range(EQ_BANDS):
+            freq = QSpinBox()
+            freq.setRange(20, 20000)
+            freq.setSuffix(" Hz")
+            gain = QDoubleSpinBox()
+            gain.setRange(*EQ_GAIN_RANGE)
+            gain.setSingleStep(0.5)
+            gain.setDecimals(1)
+            gain.setSuffix(" dB")
+            q = QDoubleSpinBox()
+            q.setRange(*EQ_Q_RANGE)
+            q.setSingleStep(0.1)
+            q.setDecimals(2)
+            grid.addWidget(QLabel(str(i + 1)), i + 1, 0)
+            grid.addWidget(freq, i + 1, 1)
+            grid.addWidget(gain, i + 1, 2)
+            grid.addWidget(q, i + 1, 3)
+            self.bands.append((freq, gain, q))
+        layout.addLayout(grid)
+
+        # Pan / balanço
+        pan_row = QHBoxLayout()
+        pan_row.addWidget(QLabel("Pan"))
+        self.pan = QSlider(Qt.Horizontal)
+        self.pan.setRange(-100, 100)
+        self.pan_label = QLabel("C")
+        self.pan_label.setMinimumWidth(40)
+        pan_row.addWidget(self.pan, 1)
+        pan_row.addWidget(self.pan_label)
+        layout.addLayout(pan_row)
+
+        buttons = QHBoxLayout()
+        reset_btn = QPushButton("Redefinir")
+        close_btn = QPushButton("Fechar")
+        reset_btn.clicked.connect(lambda: self.set_settings(None, emit=True))
+        close_btn.clicked.connect(self.close)
+        buttons.addWidget(reset_btn)
+        buttons.addStretch(1)
+        buttons.addWidget(close_btn)
+        layout.addLayout(buttons)
+
+        self.set_settings(settings)
+        self.hpf_enabled.toggled.connect(self._emit)
+        self.hpf_freq.valueChanged.connect(self._emit)
+        for freq, gain, q in self.bands:
+            freq.valueChanged.connect(self._emit)
+            gain.valueChanged.connect(self._emit)
+            q.valueChanged.connect(self._emit)
+        self.pan.valueChanged.connect(self._emit)
+
+    def set_settings(self, settings, emit=False):
+        s = normalize_dsp(settings)
+        self._loading = True
+        try:
+            self.hpf_enabled.setChecked(s["hpf"] > 0)
+            self.hpf_freq.setValue(int(round(s["hpf"])) if s["hpf"] > 0 else DEFAULT_HPF)
+            for i, (freq, gain, q) in enumerate(self.bands):
+                band = s["eq"][i] if i < len(s["eq"]) else DEFAULT_EQ[i % len(DEFAULT_EQ)]
+                freq.setValue(int(round(band["freq"])))
+                gain.setValue(band["gain"])
+                q.setValue(band["q"])
+            self.pan.setValue(int(round(s["pan"] * 100)))
+            self._update_pan_label()
+        finally:
+            self._loading = False
+        if emit:
+            self._emit()
+
+    def settings(self):
+        return {
+            "hpf": float(self.hpf_freq.value()) if self.hpf_enabled.isChecked() else 0.0,
+            "eq": [{"freq": float(f.value()), "gain": float(g.value()), "q": float(q.value())}
+                   for f, g, q in self.bands],
+            "pan": self.pan.value() / 100.0,
+        }
+
+    def _update_pan_label(self):
+        v = self.pan.value()
+        self.pan_label.setText("C" if v == 0 else (f"L{-v}" if v < 0 else f"R{v}"))
+
+    def _emit(self, *args):
+        self._update_pan_label()
+        if not self._loading:
+            self.settingsChanged.emit(self.settings())
@@ -1,15 +1,58 @@
 from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel, QSlider, QPushButton, 
-                             QGroupBox, QCheckBox, QScrollArea, QFrame, QSizePolicy)
+                             QGroupBox, QCheckBox, QScrollArea, QFrame, QSizePolicy, QMenu)
 from PyQt5.QtCore import Qt, pyqtSignal, QRect, QTimer, QSize, QPropertyAnimation, QEasingCurve, QObject, QThread, QStandardPaths
 from PyQt5.QtGui import QFont, QPainter, QColor, QPen, QPixmap, QPainterPath
 from ui.timeline import TimelineWidget, TimelineWorker
 import numpy as np
-from scipy.io import wavfile
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from audio.player import AudioPlayer
 from audio.manager import AudioManager
+from audio.structure import (song_markers, add_marker, remove_marker, section_bounds, section_name, add_loop,
+                             song_loops)
+from audio.timing import seconds_to_samples, DEFAULT_BEATS_PER_BAR
+from audio.render import offline_player, player_for_song, render_songs
+from audio.route_classifier import classify_route, route_metadata, route_from_metadata
+from audio.wavstream import optimize_to_cache, npz_array_header, wav_channels
+from audio.storage import load_sample_format, to_storage
+from audio.dsp import song_track_dsp
+from audio.transpose import transpose_stems, song_transpose, transposed_key, TRANSPOSE_RANGE
+from audio.practice import PRACTICE_SPEEDS
+from audio.track import DEFAULT_VOLUME
+from ui.track_dsp_dialog import TrackDSPDialog
+
+
+# Hand pixmap shared by every fader (loaded once per process)
+_HAND_PIXMAP = None
+_HAND_PIXMAP_SCALED = None
+
+# Hidden spare strips kept alive after a song with fewer tracks is selected
+_STRIP_POOL_SPARE = 8
+
+# Crossfade length used by "play next with crossfade" on a song card
+TRANSITION_CROSSFADE_MS = 2000
+
+
+def _clock_text(seconds):
+    seconds = int(round(seconds or 0))
+    return f"{seconds // 60}:{seconds % 60:02d}"
+
+
+def _shared_hand_pixmap():
+    """Return the (pixmap, scaled 40x40 pixmap) pair used to draw fader handles."""
+    global _HAND_PIXMAP, _HAND_PIXMAP_SCALED
+    if _HAND_PIXMAP is None:
+        try:
+            base_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+            hand_path = os.path.join(base_path, "hand.png")
+            _HAND_PIXMAP = QPixmap(hand_path)
+            if not _HAND_PIXMAP.isNull():
+                _HAND_PIXMAP_SCALED = _HAND_PIXMAP.scaled(40, 40, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+        except Exception:
+            _HAND_PIXMAP = QPixmap()
+            _HAND_PIXMAP_SCALED = None
+    return _HAND_PIXMAP, _HAND_PIXMAP_SCALED
 
 
 class CustomFader(QSlider):
@@ -24,13 +67,8 @@ class CustomFader(QSlider):
         self.setInvertedAppearance(False)
         self.setFocusPolicy(Qt.NoFocus)
         
-        # Load hand image
-        try:
-            base_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-            hand_path = os.path.join(base_path, "hand.png")
-            self.hand_pixmap = QPixmap(hand_path)
-        except:
-            self.hand_pixmap = None
+        # Hand image is shared across all faders
+        self.hand_pixmap, self._hand_scaled = _shared_hand_pixmap()
             
         # Animation for smooth movement
         self.animation = QPropertyAnimation(self, b"value")
@@ -144,11 +182,9 @@ class CustomFader(QSlider):
         
         # Draw hand (handle) - perfectly centered on the fader
         handle_y = self.height() - 10 - int((self.height() - 20) * (self.value() - self.minimum()) / (self.maximum() - self.minimum()))
-        if self.hand_pixmap and not self.hand_pixmap.isNull():
-            # Scale the pixmap to 40x40
-            scaled_pixmap = self.hand_pixmap.scaled(40, 40, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+        if self._hand_scaled is not None and not self._hand_scaled.isNull():
             # Position: center of fader is at x=50, pixmap is 40px wide, so x=50-20=30
-            painter.drawPixmap(30, handle_y - 20, scaled_pixmap)
+            painter.drawPixmap(30, handle_y - 20, self._hand_scaled)
         else:
             # Fallback: draw a circle if image fails to load
             painter.setPen(QPen(QColor("#5a9bd5"), 2))
@@ -188,6 +224,7 @@ class TrackControl(QWidget):
     muteChanged = pyqtSignal(int, bool)     # track_index, muted
     soloChanged = pyqtSignal(int, bool)     # track_index, solo_state
     faderClicked = pyqtSignal(int)
+    routeMenuRequested = pyqtSignal(int, object)  # track_index, global position
     
     def __init__(self, track_index, track_name, parent=None):
         super().__init__(parent)
@@ -207,7 +244,7 @@ class TrackControl(QWidget):
         layout.setSpacing(8)
         
         # Track name
-        self.name_label = QLabel(self.track_name[:12] + "..." if len(self.track_name) > 12 else self.track_name)
+        self.name_label = QLabel(self._display_name(self.track_name))
         self.name_label.setAlignment(Qt.AlignCenter)
         self.name_label.setStyleSheet("color: #dddddd; font-size: 10px; font-weight: bold;")
         layout.addWidget(self.name_label)
@@ -298,7 +335,24 @@ class TrackControl(QWidget):
         layout.addWidget(self.volume_label)
         
         self.setLayout(layout)
-        
+
+    def _display_name(self, track_name):
+        return track_name[:12] + "..." if len(track_name) > 12 else track_name
+
+    def contextMenuEvent(self, event):
+        self.routeMenuRequested.emit(self.track_index, event.globalPos())
+
+    def rebind(self, track_index, track_name):
+        """Point this strip at another track, resetting per-track UI state."""
+        self.track_index = track_index
+        self.track_name = track_name
+        self.name_label.setText(self._display_name(track_name))
+        self.set_solo(False)
+        self.set_muted(False)
+        self.volume_fader._smoothed_vu = 0.0
+        self.volume_fader.set_vu_level(0.0)
+        self.volume_fader.setProperty("active", False)
+
     def on_volume_changed(self, value):
         self.volume_label.setText(f"{value}%")
         # Emit signal with track index and volume (0.0 to 1.0)
@@ -403,6 +457,11 @@ class MasterTrackControl(QWidget):
         self.recorte_button.setFixedHeight(28)
         actions_layout.addWidget(self.recorte_button)
 
+        self.loop_button = QPushButton("Loop")
+        self.loop_button.setStyleSheet(btn_style)
+        self.loop_button.setFixedHeight(28)
+        actions_layout.addWidget(self.loop_button)
+
         fader_row.addWidget(actions_container)
         fader_row.addStretch(1)
         layout.addLayout(fader_row)
@@ -427,10 +486,19 @@ class MasterTrackControl(QWidget):
 
 class TracksPanel(QWidget):
     songCardSelected = pyqtSignal(object)
+    trackFaderClicked = pyqtSignal(int)  # track_index
+    markerSelected = pyqtSignal(int)  # marker index clicked on the timeline
+    savedLoopSelected = pyqtSignal(int)  # index of a saved loop picked from the timeline menu
+    loopButtonClicked = pyqtSignal()
+    exportMixRequested = pyqtSignal(object)  # song_data, or None for every song
+    exportFinished = pyqtSignal(object)  # {song_id: report dict or error message}
+    songEdited = pyqtSignal(object)  # song_data whose saved settings changed (markers, loops, key, inserts)
+    routingEdited = pyqtSignal()  # bus assignments of the routing presets changed
     def __init__(self, tracks=None, parent=None):
         super().__init__(parent)
         self.tracks = tracks or []
-        self.track_controls = []
+        self.track_controls = []  # Active strips (prefix of the strip pool)
+        self._strip_pool = []  # All TrackControl strips kept alive across songs
         self.audio_manager = AudioManager()  # Use AudioManager instead of direct AudioPlayer
         self.solo_states = {}  # Track solo states
         self.original_mute_states = {}  # Store original mute states when solo is activated
@@ -449,6 +517,7 @@ class TracksPanel(QWidget):
         
         # Connect to playback state change signal
         self.audio_manager.playbackStateChanged.connect(self.on_playback_state_changed)
+        self.audio_manager.transposeMissing.connect(self._render_transpose)
         # Blink timer for selected card border
         self.card_blink_timer = QTimer(self)
         self.card_blink_timer.setInterval(500)
@@ -466,6 +535,11 @@ class TracksPanel(QWidget):
         # Optimization threads map
         self._opt_threads = {}
         self._opt_workers = {}
+        self._transpose_threads = {}
+        self._transpose_workers = {}
+        # Offline mix export (one batch at a time)
+        self._bounce_thread = None
+        self._bounce_worker = None
 
     def connect_player_signals(self):
         """Connect to the current player's signals for VU meter updates, safely handling reconnection."""
@@ -488,6 +562,71 @@ class TracksPanel(QWidget):
         except Exception:
             pass
 
+    def bind_tracks(self, track_paths):
+        """Bind pooled track strips to the given tracks, growing or shrinking the pool as needed."""
+        self.tracks = list(track_paths or [])
+        self.solo_states.clear()
+        self.original_mute_states.clear()
+        needed = len(self.tracks)
+        # Grow: create only the strips we don't have yet
+        while len(self._strip_pool) < needed:
+            self._strip_pool.append(self._create_track_strip(len(self._strip_pool)))
+        # Shrink: drop surplus strips beyond a small spare margin
+        keep = needed + _STRIP_POOL_SPARE
+        while len(self._strip_pool) > keep:
+            strip = self._strip_pool.pop()
+            self.tracks_layout.removeWidget(strip)
+            strip.deleteLater()
+        player = self.audio_manager.current_player
+        player_tracks = getattr(player, 'tracks', [])
+        for i, strip in enumerate(self._strip_pool):
+            if i >= needed:
+                strip.setVisible(False)
+                continue
+            strip.rebind(i, os.path.basename(self.tracks[i]))
+            if 0 <= i < len(player_tracks):
+                vol, muted = player_tracks[i].volume, player_tracks[i].muted
+            else:
+                # No player track behind this strip (yet): don't keep the previous song's fader
+                vol, muted = DEFAULT_VOLUME, False
+            if vol is None:
+                vol = DEFAULT_VOLUME
+            # Convert stored amplitude gain to slider percent using panel mapping
+            try:
+                pct = self._gain_to_slider_pct(vol)
+                strip.set_volume(pct / 100.0)
+            except Exception:
+                strip.set_volume(vol)
+            strip.set_muted(muted)
+            strip.setVisible(True)
+        self.track_controls = self._strip_pool[:needed]
+
+    def clear_tracks(self):
+        """Hide all track strips without destroying them."""
+        self.bind_tracks([])
+
+    def _create_track_strip(self, index):
+        strip = TrackControl(index, "")
+        # Strips report their current track_index, so connections survive rebinding
+        strip.volumeChanged.connect(self.on_track_volume_changed)
+        strip.muteChanged.connect(self.on_track_mute_changed)
+        strip.soloChanged.connect(self.on_track_solo_changed)
+        strip.faderClicked.connect(self.trackFaderClicked.emit)
+        strip.routeMenuRequested.connect(self.show_track_route_menu)
+        # Estilo especial para o primeiro fader após o master
+        if index == 0:
+            try:
+                strip.setStyleSheet(
+                    "background-color: #252525;"
+                    "border-top-left-radius: 10px;"
+                    "border-bottom-left-radius: 10px;"
+                )
+                strip.setAttribute(Qt.WA_StyledBackground, True)
+            except Exception:
+                pass
+        self.tracks_layout.addWidget(strip)
+        return strip
+
     def set_fader_blink(self, track_index, on):
         try:
             if 0 <= track_index < len(self.track_controls):
@@ -553,6 +692,12 @@ class TracksPanel(QWidget):
             self.timeline_widget.setVisible(False)
             try:
                 self.timeline_widget.seekRequested.connect(self.on_timeline_seek_requested)
+                self.timeline_widget.markerClicked.connect(self.markerSelected.emit)
+                self.timeline_widget.addMarkerRequested.connect(self.add_marker_at_fraction)
+                self.timeline_widget.removeMarkerRequested.connect(self.remove_marker_at)
+                self.timeline_widget.loopSectionRequested.connect(self.loop_section_at_fraction)
+                self.timeline_widget.clearLoopRequested.connect(self.exit_loop)
+                self.timeline_widget.savedLoopRequested.connect(self.savedLoopSelected.emit)
             except Exception:
                 pass
             layout.addWidget(self.timeline_widget)
@@ -606,6 +751,10 @@ class TracksPanel(QWidget):
             self.master_control.ajuste_button.style().polish(self.master_control.ajuste_button)
         except Exception:
             pass
+        try:
+            self.master_control.loop_button.clicked.connect(self.loopButtonClicked.emit)
+        except Exception:
+            pass
         tracks_main_layout.addWidget(self.master_control)
         
         # Add separator line between master fader and tracks
@@ -654,6 +803,7 @@ class TracksPanel(QWidget):
         """Add a song card to the display"""
         try:
             song_id = self._get_song_id(song_data) if song_data else None
+            key = transposed_key(key, song_transpose(song_data))
             if song_id and song_id in self.song_card_map:
                 # Update existing card info
                 existing = self.song_card_map[song_id]
@@ -662,6 +812,10 @@ class TracksPanel(QWidget):
                 song_card = SongCardWidget(song_name, key, bpm, banner_image_path)
                 song_card.song_data = song_data
                 song_card.clicked.connect(lambda sc=song_card, sd=song_data: self.on_song_card_clicked(sc, sd))
+                song_card.transitionRequested.connect(lambda mode, sd=song_data: self.queue_song_transition(sd, mode))
+                song_card.exportRequested.connect(lambda all_songs, sd=song_data: self.exportMixRequested.emit(None if all_songs else sd))
+                song_card.transposeRequested.connect(lambda semitones, sd=song_data: self.transpose_song(sd, semitones))
+                song_card.practiceSpeedRequested.connect(lambda speed, sd=song_data: self.set_practice_speed(sd, speed))
                 self.song_cards.append(song_card)
                 self.song_cards_layout.addWidget(song_card)
                 if song_id:
@@ -670,11 +824,25 @@ class TracksPanel(QWidget):
         except Exception as e:
             print(f"Error adding song card: {e}")
 
+    def rekey_song(self, old_id, song_data):
+        """Move a song's card and cached timeline to its new id (its stems were relinked)."""
+        new_id = self._get_song_id(song_data)
+        if new_id == old_id:
+            return
+        card = self.song_card_map.pop(old_id, None)
+        if card is not None:
+            self.song_card_map[new_id] = card
+        cached = self.timeline_cache.pop(old_id, None)
+        if cached is not None:
+            self.timeline_cache[new_id] = cached
+
     # Add method to update song cards
     def update_song_card(self, index, song_name, key, bpm, banner_image_path=None):
         """Update an existing song card"""
         if 0 <= index < len(self.song_cards):
-            self.song_cards[index].update_info(song_name, key, bpm, banner_image_path)
+            card = self.song_cards[index]
+            key = transposed_key(key, song_transpose(getattr(card, 'song_data', None)))
+            card.update_info(song_name, key, bpm, banner_image_path)
 
     # Add method to clear song cards
     def clear_song_cards(self):
@@ -760,6 +928,135 @@ class TracksPanel(QWidget):
         self._opt_threads.pop(song_id, None)
         self._opt_workers.pop(song_id, None)
 
+    def transpose_song(self, song_data, semitones):
+        """Move a song to another key. Stems already rendered for that key switch at once; the
+        others are rendered in the background first and the song switches when they are ready.
+        """
+        try:
+            ready = self.audio_manager.set_transpose(song_data, semitones)
+            self.songEdited.emit(song_data)
+            if ready:
+                self._refresh_card_key(song_data)
+                return
+            self._render_transpose(song_data)
+        except Exception as e:
+            print(f"Error starting transposition: {e}")
+
+    def _render_transpose(self, song_data):
+        """Render the stems missing for the song's stored key offset in the background (a new key,
+        or a project opened after its variants were removed from the cache)."""
+        try:
+            song_id = self._get_song_id(song_data)
+            if song_id in self._transpose_threads:
+                return  # The running render switches to the song's key (just stored) when it ends
+            semitones = song_transpose(song_data)
+            jobs = self.audio_manager.transpose_jobs(song_data, semitones)
+            card = self.song_card_map.get(song_id)
+            if card:
+                card.set_loading(True)
+                card.set_loading_progress(0.0)
+            thread = QThread(self)
+            worker = TransposeWorker(song_data, song_id, jobs, semitones)
+            worker.moveToThread(thread)
+            thread.started.connect(worker.run)
+            worker.progressUpdated.connect(self._on_opt_progress)
+            worker.done.connect(self._on_transpose_done)
+            # The connection keeps the worker alive until its thread has finished
+            thread.finished.connect(lambda w=worker: w.deleteLater())
+            self._transpose_threads[song_id] = thread
+            self._transpose_workers[song_id] = worker
+            thread.start()
+        except Exception as e:
+            print(f"Error starting transposition: {e}")
+
+    def _on_transpose_done(self, song_id, errors):
+        worker = self._transpose_workers.pop(song_id, None)
+        thread = self._transpose_threads.pop(song_id, None)
+        if thread is not None:
+            thread.quit()
+        card = self.song_card_map.get(song_id)
+        if card:
+            card.set_loading_progress(1.0)
+            card.set_loading(False)
+        if worker is None:
+            return
+        for path, error in errors.items():
+            print(f"Transposition error for {path}: {error}")
+        song = worker.song_data
+        # The key may have been changed again while rendering: go on with the one stored now
+        if not self.audio_manager.set_transpose(song, song_transpose(song)):
+            if errors and worker.semitones == song_transpose(song):
+                # The song keeps playing in the key it had: the card and the project say so too
+                self.audio_manager.revert_transpose(song)
+                self.songEdited.emit(song)
+            else:
+                self.transpose_song(song, song_transpose(song))
+        self._refresh_card_key(song)
+
+    def set_practice_speed(self, song_data, speed):
+        """Slow a song down for rehearsal (same pitch); the card shows the speed."""
+        try:
+            self.audio_manager.set_practice_speed(song_data, speed)
+            card = self.song_card_map.get(self._get_song_id(song_data))
+            if card:
+                card.set_practice_speed(self.audio_manager.practice_speed(song_data))
+        except Exception as e:
+            print(f"Error setting practice speed: {e}")
+
+    def _refresh_card_key(self, song_data):
+        card = self.song_card_map.get(self._get_song_id(song_data))
+        if card:
+            card.update_info(song_data.get("name", ""), transposed_key(song_data.get("key", ""), song_transpose(song_data)),
+                             song_data.get("bpm", ""))
+
+    def export_mixes(self, targets):
+        """Render the mix of each (song_data, out_path) to WAV in the background.
+        Songs already loaded use their live fader/mute/LR settings.
+        """
+        if self._bounce_thread is not None or not targets:
+            return False
+        try:
+            jobs = []
+            for song_data, out_path in targets:
+                song_id = self._get_song_id(song_data)
+                live = self.audio_manager.players.get(song_id)
+                jobs.append((song_id, song_data, live, out_path))
+                card = self.song_card_map.get(song_id)
+                if card:
+                    card.set_loading(True)
+                    card.set_loading_progress(0.0)
+            thread = QThread(self)
+            worker = BounceWorker(jobs, self.audio_manager.lr_enabled)
+            worker.moveToThread(thread)
+            thread.started.connect(worker.run)
+            worker.progressUpdated.connect(self._on_opt_progress)
+            worker.done.connect(self._on_bounce_done)
+            thread.finished.connect(self._cleanup_bounce_thread)
+            self._bounce_thread = thread
+            self._bounce_worker = worker
+            thread.start()
+            return True
+        except Exception as e:
+            print(f"Error starting mix export: {e}")
+            return False
+
+    def _on_bounce_done(self, results):
+        for song_id in results:
+            card = self.song_card_map.get(song_id)
+            if card:
+                card.set_loading_progress(1.0)
+                card.set_loading(False)
+        try:
+            if self._bounce_thread:
+                self._bounce_thread.quit()
+        except Exception:
+            pass
+        self.exportFinished.emit(results)
+
+    def _cleanup_bounce_thread(self):
+        self._bounce_thread = None
+        self._bounce_worker = None
+
     def _get_song_id(self, song_data):
         """Generate a unique ID for the song card to avoid duplicates"""
         if not song_data:
@@ -836,6 +1133,21 @@ class TracksPanel(QWidget):
         except Exception:
             pass
 
+    def queue_song_transition(self, song_data, mode='bar'):
+        """Queue a song to follow the current one on the next bar line (see AudioManager)."""
+        if not song_data:
+            return
+        try:
+            if mode == 'count_in':
+                # One bar of clicks at the new song's tempo
+                self.audio_manager.queue_song_transition(song_data, count_in_beats=DEFAULT_BEATS_PER_BAR)
+            elif mode == 'crossfade':
+                self.audio_manager.queue_song_transition(song_data, crossfade_ms=TRANSITION_CROSSFADE_MS)
+            else:
+                self.audio_manager.queue_song_transition(song_data)
+        except Exception as e:
+            print(f"Error queueing song transition: {e}")
+
     def build_timeline_for_current_song(self):
         """Compute and display the envelope asynchronously to avoid blocking the UI."""
         try:
@@ -857,6 +1169,7 @@ class TracksPanel(QWidget):
                 self.timeline_widget.set_envelope(self.timeline_envelope)
                 self.timeline_widget.set_playhead_fraction(0.0)
                 self.timeline_widget.setVisible(True)
+                self.refresh_timeline_structure()
                 return
             # Cancel previous worker if running
             self._cleanup_timeline_worker()
@@ -889,6 +1202,7 @@ class TracksPanel(QWidget):
             self.timeline_widget.set_envelope(self.timeline_envelope)
             self.timeline_widget.set_playhead_fraction(0.0)
             self.timeline_widget.setVisible(bool(self.timeline_envelope))
+            self.refresh_timeline_structure()
         # Cleanup thread
         if self._timeline_thread:
             self._timeline_thread.quit()
@@ -905,11 +1219,8 @@ class TracksPanel(QWidget):
         self._timeline_worker = None
 
     def on_timeline_seek_requested(self, frac: float):
-        """Handle seek requests from the timeline. Only seeks when not playing (paused or stopped)."""
+        """Handle seek requests from the timeline. While playing, the player crossfades into the new position."""
         try:
-            # Allow seek only when not playing (paused or stopped)
-            if self.audio_manager.is_playing():
-                return
             player = self.audio_manager.current_player
             if not player:
                 return
@@ -930,6 +1241,148 @@ class TracksPanel(QWidget):
         except Exception:
             pass
 
+    def _timeline_duration(self):
+        """Current song duration in seconds, from the timeline or the loaded tracks."""
+        rate = self.timeline_sample_rate
+        total = self.timeline_total_samples
+        if total <= 0 or rate <= 0:
+            player = self.audio_manager.current_player
+            tracks = getattr(player, 'tracks', [])
+            if not tracks:
+                return 0.0, 0
+            rate = int(tracks[0].sample_rate)
+            total = player.params.song_length()
+        return total / float(rate), int(rate)
+
+    def refresh_timeline_structure(self):
+        """Push the current song's markers and active loop to the timeline."""
+        try:
+            if not self.timeline_widget:
+                return
+            duration, rate = self._timeline_duration()
+            song = self.audio_manager.current_song
+            if duration <= 0 or not song:
+                self.timeline_widget.set_markers([])
+                self.timeline_widget.set_loop_fraction(None)
+                self.timeline_widget.set_saved_loops([])
+                return
+            markers = [(min(1.0, m['time'] / duration), m['name']) for m in song_markers(song)]
+            self.timeline_widget.set_markers(markers)
+            self.timeline_widget.set_saved_loops(
+                f"{lp['name'] or f'Loop {i + 1}'} ({_clock_text(lp['start'])}–{_clock_text(lp['end'])})"
+                for i, lp in enumerate(song_loops(song)))
+            player = self.audio_manager.current_player
+            loop = getattr(player, 'loop_region', None)
+            total = duration * rate
+            self.timeline_widget.set_loop_fraction((loop[0] / total, loop[1] / total) if loop else None)
+            try:
+                btn = self.master_control.loop_button
+                btn.setProperty("active", "true" if loop else "false")
+                btn.style().unpolish(btn)
+                btn.style().polish(btn)
+            except Exception:
+                pass
+        except Exception:
+            pass
+
+    def add_marker_at_fraction(self, frac):
+        song = self.audio_manager.current_song
+        duration, _ = self._timeline_duration()
+        if song is None or duration <= 0:
+            return
+        add_marker(song, max(0.0, min(1.0, float(frac))) * duration)
+        self.songEdited.emit(song)
+        self.refresh_timeline_structure()
+
+    def remove_marker_at(self, index):
+        song = self.audio_manager.current_song
+        if song is not None and remove_marker(song, index):
+            self.songEdited.emit(song)
+            self.refresh_timeline_structure()
+
+    def jump_to_marker(self, index):
+        """Jump to marker N (0-based) at the next bar boundary of the song's BPM."""
+        try:
+            song = self.audio_manager.current_song
+            player = self.audio_manager.current_player
+            markers = song_markers(song)
+            if not player or not (0 <= index < len(markers)):
+                return False
+            _, rate = self._timeline_duration()
+            target = seconds_to_samples(markers[index]['time'], rate)
+            ok = player.arm_jump(target)
+            if ok and not player.is_playing() and self.timeline_widget and self.timeline_total_samples > 0:
+                self.timeline_widget.set_playhead_fraction(target / float(self.timeline_total_samples))
+            return ok
+        except Exception:
+            return False
+
+    def loop_section_at_fraction(self, frac):
+        duration, _ = self._timeline_duration()
+        self.loop_section_at(max(0.0, min(1.0, float(frac))) * duration)
+
+    def loop_section_at(self, time):
+        """Loop the section (span between markers) containing time, in seconds."""
+        try:
+            song = self.audio_manager.current_song
+            player = self.audio_manager.current_player
+            duration, rate = self._timeline_duration()
+            if not song or not player or duration <= 0:
+                return False
+            start, end = section_bounds(song, time, duration)
+            if not player.set_loop_region(seconds_to_samples(start, rate), seconds_to_samples(end, rate)):
+                return False
+            add_loop(song, start, end, section_name(song, start))
+            self.songEdited.emit(song)
+            self.refresh_timeline_structure()
+            return True
+        except Exception:
+            return False
+
+    def loop_saved(self, index):
+        """Loop saved loop N (0-based), entering it at the next bar boundary of the song's BPM."""
+        try:
+            song = self.audio_manager.current_song
+            player = self.audio_manager.current_player
+            loops = song_loops(song)
+            _, rate = self._timeline_duration()
+            if not player or rate <= 0 or not (0 <= index < len(loops)):
+                return False
+            ok = player.arm_loop_region(seconds_to_samples(loops[index]['start'], rate),
+                                        seconds_to_samples(loops[index]['end'], rate))
+            self.refresh_timeline_structure()
+            return ok
+        except Exception:
+            return False
+
+    def toggle_loop_section(self):
+        """Loop the section under the playhead, or leave the active loop."""
+        player = self.audio_manager.current_player
+        if not player:
+            return
+        if player.loop_region:
+            self.exit_loop()
+        else:
+            _, rate = self._timeline_duration()
+            if rate > 0:
+                self.loop_section_at(player.current_position / float(rate))
+
+    def exit_loop(self):
+        player = self.audio_manager.current_player
+        if player:
+            player.clear_loop_region()
+        self.refresh_timeline_structure()
+
+    def set_loop_button_blink(self, on):
+        try:
+            btn = self.master_control.loop_button
+            btn.setProperty("active", "true" if on else "false")
+            btn.style().unpolish(btn)
+            btn.style().polish(btn)
+            btn.update()
+        except Exception:
+            pass
+
     def _toggle_card_blink(self):
         self._card_blink_on = not self._card_blink_on
         if self.selected_card:
@@ -976,6 +1429,58 @@ class TracksPanel(QWidget):
         adjusted_gain = track_gain * master_gain
         self.audio_manager.current_player.set_volume(track_index, adjusted_gain)
 
+    def show_track_route_menu(self, track_index, pos):
+        """Per-track bus assignment of the active routing preset."""
+        preset = self.audio_manager.routing
+        player = self.audio_manager.current_player
+        if player is None or not (0 <= track_index < len(player.tracks)):
+            return
+        menu = QMenu(self)
+        act_dsp = menu.addAction("Processamento (EQ / Pan)...")
+        menu.addSeparator()
+        if preset is None:
+            act = menu.addAction("Ative um roteamento nas Configurações")
+            act.setEnabled(False)
+            if menu.exec_(pos) is act_dsp:
+                self.show_track_dsp_dialog(track_index)
+            return
+        track = player.tracks[track_index]
+        current = preset.buses_for(track)
+        actions = {}
+        for bus in preset.buses:
+            channels = "-".join(str(c + 1) for c in bus["channels"])
+            act = menu.addAction(f"{bus['name']} ({channels})")
+            act.setCheckable(True)
+            act.setChecked(bus["name"] in current)
+            actions[act] = bus["name"]
+        menu.addSeparator()
+        act_default = menu.addAction("Padrão do roteamento")
+        chosen = menu.exec_(pos)
+        if chosen is act_dsp:
+            self.show_track_dsp_dialog(track_index)
+        elif chosen is act_default:
+            self.audio_manager.set_track_buses(track.file_path, None)
+            self.routingEdited.emit()
+        elif chosen in actions:
+            name = actions[chosen]
+            buses = [b for b in current if b != name] if name in current else current + [name]
+            self.audio_manager.set_track_buses(track.file_path, buses)
+            self.routingEdited.emit()
+
+    def show_track_dsp_dialog(self, track_index):
+        """Insert chain editor of a track; edits are applied live and stored in the song."""
+        song = self.audio_manager.current_song
+        player = self.audio_manager.current_player
+        if song is None or player is None or not (0 <= track_index < len(player.tracks)):
+            return
+        track = player.tracks[track_index]
+        name = os.path.splitext(os.path.basename(track.file_path))[0]
+        dialog = TrackDSPDialog(name, song_track_dsp(song, track.file_path), self)
+        dialog.settingsChanged.connect(
+            lambda settings: self.audio_manager.set_track_dsp(song, track_index, settings))
+        dialog.settingsChanged.connect(lambda _: self.songEdited.emit(song))
+        dialog.show()
+
     def on_track_mute_changed(self, track_index, muted):
         """Handle mute change for a track"""
         self.audio_manager.current_player.set_mute(track_index, muted)
@@ -1077,6 +1582,10 @@ class TracksPanel(QWidget):
 
 class SongCardWidget(QWidget):
     clicked = pyqtSignal()
+    transitionRequested = pyqtSignal(str)  # 'bar', 'count_in' or 'crossfade'
+    exportRequested = pyqtSignal(bool)  # True = export every song
+    transposeRequested = pyqtSignal(int)  # semitones from the original key
+    practiceSpeedRequested = pyqtSignal(float)  # 1.0 = normal speed
     """Widget to display song information in a visual card format"""
     def __init__(self, song_name, key, bpm, banner_image_path=None, parent=None):
         super().__init__(parent)
@@ -1089,6 +1598,8 @@ class SongCardWidget(QWidget):
         self._blink_on = False
         self._is_loading = False
         self._loading_progress = 0.0
+        self.practice_speed = 1.0
+        self.missing_stems = 0  # Stems not found when the project was opened
         
         # Load banner image if provided
         if self.banner_image_path:
@@ -1108,6 +1619,16 @@ class SongCardWidget(QWidget):
             print(f"Error loading banner image: {e}")
             self.banner_pixmap = None
         
+    def set_banner_image(self, banner_image_path, image):
+        """Banner decoded in the background (QImage) while the project opened."""
+        self.banner_image_path = banner_image_path
+        self.banner_pixmap = QPixmap.fromImage(image)
+        self.update()
+
+    def set_missing(self, count: int):
+        self.missing_stems = int(count)
+        self.update()
+
     def setup_ui(self):
         self.setStyleSheet("""
             QWidget {
@@ -1168,11 +1689,24 @@ class SongCardWidget(QWidget):
         
         # Draw key and BPM at top right with larger font
         info_text = f"{self.key} | {self.bpm} BPM"
+        if self.practice_speed < 1.0:
+            info_text += f" | {int(round(self.practice_speed * 100))}%"
         painter.setFont(QFont("Arial", 12))  # Larger font
         info_metrics = painter.fontMetrics()
         info_width = info_metrics.horizontalAdvance(info_text)
         painter.drawText(self.width() - info_width - 15, 30, info_text)  # Higher position
 
+        # Missing stems badge at top left
+        if self.missing_stems:
+            badge = f"{self.missing_stems} faixa{'s' if self.missing_stems > 1 else ''} faltando"
+            painter.setFont(QFont("Arial", 10, QFont.Bold))
+            badge_w = painter.fontMetrics().horizontalAdvance(badge) + 16
+            painter.setPen(Qt.NoPen)
+            painter.setBrush(QColor("#d9534f"))
+            painter.drawRoundedRect(12, 12, badge_w, 22, 11, 11)
+            painter.setPen(QColor("#ffffff"))
+            painter.drawText(QRect(12, 12, badge_w, 22), Qt.AlignCenter, badge)
+
         # Draw loading progress bar (blue) at bottom when optimizing
         if self._is_loading:
             try:
@@ -1211,10 +1745,58 @@ class SongCardWidget(QWidget):
         self._is_loading = bool(loading)
         self.update()
 
+    def set_practice_speed(self, speed: float):
+        self.practice_speed = float(speed)
+        self.update()
+
     def set_loading_progress(self, progress: float):
         self._loading_progress = float(progress)
         self.update()
 
+    def contextMenuEvent(self, event):
+        menu = QMenu(self)
+        act_bar = menu.addAction("Tocar em seguida (fim do compasso)")
+        act_count = menu.addAction("Tocar em seguida com contagem")
+        act_xfade = menu.addAction("Tocar em seguida com crossfade")
+        menu.addSeparator()
+        act_export = menu.addAction("Exportar mix (WAV)...")
+        act_export_all = menu.addAction("Exportar mix de todas as músicas...")
+        menu.addSeparator()
+        key_menu = menu.addMenu("Tom")
+        current = song_transpose(getattr(self, 'song_data', None))
+        key_actions = {}
+        for semitones in range(TRANSPOSE_RANGE[0], TRANSPOSE_RANGE[1] + 1):
+            label = "Tom original" if semitones == 0 else f"{semitones:+d} semitom" + ("s" if abs(semitones) > 1 else "")
+            key = transposed_key(getattr(self, 'song_data', {}).get("key", ""), semitones) if getattr(self, 'song_data', None) else ""
+            act = key_menu.addAction(f"{label} ({key})" if key and key != "N/A" else label)
+            act.setCheckable(True)
+            act.setChecked(semitones == current)
+            key_actions[act] = semitones
+        speed_menu = menu.addMenu("Velocidade (ensaio)")
+        speed_actions = {}
+        for speed in PRACTICE_SPEEDS:
+            act = speed_menu.addAction("Normal" if speed == 1.0 else f"{int(round(speed * 100))}%")
+            act.setCheckable(True)
+            act.setChecked(abs(speed - self.practice_speed) < 0.005)
+            speed_actions[act] = speed
+        chosen = menu.exec_(event.globalPos())
+        if chosen in key_actions:
+            self.transposeRequested.emit(key_actions[chosen])
+            return
+        if chosen in speed_actions:
+            self.practiceSpeedRequested.emit(speed_actions[chosen])
+            return
+        if chosen is act_bar:
+            self.transitionRequested.emit('bar')
+        elif chosen is act_count:
+            self.transitionRequested.emit('count_in')
+        elif chosen is act_xfade:
+            self.transitionRequested.emit('crossfade')
+        elif chosen is act_export:
+            self.exportRequested.emit(False)
+        elif chosen is act_export_all:
+            self.exportRequested.emit(True)
+
 class AudioOptimizeWorker(QObject):
     progressUpdated = pyqtSignal(str, float)  # song_id, progress 0..1
     done = pyqtSignal(str)  # song_id
@@ -1224,6 +1806,7 @@ class AudioOptimizeWorker(QObject):
         super().__init__()
         self.song_data = song_data
         self.song_id = song_id
+        self.sample_format = load_sample_format()
         try:
             base = QStandardPaths.writableLocation(QStandardPaths.CacheLocation)
             if not base:
@@ -1254,6 +1837,30 @@ class AudioOptimizeWorker(QObject):
     def _npz_path(self, file_path):
         return os.path.join(self.cache_dir, f"{self._cache_key_for(file_path)}.npz")
 
+    def _upgrade_cache(self, path, npz_path):
+        """Bring a cache file written by an older optimizer (or in another sample format) up to date:
+        add the routing decision, keep mono stems mono (they used to be cached duplicated to
+        stereo) and store the samples in the format chosen in the settings."""
+        try:
+            shape, dtype = npz_array_header(npz_path)
+            to_mono = len(shape) == 2 and shape[1] == 2 and wav_channels(path) == 1
+            reformat = dtype != np.dtype(self.sample_format)
+            with np.load(npz_path) as data:
+                route = route_from_metadata(data)
+                if route is not None and not to_mono and not reformat:
+                    return
+                samples = data['samples']
+                sr = int(data['sample_rate'])
+            if to_mono:
+                samples = np.ascontiguousarray(samples[:, :1])
+            samples = to_storage(samples, self.sample_format)
+            left, info = route if route is not None else classify_route(path, samples, sr)
+            tmp_path = npz_path[:-4] + ".tmp.npz"
+            np.savez(tmp_path, samples=samples, sample_rate=sr, **route_metadata(left, info))
+            os.replace(tmp_path, npz_path)
+        except Exception as e:
+            print(f"[AudioOptimizeWorker] Could not update cache file for {path}: {e}")
+
     def run(self):
         try:
             tracks = list(self.song_data.get('tracks', []))
@@ -1263,23 +1870,15 @@ class AudioOptimizeWorker(QObject):
                     # Skip if cache exists
                     npz_path = self._npz_path(path)
                     if os.path.exists(npz_path):
+                        self._upgrade_cache(path, npz_path)
                         self.progressUpdated.emit(self.song_id, float(idx + 1) / float(total))
                         continue
-                    # Read WAV
-                    sr, samples = wavfile.read(path)
-                    # Ensure float32 stereo
-                    if samples.dtype != np.float32 and samples.dtype != np.float64:
-                        samples = samples.astype(np.float32) / 32768.0
-                    if len(samples.shape) == 1:
-                        samples = np.column_stack((samples, samples))
-                    # Offline normalization only (modest headroom, no compression)
-                    peak = float(np.max(np.abs(samples))) if samples.size > 0 else 0.0
-                    target_peak = 0.90
-                    if peak > target_peak:
-                        samples = samples * (target_peak / peak)
-                    samples = np.clip(samples, -1.0, 1.0)
-                    # Save cache
-                    np.savez(npz_path, samples=samples.astype(np.float32), sample_rate=int(sr))
+                    # Two passes over the WAV in chunks (peak, then scaled frames straight into
+                    # the cache file): memory stays at a few chunks even for hour-long stems
+                    optimize_to_cache(path, npz_path,
+                                      progress=lambda frac, i=idx: self.progressUpdated.emit(
+                                          self.song_id, (i + frac) / float(total)),
+                                      sample_format=self.sample_format)
                     self.progressUpdated.emit(self.song_id, float(idx + 1) / float(total))
                 except Exception as e:
                     self.error.emit(str(e))
@@ -1297,4 +1896,54 @@ class AudioOptimizeWorker(QObject):
                 pass
         super().mousePressEvent(event)
 
- 
+
+class TransposeWorker(QObject):
+    progressUpdated = pyqtSignal(str, float)  # song_id, progress 0..1
+    done = pyqtSignal(str, object)  # song_id, {path: error message}
+
+    def __init__(self, song_data, song_id, jobs, semitones):
+        super().__init__()
+        self.song_data = song_data
+        self.song_id = song_id
+        self.jobs = jobs  # [(source path, variant cache path)]
+        self.semitones = semitones
+        self.sample_format = load_sample_format()
+
+    def run(self):
+        errors = {}
+        try:
+            results = transpose_stems(self.jobs, self.semitones, self.sample_format,
+                                      progress=lambda done, total: self.progressUpdated.emit(
+                                          self.song_id, done / float(max(1, total))))
+            errors = {path: str(r) for path, r in results.items() if isinstance(r, Exception)}
+        except Exception as e:
+            errors = {path: str(e) for path, _npz in self.jobs}
+        self.done.emit(self.song_id, errors)
+
+
+class BounceWorker(QObject):
+    progressUpdated = pyqtSignal(str, float)
+    done = pyqtSignal(object)
+
+    def __init__(self, jobs, lr_enabled=False):
+        super().__init__()
+        self.jobs = jobs  # [(song_id, song_data, live_player or None, out_path)]
+        self.lr_enabled = lr_enabled
+
+    def run(self):
+        results = {}
+        try:
+            render_jobs = []
+            for song_id, song_data, live, out_path in self.jobs:
+                if live is not None and live.tracks:
+                    player = offline_player(live, self.lr_enabled)
+                else:
+                    player = player_for_song(song_data, self.lr_enabled)
+                render_jobs.append((song_id, player, out_path))
+            reports = render_songs(render_jobs, progress=self.progressUpdated.emit)
+            for song_id, report in reports.items():
+                results[song_id] = report if isinstance(report, dict) else str(report)
+        except Exception as e:
+            for song_id, _sd, _live, _path in self.jobs:
+                results.setdefault(song_id, str(e))
+        self.done.emit(results)